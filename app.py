@@ -19,29 +19,60 @@ The module uses the following libraries:
 - Pandas and NumPy for data manipulation.
 - Dash Bootstrap Components for styling.
 """
-from dash import Dash, html, dcc, dash_table
-from dash.dependencies import Input, Output, State
+import time
+boot_start = time.perf_counter() # start of the boot, the boot phases are exported on METRICS_ROUTE
+import json
+import logging
+import os
+import threading
+from dash import Dash, html, dcc, dash_table, ctx, no_update
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import plotly.express as px
+from flask import Response, abort, request
+import plotly.colors
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-from jbi100_app.data import get_data
-
-
-# Load the data
-df = get_data()
-
-# Initialize the Dash app
-app = Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
+from jbi100_app.data import get_data, data_version, clean_data
+from jbi100_app.filters import FilterEngine, canonical_filter_key
+from jbi100_app.indexes import GridIndex
+from jbi100_app.lru import LRUCache
+from jbi100_app.cube import CountCube
+from jbi100_app.backends import PandasBackend, SQLiteBackend, build_database, open_database
+from jbi100_app.crosstab import CrossTab
+from jbi100_app.timeline import MonthlyPrefix
+from jbi100_app.density import viewport_from_relayout
+from jbi100_app.lod import pad_bounds
+from jbi100_app.encoding import compact_map_figure, epoch_ms
+from jbi100_app.metrics import Metrics
+from jbi100_app.shared import shared_state, shareable_frame, state_key
+from jbi100_app.jobs import LatestOnly, SingleFlight, Superseded
+from jbi100_app.pool import TaskPool, pool_size, plain_figure
+from jbi100_app.export import FORMATS, csv_stream, parquet_stream, parquet_available, same_origin
+from jbi100_app.sessions import SelectionStore
+from jbi100_app.ingest import DropDirectory, ReadWriteLock
+from jbi100_app.startup import layout_key, load_layout_manifest, save_layout_manifest
+from jbi100_app.config import (
+    CACHE_DIR, # data
+    SHARED_DIR, FAST_START, # workers and startup
+    BACKEND, SQLITE_DIR, QUERY_CACHE_MB, # query backends
+    FILTER_CACHE_MB, FILTER_KEY_DECIMALS, CUBE_CACHE_MB, # filters and counts
+    DENSITY_RASTER_ROWS, DENSITY_GRID_BINS, DENSITY_SMOOTHING, MAX_MAP_POINTS, # map
+    HEATMAP_TOP_K, TIMELINE_MAX_BINS, TIMELINE_CACHE_MB, # correlation heatmap and timeline
+    COALESCE_WINDOW_MS, FIGURE_WORKERS, SINGLE_FLIGHT, # figure updates
+    SELECTION_STORE_MB, SELECTION_TTL_S, # map selections
+    INGEST_DIR, INGEST_POLL_S, # ingesting new incidents
+    EXPORT_ROUTE, EXPORT_CHUNK_ROWS, # export
+    METRICS_ROUTE, # metrics
+)
+# plotly.express is imported by the functions that build figures with it, it is not needed before the first figure
 
-# Get the range of shark lengths for the slider
-shark_length_min = df['Shark.length.m'].min()
-shark_length_max = df['Shark.length.m'].max()
+logger = logging.getLogger(__name__)
 
-# Get the range of years for the year slider
-year_min = df['Incident.year'].min()
-year_max = df['Incident.year'].max()
+# Timings of the stages of the callbacks, exported on METRICS_ROUTE and in the Server-Timing header of the callback responses
+metrics = Metrics(boot_start=boot_start)
+metrics.record_boot('imports', time.perf_counter() - boot_start)
 
 # Define for each category a human-readable name
 categories = {'Shark.common.name': 'Shark Type',
@@ -54,6 +85,109 @@ categories = {'Shark.common.name': 'Shark Type',
               'Site.category': 'Location Type', 
               'Incident.month': 'Incident Month',
               'Data.source': 'Source Type'}
+numeric_columns = ['Shark.length.m', 'Incident.year', 'Latitude', 'Longitude']
+range_dimensions = ['Incident.year', 'Shark.length.m']
+# Columns the SQLite backend stores, the columns the callbacks read
+stored_columns = [*categories, *numeric_columns, 'Shark.full.name', 'index1']
+# Columns of the exported files after the UIN, in this order: the stored columns, so both backends export the same files
+export_columns = stored_columns
+
+
+def build_data(shareable=False, df=None):
+    """
+    Loads the data and builds the structures derived from it.
+    Args:
+    - shareable (bool): Whether to convert the string columns to categoricals, so the data can be shared between workers (see jbi100_app/shared.py).
+    - df (pd.DataFrame): The cleaned data, None loads it with get_data().
+    Returns:
+    - dict: The data ('df') and its filter engine, spatial index and count cube.
+    """
+    if df is None:
+        df = get_data()
+    if shareable:
+        df = shareable_frame(df)
+    return {
+        'df': df,
+        # Index the categorical and numeric filter columns once, used to filter the data in the callbacks
+        'filter_engine': FilterEngine(df, categories, numeric_columns=numeric_columns),
+        # Spatial index over the incident locations, used to resolve map selections
+        'spatial_index': GridIndex(df['Longitude'], df['Latitude']),
+        # Count cube over the filter dimensions, the bar charts, heatmap and timeline are computed from it instead of from the rows
+        'count_cube': CountCube(df, categories, range_dimensions=range_dimensions, cuboid_cache_mb=CUBE_CACHE_MB),
+    }
+
+
+# The query backend that holds the data (see jbi100_app/backends.py) and the contingency tables of the heatmap, set by load_data
+backend = heat_tables = None
+# Bounds of the shark length and year sliders, set by set_slider_bounds
+shark_length_min = shark_length_max = year_min = year_max = None
+# The callbacks query the backend under the read side, load_data and ingest_rows write it under the write side
+data_lock = ReadWriteLock()
+# Set once the data is loaded, with FAST_START the first pages are built from the layout manifest before
+data_loaded = threading.Event()
+# Number of ingested batches, pages compare it with the revision they show to refresh their options and figures
+data_revision = 0
+# Polls INGEST_DIR for new incidents once the data is loaded, see start_data
+ingest_directory = None
+# Cache of the monthly prefix sums of the timeline, keyed by the canonical filter state without the year range (see timeline_bins)
+timeline_cache = LRUCache(int(TIMELINE_CACHE_MB * 1e6), sizeof=lambda series: series.prefix.nbytes)
+metrics.register_cache('timeline', timeline_cache.stats)
+# Latest-only execution of the figure updates of every session, superseded updates are coalesced or cancelled
+figure_jobs = LatestOnly(COALESCE_WINDOW_MS / 1000)
+# Identical figure updates of different pages that run at the same time are computed once (see figure_flight_key)
+figure_flights = SingleFlight(SINGLE_FLIGHT)
+metrics.register_cache('figure_flights', figure_flights.stats)
+# Threads that build the figures of an update concurrently, one per figure at most (row-details is not worth a thread)
+figure_pool = TaskPool(pool_size(FIGURE_WORKERS, 5))
+# The resolved map selections of the pages, the pages only carry a token (see update_selection), shared by the workers with SHARED_DIR
+# (in a directory starting with '.', which shared_state does not remove)
+selection_store = SelectionStore(int(SELECTION_STORE_MB * 1e6), SELECTION_TTL_S, os.path.join(SHARED_DIR, '.selections') if SHARED_DIR else None)
+metrics.register_cache('selections', selection_store.stats)
+
+
+def open_backend():
+    """
+    Opens the query backend of BACKEND. The pandas backend loads the data, from the state shared by the workers if
+    SHARED_DIR is set (only the first worker builds it). The SQLite backend opens the database of the data, the first
+    start writes it from get_data(); the workers share the database file, so SHARED_DIR is not used.
+    """
+    if BACKEND == 'sqlite':
+        key = state_key(data_version(), stored_columns, range_dimensions)
+        path = open_database(SQLITE_DIR, key, lambda path: build_database(path, get_data(), stored_columns, [*categories, *range_dimensions]))
+        return SQLiteBackend(path, categories, range_dimensions=range_dimensions, query_cache_mb=QUERY_CACHE_MB)
+    if BACKEND != 'pandas':
+        raise ValueError(f"Unknown backend {BACKEND!r}, JBI100_BACKEND must be 'pandas' or 'sqlite'")
+    if SHARED_DIR:
+        data = shared_state(SHARED_DIR, state_key(data_version(), categories, numeric_columns, range_dimensions, CUBE_CACHE_MB), lambda: build_data(shareable=True))
+    else:
+        data = build_data()
+    return PandasBackend(data, filter_cache_mb=FILTER_CACHE_MB)
+
+
+def load_data():
+    """
+    Opens the query backend (see open_backend) and sets the globals derived from it. Called under the write side of data_lock, see start_data.
+    """
+    global backend, heat_tables
+    with metrics.span('get_data'):
+        backend = open_backend()
+    for name, cache in backend.caches().items():
+        metrics.register_cache(name, cache.stats)
+    # Contingency tables of the heatmap, from the counts of the backend
+    heat_tables = CrossTab(backend.labels, HEATMAP_TOP_K or None)
+    set_slider_bounds()
+
+
+def set_slider_bounds():
+    """
+    Sets the bounds of the shark length and year sliders to the range of the data, taken from the backend.
+    The shark lengths are rounded like the filter bounds (the lengths are float32, 0.3 is 0.30000001192092896).
+    """
+    global shark_length_min, shark_length_max, year_min, year_max
+    low, high = backend.bounds('Shark.length.m')
+    shark_length_min, shark_length_max = round(float(low), FILTER_KEY_DECIMALS), round(float(high), FILTER_KEY_DECIMALS)
+    year_min, year_max = (int(year) for year in backend.bounds('Incident.year'))
+
 
 # Overview of the variables shown in the tool and the columns from the data source that are used in that variable, used for the pop-up modal
 category_info = {'Shark Type': 'Based on Shark.common.name and Shark.scientific.name',
@@ -68,415 +202,577 @@ category_info = {'Shark Type': 'Based on Shark.common.name and Shark.scientific.
                  'Source Type': 'Data.source',
                  'Shark Length': 'Shark.length.m'}
 
-# Define the continuous color scales
-colorscales = px.colors.named_colorscales()
-# Define the discrete color palettes
-colorsequences = {
-    'Alphabet': px.colors.qualitative.Alphabet,
-    'Antique': px.colors.qualitative.Antique,
-    'Bold': px.colors.qualitative.Bold,
-    'Dark24': px.colors.qualitative.Dark24,
-    'Dark2': px.colors.qualitative.Dark2,
-    'Light24': px.colors.qualitative.Light24,
-    'Pastel': px.colors.qualitative.Pastel,
-    'Pastel1': px.colors.qualitative.Pastel1,
-    'Pastel2': px.colors.qualitative.Pastel2,
-    'Safe': px.colors.qualitative.Safe,
-    'Set1': px.colors.qualitative.Set1,
-    'Set2': px.colors.qualitative.Set2,
-    'Set3': px.colors.qualitative.Set3,
-    'Vivid': px.colors.qualitative.Vivid
-}
+# Names of the discrete color palettes of plotly.colors.qualitative that can be selected
+discrete_palette_names = ['Alphabet', 'Antique', 'Bold', 'Dark24', 'Dark2', 'Light24', 'Pastel', 'Pastel1', 'Pastel2', 'Safe', 'Set1', 'Set2', 'Set3', 'Vivid']
+
+
+def build_palettes():
+    """
+    Resolves the continuous color scales and the discrete color palettes of plotly into lists of colors, for the layout
+    manifest and for the clientside callbacks that change the palette of the figures in the browser.
+    """
+    return {
+        'continuous': {name: plotly.colors.get_colorscale(name) for name in plotly.colors.named_colorscales()},
+        'discrete': {name: getattr(plotly.colors.qualitative, name) for name in discrete_palette_names},
+    }
+
+
+def data_layout_metadata():
+    """
+    Returns the metadata of the layout that depends on the data: the values of every categorical column in sorted order,
+    taken from the backend (which keeps them up to date when incidents are ingested), and the bounds of the sliders.
+    """
+    return {
+        'options': {column: backend.values(column) for column in categories},
+        'shark_length': [shark_length_min, shark_length_max],
+        'year': [year_min, year_max],
+    }
+
+
+def layout_metadata():
+    """
+    Returns the metadata the layout is built from, see data_layout_metadata, and the palettes. While the data loads in the
+    background (FAST_START) it is the metadata of the layout manifest, afterwards that of the data.
+    """
+    if not data_loaded.is_set() and layout_manifest is not None:
+        return layout_manifest
+    with data_lock.read():
+        return {**data_layout_metadata(), 'palettes': palettes}
+
+
+def start_data(background):
+    """
+    Loads the data (see load_data), stores the layout manifest if there was none and then starts ingesting the incidents of INGEST_DIR.
+    Args:
+    - background (bool): Whether to load the data in a background thread. The function then returns as soon as that thread holds
+      the write side of data_lock, so the callbacks wait for the data.
+    """
+    locked = threading.Event()
+    def run():
+        global ingest_directory
+        with data_lock.write():
+            locked.set()
+            with metrics.boot_phase('data'):
+                load_data()
+        data_loaded.set()
+        metrics.record_boot('data_ready', time.perf_counter() - boot_start)
+        if layout_manifest is None:
+            with data_lock.read(): # like layout_metadata, the data is only read under its lock
+                layout = {**data_layout_metadata(), 'palettes': palettes}
+            save_layout_manifest(layout, CACHE_DIR, layout_manifest_key)
+        # Ingest the incidents dropped into INGEST_DIR, every worker process polls the directory on its own (see jbi100_app/ingest.py)
+        if INGEST_DIR:
+            ingest_directory = DropDirectory(INGEST_DIR, ingest_rows, backend.index_name, INGEST_POLL_S)
+            ingest_directory.start()
+        if background:
+            import plotly.express # so the first figure update does not wait for it
+    if not background:
+        run()
+        return
+    def run_logged():
+        try:
+            run()
+        except Exception:
+            logger.exception('Could not load the data')
+        finally:
+            locked.set()
+    threading.Thread(target=run_logged, name='load-data', daemon=True).start()
+    locked.wait()
+
+
+# Load the layout manifest, built by an earlier start on the same data, the first start builds it from the data
+with metrics.boot_phase('layout_manifest'):
+    layout_manifest_key = layout_key(data_version(), categories, FILTER_KEY_DECIMALS, plotly.__version__)
+    layout_manifest = load_layout_manifest(CACHE_DIR, layout_manifest_key)
+# The palettes resolved into lists of colors, resolving them takes longer than reading them from the manifest
+palettes = layout_manifest['palettes'] if layout_manifest is not None else build_palettes()
+colorsequences = palettes['discrete']
+
+# Initialize the Dash app
+# The assets folder holds the clientside callbacks (clientside.js), its style sheets belong to the template app of jbi100_app/main.py
+# The name is passed, otherwise Dash inspects the call stack to find it, which is a large part of the boot
+with metrics.boot_phase('app'):
+    app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], assets_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jbi100_app', 'assets'), assets_ignore=r'.*\.css')
+server = app.server # WSGI entry point, e.g. for gunicorn -w 4 app:server
+metrics.install(server, METRICS_ROUTE)
+
+
+def year_marks(year_min, year_max):
+    """
+    Returns the marks of the year slider, one every 20 years.
+    """
+    return {year: str(int(year)) for year in range(year_min, year_max+1, 20)}
+
+
+def dropdown_options(values):
+    """
+    Returns the options of the dropdown of a categorical column from its values, see data_layout_metadata.
+    """
+    return [{'label': value, 'value': value} for value in values]
+
 
 ##### Create the layout #####
 
-# Full-screen container
-app.layout = html.Div(style={'height': '98vh', 'width': '98vw', 'margin': 0, 'padding': 0, 'display': 'flex'}, children=[
-    # Sidebar with dropdown and filters
-    html.Div(style={'width': '15%', 'padding': '10px', 'float': 'left', 'border': '1px solid rgba(0, 0, 0, 1)', 'fontSize': '12px', 'overflow-y': 'scroll'}, children=[
-        # Dropdown for selecting shark type: Shark.common.name
-        html.Label('Shark Type:'),
-        dcc.Dropdown(
-            id='shark-dropdown',
-            options=sorted([{'label': shark, 'value': shark} for shark in df['Shark.common.name'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select shark type(s)',
-            style={'fontSize': '12px', 'maxHeight': '100px'}
-        ),
-        # Dropdown for selecting victim injury result: Victim.injury
-        html.Label('Victim Injury Result:'),
-        dcc.Dropdown(
-            id='injury-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['Victim.injury'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select injury result(s)',
-        ),
-        # Dropdown for selecting injury severity: Injury.severity
-        html.Label('Victim Injury Severity:'),
-        dcc.Dropdown(
-            id='injury-severity-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['Injury.severity'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select injury severity(s)',
-        ),
-        # Dropdown for selecting victim activity: Victim.activity
-        html.Label('Victim Activity:'),
-        dcc.Dropdown(
-            id='victim-activity-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['Victim.activity'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select activity(s)',
-        ),
-        # Dropdown for selecting victim gender: Victim.gender
-        html.Label('Victim Gender:'),
-        dcc.Dropdown(
-            id='gender-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['Victim.gender'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select gender(s)',
-        ),
-        # Dropdown for provoked status: Provoked/unprovoked
-        html.Label('Provoked Status:'),
-        dcc.Dropdown(
-            id='provoked-status',
-            options=sorted([{'label': level, 'value': level} for level in df['Provoked/unprovoked'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select provoked status',
-        ),
-        # Dropdown for selecting state: State
-        html.Label('State:'),
-        dcc.Dropdown(
-            id='state-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['State'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select state(s)',
-        ),
-        # Dropdown for selecting location type: Site.category
-        html.Label('Location Type:'),
-        dcc.Dropdown(
-            id='site-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['Site.category'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select location type(s)',
-        ),
-        # Dropdown for month: Incident.month
-        html.Label('Incident Month:'),
-        dcc.Dropdown(
-            id='incident-month-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['Incident.month'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select incident month(s)',
-        ),
-        # Dropdown for selecting data source: Data.source
-        html.Label('Data Source:'),
-        dcc.Dropdown(
-            id='source-dropdown',
-            options=sorted([{'label': level, 'value': level} for level in df['Data.source'].unique()], key = lambda x: x['label']),
-            multi=True,
-            placeholder='Select source(s)',
-        ),
-        html.Br(), # Add a line break
-        # Range slider for shark length: Shark.length.m
-        html.Label('Shark Length (meters):'),
-        dcc.RangeSlider(
-            id='shark-length-slider',
-            min=shark_length_min,
-            max=shark_length_max,
-            step=0.1,
-            marks ={0.3: '0.3', 1.4: '1.4', 2.6: '2.6', 3.7: '3.7', 4.9: '4.9', 6: '6.0'}, # based on np.linspace(shark_length_min, shark_length_max, num=6) but now 6.0 shows up
-            value=[shark_length_min, shark_length_max],
-            tooltip={'placement': 'bottom', 'always_visible': False},
-            allowCross=False,
-        ),
-        html.Br(), # Add a line break
-        # Checkbox for including unknown lengths
-        dcc.Checklist(
-            id='include-unknown-length',
-            options=[{'label': ' Include unknown lengths', 'value': 'include'}],
-            value=['include']
-        ),
-        html.Br(), # Add a line break
-        # Reset filters button
-        html.Button(
-            'Reset Filters',
-            id='reset-filters-button',
-        ),
-        # Reset selection button
-        html.Button(
-            'Reset Selection',
-            id='reset-selection-button',
-        ),
-        html.Br(), # Add a line break
-        html.Div(id='row-details'), # Display the number and percentage of rows in the filtered and selected data
-        html.Br(), # Add a line break
-        # Dropdown for selecting continuous color palette/colorscale
-        html.Label('Select Continuous Color Palette:'),
-        dcc.Dropdown(
-            id='color-dropdown',
-            options=colorscales,
-            value='viridis',
-            clearable=False
-        ),
-        # Dropdown for selecting discrete color palette
-        html.Label('Select Discrete Color Palette:'),
-        dcc.Dropdown(
-            id='color-dropdown-discrete',
-            options=list(colorsequences.keys()),
-            value='Vivid',
-            clearable=False
-        ),
-        html.Br(), # Add a line break
-        # Pop-up modal for extra info
-        dbc.Button('Info', id='open-dismiss'), # Button to open the modal
-        dbc.Modal(
-            [
-                dbc.ModalHeader( # Header of the modal
-                    dbc.ModalTitle('Tool and Data Information'), close_button=False
-                ),
-                dbc.ModalBody(children=[ # Body of the modal: information and links to information and code from the tool and data, and a table with variable details
-                    html.Div('The table below lists each variable shown in the tool and provides the columns from the data source that are used in that variable.'),
-                    dash_table.DataTable([{'Variable Name': key, 'Details': value} for key, value in category_info.items()]),
-                    html.Div('Tool created by JBI100 team 30 (2024-2025 Q2).'),
-                    dbc.Button('Visualisation Tool GitHub', href='https://github.com/cas-png/dashframework-main'),
-                    dbc.Button('Data Source GitHub', href='https://github.com/cjabradshaw/AustralianSharkIncidentDatabase'),
-                    dbc.Button('Video Presentation', href='https://www.youtube.com/watch?v=0-_GT9-4Vnc'),
-            ]),
-                dbc.ModalFooter(dbc.Button('Close', id='close-dismiss'), className='justify-content-center') # Footer of the modal: close button
-            ],
-            id='modal-dismiss',
-            fullscreen=True,
-        ),
-    ]),
-
-    # Main content with map and timeline and year range slider
-    html.Div(style={'width': '45%', 'display': 'flex', 'flexDirection': 'column'}, children=[
-        # Tabs for switching between heatmap and scatter plot
-        dcc.Tabs(
-            id='map-tabs',
-            value='scatter',  # Default tab
-            children=[
-                dcc.Tab(label='Scatter Plot', value='scatter'),
-                dcc.Tab(label='Heatmap', value='heatmap'),
-            ],
-        ),
-        # Map and timeline and year range slider
-        html.Div(style={'display': 'flex', 'flexDirection': 'column', 'height': '100%'}, children=[
-            # Map
-            html.Div(style={'display': 'flex', 'height': '65%', 'width': '100%'}, children=[dcc.Graph(id='shark-map', style={'width': '100%', 'height': '100%'}, config={'scrollZoom': True})]),
-            # Timeline
-            html.Div(style={'display': 'flex', 'height': '25%', 'width': '100%'}, children=[dcc.Graph(id='timeline', style={'width': '100%', 'height': '100%'})]),
-            # Year Range Slider below the map
-            html.Label(id='slider-label'),  # Create a label for dynamic updates
+def serve_layout():
+    """
+    Builds the layout of a page, on every page load, so new pages show the dropdown options and slider bounds of
+    the data at that moment (incidents may have been ingested since the app started, see ingest_rows).
+    The metadata comes from layout_metadata, so pages can be served while the data is loading.
+    """
+    metadata = layout_metadata()
+    options = metadata['options']
+    shark_length_min, shark_length_max = metadata['shark_length']
+    year_min, year_max = metadata['year']
+    # Full-screen container
+    return html.Div(style={'height': '98vh', 'width': '98vw', 'margin': 0, 'padding': 0, 'display': 'flex'}, children=[
+        # Sidebar with dropdown and filters
+        html.Div(style={'width': '15%', 'padding': '10px', 'float': 'left', 'border': '1px solid rgba(0, 0, 0, 1)', 'fontSize': '12px', 'overflow-y': 'scroll'}, children=[
+            # Dropdown for selecting shark type: Shark.common.name
+            html.Label('Shark Type:'),
+            dcc.Dropdown(
+                id='shark-dropdown',
+                options=dropdown_options(options['Shark.common.name']),
+                multi=True,
+                placeholder='Select shark type(s)',
+                style={'fontSize': '12px', 'maxHeight': '100px'}
+            ),
+            # Dropdown for selecting victim injury result: Victim.injury
+            html.Label('Victim Injury Result:'),
+            dcc.Dropdown(
+                id='injury-dropdown',
+                options=dropdown_options(options['Victim.injury']),
+                multi=True,
+                placeholder='Select injury result(s)',
+            ),
+            # Dropdown for selecting injury severity: Injury.severity
+            html.Label('Victim Injury Severity:'),
+            dcc.Dropdown(
+                id='injury-severity-dropdown',
+                options=dropdown_options(options['Injury.severity']),
+                multi=True,
+                placeholder='Select injury severity(s)',
+            ),
+            # Dropdown for selecting victim activity: Victim.activity
+            html.Label('Victim Activity:'),
+            dcc.Dropdown(
+                id='victim-activity-dropdown',
+                options=dropdown_options(options['Victim.activity']),
+                multi=True,
+                placeholder='Select activity(s)',
+            ),
+            # Dropdown for selecting victim gender: Victim.gender
+            html.Label('Victim Gender:'),
+            dcc.Dropdown(
+                id='gender-dropdown',
+                options=dropdown_options(options['Victim.gender']),
+                multi=True,
+                placeholder='Select gender(s)',
+            ),
+            # Dropdown for provoked status: Provoked/unprovoked
+            html.Label('Provoked Status:'),
+            dcc.Dropdown(
+                id='provoked-status',
+                options=dropdown_options(options['Provoked/unprovoked']),
+                multi=True,
+                placeholder='Select provoked status',
+            ),
+            # Dropdown for selecting state: State
+            html.Label('State:'),
+            dcc.Dropdown(
+                id='state-dropdown',
+                options=dropdown_options(options['State']),
+                multi=True,
+                placeholder='Select state(s)',
+            ),
+            # Dropdown for selecting location type: Site.category
+            html.Label('Location Type:'),
+            dcc.Dropdown(
+                id='site-dropdown',
+                options=dropdown_options(options['Site.category']),
+                multi=True,
+                placeholder='Select location type(s)',
+            ),
+            # Dropdown for month: Incident.month
+            html.Label('Incident Month:'),
+            dcc.Dropdown(
+                id='incident-month-dropdown',
+                options=dropdown_options(options['Incident.month']),
+                multi=True,
+                placeholder='Select incident month(s)',
+            ),
+            # Dropdown for selecting data source: Data.source
+            html.Label('Data Source:'),
+            dcc.Dropdown(
+                id='source-dropdown',
+                options=dropdown_options(options['Data.source']),
+                multi=True,
+                placeholder='Select source(s)',
+            ),
+            html.Br(), # Add a line break
+            # Range slider for shark length: Shark.length.m
+            html.Label('Shark Length (meters):'),
             dcc.RangeSlider(
-                id='year-slider',
-                min=year_min,
-                max=year_max,
-                step=1,
-                marks={year: str(int(year)) for year in range(year_min, year_max+1, 20)},
-                value=[year_min, year_max],
-                tooltip={'placement': 'bottom', 'always_visible': False}, # Enable tooltip
+                id='shark-length-slider',
+                min=shark_length_min,
+                max=shark_length_max,
+                step=0.1,
+                marks ={0.3: '0.3', 1.4: '1.4', 2.6: '2.6', 3.7: '3.7', 4.9: '4.9', 6: '6.0'}, # based on np.linspace(shark_length_min, shark_length_max, num=6) but now 6.0 shows up
+                value=[shark_length_min, shark_length_max],
+                tooltip={'placement': 'bottom', 'always_visible': False},
                 allowCross=False,
-                dots=False
+            ),
+            html.Br(), # Add a line break
+            # Checkbox for including unknown lengths
+            dcc.Checklist(
+                id='include-unknown-length',
+                options=[{'label': ' Include unknown lengths', 'value': 'include'}],
+                value=['include']
+            ),
+            html.Br(), # Add a line break
+            # Reset filters button
+            html.Button(
+                'Reset Filters',
+                id='reset-filters-button',
+            ),
+            # Reset selection button
+            html.Button(
+                'Reset Selection',
+                id='reset-selection-button',
+            ),
+            html.Br(), # Add a line break
+            html.Div(id='row-details'), # Display the number and percentage of rows in the filtered and selected data
+            html.Div(id='selection-message'), # Tells when a selection is too large to keep, see show_selection_message
+            # Download the filtered (or selected) rows, the form posts the filter state and the selection to EXPORT_ROUTE
+            html.Form(id='export-form', method='POST', action=f'{EXPORT_ROUTE}/csv', children=[
+                dcc.Input(id='export-filters', type='hidden', name='filters'),
+                dcc.Input(id='export-selection', type='hidden', name='selection'),
+                html.Button('Download CSV', id='export-csv-button', type='submit'),
+                html.Button('Download Parquet', id='export-parquet-button', type='submit', formAction=f'{EXPORT_ROUTE}/parquet',
+                            hidden=not parquet_available()),
+            ]),
+            html.Br(), # Add a line break
+            # Dropdown for selecting continuous color palette/colorscale
+            html.Label('Select Continuous Color Palette:'),
+            dcc.Dropdown(
+                id='color-dropdown',
+                options=list(metadata['palettes']['continuous']),
+                value='viridis',
+                clearable=False
+            ),
+            # Dropdown for selecting discrete color palette
+            html.Label('Select Discrete Color Palette:'),
+            dcc.Dropdown(
+                id='color-dropdown-discrete',
+                options=list(metadata['palettes']['discrete']),
+                value='Vivid',
+                clearable=False
+            ),
+            html.Br(), # Add a line break
+            # Pop-up modal for extra info
+            dbc.Button('Info', id='open-dismiss'), # Button to open the modal
+            dbc.Modal(
+                [
+                    dbc.ModalHeader( # Header of the modal
+                        dbc.ModalTitle('Tool and Data Information'), close_button=False
+                    ),
+                    dbc.ModalBody(children=[ # Body of the modal: information and links to information and code from the tool and data, and a table with variable details
+                        html.Div('The table below lists each variable shown in the tool and provides the columns from the data source that are used in that variable.'),
+                        dash_table.DataTable([{'Variable Name': key, 'Details': value} for key, value in category_info.items()]),
+                        html.Div('Tool created by JBI100 team 30 (2024-2025 Q2).'),
+                        dbc.Button('Visualisation Tool GitHub', href='https://github.com/cas-png/dashframework-main'),
+                        dbc.Button('Data Source GitHub', href='https://github.com/cjabradshaw/AustralianSharkIncidentDatabase'),
+                        dbc.Button('Video Presentation', href='https://www.youtube.com/watch?v=0-_GT9-4Vnc'),
+                ]),
+                    dbc.ModalFooter(dbc.Button('Close', id='close-dismiss'), className='justify-content-center') # Footer of the modal: close button
+                ],
+                id='modal-dismiss',
+                fullscreen=True,
             ),
         ]),
-    ]),
-
-    # Bar charts for distributions and heat map
-    html.Div(style={'width': '40%', 'padding': '10px', 'border': '1px solid rgba(0, 0, 0, 1)', 'display': 'flex', 'flexDirection': 'column'}, children=[
-        # Dropdown for selecting variable for bar chart 1 and the map
-        dcc.Dropdown(
-            id='var-select',
-            options=[
-                {'label': categories[category], 'value': category} for category in categories
-            ],
-            placeholder='Select a variable',
-            value='Victim.injury',
-            clearable=False
-        ),
-        # Dropdown for selecting variable for bar chart 2
-        dcc.Dropdown(
-            id='var-select2',
-            options=[
-                {'label': categories[category], 'value': category} for category in categories
-            ],
-            placeholder='Select a variable',
-            value='Provoked/unprovoked',
-            clearable=False
-        ),
-        # Buttons to switch axes for the bar charts
-        html.Div([
-            html.Button('Switch Axes for Bar Chart 1', id='switch-axes-bar1', n_clicks=0),
-            html.Button('Switch Axes for Bar Chart 2', id='switch-axes-bar2', n_clicks=0),
-            ], style={'display': 'flex', 'justify-content': 'space-between', 'margin': '10px 0'}
-        ),
-        # Bar charts
-        html.Div(style={'display': 'flex', 'flexDirection': 'row', 'flex': '1', 'width': '100%', 'height': '40%'}, children=[
-            dcc.Graph(id='activity-bar-chart', style={'flex': '1', 'width': '100%', 'height': '100%'}),
-            dcc.Graph(id='activity-bar-chart2', style={'flex': '1', 'width': '100%', 'height': '100%'}),
+
+        # Main content with map and timeline and year range slider
+        html.Div(style={'width': '45%', 'display': 'flex', 'flexDirection': 'column'}, children=[
+            # Tabs for switching between heatmap and scatter plot
+            dcc.Tabs(
+                id='map-tabs',
+                value='scatter',  # Default tab
+                children=[
+                    dcc.Tab(label='Scatter Plot', value='scatter'),
+                    dcc.Tab(label='Heatmap', value='heatmap'),
+                ],
+            ),
+            # Map and timeline and year range slider
+            html.Div(style={'display': 'flex', 'flexDirection': 'column', 'height': '100%'}, children=[
+                # Map
+                html.Div(style={'display': 'flex', 'height': '65%', 'width': '100%'}, children=[dcc.Graph(id='shark-map', style={'width': '100%', 'height': '100%'}, config={'scrollZoom': True})]),
+                # Timeline
+                html.Div(style={'display': 'flex', 'height': '25%', 'width': '100%'}, children=[dcc.Graph(id='timeline', style={'width': '100%', 'height': '100%'})]),
+                # Year Range Slider below the map
+                html.Label(id='slider-label'),  # Create a label for dynamic updates
+                dcc.RangeSlider(
+                    id='year-slider',
+                    min=year_min,
+                    max=year_max,
+                    step=1,
+                    marks=year_marks(year_min, year_max),
+                    value=[year_min, year_max],
+                    tooltip={'placement': 'bottom', 'always_visible': False}, # Enable tooltip
+                    allowCross=False,
+                    dots=False
+                ),
+            ]),
         ]),
-        # Heatmap
-        html.Div(style={'display': 'flex', 'flexDirection': 'column', 'width': '100%', 'height': '40%'}, children=[
-            dcc.Graph(id='heat-chart', style={'flex': '1', 'width': '100%', 'height': '100%'})
-        ])
-    ]),
-])
+
+        # Bar charts for distributions and heat map
+        html.Div(style={'width': '40%', 'padding': '10px', 'border': '1px solid rgba(0, 0, 0, 1)', 'display': 'flex', 'flexDirection': 'column'}, children=[
+            # Dropdown for selecting variable for bar chart 1 and the map
+            dcc.Dropdown(
+                id='var-select',
+                options=[
+                    {'label': categories[category], 'value': category} for category in categories
+                ],
+                placeholder='Select a variable',
+                value='Victim.injury',
+                clearable=False
+            ),
+            # Dropdown for selecting variable for bar chart 2
+            dcc.Dropdown(
+                id='var-select2',
+                options=[
+                    {'label': categories[category], 'value': category} for category in categories
+                ],
+                placeholder='Select a variable',
+                value='Provoked/unprovoked',
+                clearable=False
+            ),
+            # Buttons to switch axes for the bar charts
+            html.Div([
+                html.Button('Switch Axes for Bar Chart 1', id='switch-axes-bar1', n_clicks=0),
+                html.Button('Switch Axes for Bar Chart 2', id='switch-axes-bar2', n_clicks=0),
+                ], style={'display': 'flex', 'justify-content': 'space-between', 'margin': '10px 0'}
+            ),
+            # Bar charts
+            html.Div(style={'display': 'flex', 'flexDirection': 'row', 'flex': '1', 'width': '100%', 'height': '40%'}, children=[
+                dcc.Graph(id='activity-bar-chart', style={'flex': '1', 'width': '100%', 'height': '100%'}),
+                dcc.Graph(id='activity-bar-chart2', style={'flex': '1', 'width': '100%', 'height': '100%'}),
+            ]),
+            # Heatmap
+            html.Div(style={'display': 'flex', 'flexDirection': 'column', 'width': '100%', 'height': '40%'}, children=[
+                dcc.Graph(id='heat-chart', style={'flex': '1', 'width': '100%', 'height': '100%'})
+            ])
+        ]),
+
+        # Intermediate results of the callback stages
+        dcc.Store(id='filter-store'), # Filter state, output of the filter stage
+        dcc.Store(id='selection-geometry'), # The map selection without its points (see compactSelection), input of the selection stage
+        dcc.Store(id='selection-store'), # Token and size of the selected rows, output of the selection stage
+        dcc.Store(id='viewport-store'), # Visible part of the map, output of the viewport stage
+        dcc.Store(id='palette-store', data=metadata['palettes']), # Color palettes, used by the clientside callbacks
+        dcc.Store(id='session-id'), # Random id of the page, set in the browser, used to cancel superseded figure updates
+        dcc.Store(id='data-revision', data=data_revision), # Number of ingested batches the page shows, see check_data_revision
+        dcc.Interval(id='data-poll', interval=INGEST_POLL_S * 1000, disabled=not INGEST_DIR), # Checks for ingested incidents
+    ])
+
 
 ##### Create the callbacks #####
 
-# Callback to update: map, bar charts, heat map, timeline, and row details
-@app.callback(
-    [
-        Output('shark-map', 'figure'),
-        Output('activity-bar-chart', 'figure'),
-        Output('activity-bar-chart2', 'figure'),
-        Output('heat-chart', 'figure'),
-        Output('timeline', 'figure'),
-        Output('row-details', 'children')
-    ],
-    [
-        Input('shark-dropdown', 'value'),
-        Input('injury-dropdown', 'value'),
-        Input('injury-severity-dropdown', 'value'),
-        Input('victim-activity-dropdown', 'value'),
-        Input('source-dropdown', 'value'),
-        Input('gender-dropdown', 'value'),
-        Input('site-dropdown', 'value'),
-        Input('state-dropdown', 'value'),
-        Input('shark-length-slider', 'value'),
-        Input('provoked-status', 'value'),
-        Input('incident-month-dropdown', 'value'),
-        Input('include-unknown-length', 'value'),
-        Input('map-tabs', 'value'),
-        Input('year-slider', 'value'),
-        Input('var-select', 'value'),
-        Input('var-select2', 'value'),
-        Input('switch-axes-bar1', 'n_clicks'),
-        Input('switch-axes-bar2', 'n_clicks'),
-        Input('shark-map', 'selectedData'),
-        Input('color-dropdown', 'value'),
-        Input('color-dropdown-discrete', 'value'),
-    ]
-)
-def update_map_and_chart(selected_sharks, selected_injuries, selected_injury_severities, selected_activities, selected_sources, selected_genders, selected_sites, selected_states, shark_length_range, provoked_status, incident_month, include_unknown_length, selected_tab, year_range, selected_var, selected_var2, n_clicks_bar1, n_clicks_bar2, selected_data, color_palette, color_sequence):
+# The callbacks form a graph of stages: filter -> selection -> figures -> styling.
+# - update_filter_state turns the filter inputs into a filter state (filter-store).
+# - update_selection resolves the map selection within the filtered data (selection-store).
+# - update_viewport keeps track of the visible part of the map (viewport-store).
+# - update_figures rebuilds only the outputs whose inputs changed, see FIGURE_DEPENDENCIES.
+# - check_data_revision notices ingested incidents (data-revision), which refreshes the options, the selection and all figures.
+# - The styling callbacks run in the browser (clientside callbacks), they restyle the existing figures without a request to the server.
+
+# For each output of update_figures, the inputs it depends on
+FIGURE_DEPENDENCIES = {
+    'shark-map': {'data-revision', 'filter-store', 'selection-store', 'viewport-store', 'map-tabs', 'var-select', 'var-select2'},
+    'activity-bar-chart': {'data-revision', 'filter-store', 'selection-store', 'var-select'},
+    'activity-bar-chart2': {'data-revision', 'filter-store', 'selection-store', 'var-select2'},
+    'heat-chart': {'data-revision', 'filter-store', 'selection-store', 'var-select', 'var-select2'},
+    'timeline': {'data-revision', 'filter-store'},
+    'row-details': {'data-revision', 'filter-store', 'selection-store'},
+}
+
+
+def filter_key(filter_state):
     """
-        Update the map and charts based on the selected filters and parameters.
-        Args:
-        - selected_sharks (list): List of selected shark types.
-        - selected_injuries (list): List of selected injury levels.
-        - selected_injury_severities (list): List of selected injury severities.
-        - selected_activities (list): List of selected activities.
-        - selected_sources (list): List of selected data sources.
-        - selected_genders (list): List of selected genders.
-        - selected_sites (list): List of selected sites.
-        - selected_states (list): List of selected states.
-        - shark_length_range (tuple): Range of selected shark lengths.
-        - provoked_status (list): List of selected provoked statuses.
-        - incident_month (list): List of selected incident months.
-        - include_unknown_length (str): Option to include unknown shark lengths.
-        - selected_tab (str): Selected tab for map visualization ('heatmap' or 'scatter').
-        - year_range (tuple): Range of selected years.
-        - selected_var (str): First variable selected for visualization.
-        - selected_var2 (str): Second variable selected for visualization.
-        - n_clicks_bar1 (int): Number of clicks for the first bar chart.
-        - n_clicks_bar2 (int): Number of clicks for the second bar chart.
-        - selected_data (dict): Data selected on the map.
-        - color_palette (str): Color palette for the heatmap.
-        - color_sequence (str): Color sequence for the scatter plot.
-        Returns:
-        - map_fig (plotly.graph_objs._figure.Figure): Map figure (heatmap or scatter plot).
-        - bar_fig (plotly.graph_objs._figure.Figure): First bar chart figure.
-        - bar_fig2 (plotly.graph_objs._figure.Figure): Second bar chart figure.
-        - heat_fig (plotly.graph_objs._figure.Figure): Correlation heatmap figure.
-        - timeline_fig (plotly.graph_objs._figure.Figure): Timeline histogram figure.
-        - row_details (str): Details about the number and percentage of rows in filtered and selected data.
-        """
+    Returns the canonical key of a filter state, the key of every query of the backend and of the caches.
+    """
+    return canonical_filter_key(filter_state, FILTER_KEY_DECIMALS)
 
-    filtered_df = df
-
-    # Filter the data based on the selected shark type(s)
-    if selected_sharks:
-        filtered_df = filtered_df[filtered_df['Shark.common.name'].isin(selected_sharks)]
-    # Filter the data based on the selected injury level(s)
-    if selected_injuries:
-        filtered_df = filtered_df[filtered_df['Victim.injury'].isin(selected_injuries)]
-    # Filter the data based on the selected injury severity(s)
-    if selected_injury_severities:
-        filtered_df = filtered_df[filtered_df['Injury.severity'].isin(selected_injury_severities)]
-    # Filter the data based on the selected injury severity(s)
-    if selected_activities:
-        filtered_df = filtered_df[filtered_df['Victim.activity'].isin(selected_activities)]
-    # Filter the data based on the selected data source(s)
-    if selected_sources:
-        filtered_df = filtered_df[filtered_df['Data.source'].isin(selected_sources)]
-    # Filter the data based on the selected gender(s)
-    if selected_genders:
-        filtered_df = filtered_df[filtered_df['Victim.gender'].isin(selected_genders)]
-    # Filter the data based on the selected site(s)
-    if selected_sites:
-        filtered_df = filtered_df[filtered_df['Site.category'].isin(selected_sites)]
-    # Filter the data based on the selected state(s)
-    if selected_states:
-        filtered_df = filtered_df[filtered_df['State'].isin(selected_states)]
-    # Filter the data based on the selected shark length range
-    if 'include' in include_unknown_length:
-        filtered_df = filtered_df[
-            (filtered_df['Shark.length.m'].isna()) |
-            ((filtered_df['Shark.length.m'] >= shark_length_range[0]) & (filtered_df['Shark.length.m'] <= shark_length_range[1]))
-        ]
-    else:
-        filtered_df = filtered_df[
-            (filtered_df['Shark.length.m'] >= shark_length_range[0]) &
-            (filtered_df['Shark.length.m'] <= shark_length_range[1])
-        ]
-    # Filter the data based on the selected provoked status(es)
-    if provoked_status:
-        filtered_df = filtered_df[filtered_df['Provoked/unprovoked'].isin(provoked_status)]
-    # Filter the data based on the selected incident month(s)
-    if incident_month:
-        filtered_df = filtered_df[filtered_df['Incident.month'].isin(incident_month)]
-    # Filter the data based on the selected year range
-    filtered_df = filtered_df[
-        (filtered_df['Incident.year'] >= year_range[0]) &
-        (filtered_df['Incident.year'] <= year_range[1])
-    ]
 
-    # Create selected_df based on selected_data
-    if selected_data and selected_data['points']:
-        selected_coords = [(point['lat'], point['lon']) for point in selected_data['points']]
-        selected_latitudes, selected_longitudes = zip(*selected_coords)
-        selected_df = filtered_df[
-            filtered_df['Latitude'].isin(selected_latitudes) &
-            filtered_df['Longitude'].isin(selected_longitudes)
-            ]
-        filtered_df = filtered_df.assign(IsSelected=filtered_df['index1'].isin(selected_df['index1'])) # Create a new column to indicate selected rows
-        filtered_df = filtered_df.assign(Size=filtered_df['IsSelected'].astype(float).apply(lambda x: 1 if x == 1 else 0.3)) # Create a new column to indicate map marker size based on selection
+def filter_positions(filter_state):
+    """
+    Evaluates a filter state with the backend (the pandas backend caches the result, so that the stages of one
+    interaction, and users switching between a few filter states, do not filter the data again).
+    Args:
+    - filter_state (dict): Filter state as stored in filter-store.
+    Returns:
+    - np.ndarray: Sorted positions of the rows that pass the filters.
+    """
+    with metrics.span('filter'):
+        return backend.positions(filter_key(filter_state))
+
+
+def count_rows(group_by, filter_state, selection=None):
+    """
+    Counts the filtered rows, or the given selected rows, grouped by the given columns, with the backend.
+    Args:
+    - group_by (list): The columns to group by.
+    - filter_state (dict): Filter state as stored in filter-store.
+    - selection (np.ndarray): The index1 values of the selected rows, None counts the filtered rows.
+    Returns:
+    - np.ndarray: The counts, with one axis per column of group_by, indexed like backend.labels.
+    """
+    if selection is not None:
+        return backend.selected_counts(group_by, selection)
+    return backend.counts(group_by, filter_key(filter_state))
+
+
+def timeline_bins(filter_state):
+    """
+    Bins the filtered incidents over time, see jbi100_app/timeline.py. The monthly prefix sums are counted by the backend
+    for the filter state without its year range and cached, so a change of the year range only takes new differences.
+    Args:
+    - filter_state (dict): Filter state as stored in filter-store.
+    Returns:
+    - tuple: The name of the bin width, the edges of the bins in months since January of year 0 and the counts, see MonthlyPrefix.bins.
+    """
+    selections, ranges = filter_key(filter_state)
+    (_, low_year, high_year, _), = (bounds for bounds in ranges if bounds[0] == 'Incident.year')
+    key = (selections, tuple(bounds for bounds in ranges if bounds[0] != 'Incident.year'))
+    series = timeline_cache.get_or_compute(key, lambda: MonthlyPrefix(backend.counts(['Incident.year', 'Incident.month'], key),
+                                                                      backend.labels['Incident.year'], backend.labels['Incident.month']))
+    return series.bins(low_year, high_year, TIMELINE_MAX_BINS)
+
+
+def export_rows(export_format):
+    """
+    Streams the rows that pass the filter state of a page, and are selected on its map if there is a selection, as a
+    file (the route EXPORT_ROUTE/<format>, posted by the download form of the sidebar, see jbi100_app/export.py).
+    The form carries the filter state (filter-store) and the selection (selection-store) as JSON. Posts from other
+    sites are refused, see same_origin in jbi100_app/export.py.
+    Args:
+    - export_format (str): 'csv' or 'parquet'.
+    Returns:
+    - flask.Response: The file, read and sent in chunks of EXPORT_CHUNK_ROWS rows.
+    """
+    if export_format not in FORMATS:
+        abort(404)
+    if not same_origin(request.headers, request.host):
+        abort(403, 'Exports are only sent to the pages of the dashboard.')
+    if export_format == 'parquet' and not parquet_available():
+        abort(501, 'The Parquet export needs pyarrow.')
+    try:
+        filters = json.loads(request.form['filters'])
+        if not all(values is None or isinstance(values, list) for values in filters['selections'].values()): # a string would be split into its characters
+            raise ValueError('The values of a dropdown must be a list.')
+        key = filter_key(filters)
+        selection_state = json.loads(request.form.get('selection') or 'null')
+        selection = selection_rows(selection_state)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        abort(400, 'The filter state or the selection is not valid.')
+    selections, ranges = key
+    if not ({column for column, _ in selections} <= set(categories) and {column for column, *_ in ranges} <= set(range_dimensions)):
+        abort(400, 'The filter state or the selection is not valid.')
+    if selection is None and selection_state and selection_state['rows']:
+        if selection_state['token'] is None:
+            abort(413, 'The selection is too large, select fewer incidents on the map.')
+        abort(410, 'The selection expired, select the incidents on the map again.')
+    with metrics.span('export'), data_lock.read():
+        chunks = backend.export(key, selection, export_columns, EXPORT_CHUNK_ROWS)
+    media_type, extension = FORMATS[export_format]
+    return Response(csv_stream(chunks) if export_format == 'csv' else parquet_stream(chunks), mimetype=media_type,
+                    headers={'Content-Disposition': f'attachment; filename="shark-incidents.{extension}"'})
+
+
+server.add_url_rule(f'{EXPORT_ROUTE}/<export_format>', 'export', export_rows, methods=['POST'])
+
+
+def ingest_rows(raw):
+    """
+    Appends new incidents to the backend, without rebuilding its indexes (see jbi100_app/ingest.py).
+    The rows are cleaned like get_data() cleans the Excel file. The timeline's cached prefix sums are cleared.
+    Args:
+    - raw (pd.DataFrame): The raw incidents with the columns of the Excel file, see read_batch in jbi100_app/ingest.py.
+    """
+    global data_revision
+    with metrics.span('ingest'):
+        batch = clean_data(raw.reindex(columns=[column for column in backend.columns if column not in ('index1', 'Incident.date')])) # these two are derived by clean_data
+        with data_lock.write():
+            backend.append(batch)
+            timeline_cache.clear()
+            set_slider_bounds()
+            data_revision += 1
+
+
+def selection_rows(selection_state):
+    """
+    Returns the row ids of the selection of a page (see update_selection) from the selection store.
+    Args:
+    - selection_state (dict): The token and the number of rows of the selection as stored in selection-store, or None.
+    Returns:
+    - np.ndarray: The sorted index1 values of the selected rows, None if nothing is selected (or the selection expired).
+    """
+    if not selection_state or not selection_state['rows'] or selection_state['token'] is None: # None: too large to store
+        return None
+    selection = selection_store.get(selection_state['token'])
+    if selection is None:
+        logger.info('The selection %s expired', selection_state['token'])
+    return selection
+
+
+def apply_selection(filtered_df, selection):
+    """
+    Marks the selected rows of the filtered data, for the map.
+    Args:
+    - filtered_df (pd.DataFrame): The filtered data.
+    - selection (np.ndarray): The index1 values of the selected rows, or None if nothing is selected.
+    Returns:
+    - pd.DataFrame: The filtered data with the columns 'IsSelected' and 'Size' (map marker size).
+    """
+    if selection is not None:
+        is_selected = filtered_df['index1'].isin(selection)
+        filtered_df = filtered_df.assign(IsSelected=is_selected) # Create a new column to indicate selected rows
+        filtered_df = filtered_df.assign(Size=np.where(is_selected, 1, 0.3)) # Create a new column to indicate map marker size based on selection
     else:
-        selected_df = pd.DataFrame(columns=filtered_df.columns)  # Empty DataFrame if nothing is selected
-        filtered_df['IsSelected'] = True # Create a new column to indicate selected rows (none, so all rows are fake selected)
-        filtered_df['Size'] = 1.0  # Create a new column to indicate map marker size based on selection (none, so all markers are full size)
-
-    # Calculate row details (number and percentage of rows in filtered and selected data)
-    filtered_row_percentage = np.round(len(filtered_df) / len(df) * 100, 2)
-    selected_row_percentage = np.round(len(selected_df) / len(df) * 100, 2)
-    row_details = (
-        f'Filtered Data: {len(filtered_df)} rows ({filtered_row_percentage}% of total rows). '
-        f'Selected Data: {len(selected_df)} rows ({selected_row_percentage}% of total rows).'
+        filtered_df = filtered_df.assign(IsSelected=True) # Create a new column to indicate selected rows (none, so all rows are fake selected)
+        filtered_df = filtered_df.assign(Size=1.0)  # Create a new column to indicate map marker size based on selection (none, so all markers are full size)
+    return filtered_df
+
+
+def build_row_details(n_filtered, n_selected):
+    """
+    Describes the number and percentage of rows in the filtered and selected data.
+    """
+    filtered_row_percentage = np.round(n_filtered / backend.n_rows * 100, 2)
+    selected_row_percentage = np.round(n_selected / backend.n_rows * 100, 2)
+    return (
+        f'Filtered Data: {n_filtered} rows ({filtered_row_percentage}% of total rows). '
+        f'Selected Data: {n_selected} rows ({selected_row_percentage}% of total rows).'
     )
 
-    # Create the map figure
+
+def build_map_figure(filtered_df, selected_tab, selected_var, selected_var2, color_palette, color_sequence, category_orders=None):
+    """
+    Creates the map figure: a density map (heatmap tab) or a scatter plot (scatter tab) of the incidents.
+    The colors of the scatter plot follow category_orders (see color_order), by default the order the values occur in filtered_df.
+    """
+    import plotly.express as px # imported on first use, see the imports at the top
     if selected_tab == 'heatmap':
         # Create density map (heatmap)
-        map_fig = px.density_mapbox(
+        map_fig = px.density_map(
             filtered_df,
             lat='Latitude',
             lon='Longitude',
             radius=5,
             center=dict(lat=-28, lon=130), # Roughly the center of Australia
             zoom=2.5,
-            mapbox_style='open-street-map',
+            map_style='open-street-map',
             color_continuous_scale=color_palette, # Changes colourmap
         )
-        map_fig.update_layout(margin=dict(l=5, r=5, t=30, b=5))
+        map_fig.update_layout(margin=dict(l=5, r=5, t=30, b=5), uirevision='shark-map') # keep the user's zoom and pan when the figure is rebuilt
     else:  # selected_tab == 'scatter'
         # Create scatter plot map
         map_fig = px.scatter_map(
@@ -489,33 +785,131 @@ def update_map_and_chart(selected_sharks, selected_injuries, selected_injury_sev
             zoom=2.5,
             map_style='open-street-map',
             hover_name='Shark.full.name',  # Display shark name on hover
+            custom_data=['index1'], # Row id of every point, used to resolve selections
             hover_data={selected_var: True, selected_var2: True, 'Size': False, 'IsSelected': True, 'Latitude': True, 'Longitude': True},
             labels={selected_var: categories[selected_var], selected_var2: categories[selected_var2], 'IsSelected': 'Selected'},
             color_discrete_sequence = colorsequences[color_sequence], # Changes discrete colourmap
             color_continuous_scale=color_palette, # Changes continuous colourmap
+            category_orders=category_orders,
             size_max=8, # Maximum marker size
             opacity=1,
         )
-        map_fig.update_layout(margin=dict(l=5, r=5, t=30, b=5))
-
-    # Combine the filtered and selected data for the first bar chart with a new column 'Source'
-    combined_df = (
-        pd.concat([
-            filtered_df[[selected_var]].assign(Source='Filtered Data'),
-            selected_df[[selected_var]].assign(Source='Selected Data')
-        ])
-        .groupby([selected_var, 'Source'])
-        .size()
-        .reset_index(name='Count')
+        # Let the discrete colors come from the colorway, so the palette can be changed in the browser by changing the layout
+        for trace in map_fig.data:
+            if isinstance(trace.marker.color, str):
+                trace.marker.color = None
+        map_fig.update_layout(margin=dict(l=5, r=5, t=30, b=5), colorway=colorsequences[color_sequence], uirevision='shark-map')
+    return compact_map_figure(map_fig) # keeps the row id (customdata[0]), used to resolve selections
+
+
+def color_order(key, selected_var):
+    """
+    Returns the category_orders of the scatter map: the values of selected_var in the order they occur in the filtered rows,
+    the order plotly assigns the colors in when all filtered rows are drawn. Used when only a part of them is drawn, so the colors do not change.
+    """
+    return {selected_var: backend.value_order(key, selected_var)}
+
+
+def build_scatter_lod_figure(key, viewport, selection, selected_var, selected_var2, color_palette, color_sequence):
+    """
+    Creates the scatter map when there are more filtered rows than MAX_MAP_POINTS: only the rows inside the viewport are drawn,
+    merged into clusters if there still are too many (see jbi100_app/lod.py).
+    Args:
+    - key (tuple): The canonical filter key, see filter_key.
+    - viewport (dict): The visible part of the map, see update_viewport, None for the extent of the data.
+    - selection (np.ndarray): The index1 values of the selected rows, or None if nothing is selected.
+    - other arguments: see build_map_figure.
+    Returns:
+    - plotly.graph_objs._figure.Figure: The scatter map.
+    """
+    import plotly.express as px # imported on first use, see the imports at the top
+    bounds = pad_bounds(viewport['bounds']) if viewport else backend.extent()
+    visible = backend.rows(key, bounds, limit=MAX_MAP_POINTS + 1)
+    category_orders = color_order(key, selected_var)
+    if len(visible) <= MAX_MAP_POINTS:
+        return build_map_figure(apply_selection(visible, selection), 'scatter', selected_var, selected_var2, color_palette, color_sequence, category_orders)
+
+    clusters_df = backend.clusters(key, bounds, selected_var, selection, MAX_MAP_POINTS).assign(index1=-1) # clusters have no row id, so clicking one does not select rows
+    map_fig = px.scatter_map(
+        clusters_df,
+        lat='Latitude',
+        lon='Longitude',
+        color=selected_var,
+        size='Incidents', # Size based on the number of incidents in the cluster
+        center=dict(lat=-28, lon=130),
+        zoom=2.5,
+        map_style='open-street-map',
+        custom_data=['index1'],
+        hover_data={selected_var: True, 'Incidents': True, 'Selected': True, 'Latitude': ':.2f', 'Longitude': ':.2f'},
+        labels={selected_var: categories[selected_var]},
+        color_discrete_sequence = colorsequences[color_sequence],
+        color_continuous_scale=color_palette,
+        category_orders=category_orders,
+        size_max=20,
+        opacity=0.8,
     )
-    # Switch axes for the first bar chart
-    switch_bar1 = n_clicks_bar1 % 2 == 1
-    bar1_x, bar1_y = (selected_var, 'Count') if not switch_bar1 else ('Count', selected_var)
-    # Generate the first bar chart for filtered_df and selected_df
+    for trace in map_fig.data:
+        if isinstance(trace.marker.color, str):
+            trace.marker.color = None
+    map_fig.update_layout(margin=dict(l=5, r=5, t=30, b=5), colorway=colorsequences[color_sequence], uirevision='shark-map')
+    return compact_map_figure(map_fig)
+
+
+def uses_density_grid(selected_tab, n_filtered):
+    """
+    Returns whether the map is drawn from a server-side density grid (heatmap tab, more than DENSITY_RASTER_ROWS filtered rows).
+    """
+    return selected_tab == 'heatmap' and n_filtered > DENSITY_RASTER_ROWS
+
+
+def build_density_figure(key, viewport, color_palette):
+    """
+    Creates the density map of the heatmap tab from a grid of counts over the viewport, instead of from the incidents.
+    Args:
+    - key (tuple): The canonical filter key, see filter_key.
+    - viewport (dict): The visible part of the map, see update_viewport, None for the extent of the filtered rows.
+    - color_palette (str): Color palette of the density.
+    Returns:
+    - plotly.graph_objs._figure.Figure: The density map, with one weighted point per non-empty grid cell.
+    """
+    import plotly.express as px # imported on first use, see the imports at the top
+    cell_lon, cell_lat, counts = backend.density(key, viewport['bounds'] if viewport else None, DENSITY_GRID_BINS, DENSITY_SMOOTHING)
+    map_fig = px.density_map(
+        pd.DataFrame({'Latitude': cell_lat, 'Longitude': cell_lon, 'Incidents': counts}),
+        lat='Latitude',
+        lon='Longitude',
+        z='Incidents',
+        radius=10, # about the size of a grid cell on the screen
+        center=dict(lat=-28, lon=130), # Roughly the center of Australia
+        zoom=2.5,
+        map_style='open-street-map',
+        color_continuous_scale=color_palette, # Changes colourmap
+    )
+    map_fig.update_layout(margin=dict(l=5, r=5, t=30, b=5), uirevision='shark-map') # keep the user's zoom and pan when the figure is rebuilt
+    return compact_map_figure(map_fig)
+
+
+def build_bar_figure(filtered_counts, selected_counts, selected_var, switch_axes):
+    """
+    Creates a bar chart of the counts of the values of selected_var in the filtered and in the selected data.
+    The counts are indexed like backend.labels[selected_var].
+    """
+    import plotly.express as px # imported on first use, see the imports at the top
+    # Combine the counts of the filtered and selected data in one table with a column 'Source', values without rows are left out
+    labels = backend.labels[selected_var]
+    combined_df = pd.DataFrame({
+        selected_var: np.repeat(labels, 2),
+        'Source': np.tile(['Filtered Data', 'Selected Data'], len(labels)),
+        'Count': np.column_stack([filtered_counts, selected_counts]).ravel(),
+    })
+    combined_df = combined_df[(combined_df['Count'] > 0) & combined_df[selected_var].notna()].reset_index(drop=True)
+    # Switch axes for the bar chart
+    bar_x, bar_y = (selected_var, 'Count') if not switch_axes else ('Count', selected_var)
+    # Generate the bar chart for filtered_df and selected_df
     bar_fig = px.bar(
         combined_df,
-        x=bar1_x,
-        y=bar1_y,
+        x=bar_x,
+        y=bar_y,
         color='Source',
         barmode='group',
         labels={selected_var: categories[selected_var], 'Count': 'Count', 'Source': 'Data Source'},
@@ -544,115 +938,436 @@ def update_map_and_chart(selected_sharks, selected_injuries, selected_injury_sev
             tickfont=dict(size=8)
         )
     )
+    return bar_fig
 
-    # Combine the filtered and selected data for the second bar chart with a new column 'Source'
-    combined_df2 = (
-        pd.concat([
-            filtered_df[[selected_var2]].assign(Source='Filtered Data'),
-            selected_df[[selected_var2]].assign(Source='Selected Data')
-        ])
-        .groupby([selected_var2, 'Source'])
-        .size()
-        .reset_index(name='Count')
-    )
-    # Switch axes for the second bar chart
-    switch_bar2 = n_clicks_bar2 % 2 == 1
-    bar2_x, bar2_y = (selected_var2, 'Count') if not switch_bar2 else ('Count', selected_var2)
-    # Generate the second bar chart for filtered_df and selected_df
-    bar_fig2 = px.bar(
-        combined_df2,
-        x=bar2_x,
-        y=bar2_y,
-        color='Source',
-        barmode='group',
-        labels={selected_var2: categories[selected_var2], 'Count': 'Count', 'Source': 'Data Source'},
-    )
-    bar_fig2.update_layout(
-        margin=dict(l=5, r=5, t=40, b=5),  # Adjust margins as needed
-        legend=dict(
-            orientation='h',  # Horizontal legend
-            yanchor='top',
-            y=1,  # Inside the chart at the top
-            xanchor='center',
-            x=0.5,  # Centered horizontally
-            font=dict(size=10),  # Smaller font size
-            bgcolor='rgba(255, 255, 255, 0.3)',  # Semi-transparent background for better readability
-        ),
-        xaxis = dict(
+
+def build_heat_figure(counts, selected_var, selected_var2, color_palette):
+    """
+    Creates the correlation heatmap of selected_var and selected_var2.
+    The counts have one row per label of selected_var and one column per label of selected_var2 (see backend.labels),
+    only the values that occur are shown, at most HEATMAP_TOP_K per variable if it is set (see jbi100_app/crosstab.py).
+    """
+    x, y, z = heat_tables.table(counts, selected_var, selected_var2)
+    heat_fig = go.Figure(go.Heatmap(
+        x=x,
+        y=y,
+        z=z,
+        colorscale=color_palette,  # Changes colourmap
+        texttemplate='%{z}',
+    ))
+    heat_fig.update_layout(
+        margin=dict(l=5, r=5, t=40, b=5),
+        xaxis=dict(
             title=dict(
                 font=dict(size=12)
             ),
             tickfont=dict(size=8)
         ),
-        yaxis = dict(
+        yaxis=dict(
             title=dict(
                 font=dict(size=12)
             ),
             tickfont=dict(size=8)
         )
     )
+    return heat_fig
 
-    # Create correlation heatmap
-    if selected_df.empty:
-        filtered_df['Modified_var'] = filtered_df[selected_var].astype(str).str.replace('shark', '', regex=False)
-        filtered_df['Modified_var2'] = filtered_df[selected_var2].astype(str).str.replace('shark', '', regex=False)
-        heat_fig = go.Figure(go.Histogram2d(
-            x=filtered_df['Modified_var'],
-            y=filtered_df['Modified_var2'],
-            colorscale=color_palette,  # Changes colourmap
-            texttemplate='%{z}',
-        ))
-        heat_fig.update_layout(
-            margin=dict(l=5, r=5, t=40, b=5),
-            xaxis=dict(
-                title=dict(
-                    font=dict(size=12)
-                ),
-                tickfont=dict(size=8)
-            ),
-            yaxis=dict(
-                title=dict(
-                    font=dict(size=12)
-                ),
-                tickfont=dict(size=8)
-            )
-        )
-    else:
-        selected_df['Modified_var'] = selected_df[selected_var].astype(str).str.replace('shark', '', regex=False)
-        selected_df['Modified_var2'] = selected_df[selected_var2].astype(str).str.replace('shark', '', regex=False)
-        heat_fig = go.Figure(go.Histogram2d(
-            x=selected_df['Modified_var'],
-            y=selected_df['Modified_var2'],
-            colorscale=color_palette,  # Changes colourmap
-            texttemplate='%{z}',
-        ))
-        heat_fig.update_layout(
-            margin=dict(l=5, r=5, t=40, b=5),
-            xaxis=dict(
-                title=dict(
-                    font=dict(size=12)
-                ),
-                tickfont=dict(size=8)
-            ),
-            yaxis=dict(
-                title=dict(
-                    font=dict(size=12)
-                ),
-                tickfont=dict(size=8)
-            )
-        )
 
-    # create the timeline histogram
-    timeline_fig = px.histogram(
-        filtered_df,
-        x='Incident.date',
-        nbins=100,
-        title='Timeline of Incidents',
-        labels={'Incident.date': '', 'count': 'Frequency'},
+# Date of a bar of the timeline in its hover label, per bin width
+TIMELINE_HOVER = {'month': '%{x|%b %Y}', 'year': '%{x|%Y}', 'decade': '%{x|%Y}s'}
+
+
+def build_timeline_figure(bin_width, edges, counts):
+    """
+    Creates the timeline histogram of the incidents from the binned counts of timeline_bins, one bar per bin.
+    The bins are sent as their start date and width in milliseconds (a month or a year is not a fixed number of days).
+    """
+    dates = epoch_ms((edges - 1970 * 12).astype('datetime64[M]')) # months since January of year 0 to dates
+    timeline_fig = go.Figure(go.Bar(
+        x=dates[:-1],
+        y=counts,
+        width=np.diff(dates),
+        offset=0, # the bars start at their date
+        hovertemplate=TIMELINE_HOVER[bin_width] + '<br>count=%{y}<extra></extra>',
+    ))
+    timeline_fig.update_layout(margin=dict(l=10, r=50, t=60, b=5), title=f'Timeline of Incidents (per {bin_width})', yaxis_title_text='count',
+                               xaxis_type='date', bargap=0)
+    return timeline_fig
+
+
+# Callback to turn the filter inputs into a filter state
+@app.callback(
+    Output('filter-store', 'data'),
+    [
+        Input('shark-dropdown', 'value'),
+        Input('injury-dropdown', 'value'),
+        Input('injury-severity-dropdown', 'value'),
+        Input('victim-activity-dropdown', 'value'),
+        Input('source-dropdown', 'value'),
+        Input('gender-dropdown', 'value'),
+        Input('site-dropdown', 'value'),
+        Input('state-dropdown', 'value'),
+        Input('shark-length-slider', 'value'),
+        Input('provoked-status', 'value'),
+        Input('incident-month-dropdown', 'value'),
+        Input('include-unknown-length', 'value'),
+        Input('year-slider', 'value'),
+    ]
+)
+def update_filter_state(selected_sharks, selected_injuries, selected_injury_severities, selected_activities, selected_sources, selected_genders, selected_sites, selected_states, shark_length_range, provoked_status, incident_month, include_unknown_length, year_range):
+    """
+    Collects the selected filters in a filter state.
+    Args:
+    - selected_sharks (list): List of selected shark types.
+    - selected_injuries (list): List of selected injury levels.
+    - selected_injury_severities (list): List of selected injury severities.
+    - selected_activities (list): List of selected activities.
+    - selected_sources (list): List of selected data sources.
+    - selected_genders (list): List of selected genders.
+    - selected_sites (list): List of selected sites.
+    - selected_states (list): List of selected states.
+    - shark_length_range (tuple): Range of selected shark lengths.
+    - provoked_status (list): List of selected provoked statuses.
+    - incident_month (list): List of selected incident months.
+    - include_unknown_length (str): Option to include unknown shark lengths.
+    - year_range (tuple): Range of selected years.
+    Returns:
+    - dict: The filter state, with the selected values per categorical column and the ranges per numeric column.
+    """
+    return {
+        'selections': {
+            'Shark.common.name': selected_sharks,
+            'Victim.injury': selected_injuries,
+            'Injury.severity': selected_injury_severities,
+            'Victim.activity': selected_activities,
+            'Data.source': selected_sources,
+            'Victim.gender': selected_genders,
+            'Site.category': selected_sites,
+            'State': selected_states,
+            'Provoked/unprovoked': provoked_status,
+            'Incident.month': incident_month,
+        },
+        'ranges': {
+            'Shark.length.m': [shark_length_range[0], shark_length_range[1], 'include' in include_unknown_length], # unknown lengths only if the checkbox is checked
+            'Incident.year': [year_range[0], year_range[1], False],
+        },
+    }
+
+
+# Callback to resolve the map selection within the filtered data
+@app.callback(
+    Output('selection-store', 'data'),
+    [Input('filter-store', 'data'), Input('selection-geometry', 'data'), Input('data-revision', 'data')],
+    State('session-id', 'data')
+)
+def update_selection(filter_state, selected_data, revision, session_id):
+    """
+    Finds the filtered rows that are selected on the map and keeps them in the selection store, the page gets a token.
+    Box and lasso selections are resolved server-side by the backend from their geometry, other selections by the row ids
+    (index1) the map points carry in their customdata.
+    Args:
+    - filter_state (dict): The filter state.
+    - selected_data (dict): Data selected on the map, without the selected points for boxes and lassos (see compactSelection).
+    - revision (int): The data revision, ingested incidents inside the selected area are selected as well.
+    - session_id (str): Id of the page, its new selection replaces its previous one in the store.
+    Returns:
+    - dict: The token of the selected rows in the selection store and their number ('token', 'rows'), or None if nothing is
+      selected. The token is None if the selection is too large for the store. See selection_rows.
+    """
+    with metrics.span('selection'), data_lock.read():
+        selected = backend.select(filter_key(filter_state), selected_data) # only rows that pass the filters can be selected
+    if selected is None:
+        return None
+    return {'token': selection_store.put(session_id, selected), 'rows': len(selected)}
+
+
+# Callback to tell the user when a map selection was not kept
+@app.callback(
+    Output('selection-message', 'children'),
+    Input('selection-store', 'data'),
+)
+def show_selection_message(selection_state):
+    """
+    Explains why the figures show no selection when the selection was too large for the selection store.
+    Args:
+    - selection_state (dict): The token and the number of rows of the selection, see update_selection.
+    Returns:
+    - str: The message, empty if the selection was kept.
+    """
+    if selection_state and selection_state['token'] is None:
+        return f"The selection of {selection_state['rows']} rows is too large to keep, select fewer incidents on the map."
+    return ''
+
+
+# Callback to keep track of the visible part of the map
+@app.callback(
+    Output('viewport-store', 'data'),
+    Input('shark-map', 'relayoutData'),
+    prevent_initial_call=True
+)
+def update_viewport(relayout_data):
+    """
+    Extracts the visible part of the map after the user zoomed or panned, used to aggregate the heatmap tab over the viewport.
+    Args:
+    - relayout_data (dict): The relayoutData of the map.
+    Returns:
+    - dict: The viewport with 'bounds' [lon0, lat0, lon1, lat1] and 'zoom', unchanged if the relayoutData does not describe the view.
+    """
+    viewport = viewport_from_relayout(relayout_data)
+    return no_update if viewport is None else viewport
+
+
+# Callback to notice incidents ingested since the page was loaded or last refreshed
+@app.callback(
+    Output('data-revision', 'data'),
+    Input('data-poll', 'n_intervals'),
+    State('data-revision', 'data'),
+    prevent_initial_call=True
+)
+def check_data_revision(n_intervals, revision):
+    """
+    Compares the data revision of the page with the current one, polled while incidents are ingested (see INGEST_DIR).
+    Args:
+    - n_intervals (int): Number of polls.
+    - revision (int): The data revision the page shows.
+    Returns:
+    - int: The current data revision, the callback does not update anything if the page shows it already.
+    """
+    if revision == data_revision:
+        raise PreventUpdate
+    return data_revision
+
+
+# The dropdowns of the categorical columns, by id
+DROPDOWN_COLUMNS = {
+    'shark-dropdown': 'Shark.common.name',
+    'injury-dropdown': 'Victim.injury',
+    'injury-severity-dropdown': 'Injury.severity',
+    'victim-activity-dropdown': 'Victim.activity',
+    'gender-dropdown': 'Victim.gender',
+    'provoked-status': 'Provoked/unprovoked',
+    'state-dropdown': 'State',
+    'site-dropdown': 'Site.category',
+    'incident-month-dropdown': 'Incident.month',
+    'source-dropdown': 'Data.source',
+}
+
+
+# Callback to update the dropdown options and slider bounds to the ingested incidents
+@app.callback(
+    [Output(dropdown, 'options') for dropdown in DROPDOWN_COLUMNS] + [
+        Output('year-slider', 'min'),
+        Output('year-slider', 'max'),
+        Output('year-slider', 'marks'),
+        Output('year-slider', 'value', allow_duplicate=True),
+        Output('shark-length-slider', 'min'),
+        Output('shark-length-slider', 'max'),
+        Output('shark-length-slider', 'value', allow_duplicate=True),
+    ],
+    Input('data-revision', 'data'),
+    [
+        State('year-slider', 'min'),
+        State('year-slider', 'max'),
+        State('year-slider', 'value'),
+        State('shark-length-slider', 'min'),
+        State('shark-length-slider', 'max'),
+        State('shark-length-slider', 'value'),
+    ],
+    prevent_initial_call=True
+)
+def update_data_options(revision, year_bound_min, year_bound_max, year_range, length_bound_min, length_bound_max, length_range):
+    """
+    Updates the dropdown options and the slider bounds of a page to the data after incidents were ingested.
+    A slider handle that is at a bound of its slider moves along with the bound, so the new incidents are not filtered out.
+    Args:
+    - revision (int): The data revision.
+    - year_bound_min (int), year_bound_max (int), year_range (list): The bounds and the value of the year slider.
+    - length_bound_min (float), length_bound_max (float), length_range (list): The bounds and the value of the shark length slider.
+    Returns:
+    - list: The options of every dropdown of DROPDOWN_COLUMNS, then the min, max, marks and value of the year slider and the
+      min, max and value of the shark length slider. Values are dash.no_update when they stay the same.
+    """
+    def follow(value, bound_min, bound_max, new_min, new_max): # moves the handles that are at a bound
+        low, high = value
+        moved = [new_min if low <= bound_min else low, new_max if high >= bound_max else high]
+        return no_update if moved == list(value) else moved
+    with data_lock.read():
+        options = data_layout_metadata()['options']
+        return [dropdown_options(options[column]) for column in DROPDOWN_COLUMNS.values()] + [
+            year_min, year_max, year_marks(year_min, year_max), follow(year_range, year_bound_min, year_bound_max, year_min, year_max),
+            shark_length_min, shark_length_max, follow(length_range, length_bound_min, length_bound_max, shark_length_min, shark_length_max),
+        ]
+
+
+def compute_figures(changed, filter_state, selection, viewport, selected_tab, selected_var, selected_var2, n_clicks_bar1, n_clicks_bar2, color_palette, color_sequence):
+    """
+    Rebuilds the outputs of update_figures that depend on the changed inputs.
+    Args:
+    - changed (set): Ids of the changed inputs, None rebuilds all outputs.
+    - selection (np.ndarray): The index1 values of the selected rows, None if nothing is selected, see selection_rows.
+    - other arguments: see update_figures.
+    Returns:
+    - list: One entry per key of FIGURE_DEPENDENCIES, either the new figure/children or dash.no_update.
+    """
+    stale = [output for output, inputs in FIGURE_DEPENDENCIES.items() if changed is None or inputs & changed] # the map, the slowest, first
+    key = filter_key(filter_state)
+    def map_figure():
+        n_filtered = int(backend.counts([], key))
+        if uses_density_grid(selected_tab, n_filtered):
+            return build_density_figure(key, viewport, color_palette)
+        if selected_tab == 'scatter' and n_filtered > MAX_MAP_POINTS:
+            return build_scatter_lod_figure(key, viewport, selection, selected_var, selected_var2, color_palette, color_sequence)
+        if changed is not None and changed <= {'viewport-store'}:
+            return no_update # the incidents are all sent, so the browser handles zooming and panning
+        return build_map_figure(apply_selection(backend.rows(key), selection), selected_tab, selected_var, selected_var2, color_palette, color_sequence)
+    def bar_counts(var): # counts of the filtered and of the selected data
+        filtered_counts = count_rows([var], filter_state)
+        return filtered_counts, count_rows([var], filter_state, selection) if selection is not None else np.zeros_like(filtered_counts)
+    builders = {
+        'shark-map': map_figure,
+        'activity-bar-chart': lambda: build_bar_figure(*bar_counts(selected_var), selected_var, n_clicks_bar1 % 2 == 1),
+        'activity-bar-chart2': lambda: build_bar_figure(*bar_counts(selected_var2), selected_var2, n_clicks_bar2 % 2 == 1),
+        'heat-chart': lambda: build_heat_figure(count_rows([selected_var, selected_var2], filter_state, selection), selected_var, selected_var2, color_palette), # the selected data if there is a selection
+        'timeline': lambda: build_timeline_figure(*timeline_bins(filter_state)),
+        'row-details': lambda: build_row_details(int(count_rows([], filter_state)), len(selection) if selection is not None else 0),
+    }
+    def build(output): # timed per output, the stages are named after the output ids
+        figure_jobs.check() # stop if a newer update of the session arrived
+        with metrics.span(output):
+            figure = builders[output]()
+        if figure_pool.workers: # serialized in the worker too, Dash then only writes out the dict
+            with metrics.span('serialize'):
+                figure = plain_figure(figure)
+        return figure
+    figures = dict(zip(stale, figure_pool.map(figure_jobs.bind(build), stale)))
+    return [figures.get(output, no_update) for output in FIGURE_DEPENDENCIES]
+
+
+def figure_flight_key(changed, filter_state, selection, viewport, selected_tab, selected_var, selected_var2, revision, n_clicks_bar1, n_clicks_bar2, color_palette, color_sequence):
+    """
+    Returns the key of a figure update for figure_flights: its inputs in a normalized form, without the session, so
+    updates with the same key build the same outputs.
+    Args:
+    - changed (set): Ids of the changed inputs, None rebuilds all outputs.
+    - other arguments: see update_figures.
+    Returns:
+    - tuple: The key.
+    """
+    return (
+        frozenset(changed) if changed is not None else None,
+        filter_key(filter_state),
+        selection['token'] if selection else None,
+        json.dumps(viewport, sort_keys=True),
+        selected_tab, selected_var, selected_var2, revision,
+        (n_clicks_bar1 or 0) % 2, (n_clicks_bar2 or 0) % 2, # only the orientation of the bars matters
+        color_palette, color_sequence,
     )
-    timeline_fig.update_layout(margin=dict(l=10, r=50, t=60, b=5))
 
-    return map_fig, bar_fig, bar_fig2, heat_fig, timeline_fig, row_details
+
+# Callback to update: map, bar charts, heat map, timeline, and row details
+@app.callback(
+    [
+        Output('shark-map', 'figure'),
+        Output('activity-bar-chart', 'figure'),
+        Output('activity-bar-chart2', 'figure'),
+        Output('heat-chart', 'figure'),
+        Output('timeline', 'figure'),
+        Output('row-details', 'children')
+    ],
+    [
+        Input('filter-store', 'data'),
+        Input('selection-store', 'data'),
+        Input('viewport-store', 'data'),
+        Input('map-tabs', 'value'),
+        Input('var-select', 'value'),
+        Input('var-select2', 'value'),
+        Input('data-revision', 'data'),
+    ],
+    [
+        State('switch-axes-bar1', 'n_clicks'),
+        State('switch-axes-bar2', 'n_clicks'),
+        State('color-dropdown', 'value'),
+        State('color-dropdown-discrete', 'value'),
+        State('session-id', 'data'),
+    ]
+)
+def update_figures(filter_state, selection, viewport, selected_tab, selected_var, selected_var2, revision, n_clicks_bar1, n_clicks_bar2, color_palette, color_sequence, session_id):
+    """
+        Update the map and charts whose inputs changed.
+        Args:
+        - filter_state (dict): The filter state, see update_filter_state.
+        - selection (dict): The token of the rows selected on the map, see update_selection.
+        - viewport (dict): The visible part of the map, see update_viewport.
+        - selected_tab (str): Selected tab for map visualization ('heatmap' or 'scatter').
+        - selected_var (str): First variable selected for visualization.
+        - selected_var2 (str): Second variable selected for visualization.
+        - revision (int): The data revision, all outputs are rebuilt when incidents were ingested.
+        - n_clicks_bar1 (int): Number of clicks for the first bar chart.
+        - n_clicks_bar2 (int): Number of clicks for the second bar chart.
+        - color_palette (str): Color palette for the heatmap.
+        - color_sequence (str): Color sequence for the scatter plot.
+        - session_id (str): Id of the page, updates superseded by a newer update of the same page are not completed, the newer
+          update rebuilds their outputs too.
+        Returns:
+        - map_fig (plotly.graph_objs._figure.Figure): Map figure (heatmap or scatter plot).
+        - bar_fig (plotly.graph_objs._figure.Figure): First bar chart figure.
+        - bar_fig2 (plotly.graph_objs._figure.Figure): Second bar chart figure.
+        - heat_fig (plotly.graph_objs._figure.Figure): Correlation heatmap figure.
+        - timeline_fig (plotly.graph_objs._figure.Figure): Timeline histogram figure.
+        - row_details (str): Details about the number and percentage of rows in filtered and selected data.
+        Outputs whose inputs did not change are dash.no_update. Superseded updates raise PreventUpdate. Identical updates
+        of other pages that run at the same time are computed once and share their outputs (see figure_flights).
+        """
+    changed = set(ctx.triggered_prop_ids.values()) or None # nothing triggered on the initial call: build everything
+    try:
+        with figure_jobs.job(session_id, changed) as changed, data_lock.read(): # with the changes of the superseded updates of the page
+            key = figure_flight_key(changed, filter_state, selection, viewport, selected_tab, selected_var, selected_var2, revision, n_clicks_bar1, n_clicks_bar2, color_palette, color_sequence)
+            def compute(): # the figures as dicts, so the updates that share them only write them out
+                outputs = compute_figures(changed, filter_state, selection_rows(selection), viewport, selected_tab, selected_var, selected_var2, n_clicks_bar1, n_clicks_bar2, color_palette, color_sequence)
+                return [plain_figure(output) for output in outputs]
+            return figure_flights.run(key, compute)
+    except Superseded:
+        raise PreventUpdate
+
+
+# Clientside callbacks (jbi100_app/assets/clientside.js): these only change the presentation of the figures in the browser
+
+# Switch the axes of the bar charts
+app.clientside_callback(
+    ClientsideFunction(namespace='figures', function_name='swapBarAxes'),
+    Output('activity-bar-chart', 'figure', allow_duplicate=True),
+    Input('switch-axes-bar1', 'n_clicks'),
+    State('activity-bar-chart', 'figure'),
+    prevent_initial_call=True
+)
+app.clientside_callback(
+    ClientsideFunction(namespace='figures', function_name='swapBarAxes'),
+    Output('activity-bar-chart2', 'figure', allow_duplicate=True),
+    Input('switch-axes-bar2', 'n_clicks'),
+    State('activity-bar-chart2', 'figure'),
+    prevent_initial_call=True
+)
+
+# Change the continuous color palette of the map and the heatmap
+app.clientside_callback(
+    ClientsideFunction(namespace='figures', function_name='restyleContinuousPalette'),
+    [
+        Output('shark-map', 'figure', allow_duplicate=True),
+        Output('heat-chart', 'figure', allow_duplicate=True),
+    ],
+    Input('color-dropdown', 'value'),
+    [State('palette-store', 'data'), State('shark-map', 'figure'), State('heat-chart', 'figure')],
+    prevent_initial_call=True
+)
+
+# Change the discrete color palette of the map
+app.clientside_callback(
+    ClientsideFunction(namespace='figures', function_name='restyleDiscretePalette'),
+    Output('shark-map', 'figure', allow_duplicate=True),
+    Input('color-dropdown-discrete', 'value'),
+    [State('palette-store', 'data'), State('shark-map', 'figure')],
+    prevent_initial_call=True
+)
 
 # Callback to reset filters
 @app.callback(
@@ -684,6 +1399,8 @@ def reset_filters(n_clicks):
     Returns:
     - tuple: A tuple containing the default values for all filter components.
     """
+    with data_lock.read(): # the slider bounds are set when the data is loaded
+        length_range, year_range = [shark_length_min, shark_length_max], [year_min, year_max]
     return (
         None,
         None,
@@ -693,51 +1410,59 @@ def reset_filters(n_clicks):
         None,
         None,
         None,
-        [shark_length_min, shark_length_max],
+        length_range,
         None,
         ['include'],
-        [year_min, year_max],
+        year_range,
         'viridis',
         'Vivid'
     )
 
-# Callback to reset selection
-@app.callback(
-    [Output('shark-map', 'selectedData')],
+# Give the page a random session id, once
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='sessionId'),
+    Output('session-id', 'data'),
+    Input('session-id', 'modified_timestamp'),
+    State('session-id', 'data')
+)
+
+# Send only the geometry of a map selection (or the row ids of clicked points) to the server, see update_selection
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='compactSelection'),
+    Output('selection-geometry', 'data'),
+    Input('shark-map', 'selectedData')
+)
+
+# Copy the filter state and the selection into the download form
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='exportInputs'),
+    [Output('export-filters', 'value'), Output('export-selection', 'value')],
+    [Input('filter-store', 'data'), Input('selection-store', 'data')]
+)
+
+# Reset the selection
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='resetSelection'),
+    Output('shark-map', 'selectedData'),
     Input('reset-selection-button', 'n_clicks'),
     prevent_initial_call=True
 )
-def reset_selection(n_clicks):
-    """
-    Resets the selection based on the number of clicks.
-    Args:
-    - n_clicks (int): The number of clicks that triggers the reset.
-    Returns:
-    - list: A list containing a single None element, indicating the reset state.
-    """
-    return [None]
 
-# Callback to toggle the pop-up modal
-@app.callback(
+# Toggle the pop-up modal
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='toggleModal'),
     Output('modal-dismiss', 'is_open'),
     [Input('open-dismiss', 'n_clicks'), Input('close-dismiss', 'n_clicks')],
     [State('modal-dismiss', 'is_open')],
+    prevent_initial_call=True
 )
-def toggle_modal(n_open, n_close, is_open):
-    """
-    Toggles the state of the pop-up modal window.
-    
-    Args:
-    - n_open (int): The number of times the open button has been clicked.
-    - n_close (int): The number of times the close button has been clicked.
-    - is_open (bool): The current state of the modal window (True if open, False if closed).
-    Returns:
-    - bool: The new state of the modal window (True if it should be open, False if it should be closed).
-    """
-    if n_open or n_close:
-        return not is_open
-    return is_open
+
+# Load the data, with FAST_START and a layout manifest in the background: the app serves its first pages meanwhile
+start_data(background=FAST_START and layout_manifest is not None)
+# Set the layout once the data or the layout manifest is there, Dash builds it once to validate it
+app.layout = serve_layout
+metrics.record_boot('serving', time.perf_counter() - boot_start)
 
 # Run the server
 if __name__ == '__main__':
-    app.run_server(debug=False, use_reloader=True) # set debug True to get errors and issues on the webpage with that blue circle
+    app.run(debug=False, use_reloader=True) # set debug True to get errors and issues on the webpage with that blue circle
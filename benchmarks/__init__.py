@@ -0,0 +1,3 @@
+"""
+Benchmarks for the JBI100 shark incident app, run them from the repository root, e.g. `python -m benchmarks.bench_startup`.
+"""
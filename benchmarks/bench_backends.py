@@ -0,0 +1,131 @@
+"""
+Backend benchmark: compares the query backends (see jbi100_app/backends.py) on synthetic datasets of increasing size.
+
+For every size and backend the app is imported in a fresh process with JBI100_DATASET pointing to the dataset and
+JBI100_BACKEND set. Reported are the time to open the backend (for SQLite the first open writes the database, it is
+timed in a first process and reused by the measured one), the resident memory of the process once the data is loaded,
+and per query (see queries) the median time with cold caches (a new filter state) and with warm caches (the same filter
+state again). The answers of the queries are hashed, the benchmark fails if the backends answer differently.
+
+The SQLite database is written to a temporary directory (JBI100_SQLITE_DIR) that is removed afterwards.
+
+Usage: python -m benchmarks.bench_backends [--rows 100000 1000000] [--repeat N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.synthetic import dataset_path
+
+BACKENDS = ['pandas', 'sqlite']
+
+# Filter inputs of the queries, see filter_inputs in benchmarks/bench_callbacks.py
+FILTERS = {'shark_length_range': [1.0, 4.0], 'year_range': [1950, 2000], 'incident_month': [1, 2, 3]}
+# A box selection on the map, over the east coast of Australia
+BOX = {'range': {'map': [[145, -25], [155, -40]]}}
+
+
+def queries(app, key, selection):
+    """
+    Returns the queries of the benchmark: name -> function without arguments that returns a hashable answer.
+    """
+    backend = app.backend
+    return {
+        'count': lambda: int(backend.counts([], key)),
+        'bar': lambda: backend.counts(['Victim.injury'], key).tolist(),
+        'heatmap': lambda: backend.counts(['Shark.common.name', 'State'], key).tolist(),
+        'timeline': lambda: backend.counts(['Incident.year', 'Incident.month'], key).tolist(),
+        'map rows': lambda: backend.rows(key, limit=app.MAX_MAP_POINTS + 1)['index1'].tolist(),
+        'clusters': lambda: sorted(backend.clusters(key, backend.extent(), 'Victim.injury', None, app.MAX_MAP_POINTS)['Incidents'].tolist()),
+        'density': lambda: round(float(backend.density(key, None, app.DENSITY_GRID_BINS, app.DENSITY_SMOOTHING)[2].sum())),
+        'box selection': lambda: backend.select(key, BOX),
+        'selected counts': lambda: backend.selected_counts(['Victim.injury'], selection).tolist(),
+    }
+
+
+def run_child(repeat):
+    """
+    Benchmarks the backend of JBI100_BACKEND on the dataset of JBI100_DATASET, in this process.
+
+    Returns:
+    - dict: The open time, the resident memory and per query the cold and warm median in milliseconds and a hash of its answer.
+    """
+    from benchmarks.bench_callbacks import filter_inputs
+    warnings.filterwarnings('ignore')
+    start = time.perf_counter()
+    import app
+    result = {'open_s': time.perf_counter() - start, 'rows': app.backend.n_rows,
+              'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 'queries': {}} # kilobytes on Linux
+    if not repeat: # only opens the backend
+        return result
+    key = app.filter_key(app.update_filter_state(**filter_inputs(app, FILTERS)))
+    selection = app.backend.select(key, BOX)
+    for name, query in queries(app, key, selection).items():
+        cold, warm = [], []
+        for _ in range(repeat):
+            app.backend.clear_caches()
+            start = time.perf_counter()
+            answer = query()
+            cold.append((time.perf_counter() - start) * 1e3)
+            start = time.perf_counter()
+            query()
+            warm.append((time.perf_counter() - start) * 1e3)
+        result['queries'][name] = {'cold_ms': statistics.median(cold), 'warm_ms': statistics.median(warm),
+                                   'answer': hashlib.sha256(json.dumps(answer, default=str).encode()).hexdigest()[:12]}
+    return result
+
+
+def run_backend(n_rows, backend, repeat, sqlite_dir):
+    """
+    Benchmarks a backend on a synthetic dataset of n_rows rows, in a fresh process.
+    """
+    env = dict(os.environ, JBI100_DATASET=dataset_path(n_rows), JBI100_BACKEND=backend, JBI100_SQLITE_DIR=sqlite_dir)
+    env.pop('JBI100_INGEST_DIR', None)
+    def run(*arguments):
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_backends', '--child', *arguments], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    build_s = None
+    if backend == 'sqlite':
+        start = time.perf_counter()
+        run('--repeat', '0') # writes the database
+        build_s = time.perf_counter() - start
+    return {**run('--repeat', str(repeat)), 'build_s': build_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.repeat)))
+        return
+
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory(prefix='jbi100-sqlite-') as sqlite_dir:
+            results = {backend: run_backend(n_rows, backend, args.repeat, sqlite_dir) for backend in BACKENDS}
+        print(f'{n_rows} rows, median of {args.repeat} runs')
+        for backend, result in results.items():
+            build = f", database written in {result['build_s']:.1f} s" if result['build_s'] is not None else ''
+            print(f"  {backend}: opened in {result['open_s']:.1f} s{build}, {result['rss_mb']:.0f} MB resident")
+        print(f"  {'query':<17}" + ''.join(f'{backend + " cold":>14}{backend + " warm":>14}' for backend in BACKENDS) + '  (ms)')
+        for name in results[BACKENDS[0]]['queries']:
+            print(f'  {name:<17}' + ''.join(f"{results[backend]['queries'][name]['cold_ms']:>14.1f}{results[backend]['queries'][name]['warm_ms']:>14.1f}"
+                                            for backend in BACKENDS))
+            answers = {results[backend]['queries'][name]['answer'] for backend in BACKENDS}
+            assert len(answers) == 1, f'the backends answer {name} differently'
+
+
+if __name__ == '__main__':
+    main()
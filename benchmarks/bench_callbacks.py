@@ -0,0 +1,216 @@
+"""
+Callback benchmark: runs the server-side stages of the dashboard on synthetic datasets of increasing size and
+saves a report as JSON, so runs can be compared over time (for example before and after a change).
+
+For every size a synthetic dataset with the schema of get_data() is written (see benchmarks/synthetic.py, it is
+reused by later runs) and the app is imported in a fresh process with JBI100_DATASET pointing to it. The callback
+functions are then called directly, for representative interactions (SCENARIOS), stage by stage:
+
+- filter: update_filter_state and evaluating the filter state (filter_positions).
+- selection: update_selection, resolving the map selection.
+- figures: compute_figures, rebuilding the outputs that depend on the changed input.
+- serialize: encoding the new outputs as JSON, like Dash does for the response.
+
+The filter result cache and the cuboid cache are cleared before every run, so every run does the full work of a
+new state. Timings are the median over the runs, the peak memory of a stage (the most memory allocated on top of
+what was allocated before the stage, traced with tracemalloc) is measured in a separate run, as tracing slows
+the stages down. For startup, the import time of the app and the peak resident memory of the process are reported.
+
+Usage: python -m benchmarks.bench_callbacks [--rows 10000 100000 1000000 10000000] [--repeat N] [--output FILE]
+                                            [--baseline FILE]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+from benchmarks.synthetic import dataset_path
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+STAGES = ['filter', 'selection', 'figures', 'serialize']
+
+# Representative interactions: the inputs that differ from the initial state of the app, and the inputs of
+# update_figures that changed (None for the initial call, which builds every output)
+SCENARIOS = {
+    'initial load': {'changed': None},
+    'state filter': {'filters': {'selected_states': ['NSW']}, 'changed': {'filter-store'}},
+    'narrow filters': {'filters': {'selected_sharks': ['white shark'], 'provoked_status': ['unprovoked'], 'year_range': [1950, 2000]},
+                       'changed': {'filter-store'}},
+    'map selection': {'selected_data': {'range': {'map': [[150.5, -34.2], [151.9, -33.4]]}}, 'changed': {'selection-store'}},
+    'heatmap tab': {'tab': 'heatmap', 'changed': {'map-tabs'}},
+    'zoomed viewport': {'viewport': {'bounds': [150.5, -34.2, 151.9, -33.4], 'zoom': 8}, 'changed': {'viewport-store'}},
+    'bar variable': {'var': 'State', 'changed': {'var-select'}},
+}
+
+
+def filter_inputs(app, changes):
+    """
+    Returns the arguments of update_filter_state: the initial values of the filter inputs with the given changes.
+    """
+    inputs = {
+        'selected_sharks': None, 'selected_injuries': None, 'selected_injury_severities': None, 'selected_activities': None,
+        'selected_sources': None, 'selected_genders': None, 'selected_sites': None, 'selected_states': None,
+        'shark_length_range': [app.shark_length_min, app.shark_length_max], 'provoked_status': None, 'incident_month': None,
+        'include_unknown_length': ['include'], 'year_range': [app.year_min, app.year_max],
+    }
+    inputs.update(changes)
+    return inputs
+
+
+def run_stages(app, scenario, trace_memory=False):
+    """
+    Runs the stages of one scenario.
+
+    Args:
+    - app (module): The app module.
+    - scenario (dict): The scenario, see SCENARIOS.
+    - trace_memory (bool): Whether to measure the peak memory of the stages instead of their time.
+    Returns:
+    - dict: Per stage the time in milliseconds, or the peak memory in megabytes.
+    - int: Size of the JSON of the new outputs in bytes.
+    """
+    from dash import no_update
+    from plotly.io.json import to_json_plotly
+    app.backend.clear_caches()
+    state = {}
+    def filter_stage():
+        state['filter_state'] = app.update_filter_state(**filter_inputs(app, scenario.get('filters', {})))
+        app.filter_positions(state['filter_state'])
+    def selection_stage():
+        state['selection'] = app.selection_rows(app.update_selection(state['filter_state'], scenario.get('selected_data'), app.data_revision, None))
+    def figures_stage():
+        state['outputs'] = app.compute_figures(scenario['changed'], state['filter_state'], state['selection'], scenario.get('viewport'),
+                                               scenario.get('tab', 'scatter'), scenario.get('var', 'Victim.injury'),
+                                               scenario.get('var2', 'Provoked/unprovoked'), 0, 0, 'viridis', 'Vivid')
+    def serialize_stage():
+        state['payload'] = to_json_plotly([output for output in state['outputs'] if output is not no_update])
+    stages = {'filter': filter_stage, 'selection': selection_stage, 'figures': figures_stage, 'serialize': serialize_stage}
+    measurements = {}
+    for stage in STAGES:
+        if trace_memory:
+            tracemalloc.reset_peak()
+            allocated, _ = tracemalloc.get_traced_memory()
+            stages[stage]()
+            measurements[stage] = (tracemalloc.get_traced_memory()[1] - allocated) / 1e6
+        else:
+            start = time.perf_counter()
+            stages[stage]()
+            measurements[stage] = (time.perf_counter() - start) * 1e3
+    return measurements, len(state['payload'])
+
+
+def run_child(repeat):
+    """
+    Benchmarks the app on the dataset of JBI100_DATASET, in this process.
+
+    Returns:
+    - dict: The startup measurements and the stage measurements per scenario.
+    """
+    warnings.filterwarnings('ignore')
+    start = time.perf_counter()
+    import app
+    startup = {'import_s': time.perf_counter() - start, 'rows': app.backend.n_rows,
+               'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3} # kilobytes on Linux
+    scenarios = {}
+    for name, scenario in SCENARIOS.items():
+        runs = [run_stages(app, scenario)[0] for _ in range(repeat)]
+        tracemalloc.start()
+        peak_mb, payload_bytes = run_stages(app, scenario, trace_memory=True)
+        tracemalloc.stop()
+        scenarios[name] = {
+            'ms': {stage: statistics.median(run[stage] for run in runs) for stage in STAGES},
+            'peak_mb': peak_mb,
+            'payload_bytes': payload_bytes,
+        }
+    startup['peak_rss_mb_after_scenarios'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    return {'startup': startup, 'scenarios': scenarios}
+
+
+def run_size(n_rows, repeat):
+    """
+    Benchmarks the app on a synthetic dataset of n_rows rows, in a fresh process.
+    """
+    env = dict(os.environ, JBI100_DATASET=dataset_path(n_rows))
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_callbacks', '--child', '--repeat', str(repeat)],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_revision():
+    """
+    Returns the current git commit of the repository, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    """
+    Prints the stage timings of a report, with the change relative to a baseline report if given.
+    """
+    baseline_runs = {run['rows']: run for run in baseline['runs']} if baseline else {}
+    print(f"{'rows':>10}  {'scenario':<17}" + ''.join(f'{stage + " (ms)":>16}' for stage in STAGES) + f"{'peak (MB)':>11}{'KB':>9}")
+    for run in report['runs']:
+        old = baseline_runs.get(run['rows'])
+        startup = run['startup']
+        print(f"{run['rows']:>10}  {'startup':<17}{startup['import_s'] * 1e3:>16.0f}{'':>48}{startup['peak_rss_mb']:>11.0f}")
+        for name, scenario in run['scenarios'].items():
+            cells = []
+            for stage in STAGES:
+                cell = f"{scenario['ms'][stage]:.1f}"
+                if old and name in old['scenarios'] and old['scenarios'][name]['ms'][stage] > 0:
+                    cell += f" ({scenario['ms'][stage] / old['scenarios'][name]['ms'][stage]:.2f}x)"
+                cells.append(f'{cell:>16}')
+            print(f"{run['rows']:>10}  {name:<17}" + ''.join(cells) + f"{max(scenario['peak_mb'].values()):>11.1f}{scenario['payload_bytes'] / 1e3:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON file of the report, by default in benchmarks/results/')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare the timings with')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.repeat)))
+        return
+
+    created = datetime.datetime.now()
+    report = {
+        'created': created.isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'runs': [],
+    }
+    for n_rows in args.rows:
+        report['runs'].append({'rows': n_rows, **run_size(n_rows, args.repeat)})
+
+    output = args.output or os.path.join(RESULTS_DIR, f'callbacks-{created:%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f'Report saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Count cube benchmark: compares counting the filtered rows, as the bar charts, heatmap and timeline used to do,
+with summing the cells of the count cube (jbi100_app/cube.py) on synthetic data.
+
+For every size and filter state the median latency of computing the counts of both bar charts, the heatmap
+and the timeline is reported, and the cube is checked to return the same counts.
+
+Usage: python -m benchmarks.bench_cube [--rows 10000 1000000 10000000] [--repeat N]
+"""
+import argparse
+import time
+
+import numpy as np
+from jbi100_app.cube import CountCube
+from jbi100_app.filters import FilterEngine
+from benchmarks.synthetic import make_frame
+from benchmarks.bench_filters import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, FILTER_STATES, median_ms
+
+# The variables of the bar charts and the heatmap (var-select and var-select2)
+VAR, VAR2 = 'Victim.injury', 'Provoked/unprovoked'
+
+
+def row_counts(df, engine, selections, length_range, include_unknown, year_range):
+    """
+    Counts the filtered rows per value, the way the charts did before the cube: filter, then group the rows.
+    """
+    filtered_df = df.iloc[engine.positions(selections, {'Shark.length.m': (*length_range, include_unknown), 'Incident.year': (*year_range, False)})]
+    return {
+        'bar': filtered_df.groupby(VAR).size(),
+        'bar2': filtered_df.groupby(VAR2).size(),
+        'heat': filtered_df.groupby([VAR, VAR2]).size(),
+        'timeline': filtered_df.groupby(['Incident.year', 'Incident.month']).size(),
+    }
+
+
+def cube_counts(cube, selections, length_range, include_unknown, year_range):
+    """
+    The same counts summed from the count cube.
+    """
+    ranges = {'Shark.length.m': (*length_range, include_unknown), 'Incident.year': (*year_range, False)}
+    return {
+        'bar': cube.counts([VAR], selections, ranges),
+        'bar2': cube.counts([VAR2], selections, ranges),
+        'heat': cube.counts([VAR, VAR2], selections, ranges),
+        'timeline': cube.counts(['Incident.year', 'Incident.month'], selections, ranges),
+    }
+
+
+def same_counts(cube, expected, result):
+    """
+    Checks that the dense cube counts contain exactly the non-zero group sizes of pandas.
+    """
+    for name, sizes in expected.items():
+        counts = result[name]
+        nonzero = np.nonzero(counts)
+        labels = [cube.labels[level][codes] for level, codes in zip(sizes.index.names, nonzero)]
+        if not np.array_equal(sizes.loc[list(zip(*labels)) if len(labels) > 1 else labels[0]].to_numpy(), counts[nonzero]):
+            return False
+        if len(sizes) != len(nonzero[0]):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'filter state':<16}{'rows (ms)':>12}{'cube (ms)':>12}{'speedup':>9}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        engine = FilterEngine(df, CATEGORICAL_COLUMNS, NUMERIC_COLUMNS)
+        start = time.perf_counter()
+        cube = CountCube(df, CATEGORICAL_COLUMNS, ['Incident.year', 'Shark.length.m'])
+        build_ms = (time.perf_counter() - start) * 1000
+        for name, state in FILTER_STATES.items():
+            rows_ms, expected = median_ms(lambda: row_counts(df, engine, *state), args.repeat)
+            cube_counts(cube, *state) # derive the cuboids of this state once, as the app does on first use
+            cube_ms, result = median_ms(lambda: cube_counts(cube, *state), args.repeat)
+            assert same_counts(cube, expected, result), f'different counts for {name}'
+            print(f'{n_rows:>10}  {name:<16}{rows_ms:>12.2f}{cube_ms:>12.2f}{rows_ms / cube_ms:>8.1f}x')
+        cube_mb = (cube.cell_counts.nbytes + sum(codes.nbytes for codes in cube.cells.values())) / 1e6
+        print(f'{n_rows:>10}  cube build {build_ms:.0f} ms, {len(cube.cell_counts)} cells, {cube_mb:.1f} MB, '
+              f'cuboids {cube.cuboid_cache.current_bytes / 1e6:.1f} MB')
+        del df, engine, cube
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Density map benchmark: compares sending every filtered incident to px.density_map, as the heatmap tab used
+to do, with the server-side density grid (jbi100_app/density.py) on synthetic data.
+
+For every size the payload (the JSON of the figure, as sent by Dash) and the time to build and serialize the
+figure are reported, for the extent of the data and for a zoomed-in viewport. The time the browser needs to
+draw the figure grows with the number of points it receives, so the payload is also the best proxy for the
+time to first paint available without a browser.
+
+Usage: python -m benchmarks.bench_density [--rows 10000 100000 1000000] [--repeat N]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+from jbi100_app.density import density_grid
+from jbi100_app.config import DENSITY_GRID_BINS, DENSITY_SMOOTHING
+from benchmarks.synthetic import make_frame
+from benchmarks.bench_filters import median_ms
+
+# Viewports: None is the extent of the data, the other one roughly the Sydney area
+VIEWPORTS = {'data extent': None, 'zoomed in': [150.5, -34.2, 151.9, -33.4]}
+
+
+def row_figure(df):
+    """
+    The original heatmap tab: every incident is a point of the density map.
+    """
+    return pio.to_json(px.density_map(df, lat='Latitude', lon='Longitude', radius=5, zoom=2.5, map_style='open-street-map'))
+
+
+def grid_figure(df, viewport):
+    """
+    The server-side density grid over the viewport: one weighted point per non-empty cell.
+    """
+    lon, lat = df['Longitude'].to_numpy(), df['Latitude'].to_numpy()
+    bounds = viewport or [np.nanmin(lon), np.nanmin(lat), np.nanmax(lon), np.nanmax(lat)]
+    cell_lon, cell_lat, counts = density_grid(lon, lat, bounds, bins=DENSITY_GRID_BINS, sigma=DENSITY_SMOOTHING)
+    cells = pd.DataFrame({'Latitude': cell_lat, 'Longitude': cell_lon, 'Incidents': counts})
+    return pio.to_json(px.density_map(cells, lat='Latitude', lon='Longitude', z='Incidents', radius=10, zoom=2.5, map_style='open-street-map'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'viewport':<12}{'rows (KB)':>12}{'grid (KB)':>12}{'rows (ms)':>12}{'grid (ms)':>12}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows, columns=['Latitude', 'Longitude', 'Incident.year', 'Incident.month'])
+        rows_ms, rows_json = median_ms(lambda: row_figure(df), args.repeat)
+        for name, viewport in VIEWPORTS.items():
+            grid_ms, grid_json = median_ms(lambda: grid_figure(df, viewport), args.repeat)
+            print(f'{n_rows:>10}  {name:<12}{len(rows_json) / 1e3:>12.0f}{len(grid_json) / 1e3:>12.0f}{rows_ms:>12.1f}{grid_ms:>12.1f}')
+        del df
+
+
+if __name__ == '__main__':
+    main()
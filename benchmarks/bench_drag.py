@@ -0,0 +1,91 @@
+"""
+Slider drag benchmark: sends a burst of figure updates of one page, as dragging the year slider or stepping it
+with the keyboard does, and compares running every update with the latest-only execution of jbi100_app/jobs.py.
+
+Every step of the burst narrows the year range by one more year and is sent in its own thread, interval
+milliseconds after the previous one, without waiting for the responses, like the browser. Reported are the
+number of updates that were built (200) and that were coalesced or cancelled (204), the lag (from sending the
+last update until its figures arrive, what the user waits for after releasing the slider), the time until the
+server finished all requests and the CPU time the server spent. The filter and cuboid caches are cleared before
+every burst.
+
+Usage: python -m benchmarks.bench_drag [--rows 100000] [--steps 20] [--interval-ms 30] [--repeat 3]
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+import warnings
+
+from benchmarks.synthetic import dataset_path
+
+warnings.filterwarnings('ignore')
+
+
+def burst(app, client, callback, steps, interval_s):
+    """
+    Sends one burst of figure updates.
+
+    Returns:
+    - dict: The number of built and superseded updates, the lag, the time until all requests finished and the CPU time, in milliseconds.
+    """
+    from benchmarks.bench_callbacks import filter_inputs
+    app.backend.clear_caches()
+    year_min, year_max = int(app.year_min), int(app.year_max)
+    bodies = []
+    for step in range(steps):
+        filter_state = app.update_filter_state(**filter_inputs(app, {'year_range': [year_min + step + 1, year_max]}))
+        bodies.append(client.request_body(callback, ['filter-store.data'], {'filter-store.data': filter_state}))
+    results = [None] * steps
+    def send(step):
+        sent = time.perf_counter()
+        response = app.server.test_client().post('/_dash-update-component', data=bodies[step], content_type='application/json')
+        results[step] = (sent, time.perf_counter(), response.status_code)
+
+    cpu_start, start = time.process_time(), time.perf_counter()
+    threads = []
+    for step in range(steps):
+        time.sleep(max(0.0, start + step * interval_s - time.perf_counter()))
+        thread = threading.Thread(target=send, args=(step,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    last_sent, last_received, last_status = results[-1]
+    assert last_status == 200, 'the latest update must be built'
+    return {
+        'built': sum(status == 200 for _, _, status in results),
+        'superseded': sum(status == 204 for _, _, status in results),
+        'lag': (last_received - last_sent) * 1e3,
+        'all done': (max(received for _, received, _ in results) - start) * 1e3,
+        'cpu': (time.process_time() - cpu_start) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--interval-ms', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['JBI100_DATASET'] = dataset_path(args.rows)
+    import app
+    from benchmarks.dash_client import DashClient
+    client = DashClient(app.app)
+    client.load()
+    callback = client.find_callback('shark-map.figure')
+
+    print(f'{args.rows} rows, {args.steps} updates {args.interval_ms:.0f} ms apart, median of {args.repeat} bursts')
+    print(f"{'execution':<14}{'built':>7}{'superseded':>12}{'lag (ms)':>10}{'all done (ms)':>15}{'CPU (ms)':>10}")
+    for name, enabled in [('every update', False), ('latest only', True)]:
+        app.figure_jobs.enabled = enabled
+        runs = [burst(app, client, callback, args.steps, args.interval_ms / 1000) for _ in range(args.repeat)]
+        median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{name:<14}{median['built']:>7.0f}{median['superseded']:>12.0f}{median['lag']:>10.0f}{median['all done']:>15.0f}{median['cpu']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
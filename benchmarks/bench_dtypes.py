@@ -0,0 +1,64 @@
+"""
+Dtype benchmark: memory and the speed of common operations of the compact schema of get_data() (categoricals,
+int16, float32, see apply_schema in jbi100_app/data.py) against the previous one (strings, int64, float64), on
+synthetic data with all columns.
+
+Memory is pandas' deep memory usage, which counts every string once per row, as the strings read from the Excel
+file were separate objects. Operations are timed on the columns the app filters and groups on.
+
+Usage: python -m benchmarks.bench_dtypes [--rows 1000000] [--repeat N]
+"""
+import argparse
+
+import pandas as pd
+from jbi100_app.data import COLUMN_DTYPES
+from benchmarks.synthetic import make_frame, APP_COLUMNS
+from benchmarks.bench_filters import median_ms
+
+
+def previous_schema(df):
+    """
+    Returns the data with the dtypes get_data() had before the compact schema: strings, int64 and float64.
+    """
+    dtypes = {column: 'str' for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)}
+    dtypes.update({column: 'int64' if dtype.startswith('int') else 'float64' for column, dtype in COLUMN_DTYPES.items()})
+    return df.astype(dtypes)
+
+
+OPERATIONS = {
+    'groupby 1 column': lambda df: df.groupby('Victim.injury', observed=True).size(),
+    'groupby 2 columns': lambda df: df.groupby(['State', 'Shark.common.name'], observed=True).size(),
+    'groupby year, month': lambda df: df.groupby(['Incident.year', 'Incident.month']).size(),
+    'isin 1 value': lambda df: df['State'].isin(['NSW']),
+    'isin 3 values': lambda df: df['Shark.common.name'].isin(['white shark', 'tiger shark', 'bull shark']),
+    'factorize': lambda df: pd.factorize(df['Victim.activity'], sort=True),
+    'range mask': lambda df: (df['Shark.length.m'] >= 1.5) & (df['Shark.length.m'] <= 3.0),
+    'filter rows': lambda df: df[df['State'].isin(['NSW', 'QLD']) & (df['Incident.year'] >= 1950)],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    compact = make_frame(args.rows, columns=None)
+    previous = previous_schema(compact)
+
+    print(f'{args.rows} rows')
+    print(f"{'memory (MB)':<22}{'previous':>10}{'compact':>10}{'ratio':>8}")
+    for name, columns in [('all columns', list(compact.columns)), ('app columns', APP_COLUMNS)]:
+        before = previous[columns].memory_usage(deep=True, index=False).sum() / 1e6
+        after = compact[columns].memory_usage(deep=True, index=False).sum() / 1e6
+        print(f'{name:<22}{before:>10.0f}{after:>10.0f}{before / after:>7.1f}x')
+
+    print(f"\n{'operation (ms)':<22}{'previous':>10}{'compact':>10}{'speedup':>8}")
+    for name, operation in OPERATIONS.items():
+        before, _ = median_ms(lambda: operation(previous), args.repeat)
+        after, _ = median_ms(lambda: operation(compact), args.repeat)
+        print(f'{name:<22}{before:>10.1f}{after:>10.1f}{before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
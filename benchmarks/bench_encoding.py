@@ -0,0 +1,98 @@
+"""
+Serialization benchmark: bytes on the wire and encode time of the map and timeline figures on synthetic data,
+for three encodings:
+
+- lists: every array as a JSON list of numbers and strings, how the figures were sent before.
+- typed: plotly's default for NumPy arrays, base64 typed buffers ({dtype, bdata}) with the original dtypes.
+- compact: typed, plus the reductions of jbi100_app/encoding.py (float32 coordinates, dates as milliseconds,
+  customdata reduced to the columns that vary within a trace).
+
+Usage: python -m benchmarks.bench_encoding [--rows 1000 10000 100000] [--repeat N]
+"""
+import argparse
+import base64
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from jbi100_app.encoding import compact_map_figure, epoch_ms
+from benchmarks.synthetic import make_frame
+from benchmarks.bench_filters import median_ms
+
+VAR, VAR2 = 'Victim.injury', 'Provoked/unprovoked'
+COLUMNS = ['Latitude', 'Longitude', 'Incident.year', 'Incident.month', VAR, VAR2, 'Shark.full.name']
+
+
+def as_lists(value):
+    """
+    Replaces the typed buffers in a figure dict with JSON lists.
+    """
+    if isinstance(value, dict):
+        if 'bdata' in value:
+            array = np.frombuffer(base64.b64decode(value['bdata']), dtype=np.dtype(value['dtype']))
+            return array.reshape(value['shape'] if 'shape' in value else -1).tolist()
+        return {key: as_lists(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [as_lists(item) for item in value]
+    return value
+
+
+def map_figure(df):
+    """
+    The scatter map of the scatter tab, built like build_map_figure.
+    """
+    df = df.assign(IsSelected=True, Size=1.0)
+    return px.scatter_map(df, lat='Latitude', lon='Longitude', color=VAR, size='Size', hover_name='Shark.full.name', custom_data=['index1'],
+                          hover_data={VAR: True, VAR2: True, 'Size': False, 'IsSelected': True, 'Latitude': True, 'Longitude': True},
+                          zoom=2.5, map_style='open-street-map', size_max=8)
+
+
+def timeline_figure(df):
+    """
+    The timeline, built like build_timeline_figure (one value per month).
+    """
+    monthly = df.groupby('Incident.date').size().reset_index(name='count')
+    return px.histogram(monthly, x='Incident.date', y='count', histfunc='sum', nbins=100)
+
+
+def encodings(fig, compact):
+    """
+    Returns a function per encoding that serializes the figure.
+    """
+    lists = go.Figure(as_lists(fig.to_plotly_json())) # the same figure with Python lists, which plotly serializes as JSON lists
+    compacted = compact(go.Figure(fig))
+    return {
+        'lists': lambda: pio.to_json(lists),
+        'typed': lambda: pio.to_json(fig),
+        'compact': lambda: pio.to_json(compacted),
+    }
+
+
+def compact_timeline(fig):
+    """
+    The timeline with the dates as milliseconds, like build_timeline_figure.
+    """
+    fig.update_traces(x=epoch_ms(fig.data[0].x))
+    fig.update_layout(xaxis_type='date')
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'figure':<10}{'encoding':<10}{'KB':>10}{'encode (ms)':>13}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows, columns=COLUMNS)
+        for name, fig, compact in [('map', map_figure(df), compact_map_figure), ('timeline', timeline_figure(df), compact_timeline)]:
+            for encoding, serialize in encodings(fig, compact).items():
+                encode_ms, payload = median_ms(serialize, args.repeat)
+                print(f'{n_rows:>8}  {name:<10}{encoding:<10}{len(payload) / 1e3:>10.1f}{encode_ms:>13.1f}')
+        del df
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Export benchmark: streams the filtered incidents through the export route (see jbi100_app/export.py) on synthetic
+datasets of increasing size, for every backend and format.
+
+For every size and backend the app is imported in a fresh process, the export is requested through the Flask test
+client and its response is read chunk by chunk, as a browser downloads it. Reported per filter state (EXPORTS) and
+format are the median throughput in rows and megabytes per second, and the peak memory allocated during the export
+(traced with tracemalloc in a separate run): it stays about one chunk (JBI100_EXPORT_CHUNK_ROWS rows) whatever the
+size of the export. Parquet is skipped when pyarrow is not installed.
+
+Usage: python -m benchmarks.bench_export [--rows 100000 1000000] [--backends pandas sqlite] [--repeat N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from benchmarks.synthetic import dataset_path
+
+# Filter states of the exports: the filter inputs that differ from the initial state
+EXPORTS = {
+    'all rows': {},
+    'state filter': {'selected_states': ['NSW']},
+}
+
+
+def download(client, export_format, form):
+    """
+    Requests an export and reads its response chunk by chunk.
+
+    Returns:
+    - int: The size of the file in bytes.
+    """
+    response = client.post(f'/export/{export_format}', data=form, headers={'Origin': 'http://localhost'}, # posted by a page of the dashboard
+                           buffered=False)
+    assert response.status_code == 200, response.status_code
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return size
+
+
+def run_child(repeat):
+    """
+    Times the exports of the backend of JBI100_BACKEND on the dataset of JBI100_DATASET, in this process.
+
+    Returns:
+    - dict: Per export and format the number of rows, the file size, the median seconds and the peak memory in megabytes.
+    """
+    from benchmarks.bench_callbacks import filter_inputs
+    from jbi100_app.export import parquet_available
+    warnings.filterwarnings('ignore')
+    import app
+    client = app.server.test_client()
+    formats = ['csv', 'parquet'] if parquet_available() else ['csv']
+    results = {}
+    for name, changes in EXPORTS.items():
+        filter_state = app.update_filter_state(**filter_inputs(app, changes))
+        form = {'filters': json.dumps(filter_state), 'selection': 'null'}
+        n_rows = int(app.count_rows([], filter_state))
+        for export_format in formats:
+            seconds = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                size = download(client, export_format, form)
+                seconds.append(time.perf_counter() - start)
+            tracemalloc.start()
+            download(client, export_format, form)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            results[f'{name}, {export_format}'] = {'rows': n_rows, 'bytes': size, 'seconds': statistics.median(seconds), 'peak_mb': peak_mb}
+    return results
+
+
+def run_backend(n_rows, backend, repeat, sqlite_dir):
+    """
+    Times the exports on a synthetic dataset of n_rows rows with the given backend, in a fresh process.
+    """
+    env = dict(os.environ, JBI100_DATASET=dataset_path(n_rows), JBI100_BACKEND=backend, JBI100_SQLITE_DIR=sqlite_dir)
+    env.pop('JBI100_INGEST_DIR', None)
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_export', '--child', '--repeat', str(repeat)], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--backends', nargs='+', default=['pandas', 'sqlite'], choices=['pandas', 'sqlite'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.repeat)))
+        return
+
+    print(f"{'rows':>10}  {'backend':<8}{'export':<24}{'rows out':>10}{'MB':>8}{'rows/s':>12}{'MB/s':>8}{'peak (MB)':>11}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory(prefix='jbi100-sqlite-') as sqlite_dir:
+            for backend in args.backends:
+                for name, result in run_backend(n_rows, backend, args.repeat, sqlite_dir).items():
+                    print(f"{n_rows:>10}  {backend:<8}{name:<24}{result['rows']:>10}{result['bytes'] / 1e6:>8.1f}"
+                          f"{result['rows'] / result['seconds']:>12,.0f}{result['bytes'] / 1e6 / result['seconds']:>8.1f}{result['peak_mb']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
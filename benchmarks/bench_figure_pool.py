@@ -0,0 +1,104 @@
+"""
+Figure pool benchmark: compares building the figures of an update one after another with building them concurrently
+in a pool of threads (JBI100_FIGURE_WORKERS, see jbi100_app/pool.py), on synthetic datasets of increasing size.
+
+For every size and pool size the app is imported in a fresh process and the updates that rebuild several figures
+(UPDATES) are run with cold caches, like a new filter state. Reported per update is the median wall-clock time of
+building the figures and encoding the response as Dash does, and the speedup over building them one after another.
+The CPU time of the process is reported too: with threads it stays about the same, the speedup comes from the
+parts of the figures that release the GIL and run on other cores. On a single CPU there is nothing to gain, the
+benchmark then shows the overhead of the pool.
+
+Usage: python -m benchmarks.bench_figure_pool [--rows 100000 1000000] [--workers 0 2 5] [--backend pandas|sqlite] [--repeat N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.synthetic import dataset_path
+
+# Updates that rebuild several figures: the filters that differ from the initial state and the changed inputs of update_figures
+UPDATES = {
+    'initial load': {'filters': {}, 'changed': None},
+    'state filter': {'filters': {'selected_states': ['NSW']}, 'changed': {'filter-store'}},
+    'narrow filters': {'filters': {'selected_sharks': ['white shark'], 'provoked_status': ['unprovoked'], 'year_range': [1950, 2000]},
+                       'changed': {'filter-store'}},
+}
+
+
+def run_child(repeat):
+    """
+    Times the updates with the pool of JBI100_FIGURE_WORKERS, in this process.
+
+    Returns:
+    - dict: The pool size and per update the median wall-clock and CPU time in milliseconds.
+    """
+    from benchmarks.bench_callbacks import filter_inputs
+    from dash._utils import to_json
+    warnings.filterwarnings('ignore')
+    import app
+    result = {'workers': app.figure_pool.workers, 'cpus': os.cpu_count(), 'updates': {}}
+    for name, update in UPDATES.items():
+        filter_state = app.update_filter_state(**filter_inputs(app, update['filters']))
+        wall, cpu = [], []
+        for _ in range(repeat):
+            app.backend.clear_caches()
+            app.timeline_cache.clear()
+            start, start_cpu = time.perf_counter(), time.process_time()
+            outputs = app.compute_figures(update['changed'], filter_state, None, None, 'scatter', 'Victim.injury', 'Provoked/unprovoked',
+                                          0, 0, 'viridis', 'Vivid')
+            to_json(outputs) # the response, as Dash encodes it
+            wall.append((time.perf_counter() - start) * 1e3)
+            cpu.append((time.process_time() - start_cpu) * 1e3)
+        result['updates'][name] = {'wall_ms': statistics.median(wall), 'cpu_ms': statistics.median(cpu)}
+    return result
+
+
+def run_pool(n_rows, workers, backend, repeat, sqlite_dir):
+    """
+    Times the updates on a synthetic dataset of n_rows rows with a pool of the given size, in a fresh process.
+    """
+    env = dict(os.environ, JBI100_DATASET=dataset_path(n_rows), JBI100_FIGURE_WORKERS=str(workers), JBI100_BACKEND=backend,
+               JBI100_SQLITE_DIR=sqlite_dir)
+    env.pop('JBI100_INGEST_DIR', None)
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_figure_pool', '--child', '--repeat', str(repeat)], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 5])
+    parser.add_argument('--backend', default='pandas', choices=['pandas', 'sqlite'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.repeat)))
+        return
+
+    print(f'{os.cpu_count()} CPUs, {args.backend} backend, median of {args.repeat} runs')
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory(prefix='jbi100-sqlite-') as sqlite_dir: # the SQLite database is written by the first process
+            results = [run_pool(n_rows, workers, args.backend, args.repeat, sqlite_dir) for workers in args.workers]
+        sequential = results[0]['updates']
+        print(f'{n_rows} rows')
+        print(f"  {'update':<16}" + ''.join(f"{str(result['workers']) + ' workers':>24}" for result in results) + '  (ms wall / ms CPU)')
+        for name in UPDATES:
+            cells = []
+            for result in results:
+                update = result['updates'][name]
+                cells.append(f"{update['wall_ms']:.0f} / {update['cpu_ms']:.0f} ({sequential[name]['wall_ms'] / update['wall_ms']:.2f}x)")
+            print(f'  {name:<16}' + ''.join(f'{cell:>24}' for cell in cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Filter benchmark: compares the chained `isin` filtering that update_map_and_chart used to do with the
+bitmap filter engine (jbi100_app/filters.py) and its sorted range indexes on synthetic data.
+
+For every size and filter state the median latency of both approaches is reported, and the engine is
+checked to return the same rows.
+
+Usage: python -m benchmarks.bench_filters [--rows 10000 1000000 10000000] [--repeat N]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from jbi100_app.filters import FilterEngine
+from benchmarks.synthetic import make_frame
+
+CATEGORICAL_COLUMNS = ['Shark.common.name', 'Victim.injury', 'Injury.severity', 'Victim.activity', 'Victim.gender',
+                       'Provoked/unprovoked', 'State', 'Site.category', 'Incident.month', 'Data.source']
+NUMERIC_COLUMNS = ['Shark.length.m', 'Incident.year', 'Latitude', 'Longitude']
+
+# Representative filter states: (dropdown selections, length range, include unknown lengths, year range)
+FILTER_STATES = {
+    'default': ({}, (0.3, 6.0), True, (1791, 2024)),
+    'one state': ({'State': ['NSW']}, (0.3, 6.0), True, (1791, 2024)),
+    'shark + injury': ({'Shark.common.name': ['white shark', 'tiger shark'], 'Victim.injury': ['fatal']}, (0.3, 6.0), True, (1791, 2024)),
+    'many filters': ({'State': ['NSW', 'QLD', 'WA'], 'Victim.activity': ['swimming', 'surfing', 'diving'], 'Victim.gender': ['male'],
+                      'Incident.month': [1, 2, 12]}, (1.0, 4.0), True, (1900, 2020)),
+    'known lengths': ({}, (1.5, 3.0), False, (1950, 2024)),
+    'year slider': ({}, (0.3, 6.0), True, (2010, 2012)),
+    'length slider': ({'State': ['NSW']}, (4.5, 5.0), False, (1791, 2024)),
+}
+
+
+def chained_isin(df, selections, length_range, include_unknown, year_range):
+    """
+    The original filtering of update_map_and_chart: one intermediate DataFrame per filter.
+    """
+    filtered_df = df
+    for column, values in selections.items():
+        if values:
+            filtered_df = filtered_df[filtered_df[column].isin(values)]
+    if include_unknown:
+        filtered_df = filtered_df[(filtered_df['Shark.length.m'].isna()) |
+                                  ((filtered_df['Shark.length.m'] >= length_range[0]) & (filtered_df['Shark.length.m'] <= length_range[1]))]
+    else:
+        filtered_df = filtered_df[(filtered_df['Shark.length.m'] >= length_range[0]) & (filtered_df['Shark.length.m'] <= length_range[1])]
+    return filtered_df[(filtered_df['Incident.year'] >= year_range[0]) & (filtered_df['Incident.year'] <= year_range[1])]
+
+
+def engine_filter(df, engine, selections, length_range, include_unknown, year_range):
+    """
+    The same filter state evaluated with the bitmap filter engine.
+    """
+    positions = engine.positions(selections, {'Shark.length.m': (*length_range, include_unknown), 'Incident.year': (*year_range, False)})
+    return df.iloc[positions]
+
+
+def median_ms(function, repeat):
+    """
+    Returns the median wall-clock time of `function` in milliseconds and its last result.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'filter state':<16}{'matches':>10}{'isin (ms)':>12}{'engine (ms)':>13}{'speedup':>9}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        start = time.perf_counter()
+        engine = FilterEngine(df, CATEGORICAL_COLUMNS, NUMERIC_COLUMNS)
+        build_ms = (time.perf_counter() - start) * 1000
+        for name, state in FILTER_STATES.items():
+            isin_ms, expected = median_ms(lambda: chained_isin(df, *state), args.repeat)
+            engine_ms, result = median_ms(lambda: engine_filter(df, engine, *state), args.repeat)
+            assert np.array_equal(expected['index1'].to_numpy(), result['index1'].to_numpy()), f'different rows for {name}'
+            print(f'{n_rows:>10}  {name:<16}{len(result):>10}{isin_ms:>12.2f}{engine_ms:>13.2f}{isin_ms / engine_ms:>8.1f}x')
+        bitmap_mb = sum(bitmaps.nbytes for bitmaps in engine.bitmaps.values()) / 1e6
+        print(f'{n_rows:>10}  index build {build_ms:.0f} ms, bitmaps {bitmap_mb:.1f} MB')
+        del df, engine
+
+
+if __name__ == '__main__':
+    main()
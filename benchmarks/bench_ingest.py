@@ -0,0 +1,93 @@
+"""
+Ingest benchmark: the cost of appending a batch of new incidents to the running app (ingest_rows, see
+jbi100_app/ingest.py) on tables of increasing size, against rebuilding the data and its structures (build_data),
+which is what a restart of every worker did before.
+
+For every table size the app is imported in a fresh process on a synthetic dataset (JBI100_DATASET). Batches of
+new incidents (synthetic rows turned back into raw rows, with new UINs) are then ingested one after the other.
+Reported are the median and the slowest append of a batch: the appends should cost about the same on every table
+size, the slowest one includes the occasional doubling of the buffers (which makes the cost amortized). After the
+batches a filter and the figures are computed, to check that the app works on the grown table.
+
+Usage: python -m benchmarks.bench_ingest [--rows 10000 100000 1000000] [--batch 10 100 1000] [--batches 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+import pandas as pd
+from benchmarks.synthetic import dataset_path, make_frame
+
+
+def raw_rows(n_rows, seed, first_uin):
+    """
+    Returns synthetic incidents as read from a file of the ingest directory: strings instead of categoricals,
+    without the columns clean_data derives, indexed by new UINs.
+    """
+    df = make_frame(n_rows, seed=seed)
+    df = df.astype({column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+    df = df.drop(columns=['index1', 'Incident.date'])
+    df.index = pd.RangeIndex(first_uin, first_uin + n_rows, name='UIN')
+    return df
+
+
+def run_child(batch_sizes, n_batches):
+    """
+    Benchmarks ingest_rows on the dataset of JBI100_DATASET, in this process.
+
+    Returns:
+    - dict: The rebuild time, and per batch size the median and slowest append in milliseconds.
+    """
+    warnings.filterwarnings('ignore')
+    import app
+    start = time.perf_counter()
+    app.build_data()
+    result = {'rows': app.backend.n_rows, 'rebuild_ms': (time.perf_counter() - start) * 1e3, 'batches': {}}
+    first_uin = int(app.backend.df.index.max()) + 1
+    for batch_size in batch_sizes:
+        batches = [raw_rows(batch_size, seed, first_uin + seed * batch_size) for seed in range(n_batches)]
+        first_uin += n_batches * batch_size
+        times = []
+        for batch in batches:
+            start = time.perf_counter()
+            app.ingest_rows(batch)
+            times.append((time.perf_counter() - start) * 1e3)
+        result['batches'][batch_size] = {'median_ms': statistics.median(times), 'max_ms': max(times)}
+    filter_state = app.update_filter_state(['white shark'], None, None, None, None, None, None, None, [app.shark_length_min, app.shark_length_max],
+                                           None, None, ['include'], [app.year_min, app.year_max])
+    assert len(app.filter_positions(filter_state)) == int(app.count_rows([], filter_state)), 'the filters and the counts of the backend disagree'
+    app.compute_figures(None, filter_state, None, None, 'scatter', 'Victim.injury', 'Provoked/unprovoked', 0, 0, 'viridis', 'Vivid')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--batch', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.batch, args.batches)))
+        return
+
+    print(f'{args.batches} batches per batch size')
+    print(f"{'rows':>10}{'rebuild (ms)':>14}{'batch':>8}{'append median (ms)':>20}{'append max (ms)':>17}")
+    for n_rows in args.rows:
+        env = dict(os.environ, JBI100_DATASET=dataset_path(n_rows))
+        env.pop('JBI100_INGEST_DIR', None)
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_ingest', '--child', '--batches', str(args.batches), '--batch', *map(str, args.batch)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for batch_size, times in result['batches'].items():
+            print(f"{n_rows:>10}{result['rebuild_ms']:>14.0f}{batch_size:>8}{times['median_ms']:>20.1f}{times['max_ms']:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Interaction latency benchmark: server time per kind of user interaction, before and after splitting the
+monolithic callback into the filter -> selection -> figures -> styling graph.
+
+'before' is what every interaction used to cost: filter, resolve the selection and rebuild all figures.
+'after' is the sum of the requests the interaction triggers now. Both are measured over HTTP with the
+Flask test client (see benchmarks/dash_client.py), so JSON serialization is included. Interactions handled
+by clientside callbacks send no request; the run time of their JavaScript is reported as 'client'.
+
+Usage: python -m benchmarks.bench_interactions [--repeat N]
+"""
+import argparse
+import statistics
+import warnings
+
+warnings.filterwarnings('ignore')
+
+import app  # noqa: E402
+from benchmarks.dash_client import DashClient  # noqa: E402
+
+DATA_CALLBACKS = ('filter-store', 'selection-store', '..shark-map.figure...')
+
+
+def selection_points(n_points):
+    """
+    Returns map selectedData for the first n_points incidents.
+    """
+    rows = app.backend.df.head(n_points)
+    return {'points': [{'lat': lat, 'lon': lon} for lat, lon in zip(rows['Latitude'], rows['Longitude'])]}
+
+
+# Interactions as pairs of prop changes, the benchmark alternates between both so every step is a real change
+INTERACTIONS = {
+    'filter dropdown': ({'state-dropdown.value': ['NSW']}, {'state-dropdown.value': None}),
+    'year slider': ({'year-slider.value': [1950, 2000]}, {'year-slider.value': [int(app.year_min), int(app.year_max)]}),
+    'map selection': ({'shark-map.selectedData': selection_points(100)}, {'shark-map.selectedData': None}),
+    'bar variable': ({'var-select.value': 'State'}, {'var-select.value': 'Victim.injury'}),
+    'map tab': ({'map-tabs.value': 'heatmap'}, {'map-tabs.value': 'scatter'}),
+    'continuous palette': ({'color-dropdown.value': 'ice'}, {'color-dropdown.value': 'viridis'}),
+    'discrete palette': ({'color-dropdown-discrete.value': 'Bold'}, {'color-dropdown-discrete.value': 'Vivid'}),
+    'switch axes': ({'switch-axes-bar1.n_clicks': 1}, {'switch-axes-bar1.n_clicks': 2}),
+    'info modal': ({'open-dismiss.n_clicks': 1}, {'close-dismiss.n_clicks': 1}),
+}
+
+
+def total(requests, key='ms', clientside=False):
+    return sum(request[key] for request in requests if request['clientside'] == clientside)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    client = DashClient(app.app)
+    client.load()
+
+    print(f'{app.backend.n_rows} rows, median of {args.repeat} runs')
+    print(f"{'interaction':<20}{'before (ms)':>12}{'after (ms)':>12}{'requests':>10}{'client (ms)':>13}{'before (KB)':>13}{'after (KB)':>12}")
+    for name, (change, undo) in INTERACTIONS.items():
+        before, after = [], []
+        for _ in range(args.repeat):
+            client.update(change)
+            before.append([request for request in client.load() if request['callback'].startswith(DATA_CALLBACKS)]) # the full pipeline in the changed state
+            client.update(undo)
+            after.append(client.update(change))
+            client.update(undo)
+        before_ms = statistics.median(total(requests) for requests in before)
+        after_ms = statistics.median(total(requests) for requests in after)
+        client_ms = statistics.median(total(requests, clientside=True) for requests in after)
+        n_requests = sum(not request['clientside'] for request in after[0])
+        print(f'{name:<20}{before_ms:>12.1f}{after_ms:>12.1f}{n_requests:>10}{client_ms:>13.2f}'
+              f'{total(before[0], "response_bytes") / 1000:>13.1f}{total(after[0], "response_bytes") / 1000:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
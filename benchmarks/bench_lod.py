@@ -0,0 +1,80 @@
+"""
+Scatter map level-of-detail benchmark: compares sending every filtered incident to px.scatter_map, as the
+scatter tab used to do, with the level of detail of jbi100_app/lod.py (the incidents in the viewport,
+clustered when there are more than the cap) on synthetic data.
+
+For every size the number of markers, the payload (the JSON of the figure) and the time to build and
+serialize the figure are reported, for the extent of the data and for a zoomed-in viewport.
+
+Usage: python -m benchmarks.bench_lod [--rows 10000 100000 1000000] [--cap 5000] [--repeat N]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+from jbi100_app.indexes import GridIndex
+from jbi100_app.lod import pad_bounds, visible_positions, cluster_points
+from benchmarks.synthetic import make_frame
+from benchmarks.bench_filters import median_ms
+
+COLOR = 'Victim.injury'
+HOVER = ['Shark.full.name', 'Provoked/unprovoked']
+VIEWPORTS = {'data extent': None, 'zoomed in': [150.5, -34.2, 151.9, -33.4]}
+
+
+def row_figure(df):
+    """
+    The original scatter tab: every incident is a marker with its hover data.
+    """
+    fig = px.scatter_map(df, lat='Latitude', lon='Longitude', color=COLOR, hover_name=HOVER[0], custom_data=['index1'],
+                         hover_data=HOVER[1:], zoom=2.5, map_style='open-street-map')
+    return pio.to_json(fig), len(df)
+
+
+def lod_figure(df, spatial_index, viewport, cap):
+    """
+    The level of detail: the incidents in the viewport, clustered per grid cell and color if there are more than cap.
+    """
+    bounds = pad_bounds(viewport) if viewport else [spatial_index.x_min, spatial_index.y_min, spatial_index.x_max, spatial_index.y_max]
+    visible = visible_positions(spatial_index, np.arange(len(df)), bounds)
+    if len(visible) <= cap:
+        return row_figure(df.iloc[visible])
+    codes, labels = pd.factorize(df[COLOR].to_numpy()[visible])
+    lon, lat = spatial_index.x[visible], spatial_index.y[visible]
+    clusters, n_clusters = cluster_points(lon, lat, codes, bounds, cap)
+    counts = np.bincount(clusters, minlength=n_clusters)
+    cluster_codes = np.zeros(n_clusters, dtype=codes.dtype)
+    cluster_codes[clusters] = codes
+    clusters_df = pd.DataFrame({
+        'Latitude': np.bincount(clusters, weights=lat, minlength=n_clusters) / counts,
+        'Longitude': np.bincount(clusters, weights=lon, minlength=n_clusters) / counts,
+        COLOR: np.asarray(labels)[cluster_codes],
+        'Incidents': counts,
+    })
+    fig = px.scatter_map(clusters_df, lat='Latitude', lon='Longitude', color=COLOR, size='Incidents', hover_data=['Incidents'],
+                         size_max=20, zoom=2.5, map_style='open-street-map')
+    return pio.to_json(fig), n_clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--cap', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'viewport':<12}{'markers':>9}{'rows (KB)':>11}{'lod (KB)':>10}{'rows (ms)':>11}{'lod (ms)':>10}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows, columns=['Latitude', 'Longitude', 'Incident.year', 'Incident.month', COLOR, *HOVER])
+        spatial_index = GridIndex(df['Longitude'], df['Latitude'])
+        rows_ms, (rows_json, _) = median_ms(lambda: row_figure(df), args.repeat)
+        for name, viewport in VIEWPORTS.items():
+            lod_ms, (lod_json, markers) = median_ms(lambda: lod_figure(df, spatial_index, viewport, args.cap), args.repeat)
+            print(f'{n_rows:>10}  {name:<12}{markers:>9}{len(rows_json) / 1e3:>11.0f}{len(lod_json) / 1e3:>10.0f}{rows_ms:>11.1f}{lod_ms:>10.1f}')
+        del df, spatial_index
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Selection benchmark: resolving a map box selection with lat/lon `isin` over the selected points (the old
+approach) versus answering the box from the spatial grid index (jbi100_app/indexes.py).
+
+Also reports how many rows the old approach matched wrongly: rows whose latitude equals the latitude of one
+selected point and whose longitude equals the longitude of another.
+
+Usage: python -m benchmarks.bench_selection [--rows N]
+"""
+import argparse
+import time
+
+import numpy as np
+from jbi100_app.indexes import GridIndex
+from benchmarks.synthetic import make_frame
+
+# Boxes (lon0, lat0, lon1, lat1) of increasing size around the east coast
+BOXES = [(150.0, -34.5, 151.5, -33.5), (148.0, -36.0, 153.5, -28.0), (110.0, -45.0, 155.0, -10.0)]
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    # Jitter the sampled coordinates, otherwise every location exists many times
+    rng = np.random.default_rng(1)
+    df['Latitude'] += rng.normal(0, 0.05, len(df))
+    df['Longitude'] += rng.normal(0, 0.05, len(df))
+    lat, lon = df['Latitude'].to_numpy(), df['Longitude'].to_numpy()
+    build_ms, grid = timed(lambda: GridIndex(lon, lat))
+    print(f'{args.rows} rows, grid index built in {build_ms:.0f} ms ({grid.n_cells}x{grid.n_cells} cells)')
+    print(f"{'selected':>10}{'isin (ms)':>12}{'wrong rows':>12}{'grid (ms)':>12}")
+    for lon0, lat0, lon1, lat1 in BOXES:
+        truth = np.flatnonzero((lon >= lon0) & (lon <= lon1) & (lat >= lat0) & (lat <= lat1))
+        points = [{'lat': lat[i], 'lon': lon[i]} for i in truth] # what plotly sends back
+        def isin():
+            selected_latitudes, selected_longitudes = zip(*[(point['lat'], point['lon']) for point in points])
+            return np.flatnonzero(df['Latitude'].isin(selected_latitudes) & df['Longitude'].isin(selected_longitudes))
+        isin_ms, old = timed(isin)
+        grid_ms, new = timed(lambda: np.sort(grid.box(lon0, lat0, lon1, lat1)))
+        assert np.array_equal(new, truth)
+        print(f'{len(truth):>10}{isin_ms:>12.1f}{len(old) - len(truth):>12}{grid_ms:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
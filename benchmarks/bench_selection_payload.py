@@ -0,0 +1,97 @@
+"""
+Selection payload benchmark: the size of the requests around a map selection, with the selection kept on the server
+(see jbi100_app/sessions.py) and as it used to be sent with the requests.
+
+For every size the app is imported in a fresh process and driven over HTTP (see benchmarks/dash_client.py): a box
+selection over the east coast of Australia, whose selectedData holds every drawn point inside the box as plotly
+sends it, then interactions that do not change the selection. 'now' is the size of the requests the server gets.
+'before' is the size of the same requests with the old values: the selection stage got the whole selectedData
+(instead of its geometry), and the figure update got the list of selected row ids (instead of a token).
+
+Usage: python -m benchmarks.bench_selection_payload [--rows 10000 100000 1000000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import warnings
+
+from benchmarks.synthetic import dataset_path
+
+# The box of the selection, [[lon0, lat0], [lon1, lat1]]
+BOX = [[145, -25], [155, -40]]
+
+
+def selected_data(app):
+    """
+    Returns the selectedData of a box selection as plotly sends it: the box and every drawn point inside it.
+    """
+    from benchmarks.bench_callbacks import filter_inputs
+    (lon0, lat0), (lon1, lat1) = BOX
+    key = app.filter_key(app.update_filter_state(**filter_inputs(app, {})))
+    rows = app.backend.rows(key, [lon0, lat1, lon1, lat0], limit=app.MAX_MAP_POINTS)
+    points = [{'curveNumber': 0, 'pointNumber': number, 'pointIndex': number, 'lon': float(lon), 'lat': float(lat), 'customdata': [int(row_id)]}
+              for number, (lon, lat, row_id) in enumerate(zip(rows['Longitude'], rows['Latitude'], rows['index1']))]
+    return {'points': points, 'range': {'map': BOX}}
+
+
+def run_child():
+    """
+    Measures the requests of the interactions on the dataset of JBI100_DATASET, in this process.
+
+    Returns:
+    - dict: Per interaction the number of selected rows and the request bytes now and before.
+    """
+    warnings.filterwarnings('ignore')
+    import app
+    from benchmarks.dash_client import DashClient
+    client = DashClient(app.app)
+    client.load()
+    callbacks = {callback['key']: callback for callback in client.callbacks}
+    box = selected_data(app)
+    interactions = {
+        'box selection': {'shark-map.selectedData': box},
+        'year slider': {'year-slider.value': [1950, int(app.year_max)]},
+        'state filter': {'state-dropdown.value': ['NSW', 'QLD']},
+        'bar variable': {'var-select.value': 'State'},
+    }
+    results = {}
+    for name, props in interactions.items():
+        requests = client.update(props)
+        selection = app.selection_rows(client.props.get('selection-store.data'))
+        old_props = {'selection-geometry.data': box, 'selection-store.data': selection.tolist() if selection is not None else None}
+        now = before = 0
+        for request in requests:
+            if request['clientside']:
+                continue
+            now += request['request_bytes']
+            before += len(client.request_body(callbacks[request['callback']], set(props), old_props))
+        results[name] = {'selected': 0 if selection is None else len(selection), 'now': now, 'before': before}
+    return {'points': len(box['points']), 'interactions': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child()))
+        return
+
+    print(f"{'rows':>10}  {'interaction':<15}{'selected':>10}{'before (KB)':>13}{'now (KB)':>10}")
+    for n_rows in args.rows:
+        env = dict(os.environ, JBI100_DATASET=dataset_path(n_rows))
+        env.pop('JBI100_INGEST_DIR', None)
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_selection_payload', '--child'], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for name, interaction in result['interactions'].items():
+            print(f"{n_rows:>10}  {name:<15}{interaction['selected']:>10}{interaction['before'] / 1e3:>13.1f}{interaction['now'] / 1e3:>10.1f}")
+        print(f"{'':>10}  ({result['points']} points drawn inside the box)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Single-flight load test: bursts of identical figure updates from many pages at once, with the identical updates
+computed once and shared (see SingleFlight in jbi100_app/jobs.py) and with every update computed on its own.
+
+For every size and mode the app is imported in a fresh process. Per burst the caches of the backend are cleared, then
+every thread of the burst (one page, with its own session id) posts the same update of the figures to the Dash
+endpoint, all at once, and reads its response. The updates (BURSTS) are the first update of a page, as when a link
+to the dashboard goes around, and a filter change of the same filter state on every page. Reported are the wall time
+of the burst, the median and 95th percentile latency of its requests and the number of figure computations.
+
+Usage: python -m benchmarks.bench_single_flight [--rows 100000 1000000] [--pages 8 32] [--repeat N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import warnings
+
+from benchmarks.synthetic import dataset_path
+
+# Updates of a burst: the props that differ from the initial page and the props that changed
+BURSTS = {
+    'page load': {'props': {}, 'changed': []},
+    'state filter': {'props': {'filter-store.data': {'selected_states': ['NSW']}}, 'changed': ['filter-store.data']},
+}
+
+
+def burst(app, body, n_pages):
+    """
+    Posts the update of n_pages pages at once, every page from its own thread and test client.
+
+    Returns:
+    - tuple: The wall time of the burst in seconds and the latency of every request in seconds.
+    """
+    barrier = threading.Barrier(n_pages + 1)
+    latencies = [None] * n_pages
+    def page(number):
+        client = app.server.test_client()
+        payload = body.replace('"session-id-placeholder"', json.dumps(f'page-{number}'))
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.post('/_dash-update-component', data=payload, content_type='application/json')
+        assert response.status_code == 200, response.status_code
+        latencies[number] = time.perf_counter() - start
+    threads = [threading.Thread(target=page, args=(number,)) for number in range(n_pages)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def run_child(pages, repeat):
+    """
+    Runs the bursts with the single-flight setting of JBI100_SINGLE_FLIGHT, in this process.
+
+    Returns:
+    - dict: Per burst and number of pages the median wall time and the latency percentiles in milliseconds, and the
+      number of computations per burst.
+    """
+    from benchmarks.bench_callbacks import filter_inputs
+    from benchmarks.dash_client import DashClient
+    warnings.filterwarnings('ignore')
+    import app
+    client = DashClient(app.app)
+    client.load()
+    callback = client.find_callback('shark-map.figure')
+    results = {}
+    for name, update in BURSTS.items():
+        props = {'session-id.data': 'session-id-placeholder'}
+        for prop, changes in update['props'].items(): # filter states as update_filter_state makes them
+            props[prop] = app.update_filter_state(**filter_inputs(app, changes))
+        body = client.request_body(callback, update['changed'], props)
+        for n_pages in pages:
+            walls, latencies, computed = [], [], []
+            for _ in range(repeat):
+                app.backend.clear_caches()
+                app.timeline_cache.clear()
+                before = app.figure_flights.computed if app.figure_flights.enabled else None
+                wall, burst_latencies = burst(app, body, n_pages)
+                walls.append(wall)
+                latencies.extend(burst_latencies)
+                computed.append(app.figure_flights.computed - before if before is not None else n_pages)
+            latencies.sort()
+            results[f'{name}, {n_pages} pages'] = {
+                'wall_ms': statistics.median(walls) * 1e3,
+                'p50_ms': latencies[len(latencies) // 2] * 1e3,
+                'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1e3,
+                'computed': statistics.median(computed),
+            }
+    return results
+
+
+def run_mode(n_rows, single_flight, pages, repeat):
+    """
+    Runs the bursts on a synthetic dataset of n_rows rows with single flight on or off, in a fresh process.
+    """
+    env = dict(os.environ, JBI100_DATASET=dataset_path(n_rows), JBI100_SINGLE_FLIGHT='1' if single_flight else '0')
+    env.pop('JBI100_INGEST_DIR', None)
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_single_flight', '--child', '--repeat', str(repeat),
+                             '--pages', *map(str, pages)], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--pages', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.pages, args.repeat)))
+        return
+
+    print(f"{'rows':>10}  {'single flight':<15}{'burst':<24}{'wall (ms)':>11}{'p50 (ms)':>10}{'p95 (ms)':>10}{'computed':>10}")
+    for n_rows in args.rows:
+        for single_flight in (False, True):
+            for name, result in run_mode(n_rows, single_flight, args.pages, args.repeat).items():
+                print(f"{n_rows:>10}  {'on' if single_flight else 'off':<15}{name:<24}{result['wall_ms']:>11.0f}{result['p50_ms']:>10.0f}"
+                      f"{result['p95_ms']:>10.0f}{result['computed']:>10g}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Startup benchmark, in two parts:
+
+- Data: compares loading the data from the Excel file with loading it from the columnar cache, reports the time to
+  import the data module and the time get_data() takes.
+- Boot: the boot of the app until it serves its first page, with and without JBI100_FAST_START (see
+  jbi100_app/startup.py). Reported are the phases the app records (exported on /metrics as jbi100_boot_seconds):
+  the imports, building the Dash app, loading the data and its indexes, and the time from the start of the boot until
+  the app serves requests, until the first page (/ and its layout) is answered and until the data is loaded. With
+  --rows the app loads a synthetic dataset of that size (see benchmarks/synthetic.py) instead of the real data.
+
+Every measurement runs in a fresh Python process so that nothing is shared between runs. The layout manifest is
+written by a first boot before measuring, like the columnar cache.
+
+Usage: python -m benchmarks.bench_startup [--repeat N] [--rows 1000000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.synthetic import dataset_path
+
+# Code executed in each child process, prints the timings as JSON
+CHILD = '''
+import json, time
+t0 = time.perf_counter()
+from jbi100_app.data import get_data
+t1 = time.perf_counter()
+df = get_data(use_cache={use_cache})
+t2 = time.perf_counter()
+print(json.dumps({{'import': t1 - t0, 'get_data': t2 - t1, 'rows': len(df)}}))
+'''
+
+# Code executed in each child process of the boot part, prints the boot phases as JSON
+BOOT_CHILD = '''
+import json, warnings
+warnings.filterwarnings('ignore')
+import app
+client = app.server.test_client()
+assert client.get('/').status_code == 200 and client.get('/_dash-layout').status_code == 200
+app.data_loaded.wait()
+print(json.dumps(app.metrics.boot))
+'''
+
+# Phases of the boot in the order they are reported
+BOOT_PHASES = ['imports', 'app', 'data', 'serving', 'first_response', 'data_ready']
+
+
+def run_child(use_cache):
+    """
+    Runs get_data() in a fresh process.
+
+    Args:
+    - use_cache (bool): Whether the child process uses the columnar cache.
+    Returns:
+    - dict: The timings reported by the child process.
+    """
+    output = subprocess.run([sys.executable, '-c', CHILD.format(use_cache=use_cache)], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_boot_child(fast_start, dataset=None):
+    """
+    Boots the app in a fresh process and requests its first page.
+
+    Args:
+    - fast_start (bool): Whether the child process boots with JBI100_FAST_START.
+    - dataset (str): Directory of the dataset the app loads (JBI100_DATASET), None for the real data.
+    Returns:
+    - dict: The boot phases recorded by the app, in seconds.
+    """
+    env = dict(os.environ, JBI100_FAST_START='1' if fast_start else '0')
+    env.pop('JBI100_INGEST_DIR', None)
+    if dataset:
+        env['JBI100_DATASET'] = dataset
+    output = subprocess.run([sys.executable, '-c', BOOT_CHILD], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs per path')
+    parser.add_argument('--rows', type=int, help='boot the app on a synthetic dataset of this size')
+    args = parser.parse_args()
+
+    run_child(True) # make sure the cache exists before measuring it
+    results = {}
+    for label, use_cache in [('xlsx', False), ('cache', True)]:
+        runs = [run_child(use_cache) for _ in range(args.repeat)]
+        results[label] = {
+            'rows': runs[0]['rows'],
+            'import_ms': statistics.median(run['import'] for run in runs) * 1000,
+            'get_data_ms': statistics.median(run['get_data'] for run in runs) * 1000,
+        }
+
+    print(f"{'path':<8}{'rows':>8}{'import (ms)':>14}{'get_data (ms)':>16}")
+    for label, result in results.items():
+        print(f"{label:<8}{result['rows']:>8}{result['import_ms']:>14.1f}{result['get_data_ms']:>16.1f}")
+    print(f"speedup of get_data: {results['xlsx']['get_data_ms'] / results['cache']['get_data_ms']:.1f}x (median of {args.repeat} runs)")
+
+    dataset = dataset_path(args.rows) if args.rows else None
+    run_boot_child(False, dataset) # make sure the layout manifest exists before measuring
+    print()
+    print(f"boot of the app on {f'{args.rows} synthetic rows' if args.rows else 'the real data'}, median of {args.repeat} runs (ms)")
+    print(f"{'mode':<8}" + ''.join(f'{phase:>16}' for phase in BOOT_PHASES))
+    for label, fast_start in [('eager', False), ('fast', True)]:
+        runs = [run_boot_child(fast_start, dataset) for _ in range(args.repeat)]
+        print(f'{label:<8}' + ''.join(f'{statistics.median(run[phase] for run in runs) * 1000:>16.0f}' for phase in BOOT_PHASES))
+    print('imports, app and data are durations, serving, first_response and data_ready the time from the start of the boot')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Worker memory benchmark: starts N worker processes that each import the app, like gunicorn -w N does, and reports
+their boot time and memory, with and without the shared data of jbi100_app/shared.py (JBI100_SHARED_DIR).
+
+Memory is reported per worker as RSS (resident memory, shared pages counted in every process) and as PSS
+(proportional set size, shared pages divided over the processes that map them). The sum of the PSS of the workers
+is the memory the deployment takes: without sharing it grows with every worker, with sharing it should stay about
+flat. The workers start one after the other, so with sharing only the first one builds the shared state.
+
+Usage: python -m benchmarks.bench_workers [--rows 100000] [--workers 1 2 4] [--shared-dir DIR]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import dataset_path
+
+# Code executed in each worker: imports the app, reports its boot time and then waits until stdin is closed
+WORKER = '''
+import sys, time, warnings
+warnings.filterwarnings('ignore')
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start, flush=True)
+sys.stdin.read()
+'''
+
+
+def memory_mb(pid):
+    """
+    Returns the RSS and PSS of a process in megabytes, from /proc/<pid>/smaps_rollup (Linux).
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup', encoding='utf-8') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name] = int(rest.split()[0]) / 1e3 # kilobytes
+    return values['Rss'], values['Pss']
+
+
+def run_workers(n_workers, env):
+    """
+    Starts n_workers workers one after the other and measures them once all of them are running.
+
+    Returns:
+    - list: Per worker the boot time in seconds, the RSS and the PSS in megabytes.
+    """
+    workers, boot_s = [], []
+    try:
+        for _ in range(n_workers):
+            worker = subprocess.Popen([sys.executable, '-c', WORKER], env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            workers.append(worker)
+            boot_s.append(float(worker.stdout.readline()))
+        return [(boot, *memory_mb(worker.pid)) for boot, worker in zip(boot_s, workers)]
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--shared-dir', help='directory of the shared data, by default a new temporary directory in /dev/shm (or /tmp)')
+    args = parser.parse_args()
+
+    env = dict(os.environ, JBI100_DATASET=dataset_path(args.rows), PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env.pop('JBI100_SHARED_DIR', None)
+    print(f"{args.rows} rows")
+    print(f"{'mode':<10}{'workers':>8}{'first boot (s)':>16}{'next boots (s)':>16}{'RSS/worker (MB)':>17}{'PSS total (MB)':>16}")
+    for shared in (False, True):
+        for n_workers in args.workers:
+            mode_env = dict(env)
+            shared_dir = None
+            if shared:
+                shared_dir = args.shared_dir or tempfile.mkdtemp(prefix='jbi100-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+                mode_env['JBI100_SHARED_DIR'] = shared_dir
+            try:
+                measurements = run_workers(n_workers, mode_env)
+            finally:
+                if shared_dir and not args.shared_dir:
+                    shutil.rmtree(shared_dir, ignore_errors=True)
+            next_boots = f'{sum(m[0] for m in measurements[1:]) / (n_workers - 1):.2f}' if n_workers > 1 else '-'
+            print(f"{'shared' if shared else 'separate':<10}{n_workers:>8}{measurements[0][0]:>16.2f}{next_boots:>16}"
+                  f"{sum(m[1] for m in measurements) / n_workers:>17.0f}{sum(m[2] for m in measurements):>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
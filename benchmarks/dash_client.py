@@ -0,0 +1,254 @@
+"""
+A minimal stand-in for the Dash renderer, used by the benchmarks to drive the app over HTTP.
+
+DashClient keeps the current value of every component property, and when a property changes it fires
+the callbacks that depend on it through the Flask test client, the same way the browser does: a callback
+waits until all callbacks that produce one of its inputs have run. Every request is timed and its request
+and response size are recorded.
+
+Clientside callbacks are run in a Node.js process with the JavaScript files of the app's assets folder,
+so they cost no request; their run time in JavaScript is recorded instead.
+"""
+import glob
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from dash._utils import split_callback_id
+from plotly.utils import PlotlyJSONEncoder
+
+
+def apply_patch(target, patch):
+    """
+    Applies the 'Assign' operations of a dash.Patch response to a figure, other operations are ignored.
+    """
+    for operation in patch['operations']:
+        if operation['operation'] != 'Assign' or target is None:
+            continue
+        node = target
+        for key in operation['location'][:-1]:
+            if isinstance(node, dict):
+                node = node.setdefault(key, {})
+            else:
+                node = node[key]
+        node[operation['location'][-1]] = operation['params']['value']
+
+
+# Loads the asset scripts and answers one JSON request per line: {"namespace", "function", "args"} -> {"result", "ms"}
+NODE_RUNNER = r"""
+const fs = require('fs'), vm = require('vm'), readline = require('readline');
+globalThis.window = globalThis;
+for (const path of JSON.parse(process.argv[1])) vm.runInThisContext(fs.readFileSync(path, 'utf8'), {filename: path});
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.no_update = {__no_update__: true};
+readline.createInterface({input: process.stdin}).on('line', (line) => {
+    const call = JSON.parse(line);
+    const start = process.hrtime.bigint();
+    const result = window.dash_clientside[call.namespace][call.function](...call.args);
+    const ms = Number(process.hrtime.bigint() - start) / 1e6;
+    process.stdout.write(JSON.stringify({result: result === undefined ? null : result, ms: ms}) + '\n');
+});
+"""
+
+
+def _no_update(value):
+    return isinstance(value, dict) and value.get('__no_update__') is True
+
+
+class ClientsideRunner:
+    """
+    Runs clientside callback functions in a Node.js process.
+
+    Args:
+    - scripts (list): Paths of the JavaScript files that define the functions (on window.dash_clientside).
+    """
+    def __init__(self, scripts):
+        node = shutil.which('node')
+        if node is None:
+            raise RuntimeError('Node.js is needed to run the clientside callbacks of the app')
+        self.process = subprocess.Popen([node, '-e', NODE_RUNNER, json.dumps(scripts)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    def call(self, namespace, function, args):
+        """
+        Calls window.dash_clientside[namespace][function](*args).
+
+        Returns:
+        - object: The result, decoded from JSON.
+        - float: The run time of the function in milliseconds.
+        """
+        self.process.stdin.write(json.dumps({'namespace': namespace, 'function': function, 'args': args}, cls=PlotlyJSONEncoder) + '\n')
+        self.process.stdin.flush()
+        answer = json.loads(self.process.stdout.readline())
+        return answer['result'], answer['ms']
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class DashClient:
+    """
+    Drives the callbacks of a Dash app through HTTP requests.
+
+    Args:
+    - app (dash.Dash): The app, with its layout and callbacks defined.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.client = app.server.test_client()
+        self.props = {}  # 'id.property' -> current value
+        layout = app.layout() if callable(app.layout) else app.layout # a page load calls a layout function
+        for component in layout._traverse():
+            component_id = getattr(component, 'id', None)
+            if component_id is not None:
+                for name, value in component.to_plotly_json()['props'].items():
+                    self.props[f'{component_id}.{name}'] = value
+        prevent_initial_call = {item['output']: item.get('prevent_initial_call', False) for item in app._callback_list}
+        clientside = {item['output']: item['clientside_function'] for item in app._callback_list if item.get('clientside_function')}
+        self.runner = None
+        if clientside:
+            self.runner = ClientsideRunner(sorted(glob.glob(os.path.join(app.config.assets_folder, '**', '*.js'), recursive=True)))
+        self.callbacks = []
+        for key, spec in app.callback_map.items():
+            outputs = split_callback_id(key)
+            outputs = outputs if isinstance(outputs, list) else [outputs]
+            self.callbacks.append({
+                'key': key,
+                'outputs': outputs,
+                'output_props': {f"{output['id']}.{output['property'].split('@')[0]}" for output in outputs},
+                'inputs': [f"{item['id']}.{item['property']}" for item in spec['inputs']],
+                'state': [f"{item['id']}.{item['property']}" for item in spec['state']],
+                'initial': not prevent_initial_call[key],
+                'multi': key.startswith('..'),
+                'clientside': clientside.get(key),
+            })
+
+    def find_callback(self, output_prop):
+        """
+        Returns the (server-side) callback that has the given output prop ('id.property').
+        """
+        return next(callback for callback in self.callbacks if output_prop in callback['output_props'] and not callback['clientside'])
+
+    def request_body(self, callback, changed, props=None):
+        """
+        Returns the JSON body of the request of a callback, with the current props or the given ones.
+
+        Args:
+        - callback (dict): The callback, see `find_callback`.
+        - changed (iterable): The changed props ('id.property') that trigger the callback.
+        - props (dict): Props ('id.property' -> value) used instead of the current ones.
+        Returns:
+        - str: The body.
+        """
+        values = {**self.props, **(props or {})}
+        body = {
+            'output': callback['key'],
+            'outputs': callback['outputs'] if callback['multi'] else callback['outputs'][0],
+            'inputs': [{'id': prop.split('.', 1)[0], 'property': prop.split('.', 1)[1], 'value': values.get(prop)} for prop in callback['inputs']],
+            'state': [{'id': prop.split('.', 1)[0], 'property': prop.split('.', 1)[1], 'value': values.get(prop)} for prop in callback['state']],
+            'changedPropIds': sorted(changed),
+        }
+        return json.dumps(body, cls=PlotlyJSONEncoder)
+
+    def _post(self, callback, changed):
+        """
+        Runs one callback through the server and applies its response to the props.
+
+        Returns:
+        - dict: Timing and sizes of the request.
+        """
+        payload = self.request_body(callback, changed)
+        start = time.perf_counter()
+        response = self.client.post('/_dash-update-component', data=payload, content_type='application/json')
+        elapsed = time.perf_counter() - start
+        updated = set()
+        if response.status_code == 200:
+            for component_id, values in response.get_json()['response'].items():
+                for name, value in values.items():
+                    prop = f'{component_id}.{name}'
+                    if isinstance(value, dict) and '__dash_patch_update' in value:
+                        apply_patch(self.props.get(prop), value)
+                    else:
+                        self.props[prop] = value
+                    updated.add(prop)
+        elif response.status_code != 204: # 204 means the callback prevented the update
+            raise RuntimeError(f"{callback['key']} failed with status {response.status_code}: {response.get_data(as_text=True)[:500]}")
+        return {
+            'callback': callback['key'],
+            'ms': elapsed * 1000,
+            'request_bytes': len(payload),
+            'response_bytes': len(response.get_data()),
+            'headers': dict(response.headers),
+            'updated': updated,
+            'clientside': False,
+        }
+
+    def _run_clientside(self, callback):
+        """
+        Runs one clientside callback in Node.js and applies its result to the props.
+
+        Returns:
+        - dict: Timing of the callback, see `_post` (no request, so no sizes).
+        """
+        function = callback['clientside']
+        args = [self.props.get(prop) for prop in callback['inputs'] + callback['state']]
+        result, ms = self.runner.call(function['namespace'], function['function_name'], args)
+        results = result if callback['multi'] else [result]
+        updated = set()
+        for output, value in zip(self._output_props(callback), results):
+            if not _no_update(value):
+                self.props[output] = value
+                updated.add(output)
+        return {'callback': callback['key'], 'ms': ms, 'request_bytes': 0, 'response_bytes': 0, 'headers': {}, 'updated': updated, 'clientside': True}
+
+    @staticmethod
+    def _output_props(callback):
+        """
+        Returns the output props of a callback in the order of its outputs.
+        """
+        return [f"{output['id']}.{output['property'].split('@')[0]}" for output in callback['outputs']]
+
+    def _cascade(self, changed, initial=False):
+        """
+        Fires the callbacks triggered by the changed props, and the callbacks triggered by their outputs.
+        """
+        pending = [callback for callback in self.callbacks if (initial and callback['initial']) or set(callback['inputs']) & changed]
+        triggers = {callback['key']: set(callback['inputs']) & changed for callback in pending}
+        requests = []
+        while pending:
+            produced = set().union(*(callback['output_props'] for callback in pending))
+            ready = [callback for callback in pending if not set(callback['inputs']) & (produced - callback['output_props'])]
+            callback = (ready or pending)[0]
+            pending.remove(callback)
+            changed_props = triggers.pop(callback['key'])
+            result = self._run_clientside(callback) if callback['clientside'] else self._post(callback, changed_props)
+            requests.append(result)
+            for other in self.callbacks:
+                fired = set(other['inputs']) & result['updated']
+                if fired and other is not callback:
+                    if other not in pending:
+                        pending.append(other)
+                        triggers[other['key']] = set()
+                    triggers[other['key']] |= fired
+        return requests
+
+    def load(self):
+        """
+        Simulates loading the page: runs all callbacks that fire on the initial load.
+
+        Returns:
+        - list: One dict per request, see `_post`.
+        """
+        return self._cascade(set(), initial=True)
+
+    def update(self, props):
+        """
+        Simulates a user interaction that changes the given props ('id.property' -> value).
+
+        Returns:
+        - list: One dict per request, see `_post`.
+        """
+        self.props.update(props)
+        return self._cascade(set(props))
@@ -0,0 +1,151 @@
+"""
+Generator of synthetic shark incident data with the same schema as get_data().
+
+Columns are sampled from the values of the real data, so the synthetic data keeps the cardinalities and the
+value frequencies (including the missing values, e.g. about half of Shark.length.m) of the real columns. Most
+columns are sampled independently, which gives many more distinct combinations of values than the real data has,
+as a large dataset would. Columns that describe the same thing (COLUMN_GROUPS) are sampled from the same source
+rows so that they stay consistent: a location keeps its coordinates and state, a shark its names.
+
+Large datasets are written to disk one column at a time, in the format of the columnar cache, and can be loaded
+by the app with JBI100_DATASET (see jbi100_app/config.py):
+
+> python -m benchmarks.synthetic --rows 10000 100000 1000000 10000000
+> JBI100_DATASET=benchmarks/data/synthetic-1000000 python app.py
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from jbi100_app.cache import CACHE_FORMAT_VERSION, INDEX_COLUMN, MANIFEST_NAME, save_columns
+from jbi100_app.data import get_data
+
+# Columns the app works with, sampling all 61 columns would make large frames needlessly big
+APP_COLUMNS = ['Incident.month', 'Incident.year', 'Victim.injury', 'State', 'Latitude', 'Longitude', 'Site.category',
+               'Shark.common.name', 'Shark.length.m', 'Provoked/unprovoked', 'Victim.activity', 'Injury.severity',
+               'Victim.gender', 'Data.source', 'Shark.full.name']
+
+# Columns that are sampled together from the same source rows
+COLUMN_GROUPS = [
+    ['Incident.year', 'Incident.month', 'Incident.date'],
+    ['State', 'Location', 'Latitude', 'Longitude', 'Site.category', 'Site.category.comment'],
+    ['Shark.common.name', 'Shark.scientific.name', 'Shark.full.name'],
+]
+
+# Directory of the datasets written by this module
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def sample_columns(source, n_rows, columns, seed=0):
+    """
+    Samples the columns of a synthetic frame one at a time.
+
+    Args:
+    - source (pd.DataFrame): The real data, see get_data().
+    - n_rows (int): Number of rows to generate.
+    - columns (list): Columns of the source to sample, 'index1' is numbered from 1 like the index.
+    - seed (int): Seed of the random generator.
+    Returns:
+    - generator: Pairs of column name and values, in the order of columns.
+    """
+    rng = np.random.default_rng(seed)
+    group_of = {column: i for i, group in enumerate(COLUMN_GROUPS) for column in group}
+    group_rows = {}
+    for column in columns:
+        if column == 'index1':
+            yield column, np.arange(1, n_rows + 1, dtype=source[column].dtype)
+            continue
+        if column in group_of:
+            group = group_of[column]
+            if group not in group_rows:
+                group_rows[group] = rng.integers(0, len(source), n_rows)
+            rows = group_rows[group]
+        else:
+            rows = rng.integers(0, len(source), n_rows)
+        yield column, source[column].array.take(rows) # keeps the dtype of the source column
+
+
+def make_frame(n_rows, seed=0, columns=APP_COLUMNS):
+    """
+    Generates a synthetic frame in memory.
+
+    Args:
+    - n_rows (int): Number of rows to generate.
+    - seed (int): Seed of the random generator.
+    - columns (list): Columns of get_data() to sample, None for all of them.
+    Returns:
+    - pd.DataFrame: The synthetic data, always with 'index1' and 'Incident.date'.
+    """
+    source = get_data()
+    columns = list(source.columns) if columns is None else [*columns, *(c for c in ('index1', 'Incident.date') if c not in columns)]
+    df = pd.DataFrame(dict(sample_columns(source, n_rows, columns, seed)))
+    df.index = pd.RangeIndex(1, n_rows + 1, name=source.index.name)
+    return df
+
+
+def write_dataset(n_rows, seed=0, data_dir=DATA_DIR):
+    """
+    Writes a synthetic dataset with all columns of get_data() to disk, one column at a time.
+
+    Args:
+    - n_rows (int): Number of rows to generate.
+    - seed (int): Seed of the random generator.
+    - data_dir (str): Directory the dataset is written to.
+    Returns:
+    - str: Directory of the dataset, the value for JBI100_DATASET.
+    """
+    source = get_data()
+    key = dataset_name(n_rows, seed)
+    index = pd.RangeIndex(1, n_rows + 1, name=source.index.name)
+    return save_columns(index, sample_columns(source, n_rows, list(source.columns), seed), data_dir, key)
+
+
+def dataset_name(n_rows, seed=0):
+    """
+    Returns the name of the directory of a synthetic dataset.
+    """
+    return f'synthetic-{n_rows}' if seed == 0 else f'synthetic-{n_rows}-{seed}'
+
+
+def is_current(path):
+    """
+    Returns whether the dataset in a directory exists and has the cache format and the columns and dtypes of get_data().
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    source = get_data()
+    columns = [(column['name'], column['dtype']) for column in manifest['columns'] if column['name'] != INDEX_COLUMN]
+    return manifest.get('format') == CACHE_FORMAT_VERSION and columns == [(column, str(dtype)) for column, dtype in source.dtypes.items()]
+
+
+def dataset_path(n_rows, seed=0, data_dir=DATA_DIR):
+    """
+    Returns the directory of a synthetic dataset, writing the dataset first if it does not exist yet or is outdated
+    (written with other cleaning rules or another cache format).
+    """
+    path = os.path.join(data_dir, dataset_name(n_rows, seed))
+    if not is_current(path):
+        shutil.rmtree(path, ignore_errors=True)
+        path = write_dataset(n_rows, seed, data_dir)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args()
+
+    for n_rows in args.rows:
+        print(dataset_path(n_rows, args.seed, args.data_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+/*
+ * Clientside callbacks of app.py: interactions that only change the presentation of figures that are
+ * already in the browser, so they do not need a request to the server.
+ *
+ * A callback returns a new figure object (a copy along the changed path), so dcc.Graph sees the change.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    figures: {
+        /*
+         * Puts the variable of a bar chart on the y-axis (odd number of clicks) or on the x-axis (even number).
+         * The mirror of the server-side build: swaps x and y of every trace, the orientation, the hover template
+         * and the axis titles.
+         */
+        swapBarAxes: function(nClicks, figure) {
+            if (!figure || !figure.data || !figure.data.length) {
+                return window.dash_clientside.no_update;
+            }
+            var switchAxes = nClicks % 2 === 1;
+            var horizontal = figure.data[0].orientation === 'h';
+            if (horizontal === switchAxes) {
+                return window.dash_clientside.no_update;
+            }
+            var data = figure.data.map(function(trace) {
+                var hovertemplate = (trace.hovertemplate || '').replace(/%\{x\}/g, '%{tmp}').replace(/%\{y\}/g, '%{x}').replace(/%\{tmp\}/g, '%{y}');
+                return Object.assign({}, trace, {x: trace.y, y: trace.x, orientation: horizontal ? 'v' : 'h', hovertemplate: hovertemplate});
+            });
+            var layout = figure.layout || {};
+            var xaxis = layout.xaxis || {};
+            var yaxis = layout.yaxis || {};
+            return Object.assign({}, figure, {
+                data: data,
+                layout: Object.assign({}, layout, {
+                    xaxis: Object.assign({}, xaxis, {title: Object.assign({}, xaxis.title, {text: (yaxis.title || {}).text})}),
+                    yaxis: Object.assign({}, yaxis, {title: Object.assign({}, yaxis.title, {text: (xaxis.title || {}).text})})
+                })
+            });
+        },
+
+        /*
+         * Changes the continuous color palette of the map (its color axis) and of the heatmap (its first trace).
+         * The palettes are resolved into lists of colors on the server, in palette-store.
+         */
+        restyleContinuousPalette: function(paletteName, palettes, mapFigure, heatFigure) {
+            var colorscale = palettes.continuous[paletteName];
+            if (!colorscale) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            var newMap = window.dash_clientside.no_update;
+            if (mapFigure) {
+                var layout = mapFigure.layout || {};
+                newMap = Object.assign({}, mapFigure, {
+                    layout: Object.assign({}, layout, {coloraxis: Object.assign({}, layout.coloraxis, {colorscale: colorscale})})
+                });
+            }
+            var newHeat = window.dash_clientside.no_update;
+            if (heatFigure && heatFigure.data && heatFigure.data.length) {
+                var data = heatFigure.data.slice();
+                data[0] = Object.assign({}, data[0], {colorscale: colorscale});
+                newHeat = Object.assign({}, heatFigure, {data: data});
+            }
+            return [newMap, newHeat];
+        },
+
+        /*
+         * Changes the discrete color palette of the map: its traces take their colors from the colorway.
+         */
+        restyleDiscretePalette: function(paletteName, palettes, mapFigure) {
+            var colorway = palettes.discrete[paletteName];
+            if (!colorway || !mapFigure) {
+                return window.dash_clientside.no_update;
+            }
+            return Object.assign({}, mapFigure, {layout: Object.assign({}, mapFigure.layout, {colorway: colorway})});
+        }
+    },
+
+    ui: {
+        /*
+         * Gives the page a random id once, the server uses it to recognize the figure updates of the page that a newer update superseded.
+         */
+        sessionId: function(modifiedTimestamp, sessionId) {
+            if (sessionId) {
+                return window.dash_clientside.no_update;
+            }
+            if (window.crypto && window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            return Date.now().toString(36) + Math.random().toString(36).slice(2);
+        },
+
+        /*
+         * Reduces the selectedData of the map to what the server needs to resolve the selection: the geometry of a box or
+         * lasso selection without the selected points, or the row id (the first customdata entry) of clicked points.
+         * The selectedData of a large selection holds every selected point with its coordinates.
+         */
+        compactSelection: function(selectedData) {
+            if (!selectedData) {
+                return null;
+            }
+            if (selectedData.range || selectedData.lassoPoints) {
+                return {range: selectedData.range, lassoPoints: selectedData.lassoPoints};
+            }
+            var points = (selectedData.points || []).filter(function(point) {
+                return point.customdata;
+            }).map(function(point) {
+                return {customdata: [point.customdata[0]]};
+            });
+            return {points: points};
+        },
+
+        /*
+         * Writes the filter state and the selection as JSON into the hidden inputs of the download form, which posts them to the export route.
+         */
+        exportInputs: function(filterState, selection) {
+            return [JSON.stringify(filterState || null), JSON.stringify(selection || null)];
+        },
+
+        /*
+         * Clears the selection on the map, the selection stage on the server then clears the selected data.
+         */
+        resetSelection: function(nClicks) {
+            return null;
+        },
+
+        /*
+         * Toggles the pop-up modal window.
+         */
+        toggleModal: function(nOpen, nClose, isOpen) {
+            if (nOpen || nClose) {
+                return !isOpen;
+            }
+            return isOpen;
+        }
+    }
+});
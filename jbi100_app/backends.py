@@ -0,0 +1,721 @@
+"""
+This module contains the query backends, the data access of the callbacks behind one interface.
+
+The callbacks do not read the rows themselves, they ask a backend for what a figure needs: counts grouped by filter
+dimensions (bar charts, heatmap, timeline, row details), the rows of the map (only when there are at most
+MAX_MAP_POINTS of them), clusters or a density grid of the map rows, and the rows of a map selection. Every query
+takes the canonical key of a filter state (see canonical_filter_key in jbi100_app/filters.py). Counts are indexed by
+the codes of `labels`, so the figures do not depend on the backend. JBI100_BACKEND selects one (see jbi100_app/config.py).
+
+- PandasBackend (the default) holds the data in memory and answers with the indexes derived from it: the bitmap
+  filter engine, the spatial grid index and the count cube.
+- SQLiteBackend keeps the data in a local SQLite database, for tables larger than the memory of the server. The
+  database is written once from get_data(), in chunks, with an index on every filter column. A filter state becomes
+  a parameterized WHERE clause, counts, clusters and the density grid are GROUP BY queries, so only aggregates and
+  at most MAX_MAP_POINTS rows are pulled into Python. Aggregates are cached per filter state like the count cube's cuboids.
+"""
+import fcntl
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+from .density import density_grid, grid_shape, grid_points
+from .filters import encode_positions, decode_positions
+from .growable import GrowableFrame
+from .indexes import points_in_polygon
+from .lod import visible_positions, cluster_points
+from .lru import LRUCache
+from .selection import resolve_selection, selection_geometry
+
+# Name of the table in the SQLite database, and the prefix of the database files
+TABLE = 'incidents'
+DATABASE_PREFIX = 'incidents-'
+# Number of rows written per transaction when the database is built
+BUILD_CHUNK_ROWS = 100000
+
+
+def filter_arguments(key):
+    """
+    Turns a canonical filter key (see canonical_filter_key) into the selections and ranges arguments of the filter engine and the count cube.
+    """
+    selections, ranges = key
+    return dict(selections), {column: bounds for column, *bounds in ranges}
+
+
+class PandasBackend:
+    """
+    Answers the queries from the data in memory and the indexes derived from it.
+
+    Args:
+    - data (dict): The data ('df') and its filter engine, spatial index and count cube, see build_data in app.py.
+    - filter_cache_mb (float): Memory budget of the cache of filter results, in megabytes.
+    """
+    name = 'pandas'
+
+    def __init__(self, data, filter_cache_mb=64):
+        self.df = data['df']
+        self.filter_engine, self.spatial_index, self.count_cube = data['filter_engine'], data['spatial_index'], data['count_cube']
+        self.table = GrowableFrame(self.df)  # growable storage of the data, ingested rows are appended to it
+        self.row_lookup = pd.Index(self.df['index1'])  # lookup from row id (index1) to position
+        self.filter_cache = LRUCache(int(filter_cache_mb * 1e6))  # filter key -> encoded positions, shared by all threads
+        self._selection = None  # (selection, its positions), the last selection looked up, the figures of one update share it
+        self._visible = None  # (filter key, bounds, positions), the last rows looked up inside bounds
+
+    @property
+    def n_rows(self):
+        return len(self.df)
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    @property
+    def index_name(self):
+        return self.df.index.name
+
+    @property
+    def labels(self):
+        """
+        Maps every dimension to its sorted labels, a missing value (if any) is the last label, see CountCube.
+        """
+        return self.count_cube.labels
+
+    def caches(self):
+        """
+        Returns the caches of the backend by name, to export their counters.
+        """
+        return {'filter': self.filter_cache, 'cuboids': self.count_cube.cuboid_cache}
+
+    def clear_caches(self):
+        self.filter_cache.clear()
+        self.count_cube.cuboid_cache.clear()
+        self._selection = self._visible = None
+
+    def values(self, column):
+        """
+        Returns the values of a categorical column in sorted order.
+        """
+        return sorted(self.filter_engine.codes[column])
+
+    def bounds(self, column):
+        """
+        Returns the smallest and the largest value of a numeric column, or None if no row has a value.
+        """
+        return self.filter_engine.ranges[column].bounds()
+
+    def positions(self, key):
+        """
+        Returns the sorted positions of the rows that pass a filter state, cached so that the stages of one interaction,
+        and users switching between a few filter states, do not filter the data again.
+        """
+        encoded = self.filter_cache.get_or_compute(key, lambda: encode_positions(self.filter_engine.positions(*filter_arguments(key)), self.n_rows))
+        return decode_positions(encoded, self.n_rows)
+
+    def counts(self, group_by, key):
+        """
+        Counts the rows that pass a filter state grouped by the given dimensions, see CountCube.counts.
+        """
+        return self.count_cube.counts(group_by, *filter_arguments(key))
+
+    def _selected_positions(self, selection):
+        cached = self._selection
+        if cached is None or cached[0] is not selection:
+            cached = self._selection = (selection, self.row_lookup.get_indexer(selection))
+        return cached[1]
+
+    def selected_counts(self, group_by, selection):
+        """
+        Counts the selected rows grouped by the given dimensions.
+
+        Args:
+        - group_by (list): Dimensions to group by.
+        - selection (np.ndarray): The index1 values of the selected rows.
+        """
+        return self.count_cube.row_counts(group_by, self._selected_positions(selection))
+
+    def extent(self):
+        """
+        Returns the area [lon0, lat0, lon1, lat1] of all rows with coordinates.
+        """
+        return [self.spatial_index.x_min, self.spatial_index.y_min, self.spatial_index.x_max, self.spatial_index.y_max]
+
+    def _visible_positions(self, key, bounds):
+        cached = self._visible
+        if cached is None or cached[:2] != (key, bounds):
+            cached = self._visible = (key, bounds, visible_positions(self.spatial_index, self.positions(key), bounds))
+        return cached[2]
+
+    def rows(self, key, bounds=None, limit=None):
+        """
+        Returns the rows that pass a filter state, in row order.
+
+        Args:
+        - key (tuple): The canonical filter key.
+        - bounds (list): Only the rows inside the area [lon0, lat0, lon1, lat1], None for all.
+        - limit (int): Returns at most this many rows, None for all.
+        Returns:
+        - pd.DataFrame: The rows, with all columns.
+        """
+        positions = self.positions(key) if bounds is None else self._visible_positions(key, list(bounds))
+        return self.df.iloc[positions[:limit]]
+
+    def clusters(self, key, bounds, var, selection, max_clusters):
+        """
+        Merges the filtered rows inside an area into clusters per grid cell and value of var, see jbi100_app/lod.py.
+
+        Args:
+        - key (tuple): The canonical filter key.
+        - bounds (list): The area [lon0, lat0, lon1, lat1].
+        - var (str): The dimension the map is colored by.
+        - selection (np.ndarray): The index1 values of the selected rows, or None if nothing is selected.
+        - max_clusters (int): Maximum number of clusters.
+        Returns:
+        - pd.DataFrame: One row per cluster with its mean 'Latitude' and 'Longitude', its value of var, the number of
+          'Incidents' and the number of them that are 'Selected' (all if nothing is selected).
+        """
+        visible = self._visible_positions(key, list(bounds))
+        lon, lat = self.spatial_index.x[visible], self.spatial_index.y[visible]
+        codes = self.count_cube.row_codes[var][visible]
+        clusters, n_clusters = cluster_points(lon, lat, codes, bounds, max_clusters)
+        counts = np.bincount(clusters, minlength=n_clusters)
+        is_selected = np.isin(visible, self._selected_positions(selection)) if selection is not None else np.ones(len(visible), dtype=bool)
+        cluster_codes = np.zeros(n_clusters, dtype=codes.dtype)
+        cluster_codes[clusters] = codes
+        return pd.DataFrame({
+            'Latitude': np.bincount(clusters, weights=lat, minlength=n_clusters) / counts, # mean location of the incidents of a cluster
+            'Longitude': np.bincount(clusters, weights=lon, minlength=n_clusters) / counts,
+            var: self.labels[var][cluster_codes],
+            'Incidents': counts,
+            'Selected': np.bincount(clusters, weights=is_selected, minlength=n_clusters).astype(int),
+        })
+
+    def density(self, key, bounds, bins, sigma):
+        """
+        Counts the filtered rows in a grid over an area, see density_grid in jbi100_app/density.py.
+
+        Args:
+        - key (tuple): The canonical filter key.
+        - bounds (list): The area [lon0, lat0, lon1, lat1], None for the extent of the filtered rows.
+        - bins (int), sigma (float): Number of cells along the longer side and the smoothing, see density_grid.
+        """
+        positions = self.positions(key)
+        lon = self.df['Longitude'].to_numpy()[positions]
+        lat = self.df['Latitude'].to_numpy()[positions]
+        if bounds is None:
+            bounds = [np.nanmin(lon), np.nanmin(lat), np.nanmax(lon), np.nanmax(lat)]
+        return density_grid(lon, lat, bounds, bins=bins, sigma=sigma)
+
+    def value_order(self, key, var):
+        """
+        Returns the values of var in the order they first occur in the filtered rows.
+        """
+        return self.labels[var][pd.unique(self.count_cube.row_codes[var][self.positions(key)])].tolist()
+
+    def select(self, key, selected_data):
+        """
+        Finds the filtered rows that are selected on the map, see jbi100_app/selection.py.
+
+        Returns:
+        - list: The index1 values of the selected rows in row order, or None if nothing is selected.
+        """
+        selected = resolve_selection(selected_data, self.spatial_index, self.row_lookup)
+        if selected is None:
+            return None
+        selected = np.intersect1d(selected, self.positions(key), assume_unique=True) # only rows that pass the filters can be selected
+        return self.df['index1'].to_numpy()[selected].tolist()
+
+    def append(self, batch):
+        """
+        Appends cleaned rows to the data and to the indexes derived from it, without rebuilding them (see jbi100_app/ingest.py).
+        Cached filter results are cleared, the count cube updates its cached cuboids.
+        """
+        self.table.append(batch)
+        self.filter_engine.append(batch)
+        self.spatial_index.append(batch['Longitude'], batch['Latitude'])
+        self.count_cube.append(batch)
+        self.df = self.table.frame()
+        self.row_lookup = pd.Index(self.df['index1'].to_numpy(), copy=False) # its hash table is built on the first lookup
+        self.filter_cache.clear()
+        self._selection = self._visible = None
+
+    def export(self, key, selection, columns, chunk_rows):
+        """
+        Returns the rows that pass a filter state, and are selected if there is a selection, in chunks in row order
+        (see jbi100_app/export.py). The chunks are indexed by the index of the data and have the given columns in the
+        dtypes of export_chunk, so both backends export the same files.
+
+        Called under the read lock, the chunks can be read after it is released: they are sliced from the data as it is
+        now, whose buffers appends do not change (see jbi100_app/growable.py).
+
+        Args:
+        - key (tuple): The canonical filter key.
+        - selection (np.ndarray): The index1 values of the selected rows, or None to export all filtered rows.
+        - columns (list): The columns to export, in this order.
+        - chunk_rows (int): Number of rows per chunk.
+        Returns:
+        - generator: DataFrames of at most chunk_rows rows, at least one (empty if no row matches).
+        """
+        df, positions = self.df, self.positions(key)
+        if selection is not None:
+            positions = np.intersect1d(positions, self.row_lookup.get_indexer(selection)) # unknown ids (-1) are not among the positions
+        column_positions = df.columns.get_indexer(columns)
+        def chunks():
+            for start in range(0, max(len(positions), 1), chunk_rows):
+                yield export_chunk(df.iloc[positions[start:start + chunk_rows], column_positions])
+        return chunks()
+
+
+def quote(column):
+    """
+    Returns a column name as an SQL identifier, the names contain dots and slashes.
+    """
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _column_kind(series):
+    """
+    Returns how a column is stored: 'integer', 'float32', 'float' or 'text'.
+    """
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return 'integer'
+    if pd.api.types.is_float_dtype(series.dtype):
+        return 'float32' if series.dtype == np.float32 else 'float'
+    return 'text'
+
+
+def _ids(selection):
+    """
+    Returns row ids as a JSON array, the parameter of json_each in the queries of a selection.
+    """
+    return json.dumps(np.asarray(selection).tolist())
+
+
+SQL_TYPES = {'integer': 'INTEGER', 'float32': 'REAL', 'float': 'REAL', 'text': 'TEXT'}
+# The dtypes of exported columns, the same in every chunk whatever values it holds (see SQLiteBackend.export)
+EXPORT_DTYPES = {'integer': 'Int64', 'float32': 'float32', 'float': 'float64', 'text': 'string'}
+
+
+def export_chunk(df):
+    """
+    Returns rows with their columns and index in the dtype of how they are stored (see _column_kind and EXPORT_DTYPES).
+    """
+    df = df.astype({column: EXPORT_DTYPES[_column_kind(df[column])] for column in df.columns})
+    df.index = df.index.astype(EXPORT_DTYPES[_column_kind(df.index)])
+    return df
+
+
+def _records(df, columns):
+    """
+    Returns the rows of a DataFrame as tuples of Python values, missing values as None.
+    """
+    values = []
+    for column in columns:
+        series = df[column]
+        if series.dtype.kind == 'M':
+            series = series.dt.strftime('%Y-%m-%d')
+        values.append(series.astype(object).where(series.notna(), None).tolist())
+    return list(zip(*values))
+
+
+def build_database(path, df, columns, indexed_columns):
+    """
+    Writes the data into a new SQLite database, in chunks of BUILD_CHUNK_ROWS rows, with an index on every filter column.
+
+    The database is written to a temporary file and moved in place when it is complete, so workers that start at the
+    same time never open a half written database.
+
+    Args:
+    - path (str): Path of the database.
+    - df (pd.DataFrame): The data, its index is stored as a column as well.
+    - columns (list): The columns that are stored, 'index1' must be one of them (it identifies the rows of a selection).
+    - indexed_columns (list): The columns that are filtered on, each gets an index.
+    """
+    frame_columns = [df.index.name, *columns]
+    kinds = {df.index.name: _column_kind(df.index), **{column: _column_kind(df[column]) for column in columns}}
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{DATABASE_PREFIX}', suffix='.sqlite', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(tmp_path)
+        connection.execute('PRAGMA journal_mode = OFF') # written once, a failed build is thrown away
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.execute(f'CREATE TABLE {TABLE} ({", ".join(f"{quote(column)} {SQL_TYPES[kinds[column]]}" for column in frame_columns)})')
+        insert = f'INSERT INTO {TABLE} VALUES ({", ".join("?" * len(frame_columns))})'
+        for start in range(0, len(df), BUILD_CHUNK_ROWS):
+            chunk = df.iloc[start:start + BUILD_CHUNK_ROWS].reset_index()
+            with connection:
+                connection.executemany(insert, _records(chunk, frame_columns))
+        with connection:
+            for number, column in enumerate(indexed_columns):
+                connection.execute(f'CREATE INDEX {TABLE}_{number} ON {TABLE} ({quote(column)})')
+            connection.execute(f'CREATE INDEX {TABLE}_location ON {TABLE} ("Longitude", "Latitude")')
+            connection.execute(f'CREATE UNIQUE INDEX {TABLE}_index1 ON {TABLE} ("index1")') # ingested rows that are already there are ignored
+            connection.execute('CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)')
+            connection.executemany('INSERT INTO meta VALUES (?, ?)', [('kinds', json.dumps(kinds)), ('index_name', df.index.name)])
+        connection.execute('ANALYZE') # statistics for the query planner, to choose between the indexes of a WHERE clause
+        connection.execute('PRAGMA journal_mode = WAL') # workers read while one of them appends ingested rows
+        connection.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def open_database(directory, key, build):
+    """
+    Returns the path of the SQLite database of a key, building it first if there is none, and removes the databases of other keys.
+
+    Only one process builds the database, others wait on a file lock (like shared_state in jbi100_app/shared.py).
+
+    Args:
+    - directory (str): Directory of the databases.
+    - key (str): Key of the database, it identifies the data and the stored columns.
+    - build (callable): Writes the database to the path it is given, see build_database.
+    Returns:
+    - str: The path of the database.
+    """
+    path = os.path.join(directory, f'{DATABASE_PREFIX}{key}.sqlite')
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'.{DATABASE_PREFIX}lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path): # built by another process while this one waited
+                build(path)
+                for stale in glob.glob(os.path.join(directory, f'{DATABASE_PREFIX}*.sqlite*')):
+                    if not stale.startswith(path):
+                        os.remove(stale)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return path
+
+
+class SQLiteBackend:
+    """
+    Answers the queries with SQL on a SQLite database written by build_database, see the module documentation.
+
+    Every thread has its own connection. The labels of the dimensions, the number of rows and the extent are read when
+    the backend is opened and after every append.
+
+    Args:
+    - path (str): Path of the database.
+    - dimensions (iterable): Categorical columns, filtered by lists of values.
+    - range_dimensions (iterable): Numeric columns, filtered by ranges [low, high] (and optionally the missing values).
+    - query_cache_mb (float): Memory budget of the cache of aggregates, in megabytes.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path, dimensions, range_dimensions=(), query_cache_mb=16):
+        self.path = path
+        self.dimensions = list(dimensions) + list(range_dimensions)
+        self.range_dimensions = set(range_dimensions)
+        self.query_cache = LRUCache(int(query_cache_mb * 1e6))  # (query, filter key) -> aggregate
+        self._local = threading.local()
+        meta = dict(self._execute('SELECT name, value FROM meta').fetchall())
+        self.kinds = json.loads(meta['kinds'])  # column -> how it is stored, see _column_kind
+        self.index_name = meta['index_name']
+        self.columns = [column for column in self.kinds if column != self.index_name]
+        self._refresh()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA mmap_size = 1073741824') # read the database through the page cache of the OS
+        connection.execute('PRAGMA cache_size = -65536')
+        connection.execute('PRAGMA temp_store = MEMORY') # the sorters of GROUP BY and ORDER BY
+        return connection
+
+    def _execute(self, sql, params=()):
+        return self.connection.execute(sql, params)
+
+    def _refresh(self):
+        """
+        Reads the labels of the dimensions, the number of rows and the extent, after the database was opened or appended to.
+        """
+        self.labels = {dimension: self._read_labels(dimension) for dimension in self.dimensions}
+        self._label_index = {dimension: pd.Index(labels) for dimension, labels in self.labels.items()}
+        self.n_rows, *extent = self._execute(f'SELECT COUNT(*), MIN("Longitude"), MIN("Latitude"), MAX("Longitude"), MAX("Latitude") FROM {TABLE}').fetchone()
+        self._extent = [0.0 if value is None else value for value in extent]
+        self.query_cache.clear()
+
+    def _read_labels(self, dimension):
+        """
+        Returns the sorted distinct values of a dimension, a missing value (if any) is the last label, like CountCube.
+        """
+        values = [value for value, in self._execute(f'SELECT DISTINCT {quote(dimension)} FROM {TABLE} ORDER BY 1')]
+        missing = bool(values) and values[0] is None # NULL sorts first
+        values = values[1:] if missing else values
+        kind = self.kinds[dimension]
+        if kind == 'text' or (missing and dimension not in self.range_dimensions):
+            labels = np.array(values + [np.nan] * missing, dtype=object)
+        else:
+            labels = np.array(values + [np.nan] * missing, dtype=np.float32 if kind == 'float32' else float if missing else np.int64)
+        return labels
+
+    def caches(self):
+        """
+        Returns the caches of the backend by name, to export their counters.
+        """
+        return {'query': self.query_cache}
+
+    def clear_caches(self):
+        self.query_cache.clear()
+
+    def values(self, column):
+        """
+        Returns the values of a categorical column in sorted order.
+        """
+        return [value for value in self.labels[column].tolist() if not pd.isna(value)]
+
+    def bounds(self, column):
+        """
+        Returns the smallest and the largest value of a numeric column, or None if no row has a value.
+        """
+        labels = self.labels[column]
+        labels = labels[~pd.isna(labels)]
+        return (labels[0], labels[-1]) if len(labels) else None
+
+    def _bound(self, column, value):
+        """
+        Returns a bound of a range filter as it is compared: float32 columns are compared in float32 like the filter
+        engine does (the stored value of 2.6 is 2.5999999046325684).
+        """
+        return float(np.float32(value)) if self.kinds[column] == 'float32' else float(value)
+
+    def _where(self, key, conditions=(), params=()):
+        """
+        Translates a filter key into a WHERE clause and its parameters, extra conditions (with their parameters) are added to it.
+        Ranges that match every row are left out, so the query planner does not use their index.
+        """
+        selections, ranges = key
+        clauses, values = [], []
+        for column, selected in selections:
+            clauses.append(f'{quote(column)} IN ({", ".join("?" * len(selected))})')
+            values.extend(selected)
+        for column, low, high, include_missing in ranges:
+            labels = self.labels[column]
+            missing = pd.isna(labels)
+            with np.errstate(invalid='ignore'):
+                inside = (labels >= labels.dtype.type(low)) & (labels <= labels.dtype.type(high)) if labels.dtype != object else None
+            if inside is not None and (inside | (missing & include_missing)).all():
+                continue
+            clause = f'{quote(column)} BETWEEN ? AND ?'
+            clauses.append(f'({clause} OR {quote(column)} IS NULL)' if include_missing else clause)
+            values.extend([self._bound(column, low), self._bound(column, high)])
+        clauses.extend(conditions)
+        values.extend(params)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), values
+
+    def _codes(self, dimension, values):
+        """
+        Returns the codes of the labels of the given values of a dimension, None (NULL) is the missing label.
+        """
+        return self._label_index[dimension].get_indexer([np.nan if value is None else value for value in values])
+
+    def _grouped_counts(self, group_by, where, params):
+        """
+        Counts the rows of a WHERE clause grouped by the given dimensions into a dense array indexed by the codes of the labels.
+        """
+        if not group_by:
+            return np.array(self._execute(f'SELECT COUNT(*) FROM {TABLE}{where}', params).fetchone()[0], dtype=np.int64)
+        columns = ', '.join(quote(dimension) for dimension in group_by)
+        rows = self._execute(f'SELECT {columns}, COUNT(*) FROM {TABLE}{where} GROUP BY {columns}', params).fetchall()
+        counts = np.zeros([len(self.labels[dimension]) for dimension in group_by], dtype=np.int64)
+        if rows:
+            *values, n = zip(*rows)
+            counts[tuple(self._codes(dimension, column) for dimension, column in zip(group_by, values))] = n
+        return counts
+
+    def positions(self, key):
+        """
+        Returns the sorted positions of the rows that pass a filter state (rowid - 1, rows are only appended).
+        """
+        where, params = self._where(key)
+        rows = self._execute(f'SELECT rowid - 1 FROM {TABLE}{where} ORDER BY rowid', params)
+        return np.fromiter((position for position, in rows), dtype=np.int64)
+
+    def counts(self, group_by, key):
+        """
+        Counts the rows that pass a filter state grouped by the given dimensions, with a GROUP BY query.
+        """
+        return self.query_cache.get_or_compute(('counts', tuple(group_by), key), lambda: self._grouped_counts(group_by, *self._where(key)))
+
+    def selected_counts(self, group_by, selection):
+        """
+        Counts the selected rows grouped by the given dimensions.
+
+        Args:
+        - group_by (list): Dimensions to group by.
+        - selection (np.ndarray): The index1 values of the selected rows.
+        """
+        return self._grouped_counts(group_by, ' WHERE "index1" IN (SELECT value FROM json_each(?))', [_ids(selection)])
+
+    def extent(self):
+        """
+        Returns the area [lon0, lat0, lon1, lat1] of all rows with coordinates.
+        """
+        return list(self._extent)
+
+    def _inside(self, bounds):
+        """
+        Returns the conditions and the parameters of the rows inside the area [lon0, lat0, lon1, lat1]. An area that contains
+        the extent of the data only excludes the rows without coordinates, so the query planner does not use the location index.
+        """
+        lon0, lat0, lon1, lat1 = (float(value) for value in bounds)
+        x0, y0, x1, y1 = self._extent
+        if lon0 <= x0 and lat0 <= y0 and lon1 >= x1 and lat1 >= y1:
+            return ['"Longitude" IS NOT NULL', '"Latitude" IS NOT NULL'], []
+        return ['"Longitude" BETWEEN ? AND ?', '"Latitude" BETWEEN ? AND ?'], [lon0, lon1, lat0, lat1]
+
+    def rows(self, key, bounds=None, limit=None):
+        """
+        Returns the rows that pass a filter state, in row order, see PandasBackend.rows.
+        """
+        where, params = self._where(key, *(self._inside(bounds) if bounds is not None else ((), ())))
+        columns = [self.index_name, *self.columns]
+        sql = f'SELECT {", ".join(quote(column) for column in columns)} FROM {TABLE}{where} ORDER BY rowid'
+        if limit is not None:
+            sql, params = sql + ' LIMIT ?', [*params, limit]
+        frame = pd.DataFrame.from_records(self._execute(sql, params).fetchall(), columns=columns)
+        return frame.set_index(self.index_name)
+
+    def clusters(self, key, bounds, var, selection, max_clusters):
+        """
+        Merges the filtered rows inside an area into clusters per grid cell and value of var, grouped in SQL.
+        The grid is sized like cluster_points sizes its first grid, for all labels of var, so the clusters always fit.
+        Without a selection the clusters are cached per filter state and area. See PandasBackend.clusters for the arguments and the result.
+        """
+        if selection is None:
+            return self.query_cache.get_or_compute(('clusters', key, tuple(bounds), var, max_clusters), lambda: self._clusters(key, bounds, var, None, max_clusters))
+        return self._clusters(key, bounds, var, selection, max_clusters)
+
+    def _clusters(self, key, bounds, var, selection, max_clusters):
+        lon0, lat0, lon1, lat1 = (float(value) for value in bounds)
+        n_cells = max(1, int(np.sqrt(max_clusters / len(self.labels[var]))))
+        column = f'MIN(CAST(("Longitude" - ?) / ? * {n_cells} AS INTEGER), {n_cells - 1})'
+        row = f'MIN(CAST(("Latitude" - ?) / ? * {n_cells} AS INTEGER), {n_cells - 1})'
+        selected = 'SUM("index1" IN (SELECT value FROM json_each(?)))' if selection is not None else 'COUNT(*)'
+        where, params = self._where(key, *self._inside(bounds))
+        cell_params = [lon0, max(lon1 - lon0, 1e-9), lat0, max(lat1 - lat0, 1e-9)]
+        rows = self._execute(f'SELECT {column} AS cell_column, {row} AS cell_row, {quote(var)}, COUNT(*), SUM("Longitude"), SUM("Latitude"), {selected} '
+                             f'FROM {TABLE}{where} GROUP BY cell_row, cell_column, {quote(var)}',
+                             [*cell_params, *([_ids(selection)] if selection is not None else []), *params]).fetchall()
+        _, _, values, counts, lon, lat, n_selected = (np.array(column) for column in zip(*rows)) if rows else [np.empty(0)] * 7
+        return pd.DataFrame({
+            'Latitude': lat / np.maximum(counts, 1), # mean location of the incidents of a cluster
+            'Longitude': lon / np.maximum(counts, 1),
+            var: self.labels[var][self._codes(var, values.tolist())],
+            'Incidents': counts.astype(np.int64),
+            'Selected': n_selected.astype(int),
+        })
+
+    def density(self, key, bounds, bins, sigma):
+        """
+        Counts the filtered rows in a grid over an area, grouped by grid cell in SQL and cached per filter state and area, see PandasBackend.density.
+        """
+        return self.query_cache.get_or_compute(('density', key, None if bounds is None else tuple(bounds), bins, sigma), lambda: self._density(key, bounds, bins, sigma))
+
+    def _density(self, key, bounds, bins, sigma):
+        if bounds is None:
+            where, params = self._where(key)
+            bounds = self._execute(f'SELECT MIN("Longitude"), MIN("Latitude"), MAX("Longitude"), MAX("Latitude") FROM {TABLE}{where}', params).fetchone()
+            if bounds[0] is None:
+                bounds = self._extent
+        area, bins_lon, bins_lat = grid_shape(bounds, bins)
+        lon0, lat0, lon1, lat1 = area
+        where, params = self._where(key, *self._inside(area))
+        rows = self._execute(f'SELECT MIN(CAST(("Longitude" - ?) / ? AS INTEGER), {bins_lon - 1}) AS cell_lon, '
+                             f'MIN(CAST(("Latitude" - ?) / ? AS INTEGER), {bins_lat - 1}) AS cell_lat, COUNT(*) '
+                             f'FROM {TABLE}{where} GROUP BY cell_lon, cell_lat',
+                             [lon0, (lon1 - lon0) / bins_lon, lat0, (lat1 - lat0) / bins_lat, *params]).fetchall()
+        counts = np.zeros((bins_lon, bins_lat))
+        if rows:
+            cell_lon, cell_lat, n = zip(*rows)
+            counts[list(cell_lon), list(cell_lat)] = n
+        return grid_points(counts, area, sigma)
+
+    def value_order(self, key, var):
+        """
+        Returns the values of var in the order they first occur in the filtered rows.
+        """
+        def compute():
+            where, params = self._where(key)
+            values = [value for value, in self._execute(f'SELECT {quote(var)} FROM {TABLE}{where} GROUP BY 1 ORDER BY MIN(rowid)', params)]
+            return self.labels[var][self._codes(var, values)].tolist()
+        return self.query_cache.get_or_compute(('order', var, key), compute)
+
+    def select(self, key, selected_data):
+        """
+        Finds the filtered rows that are selected on the map: boxes with a range query on the location index, lassos
+        with a range query on their bounding box and a test of the points inside it, clicked points by their row ids.
+
+        Returns:
+        - list: The index1 values of the selected rows in row order, or None if nothing is selected.
+        """
+        geometry = selection_geometry(selected_data)
+        if geometry is None:
+            return None
+        kind, shape = geometry
+        if kind == 'points':
+            where, params = self._where(key, ['"index1" IN (SELECT value FROM json_each(?))'], [json.dumps(shape)])
+            return [row_id for row_id, in self._execute(f'SELECT "index1" FROM {TABLE}{where} ORDER BY rowid', params)]
+        vertices = np.asarray(shape, dtype=float)
+        if kind == 'lasso' and len(vertices) < 3:
+            return []
+        (x0, y0), (x1, y1) = vertices.min(axis=0), vertices.max(axis=0)
+        where, params = self._where(key, *self._inside([x0, y0, x1, y1]))
+        rows = self._execute(f'SELECT "index1", "Longitude", "Latitude" FROM {TABLE}{where} ORDER BY rowid', params).fetchall()
+        if kind == 'box' or not rows:
+            return [row_id for row_id, _, _ in rows]
+        row_ids, lon, lat = (np.array(column) for column in zip(*rows))
+        return row_ids[points_in_polygon(lon.astype(float), lat.astype(float), vertices)].tolist()
+
+    def append(self, batch):
+        """
+        Inserts cleaned rows, rows whose index1 is already stored (ingested by another worker) are ignored.
+        """
+        columns = [self.index_name, *self.columns]
+        records = _records(batch.reset_index(), columns)
+        with self.connection:
+            self.connection.executemany(f'INSERT OR IGNORE INTO {TABLE} ({", ".join(quote(column) for column in columns)}) '
+                                        f'VALUES ({", ".join("?" * len(columns))})', records)
+        self._refresh()
+
+    def export(self, key, selection, columns, chunk_rows):
+        """
+        Returns the rows that pass a filter state, and are selected if there is a selection, in chunks in row order,
+        see PandasBackend.export. The columns must be stored (see build_database).
+
+        The query runs on a connection of its own, whose read transaction sees the database as it was when the first
+        chunk was read, while ingested rows are written. The chunks have the same dtypes whatever values they hold.
+        """
+        where, params = self._where(key, *((['"index1" IN (SELECT value FROM json_each(?))'], [_ids(selection)]) if selection is not None else ((), ())))
+        columns = [self.index_name, *columns]
+        sql = f'SELECT {", ".join(quote(column) for column in columns)} FROM {TABLE}{where} ORDER BY rowid'
+        dtypes = {column: EXPORT_DTYPES[self.kinds[column]] for column in columns}
+        def chunks():
+            connection = self._connect()
+            try:
+                cursor = connection.execute(sql, params)
+                first = True
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if rows or first:
+                        yield pd.DataFrame.from_records(rows, columns=columns).astype(dtypes).set_index(self.index_name)
+                    if len(rows) < chunk_rows:
+                        return
+                    first = False
+            finally:
+                connection.close()
+        return chunks()
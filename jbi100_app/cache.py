@@ -0,0 +1,196 @@
+"""
+This module contains an on-disk columnar cache for the cleaned shark incident data.
+
+Reading and cleaning the Excel file is by far the slowest part of starting the app, so the cleaned
+DataFrame is stored once as one NumPy `.npy` file per column plus a small JSON manifest:
+- Numeric, boolean and datetime columns are stored as typed arrays and reloaded memory-mapped.
+- Categorical columns are stored as their codes, and reloaded memory-mapped as categoricals.
+- All other (string or mixed) columns are dictionary-encoded: an integer code array on disk and the
+  list of distinct values in the manifest.
+
+Every cache entry lives in its own directory named after a key that covers the content of the source
+file and the version of the cleaning rules, so a changed Excel file or changed cleaning rules
+automatically lead to a rebuild.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Version of the on-disk layout below, bump when the way columns are written changes
+CACHE_FORMAT_VERSION = 2
+
+MANIFEST_NAME = 'manifest.json'
+INDEX_COLUMN = '__index__'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 digest of a file.
+
+    Args:
+    - path (str): Path of the file.
+    - chunk_size (int): Number of bytes read at a time.
+    Returns:
+    - str: The hexadecimal digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(source_path, rules_version):
+    """
+    Builds the cache key for a source file and a version of the cleaning rules.
+
+    Args:
+    - source_path (str): Path of the source (Excel) file.
+    - rules_version (int): Version of the cleaning rules applied to the source file.
+    Returns:
+    - str: A short key that changes whenever the source content, the cleaning rules or the cache format change.
+    """
+    parts = f'{file_digest(source_path)}-{rules_version}-{CACHE_FORMAT_VERSION}'
+    return hashlib.sha256(parts.encode()).hexdigest()[:16]
+
+
+def _to_json_value(value):
+    """
+    Converts a NumPy scalar to the equivalent Python value so it can be written to JSON.
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _column_kind(series):
+    """
+    Decides how a column is stored: 'array' for typed arrays, 'categorical' for the codes of categoricals, 'dictionary' for encoded values.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return 'categorical'
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_dtype(series):
+        return 'array'
+    return 'dictionary'
+
+
+def save_frame(df, cache_dir, key):
+    """
+    Writes a DataFrame to the columnar cache.
+
+    The entry is first written to a temporary directory and then moved in place, so concurrently starting
+    workers never see a half written entry.
+
+    Args:
+    - df (pd.DataFrame): The cleaned DataFrame.
+    - cache_dir (str): Directory that holds all cache entries.
+    - key (str): Cache key of this entry, see `cache_key`.
+    Returns:
+    - str: Path of the directory of the cache entry.
+    """
+    return save_columns(df.index, df.items(), cache_dir, key)
+
+
+def save_columns(index, columns, cache_dir, key):
+    """
+    Writes a frame to the columnar cache one column at a time, like `save_frame`. The columns can be produced
+    lazily, so a frame that does not fit in memory can be written (see benchmarks/synthetic.py).
+
+    Args:
+    - index (pd.Index): Index of the frame.
+    - columns (iterable): Pairs of column name and values, with as many values as the index.
+    - cache_dir (str): Directory that holds all cache entries.
+    - key (str): Cache key of this entry, see `cache_key`.
+    Returns:
+    - str: Path of the directory of the cache entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f'.{key}-', dir=cache_dir)
+    manifest_columns = []
+    def frame_columns(): # store the index as an ordinary column
+        yield INDEX_COLUMN, index
+        yield from columns
+    for i, (name, values) in enumerate(frame_columns()):
+        series = pd.Series(values, copy=False)
+        column = {'name': name, 'file': f'{i}.npy', 'dtype': str(series.dtype), 'kind': _column_kind(series)}
+        if column['kind'] == 'array':
+            values = series.to_numpy()
+        elif column['kind'] == 'categorical':
+            values = series.cat.codes.to_numpy() # in the integer type pandas uses for the codes, so they are loaded without a copy
+            column['values'] = [_to_json_value(value) for value in series.cat.categories]
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True) # missing values get code -1
+            values = codes.astype(np.int32)
+            column['values'] = [_to_json_value(value) for value in uniques]
+        np.save(os.path.join(tmp_dir, column['file']), values, allow_pickle=False)
+        manifest_columns.append(column)
+    manifest = {'key': key, 'format': CACHE_FORMAT_VERSION, 'rows': len(index), 'index_name': index.name, 'columns': manifest_columns}
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    entry_dir = os.path.join(cache_dir, key)
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError: # another process stored the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return entry_dir
+
+
+def _load_column(entry_dir, column):
+    """
+    Reads a single column of a cache entry.
+    """
+    values = np.load(os.path.join(entry_dir, column['file']), mmap_mode='r', allow_pickle=False).view(np.ndarray) # plain read-only view on the mapped file
+    if column['kind'] == 'array':
+        return values
+    if column['kind'] == 'categorical':
+        return pd.Categorical.from_codes(values, categories=column['values'])
+    uniques = np.empty(len(column['values']) + 1, dtype=object)
+    uniques[:-1] = column['values']
+    uniques[-1] = np.nan # code -1 selects this last slot, i.e. a missing value
+    decoded = pd.Series(uniques.take(values))
+    if column['dtype'] != 'object':
+        decoded = decoded.astype(column['dtype'])
+    return decoded.to_numpy()
+
+
+def load_frame(cache_dir, key):
+    """
+    Reads a DataFrame from the columnar cache.
+
+    Args:
+    - cache_dir (str): Directory that holds all cache entries.
+    - key (str): Cache key of the entry, see `cache_key`.
+    Returns:
+    - pd.DataFrame or None: The cached DataFrame, or None if there is no (valid) entry for this key.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    try:
+        with open(os.path.join(entry_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('key') != key or manifest.get('format') != CACHE_FORMAT_VERSION:
+        return None
+
+    data = {column['name']: _load_column(entry_dir, column) for column in manifest['columns']}
+    index = pd.Index(data.pop(INDEX_COLUMN), name=manifest['index_name'])
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def remove_stale_entries(cache_dir, keep_key):
+    """
+    Deletes all cache entries except the one for the given key.
+
+    Args:
+    - cache_dir (str): Directory that holds all cache entries.
+    - keep_key (str): Key of the entry that should be kept.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name != keep_key and not name.startswith('.'):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
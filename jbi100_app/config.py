@@ -1,4 +1,142 @@
 # Here you can add any global configuations
+import os
 
 color_list1 = ["green", "blue"]
 color_list2 = ["red", "purple"]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Data: the source file, the columnar cache of the cleaned data and alternative datasets
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Location of the source data and of the columnar cache of the cleaned data (see jbi100_app/cache.py)
+DATASET_DIR = os.path.join(os.path.dirname(__file__), 'dataset')
+DATA_PATH = os.path.join(DATASET_DIR, 'data_modified_new.xlsx')
+CACHE_DIR = os.environ.get('JBI100_CACHE_DIR', os.path.join(DATASET_DIR, 'cache'))
+
+# Set JBI100_DATA_CACHE=0 to always read and clean the Excel file
+USE_DATA_CACHE = os.environ.get('JBI100_DATA_CACHE', '1') != '0'
+
+# Set JBI100_DATASET to the directory of a columnar dataset (in the format of jbi100_app/cache.py) to load it instead of the
+# Excel file, for example a synthetic dataset written by benchmarks/synthetic.py
+DATASET_OVERRIDE = os.environ.get('JBI100_DATASET')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Workers and startup
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Set JBI100_SHARED_DIR to share the data and the structures derived from it between worker processes (see jbi100_app/shared.py),
+# a directory on a tmpfs such as /dev/shm/jbi100 keeps it in shared memory
+SHARED_DIR = os.environ.get('JBI100_SHARED_DIR')
+
+# Set JBI100_FAST_START=1 to serve the first page from the layout manifest (see jbi100_app/startup.py) while the data and its
+# indexes load in a background thread, the callbacks wait for them
+FAST_START = os.environ.get('JBI100_FAST_START', '0') == '1'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Query backends
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Backend that answers the queries of the callbacks (see jbi100_app/backends.py): 'pandas' keeps the data and its indexes in memory,
+# 'sqlite' keeps the data in a local SQLite database (written once, in JBI100_SQLITE_DIR) and pushes the filters and counts down to it
+BACKEND = os.environ.get('JBI100_BACKEND', 'pandas')
+SQLITE_DIR = os.environ.get('JBI100_SQLITE_DIR', CACHE_DIR)
+# Memory budget of the aggregates cached by the SQLite backend, in megabytes
+QUERY_CACHE_MB = float(os.environ.get('JBI100_QUERY_CACHE_MB', 16))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Filters and counts
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Memory budget of the cache of filter results (see jbi100_app/lru.py), in megabytes
+FILTER_CACHE_MB = float(os.environ.get('JBI100_FILTER_CACHE_MB', 64))
+# Number of decimals slider values are rounded to in the key of the filter result cache
+FILTER_KEY_DECIMALS = 6
+
+# Memory budget of the cuboids derived from the count cube (see jbi100_app/cube.py), in megabytes
+CUBE_CACHE_MB = float(os.environ.get('JBI100_CUBE_CACHE_MB', 64))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Map
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The heatmap tab aggregates the incidents into a grid on the server above this number of filtered rows (see jbi100_app/density.py)
+DENSITY_RASTER_ROWS = int(os.environ.get('JBI100_DENSITY_RASTER_ROWS', 20000))
+# Number of grid cells along the longer side of the map, and the standard deviation of the optional Gaussian smoothing in cells
+# (0 for none: the density map already blurs every cell with its radius, smoothing makes more cells non-empty and so the payload larger)
+DENSITY_GRID_BINS = 128
+DENSITY_SMOOTHING = 0.0
+
+# The scatter tab draws at most this many points, more filtered rows are limited to the viewport and clustered (see jbi100_app/lod.py)
+MAX_MAP_POINTS = int(os.environ.get('JBI100_MAX_MAP_POINTS', 5000))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Correlation heatmap and timeline
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The correlation heatmap shows at most this many values per variable, the others are summed into an 'other' bucket (see jbi100_app/crosstab.py),
+# 0 (the default) shows all values
+HEATMAP_TOP_K = int(os.environ.get('JBI100_HEATMAP_TOP_K', 0))
+
+# The timeline shows at most this many bins, its bin width (month, year or decade) adapts to the year range (see jbi100_app/timeline.py)
+TIMELINE_MAX_BINS = int(os.environ.get('JBI100_TIMELINE_MAX_BINS', 250))
+# Memory budget of the prefix sums of the timeline, one per filter state without its year range, in megabytes
+TIMELINE_CACHE_MB = float(os.environ.get('JBI100_TIMELINE_CACHE_MB', 16))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Figure updates
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Window in milliseconds in which rapid figure updates of a session are coalesced, only the latest one is built (see jbi100_app/jobs.py)
+COALESCE_WINDOW_MS = float(os.environ.get('JBI100_COALESCE_WINDOW_MS', 50))
+
+# Number of threads that build the figures of an update at the same time (see jbi100_app/pool.py): 'auto' for one per CPU (none on
+# a single CPU), 0 builds them one after another in the request thread
+FIGURE_WORKERS = os.environ.get('JBI100_FIGURE_WORKERS', '0')
+
+# Whether identical figure updates of different pages that run at the same time are computed once and shared (see SingleFlight in jbi100_app/jobs.py)
+SINGLE_FLIGHT = os.environ.get('JBI100_SINGLE_FLIGHT', '1') != '0'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Map selections
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Memory budget of the map selections kept on the server (see jbi100_app/sessions.py), in megabytes, and the seconds after its last
+# use after which the selection of a page expires
+SELECTION_STORE_MB = float(os.environ.get('JBI100_SELECTION_STORE_MB', 16))
+SELECTION_TTL_S = float(os.environ.get('JBI100_SELECTION_TTL_S', 3600))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Ingesting new incidents
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Directory that is polled for files with new incidents, which are appended to the running app (see jbi100_app/ingest.py), unset to disable
+INGEST_DIR = os.environ.get('JBI100_INGEST_DIR')
+# Seconds between two polls of INGEST_DIR, open pages check for new data at the same interval
+INGEST_POLL_S = float(os.environ.get('JBI100_INGEST_POLL_S', 5))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Export
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Path of the routes on the Flask server that stream the filtered (or selected) incidents as CSV or Parquet (see jbi100_app/export.py),
+# and the number of rows read and sent at a time
+EXPORT_ROUTE = os.environ.get('JBI100_EXPORT_ROUTE', '/export')
+EXPORT_CHUNK_ROWS = int(os.environ.get('JBI100_EXPORT_CHUNK_ROWS', 50000))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Metrics
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Path of the route on the Flask server that exports the stage timings and cache counters in the Prometheus format (see jbi100_app/metrics.py)
+METRICS_ROUTE = os.environ.get('JBI100_METRICS_ROUTE', '/metrics')
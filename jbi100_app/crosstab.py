@@ -0,0 +1,86 @@
+"""
+This module contains the contingency tables (cross-tabs) shown by the correlation heatmap.
+
+The counts of two dimensions come from the count cube (jbi100_app/cube.py) as a 2D array indexed by the codes of their
+labels, summed from its cells with np.bincount, so no rows are touched. A CrossTab turns such an array into the matrix
+the heatmap shows:
+
+- The display labels of the values are computed once per dimension, not on every update.
+- Values without rows are left out.
+- Of a dimension with many values (such as Shark.common.name) only the top K values by count are shown, the counts
+  of the others are summed into one 'other' row or column, so the matrix stays small and readable.
+"""
+import numpy as np
+
+
+def display_label(label):
+    """
+    Returns the label of a value as shown on the axes of the heatmap, 'shark' is left out of the shark types.
+    """
+    return str(label).replace('shark', '')
+
+
+class CrossTab:
+    """
+    Builds the matrices of the heatmap from count arrays, see the module documentation.
+
+    Args:
+    - labels (dict): Dimension -> its labels, the labels of a CountCube. The arrays are looked up on every call, so
+      dimensions that were relabelled after incidents were ingested get new display labels.
+    - top_k (int): Number of values per dimension that are shown, the others are summed into an 'other' bucket. None shows all.
+    """
+    def __init__(self, labels, top_k=None):
+        self.labels = labels
+        self.top_k = top_k
+        self._display = {}  # dimension -> (the labels the display labels were computed for, display labels)
+
+    def display_labels(self, dimension):
+        """
+        Returns the display labels of a dimension, indexed like its labels.
+        """
+        labels = self.labels[dimension]
+        cached = self._display.get(dimension)
+        if cached is None or cached[0] is not labels:
+            cached = self._display[dimension] = (labels, np.array([display_label(label) for label in labels], dtype=object))
+        return cached[1]
+
+    def _shown(self, totals):
+        """
+        Returns the codes of the values that are shown (with rows, in the order of the labels) and the codes of those
+        summed into the 'other' bucket (None if there is none).
+        """
+        present = np.flatnonzero(totals)
+        if self.top_k is None or len(present) <= self.top_k:
+            return present, None
+        top = np.sort(present[np.argsort(-totals[present], kind='stable')[:self.top_k]]) # ties keep the order of the labels
+        return top, np.setdiff1d(present, top, assume_unique=True)
+
+    def _axis(self, counts, dimension, axis):
+        """
+        Reduces one axis of the counts to the values that are shown, plus the 'other' bucket.
+
+        Returns:
+        - tuple: The reduced counts and the display labels along that axis.
+        """
+        shown, other = self._shown(counts.sum(axis=1 - axis))
+        labels = list(self.display_labels(dimension)[shown])
+        reduced = counts.take(shown, axis=axis)
+        if other is not None:
+            reduced = np.concatenate([reduced, counts.take(other, axis=axis).sum(axis=axis, keepdims=True)], axis=axis)
+            labels.append(f'other ({len(other)} values)')
+        return reduced, labels
+
+    def table(self, counts, dimension, dimension2):
+        """
+        Builds the contingency table of two dimensions.
+
+        Args:
+        - counts (np.ndarray): Counts with one row per label of dimension and one column per label of dimension2.
+        - dimension (str), dimension2 (str): The dimensions.
+        Returns:
+        - tuple: The display labels of the shown values of dimension (the x axis), those of dimension2 (the y axis)
+          and the counts as a matrix with one row per y label and one column per x label.
+        """
+        counts, x = self._axis(counts, dimension, 0)
+        counts, y = self._axis(counts, dimension2, 1)
+        return x, y, counts.T
@@ -0,0 +1,249 @@
+"""
+This module contains a pre-aggregated count cube over the filter dimensions of the shark incident data.
+
+The rows are grouped once by all dimensions (the dropdown columns plus the slider columns), which gives the
+base cuboid: one cell per distinct combination of values with the number of rows in it. A count for any
+filter state, grouped by one or two dimensions (bar charts, heatmap) or by year and month (timeline), is
+then a sum over the matching cells instead of a scan over the rows.
+
+A query only needs the dimensions it groups by or filters on, so coarser cuboids, with the other dimensions
+summed out, are derived from the base cuboid on first use and kept in an LRU cache.
+
+Appended rows (see jbi100_app/ingest.py) are grouped into cells of their own, which are appended to the base
+cuboid and merged into the cached cuboids. Cells may therefore occur more than once, which the sums do not
+mind; the base cuboid is regrouped when it doubled in length.
+"""
+import numpy as np
+import pandas as pd
+from .growable import GrowableArray
+from .lru import LRUCache
+
+
+def _smallest_int(n_values):
+    """
+    Returns the smallest signed integer type that can hold the codes 0..n_values.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def group_codes(codes, sizes, weights=None):
+    """
+    Groups rows (or cells) by their combination of codes.
+
+    Args:
+    - codes (list): One integer code array per dimension.
+    - sizes (list): Number of distinct codes per dimension.
+    - weights (np.ndarray): Count of each row, None counts every row once.
+    Returns:
+    - list: One code array per dimension with the codes of each group.
+    - np.ndarray: Number of rows (sum of weights) per group.
+    """
+    length = len(weights) if weights is not None else (len(codes[0]) if codes else 0)
+    if not codes:
+        return [], np.array([weights.sum() if weights is not None else length], dtype=np.int64)
+    if np.prod([float(size) for size in sizes]) < 2 ** 62: # one combined key per row, decoded again below
+        key = np.zeros(length, dtype=np.int64)
+        for code, size in zip(codes, sizes):
+            key = key * size + code
+        keys, inverse = np.unique(key, return_inverse=True)
+        group_codes = []
+        for size in reversed(sizes):
+            group_codes.append(keys % size)
+            keys = keys // size
+        group_codes.reverse()
+    else:
+        stacked, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        group_codes = [stacked[:, i] for i in range(len(codes))]
+    counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(group_codes[0])).astype(np.int64)
+    return [code.astype(_smallest_int(size)) for code, size in zip(group_codes, sizes)], counts
+
+
+class CountCube:
+    """
+    Count cube over categorical dimensions and numeric range dimensions.
+
+    Args:
+    - df (pd.DataFrame): The data.
+    - dimensions (iterable): Categorical columns, filtered by lists of values.
+    - range_dimensions (iterable): Numeric columns, filtered by ranges [low, high] (and optionally the missing values).
+    - cuboid_cache_mb (float): Memory budget of the derived cuboids.
+    """
+    def __init__(self, df, dimensions, range_dimensions=(), cuboid_cache_mb=64):
+        self.n_rows = len(df)
+        self.dimensions = list(dimensions) + list(range_dimensions)
+        self.range_dimensions = set(range_dimensions)
+        self.labels = {}  # dimension -> sorted distinct values, a missing value (if any) is the last label
+        self._row_codes = {}  # dimension -> code of every row
+        for dimension in self.dimensions:
+            codes, self.labels[dimension] = self._factorize(dimension, df[dimension])
+            self._row_codes[dimension] = GrowableArray(codes)
+        codes, cell_counts = group_codes([self._row_codes[d].values for d in self.dimensions], self.sizes(self.dimensions))
+        self._cells = {dimension: GrowableArray(code) for dimension, code in zip(self.dimensions, codes)}  # dimension -> code of every cell of the base cuboid
+        self._cell_counts = GrowableArray(cell_counts)
+        self._grouped_cells = len(cell_counts)  # number of cells when the base cuboid was last grouped
+        self.cuboid_cache = LRUCache(int(cuboid_cache_mb * 1e6))  # dimensions -> derived cuboid
+
+    def _factorize(self, dimension, values):
+        """
+        Returns the code of every value and the sorted labels of a dimension.
+        """
+        codes, labels = pd.factorize(values, sort=True, use_na_sentinel=True)
+        labels = np.asarray(labels)
+        if (codes < 0).any(): # missing values get their own label at the end
+            labels = labels.astype(labels.dtype if labels.dtype.kind == 'f' else float) if dimension in self.range_dimensions else labels.astype(object)
+            labels = np.append(labels, labels.dtype.type(np.nan)) # in the dtype of the labels, so float32 values are compared in float32
+            codes = np.where(codes < 0, len(labels) - 1, codes)
+        return codes.astype(_smallest_int(len(labels))), labels
+
+    @property
+    def row_codes(self):
+        """
+        Maps every dimension to the code of every row.
+        """
+        return {dimension: codes.values for dimension, codes in self._row_codes.items()}
+
+    @property
+    def cells(self):
+        """
+        Maps every dimension to the code of every cell of the base cuboid.
+        """
+        return {dimension: codes.values for dimension, codes in self._cells.items()}
+
+    @property
+    def cell_counts(self):
+        """
+        The number of rows in every cell of the base cuboid.
+        """
+        return self._cell_counts.values
+
+    def append(self, df):
+        """
+        Appends rows to the cube, in amortized O(rows appended + size of the cached cuboids).
+
+        A value that a dimension did not have yet gets a label in sorted order, which renumbers the codes of that
+        dimension and clears the cached cuboids (O(rows), but only for values never seen before).
+
+        Args:
+        - df (pd.DataFrame): The new rows, with a column per dimension.
+        """
+        batch = {dimension: self._append_codes(dimension, np.asarray(df[dimension])) for dimension in self.dimensions}
+        codes, counts = group_codes([batch[d] for d in self.dimensions], self.sizes(self.dimensions))
+        for dimension, code in zip(self.dimensions, codes):
+            self._cells[dimension].append(code)
+        self._cell_counts.append(counts)
+        self.n_rows += len(df)
+        if len(self._cell_counts) > 2 * self._grouped_cells:
+            codes, counts = group_codes([self._cells[d].values for d in self.dimensions], self.sizes(self.dimensions), weights=self.cell_counts)
+            self._cells = {dimension: GrowableArray(code) for dimension, code in zip(self.dimensions, codes)}
+            self._cell_counts = GrowableArray(counts)
+            self._grouped_cells = len(counts)
+        def merge(dimensions, cuboid): # adds the cells of the new rows to a derived cuboid
+            cells, counts = cuboid
+            if not dimensions: # the total, the new rows have no codes to group
+                return cells, counts + len(df)
+            codes, batch_counts = group_codes([batch[d] for d in dimensions], self.sizes(dimensions))
+            codes, counts = group_codes([np.concatenate([cells[d], code]) for d, code in zip(dimensions, codes)], self.sizes(dimensions),
+                                        weights=np.concatenate([counts, batch_counts]))
+            return dict(zip(dimensions, codes)), counts
+        self.cuboid_cache.transform(merge)
+
+    def _append_codes(self, dimension, values):
+        """
+        Appends the codes of new values to the row codes of a dimension and returns them, adding labels for values it did not have yet.
+        """
+        codes = pd.Index(self.labels[dimension]).get_indexer(values)
+        if (codes < 0).any():
+            old = self.labels[dimension]
+            _, self.labels[dimension] = self._factorize(dimension, np.concatenate([old, values[codes < 0]]))
+            mapping = pd.Index(self.labels[dimension]).get_indexer(old).astype(_smallest_int(len(self.labels[dimension])))
+            self._row_codes[dimension].remap(mapping)
+            self._cells[dimension].remap(mapping)
+            self.cuboid_cache.clear()
+            codes = pd.Index(self.labels[dimension]).get_indexer(values)
+        self._row_codes[dimension].append(codes)
+        return codes.astype(self._row_codes[dimension].values.dtype)
+
+    def sizes(self, dimensions):
+        """
+        Returns the number of labels of each of the given dimensions.
+        """
+        return [len(self.labels[dimension]) for dimension in dimensions]
+
+    def _cuboid(self, dimensions):
+        """
+        Returns the cuboid over the given dimensions (a tuple), derived from the base cuboid on first use.
+        """
+        if list(dimensions) == self.dimensions:
+            return self.cells, self.cell_counts
+        def derive():
+            codes, counts = group_codes([self.cells[d] for d in dimensions], self.sizes(dimensions), weights=self.cell_counts)
+            return dict(zip(dimensions, codes)), counts
+        return self.cuboid_cache.get_or_compute(dimensions, derive)
+
+    def _label_filters(self, selections, ranges):
+        """
+        Turns a filter state into a boolean lookup table over the labels of every filtered dimension.
+        Dimensions whose filter keeps every label are left out.
+        """
+        filters = {}
+        for dimension, values in selections.items():
+            if values:
+                keep = pd.Index(self.labels[dimension]).isin(list(values))
+                if not keep.all():
+                    filters[dimension] = keep
+        for dimension, (low, high, include_missing) in ranges.items():
+            labels = self.labels[dimension]
+            with np.errstate(invalid='ignore'):
+                keep = (labels >= labels.dtype.type(low)) & (labels <= labels.dtype.type(high))
+            if include_missing:
+                keep |= np.isnan(labels)
+            if not keep.all():
+                filters[dimension] = keep
+        return filters
+
+    def counts(self, group_by, selections=None, ranges=None):
+        """
+        Counts the rows that pass a filter state, grouped by the given dimensions.
+
+        Args:
+        - group_by (list): Dimensions to group by.
+        - selections (dict): Maps a categorical dimension to the list of selected values, an empty list or None means no filter.
+        - ranges (dict): Maps a range dimension to a tuple (low, high, include_missing).
+        Returns:
+        - np.ndarray: Counts with one axis per group_by dimension, indexed by the codes of `labels`.
+        """
+        filters = self._label_filters(selections or {}, ranges or {})
+        dimensions = tuple(d for d in self.dimensions if d in group_by or d in filters) # in cube order, so the cuboid is shared between queries
+        cells, cell_counts = self._cuboid(dimensions)
+        keep = np.ones(len(cell_counts), dtype=bool)
+        for dimension, lookup in filters.items():
+            keep &= lookup[cells[dimension]]
+        return self._bincount([cells[d][keep] for d in group_by], group_by, cell_counts[keep])
+
+    def row_counts(self, group_by, positions):
+        """
+        Counts the given rows (for example the rows selected on the map), grouped by the given dimensions.
+
+        Args:
+        - group_by (list): Dimensions to group by.
+        - positions (np.ndarray): Positions of the rows to count.
+        Returns:
+        - np.ndarray: Counts with one axis per group_by dimension, indexed by the codes of `labels`.
+        """
+        if not group_by: # no codes to count the rows by
+            return np.array(len(positions), dtype=np.int64)
+        return self._bincount([self.row_codes[d][positions] for d in group_by], group_by)
+
+    def _bincount(self, codes, group_by, weights=None):
+        """
+        Sums the weights per combination of codes into a dense array with one axis per dimension.
+        """
+        sizes = self.sizes(group_by)
+        key = np.zeros(len(codes[0]) if codes else (len(weights) if weights is not None else 0), dtype=np.int64)
+        for code, size in zip(codes, sizes):
+            key = key * size + code
+        counts = np.bincount(key, weights=weights, minlength=int(np.prod(sizes)))
+        return counts.astype(np.int64).reshape(sizes)
@@ -1,21 +1,51 @@
 """
-This module contains a function to read and process the shark attack data from an Excel file.
+This module contains functions to read and process the shark attack data from an Excel file.
 """
+import json
+import os
 import pandas as pd
+from .cache import MANIFEST_NAME, cache_key, load_frame, save_frame, remove_stale_entries
+from .config import DATA_PATH, CACHE_DIR, USE_DATA_CACHE, DATASET_OVERRIDE
 
+# Version of the cleaning rules in clean_data, bump it whenever these rules change so the cached data is rebuilt
+CLEANING_VERSION = 3
 
-def get_data():
+# Compact dtypes of the cleaned data, all string columns become categoricals (see apply_schema)
+COLUMN_DTYPES = {
+    'index1': 'int32',
+    'Incident.month': 'int16',
+    'Incident.year': 'int16',
+    'Latitude': 'float32',
+    'Longitude': 'float32',
+    'Shark.length.m': 'float32',
+}
+
+
+def read_source(path=DATA_PATH):
+    """
+    Reads the raw shark attack data from an Excel file.
+
+    Args:
+    - path (str): Path of the Excel file, by default './jbi100_app/dataset/data_modified_new.xlsx'.
+    Returns:
+    - pd.DataFrame: The raw data, indexed by the first column of the file.
     """
-    Reads and processes shark attack data from an Excel file.
+    return pd.read_excel(path, index_col=0) # read data from excel file
+
+
+def clean_data(df):
+    """
+    Processes the raw shark attack data.
     
     The function performs the following operations:
-    - Reads data from an Excel file located at './jbi100_app/dataset/data_modified_new.xlsx'.
     - Creates a new column 'index1' with the index values for selection highlights in the app.
     - Fills missing values in 'Shark.common.name', 'Victim.activity', 'Injury.severity', 'Victim.gender', 
       'Data.source', 'Provoked/unprovoked', and 'Shark.full.name' columns with "unknown".
     - Standardizes values in 'Victim.injury' and 'Injury.severity' columns.
     - Removes commas from 'Incident.year' column and converts it to integer type.
+    - Converts 'Latitude' and 'Longitude' to numbers, a few cells are text with stray (non-breaking) spaces or a trailing dot.
     - Creates a new column 'Incident.date' with the date of the incident, set to the first day of the month.
+    - Applies the compact dtypes of the schema, see apply_schema.
     
     Additionally, the excel file was manually modified to include the 'Shark.full.name' column as "Shark.common.name (Shark.scientific.name)", and modified:
     The Shark.full.name column was MANUALLY added and modified in the following ways:
@@ -24,10 +54,11 @@ def get_data():
     - all variations of "whaler shark ([])" were replaced by "whaler shark (Carcharhinidae)"
     - row 1223 was "lemon shark", replaced by "lemon shark (Negaprion brevirostris)"
     
+    Args:
+    - df (pd.DataFrame): The raw data as returned by read_source.
     Returns:
     - pd.DataFrame: A pandas DataFrame containing the processed shark attack data.
     """
-    df= pd.read_excel('./jbi100_app/dataset/data_modified_new.xlsx', index_col=0) # read data from excel file
     df['index1'] = df.index # create a new column with the index values, used for selection highlights in the app
     df['Shark.common.name'] = df['Shark.common.name'].fillna('unknown') # fill missing values with 'unknown'
     df['Victim.injury'] = df['Victim.injury'].replace(['injured', 'injury', 'Injured'], 'injured') # standardize injury result names
@@ -39,6 +70,76 @@ def get_data():
     df['Provoked/unprovoked'] = df['Provoked/unprovoked'].fillna('unknown') # fill missing values with 'unknown'
     df['Incident.year'] = df['Incident.year'].astype(str).str.replace(',', '').astype(int) # remove commas and convert to int
     df['Shark.full.name'] = df['Shark.full.name'].fillna('unknown') # fill missing values with 'unknown'
+    df['Latitude'] = pd.to_numeric(df['Latitude'].astype(str).str.strip().str.rstrip('.')) # strip spaces and trailing dots and convert to float
+    df['Longitude'] = pd.to_numeric(df['Longitude'].astype(str).str.strip().str.rstrip('.')) # strip spaces and trailing dots and convert to float
     df2=pd.DataFrame({'month':df['Incident.month'], 'year':df['Incident.year']}) # create an auxiliary dataframe with the month and year columns
     df['Incident.date']=pd.to_datetime(df2[['year','month']].assign(day=1)) # create a new column with the date of the incident, set to first day of the month
+    return apply_schema(df)
+
+
+def apply_schema(df):
+    """
+    Converts the columns of the cleaned data to compact dtypes: the string columns to categoricals (sorted categories,
+    so filters and charts keep the order of the values) and the columns of COLUMN_DTYPES to narrower numeric types.
+
+    Args:
+    - df (pd.DataFrame): The cleaned data.
+    Returns:
+    - pd.DataFrame: The data with the compact dtypes.
+    """
+    string_columns = [column for column in df.columns if pd.api.types.is_string_dtype(df[column])]
+    return df.astype({**{column: 'category' for column in string_columns}, **COLUMN_DTYPES})
+
+
+def load_dataset(path):
+    """
+    Reads a columnar dataset, a directory in the format of the cache entries (see jbi100_app/cache.py).
+
+    Args:
+    - path (str): Directory of the dataset, its name is the key in its manifest.
+    Returns:
+    - pd.DataFrame: The data.
+    """
+    path = os.path.normpath(os.path.abspath(path))
+    df = load_frame(os.path.dirname(path), os.path.basename(path))
+    if df is None:
+        raise FileNotFoundError(f'No columnar dataset in {path}')
+    return df
+
+
+def data_version():
+    """
+    Returns a string that identifies the data get_data() returns: the key of the cache entry of the cleaned data,
+    or the path and key of the dataset of JBI100_DATASET.
+    """
+    if DATASET_OVERRIDE:
+        path = os.path.normpath(os.path.abspath(DATASET_OVERRIDE))
+        with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as f:
+            return f'{path}:{json.load(f)["key"]}'
+    return cache_key(DATA_PATH, CLEANING_VERSION)
+
+
+def get_data(use_cache=USE_DATA_CACHE):
+    """
+    Returns the processed shark attack data.
+
+    The cleaned data is stored in a columnar cache (see jbi100_app/cache.py) the first time it is built. Later
+    calls load it from there, unless the Excel file or CLEANING_VERSION changed, in which case it is rebuilt.
+    If JBI100_DATASET is set (see DATASET_OVERRIDE in config.py), that dataset is loaded instead.
+
+    Args:
+    - use_cache (bool): Whether to use the columnar cache, if False the Excel file is always read and cleaned.
+    Returns:
+    - pd.DataFrame: A pandas DataFrame containing the processed shark attack data.
+    """
+    if DATASET_OVERRIDE:
+        return load_dataset(DATASET_OVERRIDE)
+    if not use_cache:
+        return clean_data(read_source())
+    key = cache_key(DATA_PATH, CLEANING_VERSION)
+    df = load_frame(CACHE_DIR, key)
+    if df is None:
+        df = clean_data(read_source())
+        save_frame(df, CACHE_DIR, key)
+        remove_stale_entries(CACHE_DIR, key)
     return df
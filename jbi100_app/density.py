@@ -0,0 +1,112 @@
+"""
+This module contains the server-side density aggregation of the map's heatmap tab.
+
+Instead of sending every filtered incident to the browser and letting it compute the kernel density, the
+points inside the visible part of the map (the viewport) are counted in a regular grid with
+`np.histogram2d`, optionally smoothed with a Gaussian kernel, and only the non-empty grid cells are sent,
+as weighted points of a density map. The number of cells, and so the payload, is bounded by the grid size,
+however many incidents there are. Zooming in makes the cells smaller, as the grid always spans the viewport.
+"""
+import numpy as np
+
+# Size of a map tile in pixels, and the size of the map in pixels assumed when the viewport is only known by its center and zoom
+TILE_SIZE = 256
+DEFAULT_MAP_PIXELS = (1000, 500)
+
+
+def viewport_from_relayout(relayout_data):
+    """
+    Extracts the visible part of the map from the relayoutData of a map (dcc.Graph with a 'map' subplot).
+
+    Args:
+    - relayout_data (dict): The relayoutData, with 'map._derived' (corner coordinates) or 'map.center' and 'map.zoom'.
+    Returns:
+    - dict: The viewport with 'bounds' [lon0, lat0, lon1, lat1] and 'zoom', or None if the relayoutData does not describe the view
+      (for example {'autosize': True}).
+    """
+    if not relayout_data:
+        return None
+    zoom = relayout_data.get('map.zoom')
+    derived = relayout_data.get('map._derived')
+    if derived and derived.get('coordinates'):
+        coordinates = np.asarray(derived['coordinates'], dtype=float)
+        (lon0, lat0), (lon1, lat1) = coordinates.min(axis=0), coordinates.max(axis=0)
+    elif 'map.center' in relayout_data and zoom is not None:
+        center = relayout_data['map.center']
+        lon0, lat0, lon1, lat1 = bounds_from_center(center['lon'], center['lat'], zoom)
+    else:
+        return None
+    return {'bounds': [float(lon0), float(lat0), float(lon1), float(lat1)], 'zoom': zoom}
+
+
+def bounds_from_center(lon, lat, zoom, pixels=DEFAULT_MAP_PIXELS):
+    """
+    Estimates the bounds of a Web Mercator map of the given size in pixels around a center.
+    """
+    degrees_per_pixel = 360 / (TILE_SIZE * 2 ** zoom)
+    half_width = pixels[0] / 2 * degrees_per_pixel
+    half_height = pixels[1] / 2 * degrees_per_pixel * np.cos(np.radians(lat)) # a degree of latitude is longer on the map away from the equator
+    return lon - half_width, max(lat - half_height, -85), lon + half_width, min(lat + half_height, 85)
+
+
+def gaussian_smooth(grid, sigma):
+    """
+    Smooths a 2D grid with a Gaussian kernel (sigma in cells), as two 1D convolutions.
+    """
+    if sigma <= 0:
+        return grid
+    offsets = np.arange(-int(np.ceil(3 * sigma)), int(np.ceil(3 * sigma)) + 1)
+    kernel = np.exp(-offsets ** 2 / (2 * sigma ** 2))
+    kernel /= kernel.sum()
+    grid = np.apply_along_axis(np.convolve, 0, grid, kernel, mode='same')
+    return np.apply_along_axis(np.convolve, 1, grid, kernel, mode='same')
+
+
+def grid_shape(bounds, bins=256, padding=0.1):
+    """
+    Returns the area the grid of a viewport spans, the viewport widened by padding on every side, as [lon0, lat0, lon1, lat1],
+    and its number of cells along the longitude and along the latitude (bins along the longer side).
+    """
+    lon0, lat0, lon1, lat1 = bounds
+    width, height = max(lon1 - lon0, 1e-9), max(lat1 - lat0, 1e-9)
+    area = [lon0 - width * padding, lat0 - height * padding, lon1 + width * padding, lat1 + height * padding]
+    bins_lon = max(1, int(round(bins * min(1.0, width / height))))
+    bins_lat = max(1, int(round(bins * min(1.0, height / width))))
+    return area, bins_lon, bins_lat
+
+
+def grid_points(counts, area, sigma=0.0):
+    """
+    Turns the counts of a grid (one row per longitude cell, one column per latitude cell) over an area into the weighted
+    points of the density map, see density_grid for what is returned.
+    """
+    lon0, lat0, lon1, lat1 = area
+    counts = gaussian_smooth(counts, sigma)
+    cells = np.nonzero(counts > (1e-3 if sigma > 0 else 0)) # smoothing spreads every point over many cells, drop the negligible ones
+    lon_edges = np.linspace(lon0, lon1, counts.shape[0] + 1)
+    lat_edges = np.linspace(lat0, lat1, counts.shape[1] + 1)
+    lon_centers = (lon_edges[:-1] + lon_edges[1:]) / 2
+    lat_centers = (lat_edges[:-1] + lat_edges[1:]) / 2
+    return lon_centers[cells[0]].astype(np.float32), lat_centers[cells[1]].astype(np.float32), counts[cells].astype(np.float32) # float32 halves the payload
+
+
+def density_grid(lon, lat, bounds, bins=256, sigma=0.0, padding=0.1):
+    """
+    Counts the points in a regular grid over the viewport.
+
+    Args:
+    - lon (np.ndarray), lat (np.ndarray): Coordinates of the points, points without coordinates are ignored.
+    - bounds (list): The viewport [lon0, lat0, lon1, lat1].
+    - bins (int): Number of cells along the longer side of the viewport.
+    - sigma (float): Standard deviation of the Gaussian smoothing in cells, 0 for none.
+    - padding (float): Fraction of the viewport added on every side, so panning a little does not show an empty border.
+    Returns:
+    - np.ndarray: Longitudes of the centers of the non-empty cells (float32, as all returned arrays).
+    - np.ndarray: Latitudes of the centers of the non-empty cells.
+    - np.ndarray: Counts (smoothed if sigma > 0) of the non-empty cells.
+    """
+    area, bins_lon, bins_lat = grid_shape(bounds, bins, padding)
+    lon0, lat0, lon1, lat1 = area
+    valid = ~(np.isnan(lon) | np.isnan(lat))
+    counts, _, _ = np.histogram2d(lon[valid], lat[valid], bins=[bins_lon, bins_lat], range=[[lon0, lon1], [lat0, lat1]])
+    return grid_points(counts, area, sigma)
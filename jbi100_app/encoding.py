@@ -0,0 +1,116 @@
+"""
+This module contains helpers that make the figures smaller on the wire.
+
+Plotly (>= 6) sends NumPy arrays as base64-encoded typed buffers ({dtype, bdata}) instead of JSON lists of
+numbers, so the figures should carry their data as compact NumPy arrays:
+
+- Coordinates and marker sizes are sent as float32 instead of float64.
+- Dates are sent as milliseconds since the epoch (float64) on a date axis, instead of ISO strings.
+- The customdata of a trace, which plotly express fills with every hover column, is reduced to the columns
+  that vary within the trace. Columns with one value per trace (such as the color variable, as plotly
+  express makes one trace per color) are dictionary-encoded: their value is written into the hover
+  template of the trace once. Columns that repeat lat/lon are replaced with references to these.
+"""
+import re
+
+import numpy as np
+
+
+def epoch_ms(dates):
+    """
+    Converts dates to milliseconds since the epoch, which plotly reads as dates on an axis of type 'date'.
+
+    Args:
+    - dates (array-like): The dates (datetime64 or pandas datetimes).
+    Returns:
+    - np.ndarray: float64 milliseconds since 1970-01-01.
+    """
+    return np.asarray(dates, dtype='datetime64[ms]').astype(np.int64).astype(np.float64)
+
+
+def _is_numeric(values):
+    """
+    Returns whether an object array only holds numbers (bools excluded), so it can be sent as a typed array.
+    """
+    return all(isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_)) for value in values)
+
+
+def _hover_text(value):
+    """
+    Writes a value the way plotly shows it in a hover label (booleans as true/false).
+    """
+    return str(bool(value)).lower() if isinstance(value, (bool, np.bool_)) else str(value)
+
+
+# A reference to a customdata column in a hover template, with an optional format: %{customdata[1]} or %{customdata[1]:.2f}
+CUSTOMDATA_REFERENCE = re.compile(r'%\{customdata\[(\d+)\](:[^}]*)?\}')
+
+
+def compact_customdata(trace, keep=(0,), coordinate_format=':.5f'):
+    """
+    Removes the customdata columns of a trace that do not need to be sent per point, and updates its hover template.
+
+    - Columns that are not shown in the hover template are removed, unless they are in keep.
+    - Columns equal to the lat or lon of the points are replaced with %{lat} and %{lon}.
+    - Columns with the same value for all points are replaced with that value in the hover template.
+
+    Args:
+    - trace (plotly.basedatatypes.BaseTraceType): The trace, changed in place.
+    - keep (tuple): Columns that are always kept (for example the row id used to resolve selections).
+    - coordinate_format (str): Format of the coordinates in the hover template, if the column has no format of its own.
+    """
+    if trace.customdata is None or not len(trace.customdata):
+        return
+    customdata = np.asarray(trace.customdata, dtype=object)
+    template = trace.hovertemplate or ''
+    shown = {int(match.group(1)) for match in CUSTOMDATA_REFERENCE.finditer(template)}
+    coordinates = {axis: np.asarray(trace[axis], dtype=float) for axis in ('lat', 'lon') if axis in trace and trace[axis] is not None}
+    replacements = {}  # column -> function of the format of a reference that returns its replacement
+    kept = []
+    for i in range(customdata.shape[1]):
+        column = customdata[:, i]
+        axis = None
+        if _is_numeric(column):
+            axis = next((axis for axis, values in coordinates.items() if np.array_equal(column.astype(float), values)), None)
+        if i in keep:
+            kept.append(i)
+        elif i not in shown:
+            continue
+        elif axis is not None:
+            replacements[i] = lambda number_format, axis=axis: f'%{{{axis}{number_format or coordinate_format}}}'
+        elif all(value == column[0] for value in column):
+            replacements[i] = lambda number_format, value=column[0]: _hover_text(value)
+        else:
+            kept.append(i)
+    new_columns = {old: new for new, old in enumerate(kept)}
+    def replace(match):
+        column, number_format = int(match.group(1)), match.group(2) or ''
+        if column in replacements:
+            return replacements[column](number_format)
+        return f'%{{customdata[{new_columns[column]}]{number_format}}}'
+    trace.hovertemplate = CUSTOMDATA_REFERENCE.sub(replace, template)
+    customdata = customdata[:, kept]
+    if _is_numeric(customdata.ravel()):
+        customdata = customdata.astype(np.float64 if any(isinstance(value, (float, np.floating)) for value in customdata.ravel()) else np.int64)
+    trace.customdata = customdata
+
+
+def compact_map_figure(fig, keep=(0,)):
+    """
+    Makes the traces of a map figure smaller on the wire: float32 coordinates and marker sizes, and reduced customdata
+    (see compact_customdata).
+
+    Args:
+    - fig (plotly.graph_objs._figure.Figure): The figure, changed in place.
+    - keep (tuple): Columns of the customdata that are always kept.
+    Returns:
+    - plotly.graph_objs._figure.Figure: The figure.
+    """
+    for trace in fig.data:
+        compact_customdata(trace, keep)
+        for axis in ('lat', 'lon'):
+            if trace[axis] is not None:
+                trace[axis] = np.asarray(trace[axis], dtype=np.float32)
+        if 'marker' in trace and trace.marker.size is not None and not np.isscalar(trace.marker.size):
+            trace.marker.size = np.asarray(trace.marker.size, dtype=np.float32)
+    return fig
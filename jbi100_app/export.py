@@ -0,0 +1,118 @@
+"""
+This module contains the streaming export of the filtered (and selected) incidents as CSV or Parquet.
+
+The backend hands out the matching rows in chunks of a fixed number of rows (see `export` of the backends), and each
+chunk is encoded and sent before the next one is read. The memory of an export is about one chunk, whatever the
+number of rows:
+
+- CSV: every chunk is written as CSV text, the header with the first one.
+- Parquet: every chunk is written as a row group. The writer writes into a buffer that is emptied after each row
+  group, the footer (with the offsets of the row groups) follows the last one. Parquet needs pyarrow, which is an
+  optional dependency.
+
+The rows are a snapshot of the data when the export started, incidents ingested meanwhile are not included.
+
+The export is a plain form post, which any site could make a browser send to the dashboard (cross-site request
+forgery). So only posts from the pages of the dashboard itself are answered, see `same_origin`.
+"""
+import importlib.util
+import io
+from urllib.parse import urlsplit
+
+# Media type and file extension per export format
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def parquet_available():
+    """
+    Returns whether pyarrow, needed for the Parquet export, is installed, without importing it.
+    """
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def same_origin(headers, host):
+    """
+    Returns whether a request was sent by a page of this server: the host of its Origin header, or without one that of
+    its Referer header, is the host of the request. Browsers send at least one of them with a form post, a request
+    without either is refused.
+
+    Args:
+    - headers (werkzeug.datastructures.Headers): The headers of the request.
+    - host (str): The host (and port) the request was sent to, request.host.
+    """
+    source = headers.get('Origin') or headers.get('Referer')
+    return bool(source) and urlsplit(source).netloc == host # an opaque origin ('null') has no host
+
+
+def csv_stream(chunks):
+    """
+    Encodes chunks of rows as one CSV file.
+
+    Args:
+    - chunks (iterable): DataFrames with the same columns, their index (the UIN) is the first column.
+    Returns:
+    - generator: The CSV file in parts of UTF-8 bytes, one per chunk.
+    """
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(header=header).encode('utf-8')
+        header = False
+
+
+class _Buffer(io.RawIOBase):
+    """
+    Write-only file that keeps what was written until it is taken, so a writer can be drained while it writes.
+    """
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        """
+        Returns the bytes written since the last call.
+        """
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_stream(chunks):
+    """
+    Encodes chunks of rows as one Parquet file, a row group per chunk.
+
+    The schema is taken from the first chunk, the backends hand out chunks with the same dtypes.
+
+    Args:
+    - chunks (iterable): DataFrames with the same columns and dtypes, their index (the UIN) is stored as a column.
+    Returns:
+    - generator: The Parquet file in parts of bytes, one per row group and one with the footer.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    buffer = _Buffer()
+    writer = schema = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=True)
+                writer = pq.ParquetWriter(buffer, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=True))
+            yield buffer.take()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield buffer.take()
@@ -0,0 +1,227 @@
+"""
+This module contains a bitmap index based filter engine for the shark incident data.
+
+Instead of filtering the DataFrame column by column (which creates a new DataFrame per filter), every
+categorical column is encoded as integer codes once, and for every value of such a column a packed
+bitmap (one bit per row) is stored. Any combination of dropdown filters then is a bitwise OR over the
+bitmaps of the selected values of a column, and a bitwise AND over the columns. Only the final mask is
+unpacked and turned into row positions. The numeric range filters (sliders) use the sorted indexes of
+jbi100_app/indexes.py.
+
+New rows can be appended (see jbi100_app/ingest.py): they only set their own bits, and the bitmaps keep spare
+bytes at the end that double when they are full, so an append costs O(rows appended) amortized.
+"""
+import numpy as np
+import pandas as pd
+from .indexes import SortedIndex
+
+# A range filter that matches at most this fraction of the rows is evaluated on its row ids instead of on a mask
+SPARSE_FRACTION = 1 / 16
+
+
+class FilterEngine:
+    """
+    Bitmap index over the categorical columns of a DataFrame.
+
+    Args:
+    - df (pd.DataFrame): The data to index.
+    - columns (iterable): Names of the categorical columns that can be filtered on.
+    - numeric_columns (iterable): Names of the numeric columns that can be filtered on with a range.
+    """
+    def __init__(self, df, columns, numeric_columns=()):
+        self.n_rows = len(df)
+        self.columns = list(columns)
+        self.codes = {}  # column -> {value: position of the bitmap of that value}
+        self.bitmaps = {}  # column -> packed bitmaps, one row of bytes per value
+        self.present = {}  # column -> packed bitmap of the rows that have a value, None if no values are missing
+        self._buffers = {}  # column -> (bitmaps, present) with spare bytes, of which bitmaps and present are views
+        for column in self.columns:
+            self._index_column(column, df[column])
+        self.ranges = {column: SortedIndex(df[column]) for column in numeric_columns}  # column -> sorted index, for range filters
+
+    def _index_column(self, column, series):
+        """
+        Builds the packed bitmaps of one categorical column.
+        """
+        codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=True)
+        bitmaps = np.empty((len(uniques), self._n_bytes), dtype=np.uint8)
+        for code in range(len(uniques)):
+            bitmaps[code] = np.packbits(codes == code)
+        self.codes[column] = {value: code for code, value in enumerate(uniques)}
+        self.bitmaps[column] = bitmaps
+        self.present[column] = np.packbits(codes >= 0) if (codes < 0).any() else None
+        self._buffers[column] = (self.bitmaps[column], self.present[column])
+
+    def append(self, df):
+        """
+        Appends rows to the index, in amortized O(rows appended): values that are new to a column get a new bitmap.
+
+        Args:
+        - df (pd.DataFrame): The new rows, with the indexed columns.
+        """
+        start = self.n_rows
+        self.n_rows += len(df)
+        positions = np.arange(start, self.n_rows)
+        byte, bit = positions >> 3, (np.uint8(128) >> (positions & 7).astype(np.uint8))
+        for column in self.columns:
+            values = np.asarray(df[column], dtype=object)
+            lookup = self.codes[column]
+            missing = pd.isna(values)
+            for value in pd.unique(values[~missing]):
+                if value not in lookup:
+                    lookup[value] = len(lookup)
+            codes = np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+            bitmaps, present = self._reserve(column, start, missing.any())
+            np.bitwise_or.at(bitmaps, (codes[~missing], byte[~missing]), bit[~missing])
+            if present is not None:
+                np.bitwise_or.at(present, byte[~missing], bit[~missing])
+        for column, index in self.ranges.items():
+            index.append(df[column])
+
+    def _reserve(self, column, start, has_missing):
+        """
+        Makes room for the rows appended from position `start` on and the new values of a column, returns its
+        (bitmaps, present) buffers.
+        """
+        bitmaps, present = self._buffers[column]
+        n_values, n_bytes = len(self.codes[column]), self._n_bytes
+        if present is None and has_missing: # the first missing value: until now every row had a value
+            present = np.packbits(np.arange(self.n_rows) < start)
+        if len(bitmaps) < n_values or bitmaps.shape[1] < n_bytes or not bitmaps.flags.writeable:
+            capacity = max(n_bytes, 2 * bitmaps.shape[1])
+            grown = np.zeros((n_values, capacity), dtype=np.uint8)
+            grown[:len(bitmaps), :bitmaps.shape[1]] = bitmaps
+            bitmaps = grown
+        if present is not None and (len(present) < n_bytes or not present.flags.writeable):
+            grown = np.zeros(max(n_bytes, 2 * len(present)), dtype=np.uint8)
+            grown[:len(present)] = present
+            present = grown
+        self._buffers[column] = (bitmaps, present)
+        self.bitmaps[column] = bitmaps[:n_values, :n_bytes]
+        self.present[column] = None if present is None else present[:n_bytes]
+        return bitmaps, present
+
+    @property
+    def _n_bytes(self):
+        return (self.n_rows + 7) // 8
+
+    def _all_rows(self):
+        """
+        Returns a packed bitmap with a bit set for every row.
+        """
+        return np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def _column_bitmap(self, column, values):
+        """
+        Returns the packed bitmap of the rows whose value in `column` is one of `values`.
+
+        If more than half of the values of the column are selected, the complement of the unselected values
+        is used instead, so at most half of the bitmaps of a column are combined.
+        """
+        lookup = self.codes[column]
+        selected = {lookup[value] for value in values if value in lookup}
+        bitmaps = self.bitmaps[column]
+        if len(selected) * 2 <= len(lookup):
+            if not selected:
+                return np.zeros(self._n_bytes, dtype=np.uint8)
+            return np.bitwise_or.reduce(bitmaps[sorted(selected)], axis=0)
+        unselected = sorted(set(range(len(lookup))) - selected)
+        bitmap = self._all_rows() if self.present[column] is None else self.present[column].copy()
+        if unselected:
+            bitmap &= ~np.bitwise_or.reduce(bitmaps[unselected], axis=0)
+        return bitmap
+
+    def _selection_bitmap(self, selections):
+        """
+        Returns the packed bitmap of the rows that pass all dropdown filters, or None if no dropdown filter is set.
+        """
+        bitmap = None
+        for column, values in selections.items():
+            if not values:
+                continue
+            column_bitmap = self._column_bitmap(column, values)
+            bitmap = column_bitmap if bitmap is None else bitmap & column_bitmap
+        return bitmap
+
+    def positions(self, selections, ranges=None):
+        """
+        Evaluates a filter state and returns the positions of the matching rows.
+
+        Ranges that match every row are skipped. If the most selective range matches only a small part of the
+        rows, its row ids (found with two binary searches) are used as candidates, and the other ranges and the
+        dropdown bitmap are only tested for those candidates. Otherwise all filters are evaluated as masks.
+
+        Args:
+        - selections (dict): Maps a categorical column to the list of selected values, an empty list or None means no filter.
+        - ranges (dict): Maps a numeric column to a tuple (low, high, include_missing), rows are kept if their value
+          lies within [low, high] or, if include_missing is True, if the value is missing.
+        Returns:
+        - np.ndarray: Sorted integer positions of the rows that pass all filters, usable with `df.iloc`.
+        """
+        bitmap = self._selection_bitmap(selections)
+        active = [(self.ranges[column], bounds) for column, bounds in (ranges or {}).items() if not self.ranges[column].covers_all(*bounds)]
+        active.sort(key=lambda item: item[0].count(*item[1]))
+
+        if active and active[0][0].count(*active[0][1]) <= self.n_rows * SPARSE_FRACTION:
+            index, bounds = active[0]
+            positions = np.sort(index.range(*bounds))
+            for index, bounds in active[1:]:
+                positions = positions[index.contains(positions, *bounds)]
+            if bitmap is not None:
+                positions = positions[((bitmap[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)] # test the bit of each candidate
+            return positions
+
+        mask = np.ones(self.n_rows, dtype=bool) if bitmap is None else np.unpackbits(bitmap, count=self.n_rows).view(bool)
+        for index, bounds in active:
+            mask &= index.mask(*bounds)
+        return np.flatnonzero(mask)
+
+
+def canonical_filter_key(filter_state, decimals=6):
+    """
+    Builds a canonical, hashable key of a filter state, so that equivalent states share a cache entry.
+
+    - The selected values of a dropdown are sorted and deduplicated, None and [] both mean no filter.
+    - Slider bounds are rounded to `decimals` decimals, so 2.6 and 2.6000000000000005 are the same bound.
+
+    Args:
+    - filter_state (dict): Filter state with 'selections' (column -> values) and 'ranges' (column -> [low, high, include_missing]).
+    - decimals (int): Number of decimals slider bounds are rounded to.
+    Returns:
+    - tuple: The key.
+    """
+    selections = tuple(sorted(
+        (column, tuple(sorted(set(values))))
+        for column, values in filter_state['selections'].items() if values
+    ))
+    ranges = tuple(sorted(
+        (column, round(float(low), decimals), round(float(high), decimals), bool(include_missing))
+        for column, (low, high, include_missing) in filter_state['ranges'].items()
+    ))
+    return selections, ranges
+
+
+def encode_positions(positions, n_rows):
+    """
+    Stores row positions compactly: as int32 row ids for sparse results, as a packed bitmap for dense ones.
+
+    Args:
+    - positions (np.ndarray): Sorted row positions.
+    - n_rows (int): Number of rows in the data.
+    Returns:
+    - np.ndarray: int32 row ids, or a uint8 packed bitmap if that is smaller (more than 1 in 32 rows).
+    """
+    if len(positions) * 32 > n_rows:
+        mask = np.zeros(n_rows, dtype=bool)
+        mask[positions] = True
+        return np.packbits(mask)
+    return positions.astype(np.int32)
+
+
+def decode_positions(encoded, n_rows):
+    """
+    Returns the sorted row positions stored with encode_positions.
+    """
+    if encoded.dtype == np.uint8:
+        return np.flatnonzero(np.unpackbits(encoded, count=n_rows))
+    return encoded
@@ -0,0 +1,151 @@
+"""
+This module contains growable arrays and frames, the storage that new rows are appended to (see jbi100_app/ingest.py).
+
+NumPy arrays and DataFrames have a fixed length, appending rows to them copies all rows. A GrowableArray keeps its
+values in a buffer with spare capacity that doubles when it is full, so appending n values costs O(n) amortized,
+whatever the length of the array. Its `values` are a view of the used part of the buffer: rows are only ever
+added after the end, so views taken before an append keep showing the rows they showed.
+
+A GrowableFrame stores every column of a DataFrame as a GrowableArray (categoricals as their codes) and builds
+the DataFrame from views of the buffers, which costs O(columns) and copies no rows.
+"""
+import numpy as np
+import pandas as pd
+
+# Capacity of the first buffer of an array that grows from (almost) nothing
+MIN_CAPACITY = 16
+
+
+class GrowableArray:
+    """
+    Array with spare capacity at the end, rows (along the first axis) can be appended in amortized O(rows appended).
+
+    The initial values are used as the buffer without a copy, the first append that does not fit (or that finds the
+    buffer read-only, e.g. memory-mapped) moves the values to a new buffer of twice the size.
+
+    Args:
+    - values (np.ndarray): The initial values.
+    """
+    def __init__(self, values):
+        self._buffer = np.asarray(values)
+        self.length = len(self._buffer)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def values(self):
+        """
+        The appended values, a view of the buffer.
+        """
+        return self._buffer[:self.length]
+
+    def reserve(self, length):
+        """
+        Makes sure the buffer is writable and can hold `length` rows.
+        """
+        if length <= len(self._buffer) and self._buffer.flags.writeable:
+            return
+        buffer = np.zeros((max(length, 2 * len(self._buffer), MIN_CAPACITY),) + self._buffer.shape[1:], dtype=self._buffer.dtype)
+        buffer[:self.length] = self.values
+        self._buffer = buffer
+
+    def append(self, values):
+        """
+        Appends values after the end, cast to the dtype of the array.
+
+        Args:
+        - values (array-like): The values, with the shape of a row of the array beyond the first axis.
+        """
+        values = np.asarray(values)
+        end = self.length + len(values)
+        self.reserve(end)
+        self._buffer[self.length:end] = values
+        self.length = end
+
+    def remap(self, mapping):
+        """
+        Replaces every value v by mapping[v], for integer codes whose meaning changed; the dtype follows mapping.
+        """
+        self._buffer = mapping[self.values]
+        self.length = len(self._buffer)
+
+
+def _codes_dtype(n_categories):
+    """
+    Returns the integer type pandas uses for the codes of a categorical with n_categories categories.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class GrowableFrame:
+    """
+    DataFrame storage that rows can be appended to, see the module documentation.
+
+    Categorical columns keep sorted categories: values that are not a category yet are inserted in order, which
+    renumbers the codes of the column (O(rows), but only when a batch brings a value never seen before).
+
+    Args:
+    - df (pd.DataFrame): The initial data, its columns are used without a copy until the first append.
+    """
+    def __init__(self, df):
+        self.index = GrowableArray(df.index.to_numpy())
+        self.index_name = df.index.name
+        self.columns = {}  # column -> GrowableArray of the values, or of the codes for categoricals
+        self.dtypes = {}  # column -> dtype of the column
+        for column in df.columns:
+            series = df[column]
+            self.dtypes[column] = series.dtype
+            self.columns[column] = GrowableArray(series.array.codes if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy())
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self):
+        """
+        Returns the data as a DataFrame of views of the buffers.
+        """
+        columns = {}
+        for column, values in self.columns.items():
+            dtype = self.dtypes[column]
+            if isinstance(dtype, pd.CategoricalDtype):
+                columns[column] = pd.Categorical.from_codes(values.values, dtype=dtype, validate=False)
+            else:
+                columns[column] = values.values
+        return pd.DataFrame(columns, index=pd.Index(self.index.values, name=self.index_name, copy=False), copy=False)
+
+    def _category_codes(self, column, values):
+        """
+        Returns the codes of values in a categorical column, new values are added to its categories first.
+        """
+        dtype = self.dtypes[column]
+        categories = dtype.categories
+        codes = categories.get_indexer(values)
+        new = pd.unique(values[(codes < 0) & pd.notna(values)])
+        if len(new):
+            merged = categories.append(pd.Index(new, dtype=categories.dtype)).sort_values()
+            mapping = merged.get_indexer(categories).astype(_codes_dtype(len(merged)))
+            self.columns[column].remap(np.append(mapping, mapping.dtype.type(-1))) # code -1 (missing) indexes the last entry and stays -1
+            self.dtypes[column] = dtype = pd.CategoricalDtype(merged, ordered=dtype.ordered)
+            codes = dtype.categories.get_indexer(values)
+        return codes
+
+    def append(self, df):
+        """
+        Appends rows. Columns of the table that df lacks are missing values in the new rows, other columns of df are ignored.
+
+        Args:
+        - df (pd.DataFrame): The rows, with the dtypes of the table (see apply_schema in jbi100_app/data.py).
+        """
+        for column, values in self.columns.items():
+            if isinstance(self.dtypes[column], pd.CategoricalDtype):
+                batch = np.asarray(df[column], dtype=object) if column in df.columns else np.full(len(df), None, dtype=object)
+                values.append(self._category_codes(column, batch))
+            elif column in df.columns:
+                values.append(df[column].to_numpy())
+            else:
+                values.append(np.full(len(df), np.nan))
+        self.index.append(df.index.to_numpy())
@@ -0,0 +1,290 @@
+"""
+This module contains indexes over the numeric columns of the shark incident data.
+
+A SortedIndex keeps the row positions of a column in the order of their values, so a range query is two
+binary searches (`np.searchsorted`) followed by a slice, instead of a comparison over every row.
+A GridIndex buckets the rows by location in a uniform grid, so a box or polygon on the map only has to
+look at the rows in the grid cells it overlaps.
+
+Both indexes accept appended rows (see jbi100_app/ingest.py) at a cost that depends on the number of rows
+appended, not on the number of rows indexed.
+"""
+import numpy as np
+from .growable import GrowableArray
+
+# Appended rows are kept out of the grid of a GridIndex until they are this fraction of the rows in the grid
+GRID_REBUILD_FRACTION = 0.25
+
+
+class SortedIndex:
+    """
+    Sorted-order index over a numeric column, missing values are tracked separately.
+
+    Appended rows (see `append`) are sorted into runs of their own instead of into the sorted order of all rows.
+    Runs of about the same size are merged, like the digits of a binary counter, so there are O(log rows) runs to
+    search and every row is merged O(log rows) times.
+
+    Args:
+    - values (array-like): The values of the column, NaN marks a missing value.
+    """
+    def __init__(self, values):
+        values = np.asarray(values)
+        if not np.issubdtype(values.dtype, np.floating):
+            values = values.astype(float)
+        missing = np.isnan(values)
+        self._values = GrowableArray(values)  # the column in row order
+        self._missing = GrowableArray(np.flatnonzero(missing))  # positions of the rows without a value
+        order = np.flatnonzero(~missing)
+        order = order[np.argsort(values[order], kind='stable')]
+        self.runs = [(order, values[order])]  # (positions of rows with a value sorted by value, their values), largest run first
+
+    @property
+    def values(self):
+        return self._values.values
+
+    @property
+    def missing(self):
+        return self._missing.values
+
+    def __len__(self):
+        return len(self._values)
+
+    def append(self, values):
+        """
+        Appends rows to the index, in amortized O(rows appended * log(rows)).
+
+        Args:
+        - values (array-like): The values of the new rows, NaN marks a missing value.
+        """
+        values = np.asarray(values, dtype=self.values.dtype)
+        start = len(self)
+        self._values.append(values)
+        missing = np.isnan(values)
+        self._missing.append(start + np.flatnonzero(missing))
+        order = np.flatnonzero(~missing)
+        if not len(order):
+            return
+        order = order[np.argsort(values[order], kind='stable')]
+        self.runs.append((start + order, values[order]))
+        while len(self.runs) > 1 and len(self.runs[-2][0]) <= 2 * len(self.runs[-1][0]):
+            (order0, values0), (order1, values1) = self.runs[-2:]
+            merged = np.concatenate([values0, values1])
+            sort = np.argsort(merged, kind='stable') # merges the two sorted runs
+            self.runs[-2:] = [(np.concatenate([order0, order1])[sort], merged[sort])]
+
+    def bounds(self):
+        """
+        Returns the smallest and the largest value of the column, or None if no row has a value.
+        """
+        runs = [sorted_values for _, sorted_values in self.runs if len(sorted_values)]
+        if not runs:
+            return None
+        return min(values[0] for values in runs), max(values[-1] for values in runs)
+
+    def _bounds(self, sorted_values, low, high):
+        """
+        Returns the slice of a run with the rows whose value lies within [low, high].
+        """
+        dtype = sorted_values.dtype.type # compare in the precision of the column
+        start = np.searchsorted(sorted_values, dtype(low), side='left')
+        stop = np.searchsorted(sorted_values, dtype(high), side='right')
+        return start, max(start, stop)
+
+    def count(self, low, high, include_missing=False):
+        """
+        Returns the number of rows with a value within [low, high] (plus the rows without a value if include_missing is True).
+        """
+        count = sum(stop - start for start, stop in (self._bounds(sorted_values, low, high) for _, sorted_values in self.runs))
+        return count + (len(self.missing) if include_missing else 0)
+
+    def covers_all(self, low, high, include_missing=False):
+        """
+        Returns whether the range [low, high] matches every row, in which case it does not need to be applied.
+        """
+        return self.count(low, high, include_missing) == len(self)
+
+    def range(self, low, high, include_missing=False):
+        """
+        Returns the positions of the rows with a value within [low, high].
+
+        Args:
+        - low (float): Lower bound, inclusive.
+        - high (float): Upper bound, inclusive.
+        - include_missing (bool): Whether rows without a value are included as well.
+        Returns:
+        - np.ndarray: Row positions in order of value per run (rows without a value last), not sorted by position.
+        """
+        parts = []
+        for order, sorted_values in self.runs:
+            start, stop = self._bounds(sorted_values, low, high)
+            parts.append(order[start:stop])
+        if include_missing:
+            parts.append(self.missing)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def contains(self, positions, low, high, include_missing=False):
+        """
+        Tests for the given rows whether their value lies within [low, high].
+
+        Args:
+        - positions (np.ndarray): Row positions to test.
+        - low (float), high (float), include_missing (bool): The range, see `range`.
+        Returns:
+        - np.ndarray: Boolean array with one entry per position.
+        """
+        dtype = self.values.dtype.type
+        values = self.values[positions]
+        result = (values >= dtype(low)) & (values <= dtype(high))
+        if include_missing:
+            result |= np.isnan(values)
+        return result
+
+    def mask(self, low, high, include_missing=False):
+        """
+        Returns the boolean mask over all rows of the range [low, high], see `contains`.
+        """
+        return self.contains(slice(None), low, high, include_missing)
+
+
+def points_in_polygon(x, y, polygon):
+    """
+    Tests which points lie inside a polygon (even-odd rule, vectorized over the points).
+
+    Args:
+    - x (np.ndarray), y (np.ndarray): Coordinates of the points.
+    - polygon (array-like): Vertices of the polygon as (x, y) pairs, the polygon is closed implicitly.
+    Returns:
+    - np.ndarray: Boolean array with one entry per point.
+    """
+    polygon = np.asarray(polygon, dtype=float)
+    inside = np.zeros(len(x), dtype=bool)
+    previous = polygon[-1]
+    with np.errstate(divide='ignore', invalid='ignore'): # horizontal edges never cross, their division is not used
+        for vertex in polygon:
+            crosses = ((vertex[1] > y) != (previous[1] > y)) & (x < (previous[0] - vertex[0]) * (y - vertex[1]) / (previous[1] - vertex[1]) + vertex[0])
+            inside ^= crosses
+            previous = vertex
+    return inside
+
+
+class GridIndex:
+    """
+    Uniform grid index over point coordinates (longitude, latitude), rows without coordinates are left out.
+
+    The rows are sorted by grid cell (cells are numbered row by row), so the rows of a horizontal run of
+    cells are one contiguous slice of `order`.
+
+    Args:
+    - x (array-like): Longitudes.
+    - y (array-like): Latitudes.
+    - points_per_cell (int): Average number of rows per cell the grid resolution is chosen for.
+    """
+    def __init__(self, x, y, points_per_cell=16):
+        self.points_per_cell = points_per_cell
+        self._x = GrowableArray(np.asarray(x, dtype=float))
+        self._y = GrowableArray(np.asarray(y, dtype=float))
+        self._build()
+
+    @property
+    def x(self):
+        return self._x.values
+
+    @property
+    def y(self):
+        return self._y.values
+
+    def _build(self):
+        """
+        Sorts all rows with coordinates into a grid sized for them.
+        """
+        valid = np.flatnonzero(~(np.isnan(self.x) | np.isnan(self.y)))
+        if len(valid):
+            self.x_min, self.x_max = self.x[valid].min(), self.x[valid].max()
+            self.y_min, self.y_max = self.y[valid].min(), self.y[valid].max()
+        else:
+            self.x_min = self.x_max = self.y_min = self.y_max = 0.0
+        self.grid_x0, self.grid_y0 = self.x_min, self.y_min  # origin of the grid, the extent (x_min etc.) grows with appended rows
+        self.n_cells = max(1, int(np.sqrt(len(valid) / self.points_per_cell)))  # cells per side
+        self.cell_width = max(self.x_max - self.x_min, 1e-9) / self.n_cells
+        self.cell_height = max(self.y_max - self.y_min, 1e-9) / self.n_cells
+        cells = self._cell(self.x[valid], self.y[valid])
+        sort = np.argsort(cells, kind='stable')
+        self.order = valid[sort]  # row positions sorted by cell
+        self.starts = np.searchsorted(cells[sort], np.arange(self.n_cells * self.n_cells + 1))  # first entry of each cell in order
+        self.pending = GrowableArray(np.empty(0, dtype=self.order.dtype))  # appended rows with coordinates that are not in the grid yet
+
+    def append(self, x, y):
+        """
+        Appends rows to the index. They are tested one by one in queries until there are enough of them to rebuild
+        the grid (GRID_REBUILD_FRACTION), so an append costs O(rows appended) amortized.
+
+        Args:
+        - x (array-like): Longitudes of the new rows.
+        - y (array-like): Latitudes of the new rows.
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        start = len(self.x)
+        self._x.append(x)
+        self._y.append(y)
+        valid = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+        if len(valid):
+            if not len(self.order) and not len(self.pending): # the first rows with coordinates
+                self.x_min = self.x_max = x[valid[0]]
+                self.y_min = self.y_max = y[valid[0]]
+            self.x_min, self.x_max = min(self.x_min, x[valid].min()), max(self.x_max, x[valid].max())
+            self.y_min, self.y_max = min(self.y_min, y[valid].min()), max(self.y_max, y[valid].max())
+            self.pending.append(start + valid)
+        if len(self.pending) > max(len(self.order) * GRID_REBUILD_FRACTION, self.points_per_cell):
+            self._build()
+
+    def _column(self, x):
+        return np.clip(((np.asarray(x) - self.grid_x0) / self.cell_width).astype(int), 0, self.n_cells - 1)
+
+    def _row(self, y):
+        return np.clip(((np.asarray(y) - self.grid_y0) / self.cell_height).astype(int), 0, self.n_cells - 1)
+
+    def _cell(self, x, y):
+        return self._row(y) * self.n_cells + self._column(x)
+
+    def _candidates(self, x0, y0, x1, y1):
+        """
+        Returns the rows in the grid cells that overlap the box and the appended rows that are not in the grid yet,
+        a superset of the rows inside it.
+        """
+        if x1 < self.x_min or x0 > self.x_max or y1 < self.y_min or y0 > self.y_max:
+            return np.empty(0, dtype=self.order.dtype)
+        column0, column1 = self._column(x0), self._column(x1)
+        slices = [self.order[self.starts[row * self.n_cells + column0]:self.starts[row * self.n_cells + column1 + 1]]
+                  for row in range(self._row(y0), self._row(y1) + 1)]
+        return np.concatenate(slices + [self.pending.values])
+
+    def box(self, x0, y0, x1, y1):
+        """
+        Returns the positions of the rows inside a box, in no particular order.
+
+        Args:
+        - x0 (float), y0 (float), x1 (float), y1 (float): Two opposite corners of the box.
+        Returns:
+        - np.ndarray: Row positions.
+        """
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        candidates = self._candidates(x0, y0, x1, y1)
+        x, y = self.x[candidates], self.y[candidates]
+        return candidates[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)]
+
+    def polygon(self, vertices):
+        """
+        Returns the positions of the rows inside a polygon, in no particular order.
+
+        Args:
+        - vertices (array-like): Vertices of the polygon as (x, y) pairs.
+        Returns:
+        - np.ndarray: Row positions.
+        """
+        vertices = np.asarray(vertices, dtype=float)
+        if len(vertices) < 3:
+            return np.empty(0, dtype=self.order.dtype)
+        (x0, y0), (x1, y1) = vertices.min(axis=0), vertices.max(axis=0)
+        candidates = self.box(x0, y0, x1, y1)
+        return candidates[points_in_polygon(self.x[candidates], self.y[candidates], vertices)]
@@ -0,0 +1,162 @@
+"""
+This module contains the ingestion of new incidents while the app is running.
+
+New incidents are dropped as files into a directory (JBI100_INGEST_DIR, see jbi100_app/config.py):
+
+- CSV files with the columns of the Excel file, the first column is the UIN (the index), like read_source reads them.
+- JSONL files with one incident per line, an object with the columns of the Excel file including the UIN.
+
+Every worker process polls the directory (every JBI100_INGEST_POLL_S seconds) and ingests the files it has not
+ingested yet, in the order of their names, so all workers end up with the same rows. Files are never removed or
+changed by the app: a restarted worker ingests all of them again on top of the data of get_data(). A file must be
+complete when it appears, so write it under a name starting with '.' (ignored) and rename it when it is done.
+
+The rows go through the same cleaning rules as get_data() and are appended to the table and to the structures
+derived from it (the filter engine, the spatial index and the count cube), which all support appends at a cost
+that depends on the number of new rows, not on the number of rows they hold (see jbi100_app/growable.py). The
+callbacks read the data under the read side of a ReadWriteLock, an append holds the write side, so a callback
+never sees a half appended batch.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Extensions of the files that are ingested
+INGEST_EXTENSIONS = ('.csv', '.jsonl')
+
+
+class ReadWriteLock:
+    """
+    Lock that many readers can hold at the same time, or one writer.
+
+    Once a writer waits, new readers wait for it, so a steady stream of readers (the callbacks) cannot keep a writer
+    (an ingest) waiting forever. A thread that already reads can read again (e.g. a callback that calls another
+    function that reads) without waiting, otherwise it would deadlock with the writer that waits for it to finish;
+    so can the thread that writes.
+    """
+    def __init__(self):
+        self._readers = 0
+        self._writers = 0  # waiting or writing
+        self._writing = None  # the thread that writes
+        self._local = threading.local()  # the number of nested reads of this thread
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def read(self):
+        """
+        Holds the lock for reading during the with block, after the waiting writers finished.
+        """
+        nested = getattr(self._local, 'reads', 0)
+        with self._condition:
+            if not nested and self._writing != threading.get_ident():
+                self._condition.wait_for(lambda: not self._writers)
+            self._readers += 1
+        self._local.reads = nested + 1
+        try:
+            yield
+        finally:
+            self._local.reads = nested
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """
+        Holds the lock for writing during the with block, after the current readers finished.
+        """
+        with self._condition:
+            self._writers += 1
+            self._condition.wait_for(lambda: not self._readers and self._writing is None)
+            self._writing = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = None
+                self._writers -= 1
+                self._condition.notify_all()
+
+
+def read_batch(path, index_name):
+    """
+    Reads a file of new incidents.
+
+    Args:
+    - path (str): Path of a .csv or .jsonl file, see the module documentation.
+    - index_name (str): Name of the index column (the UIN) in JSONL files.
+    Returns:
+    - pd.DataFrame: The raw incidents, indexed like the result of read_source.
+    """
+    if path.endswith('.csv'):
+        return pd.read_csv(path, index_col=0)
+    return pd.read_json(path, lines=True, dtype=False).set_index(index_name)
+
+
+class DropDirectory:
+    """
+    Polls a directory for files of new incidents and passes every new file to a function, see the module documentation.
+
+    Args:
+    - directory (str): The directory, it does not need to exist yet.
+    - ingest (callable): Function that takes the raw incidents of one file (see read_batch) and appends them.
+    - index_name (str): Name of the index column, see read_batch.
+    - poll_s (float): Seconds between two polls of the background thread.
+    """
+    def __init__(self, directory, ingest, index_name, poll_s=5.0):
+        self.directory = directory
+        self.ingest = ingest
+        self.index_name = index_name
+        self.poll_s = poll_s
+        self.ingested = set()  # names of the files that were ingested, or failed to
+        self.failed = []  # names of the files that could not be ingested
+        self.rows = 0  # number of rows ingested
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """
+        Ingests the files that appeared since the previous poll, in the order of their names.
+
+        Returns:
+        - int: Number of rows ingested.
+        """
+        with self._lock:
+            try:
+                names = sorted(name for name in os.listdir(self.directory)
+                               if name.endswith(INGEST_EXTENSIONS) and not name.startswith('.') and name not in self.ingested)
+            except FileNotFoundError:
+                return 0
+            rows = 0
+            for name in names:
+                self.ingested.add(name)
+                try:
+                    batch = read_batch(os.path.join(self.directory, name), self.index_name)
+                    self.ingest(batch)
+                except Exception: # a bad file must not stop the files after it, it is not retried
+                    logger.exception('Could not ingest %s', name)
+                    self.failed.append(name)
+                    continue
+                rows += len(batch)
+            self.rows += rows
+            return rows
+
+    def start(self):
+        """
+        Ingests the files that are already there, then keeps polling in a daemon thread.
+        """
+        self.poll()
+        def run():
+            while True:
+                time.sleep(self.poll_s)
+                try:
+                    self.poll()
+                except OSError:
+                    logger.exception('Could not poll %s', self.directory)
+        threading.Thread(target=run, name='ingest', daemon=True).start()
@@ -0,0 +1,230 @@
+"""
+This module contains the latest-only execution of the figure updates of a session, and the sharing of identical
+figure updates between sessions.
+
+When a user drags a slider or clicks quickly, the browser sends a new request for every intermediate state,
+without waiting for the previous one. Each of them would rebuild all figures, although only the last one is
+rendered, so under load stale requests pile up behind each other. LatestOnly gives every request of a session a
+sequence number and cancels the ones that a newer request of the same session superseded:
+
+- Coalescing: a request that arrives while the session has a request running, or shortly after its previous
+  request (within the window), first waits for the window. If a newer request arrived meanwhile, it is
+  cancelled without doing any work, so a burst of inputs costs about one update.
+- Cancellation: long running work calls `check` between its stages (for example between figures), which cancels
+  it as soon as a newer request of the session arrived.
+- Carrying over: a request only rebuilds the outputs of the inputs that changed, so the newer request also rebuilds
+  what the requests it superseded would have rebuilt. Every request passes the inputs it changed, and gets back the
+  union of them and of the changes of the earlier requests of the session that did not complete.
+
+A cancelled request raises Superseded, the app answers it with PreventUpdate. Requests run in the threads of the
+server, so the server must handle requests concurrently (threads, as Flask's development server does). The state
+lives in the worker process, which is enough as a session's requests normally reach the same worker.
+
+Across sessions, SingleFlight runs identical updates once: when many pages ask for the same figures at the same time
+(for example the default view, when a link to the dashboard goes around), the first request computes them and the
+requests with the same key that arrive while it runs wait for it and share its result. Once the computation is done
+the key is forgotten, so it is not a cache: later requests compute again (and find the caches of the stages warm).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Sessions without requests for this long are forgotten
+IDLE_SECONDS = 600
+
+
+class Superseded(Exception):
+    """
+    Raised in a request that a newer request of the same session superseded.
+    """
+
+
+def union_changed(changes):
+    """
+    Returns the union of sets of changed inputs, None (everything changed) if one of them is None.
+    """
+    union = set()
+    for changed in changes:
+        if changed is None:
+            return None
+        union |= changed
+    return union
+
+
+class LatestOnly:
+    """
+    Runs only the latest request of every session, see the module documentation.
+
+    Args:
+    - window_s (float): Coalescing window in seconds.
+    - enabled (bool): Whether requests are coalesced and cancelled at all.
+    """
+    def __init__(self, window_s=0.05, enabled=True):
+        self.window_s = window_s
+        self.enabled = enabled
+        self.started = 0
+        self.superseded = 0
+        self._sessions = {}  # session -> {'sequence': latest sequence number, 'arrived': time of the latest request, 'running': number of running requests,
+                             #             'pending': {sequence number: changed inputs} of the requests that did not complete}
+        self._local = threading.local()  # the (session, sequence number) of the request of this thread
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def job(self, session, changed=None):
+        """
+        Runs the with block as the latest request of a session, after the coalescing window if the session is busy.
+
+        Args:
+        - session (str): Id of the session, None runs the block without coalescing or cancellation.
+        - changed (set): The changed inputs of the request, None if everything changed.
+        Yields:
+        - set: The inputs to handle as changed: `changed` and the changed inputs of the earlier requests of the session
+          that did not complete, None if everything changed.
+        Raises:
+        - Superseded: If a newer request of the session arrived during the window (or at a `check` in the block).
+        """
+        if session is None or not self.enabled:
+            yield changed
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._forget_idle(now)
+            state = self._sessions.setdefault(session, {'sequence': 0, 'arrived': float('-inf'), 'running': 0, 'pending': {}})
+            busy = state['running'] > 0 or now - state['arrived'] < self.window_s
+            state['sequence'] += 1
+            state['arrived'] = now
+            state['running'] += 1
+            sequence = state['sequence']
+            state['pending'][sequence] = changed
+            self.started += 1
+            self._local.job = (session, sequence)
+        completed = False
+        try:
+            if busy:
+                time.sleep(self.window_s)
+            self.check()
+            with self._lock:
+                changed = union_changed(state['pending'].values())
+            yield changed
+            completed = True
+        finally:
+            self._local.job = None
+            with self._lock:
+                state['running'] -= 1
+                if completed: # its changes include those of the earlier requests
+                    for earlier in [earlier for earlier in state['pending'] if earlier <= sequence]:
+                        del state['pending'][earlier]
+
+    def check(self):
+        """
+        Raises Superseded if a newer request of the session of the current request arrived. Outside a job it does nothing.
+        """
+        job = getattr(self._local, 'job', None)
+        if job is None:
+            return
+        session, sequence = job
+        with self._lock:
+            if self._sessions[session]['sequence'] == sequence:
+                return
+            self.superseded += 1
+        raise Superseded()
+
+    def bind(self, function):
+        """
+        Returns a function that calls `function` as part of the request of the current thread, so that `check` in it
+        also cancels it when it runs in another thread (see jbi100_app/pool.py).
+        """
+        job = getattr(self._local, 'job', None)
+        def bound(*args, **kwargs):
+            previous = getattr(self._local, 'job', None)
+            self._local.job = job
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._local.job = previous
+        return bound
+
+    def _forget_idle(self, now):
+        """
+        Drops the sessions without running requests and without requests for IDLE_SECONDS, called with the lock held.
+        """
+        idle = [session for session, state in self._sessions.items() if not state['running'] and now - state['arrived'] > IDLE_SECONDS]
+        for session in idle:
+            del self._sessions[session]
+
+    def stats(self):
+        """
+        Returns the number of started and superseded requests, and the number of known sessions.
+        """
+        with self._lock:
+            return {'started': self.started, 'superseded': self.superseded, 'sessions': len(self._sessions)}
+
+
+class _Flight:
+    """
+    A running computation of SingleFlight and, once done, its result.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.succeeded = False
+
+
+class SingleFlight:
+    """
+    Runs concurrent calls with the same key once and gives all of them its result, see the module documentation.
+
+    Args:
+    - enabled (bool): Whether calls are shared at all.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.computed = 0
+        self.shared = 0
+        self._flights = {}  # key -> _Flight of the running computation
+        self._lock = threading.Lock()
+
+    def run(self, key, function):
+        """
+        Returns function(), or the result of the running call with the same key.
+
+        If the call that computes fails (for example because a newer update superseded it, see LatestOnly), its
+        exception is raised in it only, the waiting calls then compute the result themselves (one of them, again shared).
+
+        Args:
+        - key (hashable): Key of the computation, calls with equal keys must compute the same result.
+        - function (callable): Function without arguments that computes the result, which is shared read-only.
+        """
+        if not self.enabled:
+            return function()
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self.computed += 1
+            if leader:
+                try:
+                    flight.result = function()
+                    flight.succeeded = True
+                    return flight.result
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+            flight.done.wait()
+            if flight.succeeded:
+                with self._lock:
+                    self.shared += 1
+                return flight.result
+
+    def stats(self):
+        """
+        Returns the number of computed and shared results and of running computations, in the fields of LRUCache.stats
+        (a shared result is a hit, a computed one a miss), so they are exported with the caches.
+        """
+        with self._lock:
+            calls = self.computed + self.shared
+            return {'hits': self.shared, 'misses': self.computed, 'evictions': 0, 'entries': len(self._flights), 'bytes': 0,
+                    'max_bytes': 0, 'hit_rate': self.shared / calls if calls else 0.0}
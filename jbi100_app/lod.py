@@ -0,0 +1,59 @@
+"""
+This module contains the level of detail of the map's scatter tab.
+
+When there are more filtered incidents than the map may show (MAX_MAP_POINTS), only the incidents inside the
+visible part of the map (the viewport) are considered, found with the spatial grid index. If these still are
+too many, which happens when the map is zoomed out, they are merged into clusters: the viewport is divided into
+a grid, and the incidents of one grid cell with the same value of the color variable form one cluster, drawn
+at their mean location with their count. The grid is made coarser until the clusters fit within the cap, so
+the payload is bounded however many incidents there are.
+"""
+import numpy as np
+
+
+def pad_bounds(bounds, padding=0.1):
+    """
+    Widens the bounds [lon0, lat0, lon1, lat1] by a fraction of their size on every side, so panning a little does not show an empty border.
+    """
+    lon0, lat0, lon1, lat1 = bounds
+    width, height = lon1 - lon0, lat1 - lat0
+    return [lon0 - width * padding, lat0 - height * padding, lon1 + width * padding, lat1 + height * padding]
+
+
+def visible_positions(spatial_index, positions, bounds):
+    """
+    Returns the rows among the given positions that lie inside the bounds.
+
+    Args:
+    - spatial_index (GridIndex): Grid index over the longitudes and latitudes of all rows.
+    - positions (np.ndarray): Sorted positions of the candidate rows (the filtered rows).
+    - bounds (list): The area [lon0, lat0, lon1, lat1].
+    Returns:
+    - np.ndarray: Sorted positions of the candidate rows inside the area.
+    """
+    return np.intersect1d(spatial_index.box(*bounds), positions, assume_unique=True)
+
+
+def cluster_points(lon, lat, groups, bounds, max_clusters):
+    """
+    Merges points into at most max_clusters clusters: per grid cell over the bounds and per group.
+
+    Args:
+    - lon (np.ndarray), lat (np.ndarray): Coordinates of the points, all inside the bounds and not missing.
+    - groups (np.ndarray): Integer group (the code of the color variable) of every point.
+    - bounds (list): The area [lon0, lat0, lon1, lat1] that is divided into grid cells.
+    - max_clusters (int): Maximum number of clusters.
+    Returns:
+    - np.ndarray: Cluster of every point, numbered from 0.
+    - int: Number of clusters.
+    """
+    lon0, lat0, lon1, lat1 = bounds
+    n_groups = int(groups.max()) + 1 if len(groups) else 1
+    n_cells = max(1, int(np.sqrt(max_clusters / n_groups)))  # cells per side, made coarser until the clusters fit
+    while True:
+        column = np.clip(((lon - lon0) / max(lon1 - lon0, 1e-9) * n_cells).astype(np.int64), 0, n_cells - 1)
+        row = np.clip(((lat - lat0) / max(lat1 - lat0, 1e-9) * n_cells).astype(np.int64), 0, n_cells - 1)
+        keys, clusters = np.unique((row * n_cells + column) * n_groups + groups, return_inverse=True)
+        if len(keys) <= max_clusters or n_cells == 1:
+            return clusters.ravel(), len(keys)
+        n_cells = max(1, int(n_cells / np.sqrt(len(keys) / max_clusters)))
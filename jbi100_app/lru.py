@@ -0,0 +1,145 @@
+"""
+This module contains a thread-safe least-recently-used cache with a memory budget.
+
+Unlike functools.lru_cache, which bounds the number of entries, LRUCache bounds the total size in bytes of
+the cached values, so it can hold many small filter results or a few large ones. It counts hits, misses
+and evictions, so its effectiveness can be monitored.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def sizeof(value):
+    """
+    Returns the size of a cached value in bytes: the buffer size for NumPy arrays, sys.getsizeof otherwise.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by the total size of its values.
+
+    Args:
+    - max_bytes (int): Memory budget, the least recently used entries are evicted when it is exceeded.
+    - sizeof (callable): Function that returns the size of a value in bytes.
+    """
+    def __init__(self, max_bytes, sizeof=sizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size), least recently used first
+        self._lock = threading.Lock()
+
+    def __getstate__(self): # pickled empty and without its lock, e.g. as part of the shared state (see jbi100_app/shared.py)
+        return {'max_bytes': self.max_bytes, 'sizeof': self.sizeof}
+
+    def __setstate__(self, state):
+        self.__init__(state['max_bytes'], state['sizeof'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for a key and marks it as most recently used, or default if the key is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Stores a value and evicts least recently used entries until the cache fits its budget again.
+        Values larger than the whole budget are not stored.
+        """
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for a key, or computes, stores and returns it.
+
+        The computation runs outside the lock, so a slow computation does not block lookups of other keys.
+
+        Args:
+        - key (hashable): The cache key.
+        - compute (callable): Function without arguments that computes the value.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def transform(self, function):
+        """
+        Replaces every cached value by function(key, value), e.g. to bring derived values up to date with their
+        source. The recency order is kept, entries that no longer fit the budget are evicted.
+        """
+        with self._lock:
+            for key, (value, size) in list(self._entries.items()):
+                value = function(key, value)
+                self._entries[key] = (value, self.sizeof(value))
+                self.current_bytes += self._entries[key][1] - size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all entries, the counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Returns the counters and the memory use of the cache.
+
+        Returns:
+        - dict: hits, misses, evictions, entries, bytes, max_bytes and hit_rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
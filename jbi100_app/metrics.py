@@ -0,0 +1,204 @@
+"""
+This module contains low-overhead timing of the stages of the callbacks, exported in two ways:
+
+- As Prometheus histograms on a route of the Flask server (by default /metrics), together with the counters of the
+  caches. Every worker process keeps its own metrics, so with several workers each scrape sees one of them.
+- As a Server-Timing header on every Dash callback response, with the duration of each stage that ran during the
+  request, so the breakdown of a request can be read in the network panel of the browser's developer tools.
+
+A stage is timed with `with metrics.span('name'):`. A span costs two clock reads and a lock, so it can wrap every
+stage of the hot path.
+
+The route also exports the breakdown of the boot of the worker (imports, loading the data, building the app) as gauges,
+see `record_boot`.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Upper bounds of the histogram buckets in seconds, the stages take from well under a millisecond to seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Path of the Dash callback requests, only their responses get a Server-Timing header
+DASH_UPDATE_PATH = '_dash-update-component'
+
+
+class Histogram:
+    """
+    Cumulative histogram of durations in the Prometheus format.
+
+    Args:
+    - buckets (tuple): Sorted upper bounds of the buckets in seconds, an overflow bucket (+Inf) is added.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, not cumulative, the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """
+        Adds a duration to the histogram.
+        """
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+
+    def render(self, name, labels):
+        """
+        Returns the lines of the histogram in the Prometheus text format.
+        """
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """
+    Registry of the stage and request histograms and of the caches whose counters are exported.
+
+    Args:
+    - buckets (tuple): Upper bounds of the histogram buckets in seconds.
+    - prefix (str): Prefix of the metric names.
+    - boot_start (float): time.perf_counter() at the start of the boot, the time to the first response is measured from it.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='jbi100', boot_start=None):
+        self.buckets = buckets
+        self.prefix = prefix
+        self.boot_start = boot_start
+        self.boot = {}  # phase of the boot -> seconds
+        self.stages = {}  # stage -> Histogram
+        self.requests = {}  # callback output -> Histogram
+        self.caches = {}  # name -> function that returns the stats of the cache (see LRUCache.stats)
+        self._lock = threading.Lock()
+
+    def observe(self, histograms, key, seconds):
+        """
+        Adds a duration to the histogram of the given key, creating the histogram on first use.
+        """
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Times the code in the with block as the given stage. Inside a request the duration is also added to the
+        Server-Timing header of the response.
+
+        Args:
+        - stage (str): Name of the stage, a token (letters, digits, '-', '_' or '.').
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(self.stages, stage, seconds)
+            if has_request_context():
+                timings = g.setdefault('server_timing', {})
+                timings[stage] = timings.get(stage, 0.0) + seconds # a stage that runs twice in a request is summed
+
+    def record_boot(self, phase, seconds):
+        """
+        Records the duration of a phase of the boot.
+
+        Args:
+        - phase (str): Name of the phase.
+        - seconds (float): Its duration, or for milestones (such as 'first_response') the time since boot_start.
+        """
+        with self._lock:
+            self.boot[phase] = seconds
+
+    @contextmanager
+    def boot_phase(self, phase):
+        """
+        Times the code in the with block as a phase of the boot, see `record_boot`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_boot(phase, time.perf_counter() - start)
+
+    def register_cache(self, name, stats):
+        """
+        Exports the counters of a cache.
+
+        Args:
+        - name (str): Name of the cache, the value of the cache label.
+        - stats (callable): Function that returns the stats of the cache, see LRUCache.stats.
+        """
+        self.caches[name] = stats
+
+    def render(self):
+        """
+        Returns all metrics in the Prometheus text format.
+        """
+        lines = []
+        with self._lock:
+            for name, label, histograms, description in [
+                (f'{self.prefix}_stage_seconds', 'stage', self.stages, 'Time spent in a stage of the callbacks.'),
+                (f'{self.prefix}_request_seconds', 'callback', self.requests, 'Time spent on a Dash callback request, including serialization.'),
+            ]:
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for key, histogram in sorted(histograms.items()):
+                    lines += histogram.render(name, f'{label}="{_escape(key)}"')
+            name = f'{self.prefix}_boot_seconds'
+            lines += [f'# HELP {name} Duration of a phase of the boot of the worker, or the time from its start to a milestone.', f'# TYPE {name} gauge']
+            lines += [f'{name}{{phase="{_escape(phase)}"}} {seconds}' for phase, seconds in self.boot.items()]
+        stats = {name: cache_stats() for name, cache_stats in self.caches.items()}
+        for field, kind, description in [
+            ('hits', 'counter', 'Lookups answered from the cache.'),
+            ('misses', 'counter', 'Lookups that had to compute the value.'),
+            ('evictions', 'counter', 'Entries removed to stay within the memory budget.'),
+            ('entries', 'gauge', 'Entries in the cache.'),
+            ('bytes', 'gauge', 'Size of the cached values in bytes.'),
+            ('max_bytes', 'gauge', 'Memory budget of the cache in bytes.'),
+        ]:
+            name = f'{self.prefix}_cache_{field}' + ('_total' if kind == 'counter' else '')
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{{cache="{_escape(cache)}"}} {values[field]}' for cache, values in sorted(stats.items())]
+        return '\n'.join(lines) + '\n'
+
+    def install(self, server, route='/metrics'):
+        """
+        Adds the metrics route and the Server-Timing header to a Flask server.
+
+        Args:
+        - server (flask.Flask): The server of the Dash app (app.server).
+        - route (str): Path of the metrics route.
+        """
+        server.add_url_rule(route, 'metrics', lambda: Response(self.render(), mimetype='text/plain; version=0.0.4'))
+
+        @server.before_request
+        def start_request_timer():
+            g.request_start = time.perf_counter()
+
+        @server.after_request
+        def add_server_timing(response):
+            if self.boot_start is not None and 'first_response' not in self.boot:
+                self.record_boot('first_response', time.perf_counter() - self.boot_start)
+            if not request.path.endswith(DASH_UPDATE_PATH) or 'request_start' not in g:
+                return response
+            seconds = time.perf_counter() - g.request_start
+            body = request.get_json(silent=True) or {}
+            self.observe(self.requests, body.get('output', 'unknown'), seconds)
+            timings = [*g.get('server_timing', {}).items(), ('total', seconds)]
+            response.headers['Server-Timing'] = ', '.join(f'{stage};dur={duration * 1e3:.2f}' for stage, duration in timings)
+            return response
+
+
+def _escape(value):
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
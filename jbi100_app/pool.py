@@ -0,0 +1,74 @@
+"""
+This module contains the pool of threads that builds the figures of an update concurrently.
+
+An update rebuilds up to five independent figures (the map, two bar charts, the heatmap and the timeline). Built one
+after another, the request waits for the sum of their times. The pool builds them at the same time and the request
+waits for the slowest one. Each figure is also converted to the plain dict Dash encodes (see `plain_figure`) in the
+worker that built it, so little of the serialization is left to the request thread.
+
+Threads rather than processes: the figures read the data and its indexes in place, as read-only arrays under the
+read side of the data lock, so nothing is copied or pickled. Threads of one process share the GIL, so only the
+parts of a figure that release it run in parallel. These are the NumPy kernels, the pandas group-bys and the
+SQLite queries, most of the work at large row counts. Plotly's validation still runs one thread at a time.
+
+The tasks run in a copy of the context of the caller (contextvars), so their stages are still timed into the
+Server-Timing header of the request (see jbi100_app/metrics.py).
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from plotly.basedatatypes import BaseFigure
+
+
+def pool_size(setting, n_tasks):
+    """
+    Returns the number of threads of a pool.
+
+    Args:
+    - setting (str): A number of threads, or 'auto' for one per CPU (none on a single CPU), up to one per task.
+    - n_tasks (int): The largest number of tasks that run at the same time.
+    Returns:
+    - int: The number of threads, 0 runs the tasks in the calling thread.
+    """
+    if setting == 'auto':
+        cpus = os.cpu_count() or 1
+        return min(cpus, n_tasks) if cpus > 1 else 0
+    return int(setting)
+
+
+def plain_figure(figure):
+    """
+    Converts a plotly figure to the dict of lists and base64 arrays that Dash encodes as JSON, other outputs (such as
+    dash.no_update, which Dash must recognize) are returned as they are.
+    """
+    return figure.to_plotly_json() if isinstance(figure, BaseFigure) else figure
+
+
+class TaskPool:
+    """
+    Runs independent tasks of a request concurrently.
+
+    Args:
+    - workers (int): Number of threads, 0 runs the tasks one after another in the calling thread.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='figures') if workers else None
+
+    def map(self, function, items):
+        """
+        Returns [function(item) for item in items], computed concurrently.
+
+        Returns only after all tasks finished, also when one of them raised, so no task still reads the data once the
+        caller releases its lock. The first exception (in the order of items) is then raised.
+
+        Args:
+        - function (callable): Function of one item.
+        - items (list): The items.
+        """
+        if self._executor is None or len(items) < 2:
+            return [function(item) for item in items]
+        futures = [self._executor.submit(contextvars.copy_context().run, function, item) for item in items]
+        wait(futures)
+        return [future.result() for future in futures]
@@ -0,0 +1,65 @@
+"""
+This module contains the resolution of map selections (plotly selectedData) into row positions.
+
+Box and lasso selections are answered with the spatial grid index from the selection geometry, so the
+points plotly sends along are not needed. Other selections are resolved from the row id (index1) that the
+map traces carry as the first customdata entry of every point.
+"""
+import numpy as np
+
+
+def _geometry(selected_data, key):
+    """
+    Returns the geometry of a selection for the first map subplot ('map' or 'mapbox'), or None.
+    """
+    geometry = selected_data.get(key) or {}
+    return next(iter(geometry.values()), None)
+
+
+def selection_geometry(selected_data):
+    """
+    Describes a map selection independently of how the rows are stored.
+
+    Args:
+    - selected_data (dict): The selectedData of the map figure.
+    Returns:
+    - tuple or None: ('box', ((x0, y0), (x1, y1))) with two opposite corners, ('lasso', vertices) or ('points', row ids),
+      None if there is no selection.
+    """
+    if not selected_data:
+        return None
+    box = _geometry(selected_data, 'range')
+    lasso = _geometry(selected_data, 'lassoPoints')
+    if box:
+        return 'box', box
+    if lasso:
+        return 'lasso', lasso
+    if selected_data.get('points'):
+        return 'points', [point['customdata'][0] for point in selected_data['points'] if point.get('customdata')]
+    return None
+
+
+def resolve_selection(selected_data, spatial_index, row_lookup):
+    """
+    Finds the rows selected on the map.
+
+    Args:
+    - selected_data (dict): The selectedData of the map figure.
+    - spatial_index (GridIndex): Grid index over the longitudes and latitudes of all rows.
+    - row_lookup (pd.Index): The index1 values of all rows, to turn row ids into positions.
+    Returns:
+    - np.ndarray or None: Sorted positions of the selected rows, None if there is no selection.
+    """
+    geometry = selection_geometry(selected_data)
+    if geometry is None:
+        return None
+    kind, shape = geometry
+    if kind == 'box':
+        (x0, y0), (x1, y1) = shape
+        positions = spatial_index.box(x0, y0, x1, y1)
+    elif kind == 'lasso':
+        positions = spatial_index.polygon(shape)
+    else:
+        positions = row_lookup.get_indexer(shape)
+        positions = positions[positions >= 0]
+    return np.unique(positions)
@@ -0,0 +1,227 @@
+"""
+This module contains the server-side store of the map selections of the pages.
+
+A map selection used to travel with every request: the browser sent the selectedData of the map (every selected
+point with its coordinates, curve and point numbers) whenever the filters changed, and the resolved selection (the
+row ids of the selected incidents) with every figure update. Both grow with the selection. Now the browser sends
+only the geometry of a selection (see compactSelection in assets/clientside.js), the server resolves it once into
+a sorted array of row ids and keeps it here, and the pages carry a short random token instead.
+
+- Every page (session) has at most one selection, a new selection of the page replaces the previous one.
+- A selection expires when it was not used for `ttl_s` seconds, and the least recently used selections are evicted
+  when the store exceeds its memory budget. A page whose selection expired shows no selection until it selects again.
+- A selection is kept in the smaller of two forms: the array of its row ids, or a bitmap of the ids from its first to
+  its last one. Large selections (a box around a coast selects millions of rows) are dense, so a bitmap keeps them in
+  about an eighth of the bytes of the array. A selection that does not fit the budget even so is not stored, `put`
+  then returns no token.
+- With a directory (JBI100_SHARED_DIR), selections are also written there, so a request of the page that reaches
+  another worker process finds its selection too.
+"""
+import glob
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def compact_ids(ids):
+    """
+    Returns row ids as a sorted array without duplicates, as int32 if they fit.
+    """
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    if not len(ids) or (ids[0] >= np.iinfo(np.int32).min and ids[-1] <= np.iinfo(np.int32).max):
+        ids = ids.astype(np.int32)
+    return ids
+
+
+class _Bitmap:
+    """
+    Sorted row ids as a bitmap: bit i is set if the id start + i is selected.
+    """
+    def __init__(self, ids):
+        self.start = int(ids[0])
+        self.count = int(ids[-1]) - self.start + 1
+        bits = np.zeros(self.count, dtype=bool)
+        bits[ids - self.start] = True
+        self.bits = np.packbits(bits)
+        self.nbytes = self.bits.nbytes
+        self.dtype = ids.dtype
+
+    def ids(self):
+        return (np.flatnonzero(np.unpackbits(self.bits, count=self.count)) + self.start).astype(self.dtype)
+
+
+def pack_ids(ids):
+    """
+    Returns sorted row ids (see compact_ids) in their smaller form, the array itself or a _Bitmap. Both have `nbytes`.
+    """
+    if len(ids) and (int(ids[-1]) - int(ids[0])) // 8 + 1 < ids.nbytes:
+        return _Bitmap(ids)
+    return ids
+
+
+def unpack_ids(packed):
+    """
+    Returns the row ids of the result of pack_ids as a sorted array.
+    """
+    return packed.ids() if isinstance(packed, _Bitmap) else packed
+
+
+class SelectionStore:
+    """
+    Selections (arrays of row ids) by token, bounded by age and total size, see the module documentation.
+
+    Args:
+    - max_bytes (int): Memory budget, the least recently used selections are evicted when it is exceeded.
+    - ttl_s (float): Seconds after its last use after which a selection expires.
+    - directory (str): Directory shared by the worker processes, None keeps the selections in this process only.
+    """
+    def __init__(self, max_bytes, ttl_s, directory=None):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # token -> (ids packed by pack_ids, session, time of the last use), least recently used first
+        self._tokens = {}  # session -> token of its selection
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def put(self, session, ids):
+        """
+        Stores the selection of a session, replacing its previous one.
+
+        Args:
+        - session (str): Id of the page, None for a page without id (its selections are only evicted, never replaced).
+        - ids (array-like): The row ids of the selection.
+        Returns:
+        - str: The token of the selection, None if it does not fit the memory budget (nothing is stored or removed then).
+        """
+        ids = compact_ids(ids)
+        packed = pack_ids(ids)
+        if packed.nbytes > self.max_bytes:
+            return None
+        token = secrets.token_urlsafe(12)
+        now = time.monotonic()
+        with self._lock:
+            previous = self._tokens.pop(session, None) if session is not None else None
+            if previous in self._entries:
+                self._remove(previous)
+            self._entries[token] = (packed, session, now)
+            self.current_bytes += packed.nbytes
+            if session is not None:
+                self._tokens[session] = token
+            self._evict(now)
+        if self.directory:
+            self._write(token, ids, previous)
+        return token
+
+    def get(self, token):
+        """
+        Returns the row ids of a selection (a sorted array) and marks it as used, or None if the token is unknown or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and now - entry[2] <= self.ttl_s:
+                self._entries[token] = (entry[0], entry[1], now)
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return unpack_ids(entry[0])
+        ids = self._read(token) if self.directory else None
+        with self._lock:
+            if ids is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            packed = pack_ids(ids)
+            if token not in self._entries and packed.nbytes <= self.max_bytes: # written by another worker, kept here from now on
+                self._entries[token] = (packed, None, now)
+                self.current_bytes += packed.nbytes
+                self._evict(now)
+        return ids
+
+    def _remove(self, token):
+        """
+        Removes a selection from memory, called with the lock held.
+        """
+        packed, session, _ = self._entries.pop(token)
+        self.current_bytes -= packed.nbytes
+        if session is not None and self._tokens.get(session) == token:
+            del self._tokens[session]
+
+    def _evict(self, now):
+        """
+        Removes the expired selections and then the least recently used ones until the store fits its budget, called with the lock held.
+        """
+        while self._entries:
+            token, (_, _, used) = next(iter(self._entries.items()))
+            if now - used <= self.ttl_s and self.current_bytes <= self.max_bytes:
+                break
+            self._remove(token)
+            self.evictions += 1
+
+    def _path(self, token):
+        return os.path.join(self.directory, f'{token}.npy')
+
+    def _write(self, token, ids, previous):
+        """
+        Writes a selection to the shared directory, removes the previous selection of the session and the expired files.
+        """
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as file:
+            np.save(file, ids, allow_pickle=False)
+        os.replace(temporary, self._path(token))
+        expired = time.time() - self.ttl_s
+        stale = [self._path(previous)] if previous else []
+        for path in glob.glob(os.path.join(self.directory, '*.npy')):
+            try:
+                if os.path.getmtime(path) < expired:
+                    stale.append(path)
+            except FileNotFoundError: # removed by another worker
+                pass
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _read(self, token):
+        """
+        Reads a selection from the shared directory, or returns None if there is none or it expired. The file's time is
+        its last use, so it is touched.
+        """
+        if not token.replace('-', '').replace('_', '').isalnum(): # only tokens of put, not paths
+            return None
+        path = self._path(token)
+        try:
+            if os.path.getmtime(path) < time.time() - self.ttl_s:
+                return None
+            ids = np.load(path, allow_pickle=False)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return ids
+
+    def stats(self):
+        """
+        Returns the counters and the memory use of the store, in the fields of LRUCache.stats.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,154 @@
+"""
+This module contains the shared data of deployments with several worker processes (e.g. gunicorn -w 4 app:server).
+
+Normally every worker loads the data and builds everything derived from it (the filter engine, the spatial index,
+the count cube) on its own, so memory grows with every worker. With JBI100_SHARED_DIR set, these objects are
+built once and stored in that directory: every large NumPy array as an .npy file, the small rest as a pickle.
+Workers load the state with the arrays memory-mapped read-only, so they share the same physical pages (of the page
+cache, or of shared memory if the directory is on a tmpfs such as /dev/shm) and do not read or build the data again.
+
+Only NumPy arrays of a fixed-size dtype can be mapped, so string columns are stored as categoricals (integer codes
+and a small list of categories), see `shareable_frame`.
+
+The state is stored under a key that covers the data and the version of the build. The first process that needs a
+state builds it while holding a file lock, processes that start meanwhile wait for it and load the result.
+"""
+import fcntl
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Version of the on-disk layout below, bump when the way the state is written or the attributes of the objects in it change
+SHARED_FORMAT_VERSION = 2
+
+STATE_NAME = 'state.pkl'
+# Arrays from this size on are stored as .npy files and mapped, smaller ones are part of the pickle
+MIN_MAPPED_BYTES = 1 << 16
+
+
+class _ArrayPickler(pickle.Pickler):
+    """
+    Pickler that writes large NumPy arrays to separate .npy files.
+    """
+    def __init__(self, file, directory):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.names = {}  # id of an array -> name of its file, an array that is referenced twice is written once
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < MIN_MAPPED_BYTES:
+            return None
+        if id(obj) not in self.names:
+            self.names[id(obj)] = name = f'{len(self.names)}.npy'
+            np.save(os.path.join(self.directory, name), obj, allow_pickle=False)
+        return self.names[id(obj)]
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """
+    Unpickler that maps the arrays written by _ArrayPickler.
+    """
+    def __init__(self, file, directory):
+        super().__init__(file)
+        self.directory = directory
+        self.arrays = {}  # name of a file -> its array, so an array that was referenced twice is loaded as one object
+
+    def persistent_load(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = np.load(os.path.join(self.directory, name), mmap_mode='r', allow_pickle=False).view(np.ndarray) # plain read-only view on the mapped file
+        return self.arrays[name]
+
+
+def dump_state(state, directory):
+    """
+    Writes a state (any picklable object) to a directory, its large arrays as separate .npy files.
+
+    The state is first written to a temporary directory and then moved in place, so other processes never see a
+    half written state.
+
+    Args:
+    - state (object): The state.
+    - directory (str): The directory of the state, it must not exist yet.
+    """
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f'.{os.path.basename(directory)}-', dir=parent)
+    with open(os.path.join(tmp_dir, STATE_NAME), 'wb') as f:
+        _ArrayPickler(f, tmp_dir).dump(state)
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError: # another process stored the same state first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_state(directory):
+    """
+    Reads a state written by dump_state, with its large arrays memory-mapped read-only.
+
+    Args:
+    - directory (str): The directory of the state.
+    Returns:
+    - object or None: The state, or None if there is no (complete) state in the directory.
+    """
+    try:
+        with open(os.path.join(directory, STATE_NAME), 'rb') as f:
+            return _ArrayUnpickler(f, directory).load()
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def shareable_frame(df):
+    """
+    Converts the string (and other object) columns of a DataFrame to categoricals, so all its columns are
+    fixed-size arrays that can be mapped. The categories are sorted, so the codes keep the order of the values.
+    """
+    columns = [column for column in df.columns if not (pd.api.types.is_bool_dtype(df[column]) or pd.api.types.is_numeric_dtype(df[column])
+                                                       or pd.api.types.is_datetime64_dtype(df[column]) or isinstance(df[column].dtype, pd.CategoricalDtype))]
+    return df.astype({column: 'category' for column in columns})
+
+
+def state_key(*parts):
+    """
+    Returns the key of a state from the parts that identify it (such as the data version and build parameters).
+    """
+    digest = hashlib.sha256(repr((SHARED_FORMAT_VERSION, *parts)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def shared_state(shared_dir, key, build):
+    """
+    Returns the state of a key from the shared directory, building and storing it first if there is none.
+
+    Only one process builds a state, others wait on a file lock. The builder also returns the mapped state,
+    so its pages are shared too. States of other keys are removed, entries whose names start with '.' are kept.
+
+    Args:
+    - shared_dir (str): Directory of the shared states.
+    - key (str): Key of the state, see state_key.
+    - build (callable): Function without arguments that builds the state.
+    Returns:
+    - object: The state, with its large arrays memory-mapped read-only.
+    """
+    directory = os.path.join(shared_dir, key)
+    state = load_state(directory)
+    if state is not None:
+        return state
+    os.makedirs(shared_dir, exist_ok=True)
+    with open(os.path.join(shared_dir, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            state = load_state(directory) # built by another process while this one waited
+            if state is None:
+                dump_state(build(), directory)
+                state = load_state(directory)
+                for name in os.listdir(shared_dir):
+                    if name != key and not name.startswith('.'):
+                        shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return state
@@ -0,0 +1,79 @@
+"""
+This module contains the layout manifest, a small precomputed file that lets the app build its layout without the data.
+
+The layout needs the options of the dropdowns (the values of every categorical column), the bounds of the sliders and
+the color palettes resolved into lists of colors. Computing them needs the data and the filter engine built from it,
+and resolving the palettes needs the validators of plotly, so building the first layout used to wait for all of it.
+The app stores this metadata once as a JSON file next to the columnar cache of the data (jbi100_app/cache.py), under a
+key that covers the data version and the plotly version, and later starts read it in about a millisecond.
+
+With JBI100_FAST_START=1 (see jbi100_app/config.py) the app serves its first pages from the manifest while the data and
+its indexes load in a background thread; without a manifest (the first start on new data) it loads them first.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+# Version of the content of the manifest, bump when what is stored in it changes
+LAYOUT_FORMAT_VERSION = 1
+
+LAYOUT_PREFIX = 'layout-'
+
+
+def layout_key(*parts):
+    """
+    Returns the key of a layout manifest from the parts that identify it (such as the data version and the plotly version).
+    """
+    digest = hashlib.sha256(repr((LAYOUT_FORMAT_VERSION, *parts)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _manifest_path(cache_dir, key):
+    return os.path.join(cache_dir, f'{LAYOUT_PREFIX}{key}.json')
+
+
+def load_layout_manifest(cache_dir, key):
+    """
+    Reads a layout manifest.
+
+    Args:
+    - cache_dir (str): Directory of the manifests, the directory of the columnar cache.
+    - key (str): Key of the manifest, see `layout_key`.
+    Returns:
+    - dict or None: The layout metadata, or None if there is no (valid) manifest for this key.
+    """
+    try:
+        with open(_manifest_path(cache_dir, key), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('key') != key:
+        return None
+    return manifest['layout']
+
+
+def save_layout_manifest(layout, cache_dir, key):
+    """
+    Writes a layout manifest and removes the manifests of other keys.
+
+    The manifest is first written to a temporary file and then moved in place, so concurrently starting workers never
+    read a half written manifest.
+
+    Args:
+    - layout (dict): The layout metadata, JSON serializable.
+    - cache_dir (str): Directory of the manifests, the directory of the columnar cache.
+    - key (str): Key of the manifest, see `layout_key`.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{LAYOUT_PREFIX}', suffix='.json', dir=cache_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'key': key, 'layout': layout}, f)
+    path = _manifest_path(cache_dir, key)
+    os.replace(tmp_path, path)
+    for name in os.listdir(cache_dir):
+        if name.startswith(LAYOUT_PREFIX) and name.endswith('.json') and os.path.join(cache_dir, name) != path:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError: # removed by another worker
+                pass
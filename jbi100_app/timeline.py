@@ -0,0 +1,68 @@
+"""
+This module contains the timeline engine: binned incident counts over time, answered from prefix sums.
+
+All incident dates are the first day of a month. The counts per month of one slice of the data (the rows that pass
+every filter except the year range) are laid out on a dense axis of months and summed into a prefix sum once. The
+number of incidents between any two months is then the difference of two prefix sums, so the timeline of any year
+range in any bin width takes O(bins): moving the year slider does not query the count cube again.
+
+The bin width adapts to the visible range (the year range, narrowed to the months with incidents): months, years or
+decades, the finest with at most max_bins bins. Bins start on calendar boundaries (January, years divisible by ten),
+the first and last bin are cut off at the visible range. Only the binned series is sent to the browser.
+"""
+import numpy as np
+
+# Bin widths in months, finest first
+BIN_WIDTHS = (('month', 1), ('year', 12), ('decade', 120))
+
+
+class MonthlyPrefix:
+    """
+    Prefix sums of the monthly incident counts of one slice of the data.
+
+    Args:
+    - monthly_counts (np.ndarray): Counts with one row per year and one column per month (as counted by the count cube).
+    - years (array-like): The year of every row, a missing year (NaN) is left out.
+    - months (array-like): The month (1 to 12) of every column, a missing month (NaN) is left out.
+    """
+    def __init__(self, monthly_counts, years, months):
+        years, months = np.asarray(years, dtype=float), np.asarray(months, dtype=float)
+        monthly_counts = monthly_counts * (~np.isnan(years))[:, None] * (~np.isnan(months))[None, :]
+        rows, columns = np.nonzero(monthly_counts)
+        month_index = years[rows].astype(np.int64) * 12 + months[columns].astype(np.int64) - 1 # months since January of year 0
+        self.first = int(month_index.min()) if len(month_index) else 0  # first month with incidents
+        dense = np.bincount(month_index - self.first, weights=monthly_counts[rows, columns]).astype(np.int64)
+        self.prefix = np.concatenate([[0], np.cumsum(dense)])  # prefix[i]: incidents before month first + i
+
+    def __len__(self):
+        return len(self.prefix) - 1
+
+    def cumulative(self, months):
+        """
+        Returns the number of incidents before each of the given months (months since January of year 0).
+        """
+        return self.prefix[np.clip(np.asarray(months) - self.first, 0, len(self))]
+
+    def bins(self, low_year, high_year, max_bins):
+        """
+        Bins the incidents of a year range.
+
+        Args:
+        - low_year (float), high_year (float): The year range, inclusive.
+        - max_bins (int): Largest number of bins, the finest bin width of BIN_WIDTHS that stays within it is used (decades always).
+        Returns:
+        - tuple: The name of the bin width, the edges of the bins (n + 1 months since January of year 0, the first
+          and last bin cut off at the range) and the number of incidents in every bin. No bins if the range lies
+          outside the months with incidents.
+        """
+        start = max(int(np.ceil(low_year)) * 12, self.first)
+        stop = min((int(np.floor(high_year)) + 1) * 12, self.first + len(self))
+        if stop <= start:
+            return BIN_WIDTHS[-1][0], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        for name, width in BIN_WIDTHS:
+            first_bin = start // width * width
+            n_bins = -(-(stop - first_bin) // width)
+            if n_bins <= max_bins:
+                break
+        edges = np.clip(first_bin + width * np.arange(n_bins + 1, dtype=np.int64), start, stop)
+        return name, edges, np.diff(self.cumulative(edges))
@@ -0,0 +1,43 @@
+"""
+Fixtures of the tests: the app, imported once, and the props of a loaded page.
+"""
+import warnings
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app():
+    """
+    The app module, with its data loaded.
+    """
+    warnings.filterwarnings('ignore')
+    import app
+    app.data_loaded.wait()
+    return app
+
+
+@pytest.fixture(scope='session')
+def initial_props(app):
+    """
+    The props ('id.property' -> value) of the components of a freshly loaded page.
+    """
+    props = {}
+    for component in app.app.layout()._traverse():
+        component_id = getattr(component, 'id', None)
+        if component_id is not None:
+            for name, value in component.to_plotly_json()['props'].items():
+                props[f'{component_id}.{name}'] = value
+    return props
+
+
+
+@pytest.fixture(scope='session')
+def sqlite_backend(app, tmp_path_factory):
+    """
+    A SQLite backend on the data of the app, as the app opens it with JBI100_BACKEND=sqlite.
+    """
+    from jbi100_app.backends import SQLiteBackend, build_database
+    path = str(tmp_path_factory.mktemp('sqlite') / 'data.sqlite')
+    build_database(path, app.get_data(), app.stored_columns, [*app.categories, *app.range_dimensions])
+    return SQLiteBackend(path, app.categories, range_dimensions=app.range_dimensions)
@@ -0,0 +1,44 @@
+"""
+Small random incident tables for the tests of the indexes, with missing values in every column.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORIES = {'State': ['NSW', 'QLD', 'WA', 'SA'], 'Victim.activity': ['swimming', 'surfing', 'diving']}
+NUMERIC = ['Incident.year', 'Shark.length.m']
+
+
+def random_frame(n_rows, seed=0):
+    """
+    Returns n_rows incidents with the CATEGORIES (as strings) and the NUMERIC columns, about a tenth of the values missing.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: rng.choice(values, n_rows).astype(object) for column, values in CATEGORIES.items()})
+    df['Incident.year'] = rng.integers(1900, 2020, n_rows).astype(float)
+    df['Shark.length.m'] = rng.uniform(0.5, 6, n_rows).round(1).astype(np.float32)
+    for column in df.columns:
+        df.loc[rng.random(n_rows) < 0.1, column] = np.nan
+    return df
+
+
+def reference_mask(df, selections, ranges):
+    """
+    Evaluates a filter state (see FilterEngine.positions) on a DataFrame with pandas, column by column.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in selections.items():
+        if values:
+            mask &= df[column].isin(values).to_numpy()
+    for column, (low, high, include_missing) in ranges.items():
+        values = df[column]
+        mask &= ((values >= low) & (values <= high)).to_numpy() | (include_missing & values.isna().to_numpy())
+    return mask
+
+
+FILTER_STATES = [
+    ({}, {}),
+    ({'State': ['NSW', 'WA']}, {}),
+    ({'State': ['QLD'], 'Victim.activity': ['surfing', 'diving']}, {'Incident.year': (1950, 2000, False)}),
+    ({}, {'Shark.length.m': (2.0, 3.5, True), 'Incident.year': (1900, 1905, False)}), # a sparse range
+    ({'Victim.activity': []}, {'Shark.length.m': (0, 10, False)}),
+]
@@ -0,0 +1,41 @@
+"""
+Helpers of the tests that drive the callbacks of the app.
+"""
+import json
+
+from plotly.utils import PlotlyJSONEncoder
+
+# Headers of a post from a page of the dashboard, the test client sends its requests to http://localhost
+PAGE_HEADERS = {'Origin': 'http://localhost'}
+
+
+def filter_state(app, **changes):
+    """
+    Returns the filter state of the initial filter inputs with the given changes, see update_filter_state.
+    """
+    inputs = {
+        'selected_sharks': None, 'selected_injuries': None, 'selected_injury_severities': None, 'selected_activities': None,
+        'selected_sources': None, 'selected_genders': None, 'selected_sites': None, 'selected_states': None,
+        'shark_length_range': [app.shark_length_min, app.shark_length_max], 'provoked_status': None, 'incident_month': None,
+        'include_unknown_length': ['include'], 'year_range': [app.year_min, app.year_max],
+    }
+    inputs.update(changes)
+    return app.update_filter_state(**inputs)
+
+
+def figure_update_body(app, props, changed):
+    """
+    Returns the JSON body of a request of update_figures, as the browser sends it.
+
+    Args:
+    - app (module): The app module.
+    - props (dict): The props ('id.property' -> value) of the page.
+    - changed (list): The changed props that trigger the request.
+    """
+    key = next(key for key in app.app.callback_map if key.startswith('..shark-map.figure..'))
+    spec = app.app.callback_map[key]
+    def values(items):
+        return [{'id': item['id'], 'property': item['property'], 'value': props.get(f"{item['id']}.{item['property']}")} for item in items]
+    outputs = [{'id': output, 'property': 'children' if output == 'row-details' else 'figure'} for output in app.FIGURE_DEPENDENCIES]
+    body = {'output': key, 'outputs': outputs, 'inputs': values(spec['inputs']), 'state': values(spec['state']), 'changedPropIds': changed}
+    return json.dumps(body, cls=PlotlyJSONEncoder)
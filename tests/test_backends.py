@@ -0,0 +1,71 @@
+"""
+Tests of the query backends (jbi100_app/backends.py): the pandas and the SQLite backend answer every query the same,
+and a backend that ingested rows answers like one built on all rows.
+"""
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_frame
+from jbi100_app.backends import PandasBackend, SQLiteBackend, build_database
+from tests.helpers import filter_state
+
+N_ROWS = 4000
+# A box selection on the map, over the east coast of Australia
+BOX = {'range': {'map': [[145, -25], [155, -40]]}}
+FILTERS = [{}, {'selected_states': ['NSW', 'QLD']}, {'shark_length_range': [1.0, 4.0], 'year_range': [1950, 2000], 'incident_month': [1, 2, 3]}]
+
+
+def pandas_backend(app, df):
+    return PandasBackend(app.build_data(df=df))
+
+
+def sqlite_backend(app, df, path):
+    build_database(str(path), df, app.stored_columns, [*app.categories, *app.range_dimensions])
+    return SQLiteBackend(str(path), app.categories, range_dimensions=app.range_dimensions)
+
+
+def answers(app, backend, key):
+    """
+    Returns the answers of a backend to the queries of the callbacks for a filter key, as comparable values.
+    """
+    selection = backend.select(key, BOX)
+    return {
+        'count': int(backend.counts([], key)),
+        'bar': backend.counts(['Victim.injury'], key).tolist(),
+        'heatmap': backend.counts(['Shark.common.name', 'State'], key).tolist(),
+        'timeline': backend.counts(['Incident.year', 'Incident.month'], key).tolist(),
+        'labels': {column: [str(label) for label in labels] for column, labels in backend.labels.items()},
+        'map rows': backend.rows(key)['index1'].tolist(),
+        'clusters': sorted(backend.clusters(key, backend.extent(), 'Victim.injury', None, 100)['Incidents'].tolist()),
+        'density': round(float(backend.density(key, None, app.DENSITY_GRID_BINS, app.DENSITY_SMOOTHING)[2].sum())),
+        'box selection': selection,
+        'selected counts': backend.selected_counts(['Victim.injury'], np.asarray(selection)).tolist(),
+    }
+
+
+@pytest.fixture(scope='module')
+def frame(app):
+    return make_frame(N_ROWS, seed=3)
+
+
+@pytest.mark.parametrize('changes', FILTERS)
+def test_backends_agree(app, frame, tmp_path, changes):
+    key = app.filter_key(filter_state(app, **changes))
+    assert answers(app, pandas_backend(app, frame), key) == answers(app, sqlite_backend(app, frame, tmp_path / 'data.sqlite'), key)
+
+
+@pytest.mark.parametrize('kind', ['pandas', 'sqlite'])
+def test_ingest_matches_a_rebuild(app, frame, tmp_path, kind):
+    first, batch = frame.iloc[:N_ROWS - 500], frame.iloc[N_ROWS - 500:]
+    if kind == 'pandas':
+        ingested, rebuilt = pandas_backend(app, first.copy()), pandas_backend(app, frame.copy())
+    else:
+        ingested, rebuilt = sqlite_backend(app, first, tmp_path / 'ingested.sqlite'), sqlite_backend(app, frame, tmp_path / 'rebuilt.sqlite')
+    for changes in FILTERS:
+        ingested.counts([], app.filter_key(filter_state(app, **changes))) # cached results that the append must update or clear
+    ingested.append(batch)
+    if kind == 'sqlite':
+        ingested.append(batch) # rows that are already stored (ingested by another worker) are ignored
+    for changes in FILTERS:
+        key = app.filter_key(filter_state(app, **changes))
+        assert answers(app, ingested, key) == answers(app, rebuilt, key)
@@ -0,0 +1,75 @@
+"""
+Tests of the columnar cache of the cleaned data (jbi100_app/cache.py).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from jbi100_app.cache import cache_key, load_frame, remove_stale_entries, save_frame
+
+
+def cleaned_frame():
+    """
+    Returns a small frame with a column of every kind the cache stores: typed arrays, categoricals and dictionary encoded values.
+    """
+    return pd.DataFrame({
+        'Incident.year': [1900.0, np.nan, 2001.0, 2020.0],
+        'Victim.age': np.array([12, 40, 33, 7], dtype=np.int16),
+        'Provoked': [True, False, False, True],
+        'Incident.date': pd.to_datetime(['1900-01-01', '1950-06-01', '2001-03-01', '2020-12-01']),
+        'State': pd.Categorical(['NSW', 'WA', None, 'NSW']),
+        'Shark.common.name': ['white shark', None, 'tiger shark', 'white shark'],
+        'Location': ['Bondi', 'Perth', 3, np.nan], # mixed values, missing values are loaded as NaN
+    }, index=pd.Index([10, 11, 12, 13], name='UIN'))
+
+
+def test_round_trip(tmp_path):
+    df = cleaned_frame()
+    save_frame(df, str(tmp_path), 'key')
+    loaded = load_frame(str(tmp_path), 'key')
+    pd.testing.assert_frame_equal(loaded, df)
+    assert isinstance(np.load(os.path.join(tmp_path, 'key', '1.npy'), mmap_mode='r'), np.memmap) # the year, reloaded memory-mapped
+
+
+def test_save_of_an_existing_entry(tmp_path):
+    df = cleaned_frame()
+    save_frame(df, str(tmp_path), 'key')
+    save_frame(df.iloc[:2], str(tmp_path), 'key') # as a worker that started at the same time, the first entry is kept
+    pd.testing.assert_frame_equal(load_frame(str(tmp_path), 'key'), df)
+    assert os.listdir(tmp_path) == ['key'] # no temporary directories are left
+
+
+def test_key_changes_with_source_and_rules(tmp_path):
+    source = tmp_path / 'incidents.xlsx'
+    source.write_bytes(b'incidents')
+    key = cache_key(str(source), 1)
+    assert cache_key(str(source), 1) == key
+    assert cache_key(str(source), 2) != key
+    source.write_bytes(b'more incidents')
+    assert cache_key(str(source), 1) != key
+
+
+def test_invalidation_on_a_new_key(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    source = tmp_path / 'incidents.xlsx'
+    source.write_bytes(b'incidents')
+    old_key = cache_key(str(source), 1)
+    save_frame(cleaned_frame(), str(cache_dir), old_key)
+    source.write_bytes(b'more incidents')
+    new_key = cache_key(str(source), 1)
+    assert load_frame(str(cache_dir), new_key) is None # a changed source is a cache miss
+    save_frame(cleaned_frame().iloc[:3], str(cache_dir), new_key)
+    (cache_dir / '.other-entry-being-written').mkdir()
+    remove_stale_entries(str(cache_dir), new_key)
+    assert sorted(os.listdir(cache_dir)) == ['.other-entry-being-written', new_key]
+    assert load_frame(str(cache_dir), old_key) is None
+    assert len(load_frame(str(cache_dir), new_key)) == 3
+
+
+def test_invalid_entry(tmp_path):
+    save_frame(cleaned_frame(), str(tmp_path), 'key')
+    with open(os.path.join(tmp_path, 'key', 'manifest.json'), 'w', encoding='utf-8') as f:
+        f.write('{"key": "key", "format"') # a truncated manifest
+    assert load_frame(str(tmp_path), 'key') is None
+    assert load_frame(str(tmp_path), 'missing') is None
@@ -0,0 +1,67 @@
+"""
+Tests of the contingency tables of the correlation heatmap (jbi100_app/crosstab.py).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from jbi100_app.crosstab import CrossTab, display_label
+from jbi100_app.cube import CountCube
+from tests.frames import CATEGORIES, FILTER_STATES, NUMERIC, random_frame, reference_mask
+
+OTHER = 'other'
+
+
+def reference_table(df, mask, dimension, dimension2):
+    """
+    Counts the rows of a mask per pair of display labels of two dimensions with pd.crosstab, missing values as 'nan'.
+    """
+    rows = df.loc[mask, [dimension, dimension2]].astype(object).apply(lambda column: column.map(display_label))
+    return pd.crosstab(rows[dimension], rows[dimension2])
+
+
+def grouped_labels(labels, reference_labels):
+    """
+    Returns the labels of an axis of a table with the 'other' bucket (if any) renamed to OTHER, and the reference
+    labels mapped to the labels they are counted under.
+    """
+    if labels and labels[-1].startswith('other ('):
+        shown = labels[:-1]
+        other = reference_labels.difference(shown)
+        assert labels[-1] == f'other ({len(other)} values)'
+        return [*shown, OTHER], reference_labels.map(lambda label: label if label in shown else OTHER)
+    assert sorted(labels) == sorted(reference_labels)
+    return labels, reference_labels
+
+
+@pytest.mark.parametrize('selections, ranges', FILTER_STATES)
+@pytest.mark.parametrize('dimension, dimension2, top_k', [
+    ('State', 'Victim.activity', None),
+    ('Incident.year', 'State', None),
+    ('Incident.year', 'State', 5),
+    ('State', 'Victim.activity', 2), # an 'other' bucket on both axes
+])
+def test_table_matches_pandas(selections, ranges, dimension, dimension2, top_k):
+    df = random_frame(4000)
+    cube = CountCube(df, CATEGORIES, range_dimensions=NUMERIC)
+    mask = reference_mask(df, selections, ranges)
+    x, y, z = CrossTab(cube.labels, top_k).table(cube.counts([dimension, dimension2], selections, ranges), dimension, dimension2)
+    reference = reference_table(df, mask, dimension, dimension2)
+    x, index = grouped_labels(x, reference.index)
+    y, columns = grouped_labels(y, reference.columns)
+    expected = reference.groupby(index).sum().T.groupby(columns).sum()
+    assert np.array_equal(z, expected.loc[y, x].to_numpy().reshape(len(y), len(x)))
+    assert z.sum() == mask.sum()
+    if top_k is not None: # the shown values are those with the most rows
+        for labels, totals in ((x, reference.sum(axis=1)), (y, reference.sum(axis=0))):
+            if labels[-1:] == [OTHER]:
+                assert len(labels) == top_k + 1
+                assert totals[labels[:-1]].min() >= totals.drop(labels[:-1]).max()
+
+
+def test_display_labels_follow_relabelled_dimensions():
+    labels = {'Shark.type': np.array(['white shark', 'tiger shark'], dtype=object)}
+    tables = CrossTab(labels)
+    assert list(tables.display_labels('Shark.type')) == ['white ', 'tiger ']
+    labels['Shark.type'] = np.array(['white shark', 'tiger shark', 'bull shark'], dtype=object)
+    assert list(tables.display_labels('Shark.type')) == ['white ', 'tiger ', 'bull ']
@@ -0,0 +1,53 @@
+"""
+Tests of the count cube (jbi100_app/cube.py).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from jbi100_app.cube import CountCube
+from tests.frames import CATEGORIES, FILTER_STATES, NUMERIC, random_frame, reference_mask
+
+
+def reference_counts(cube, df, group_by, mask):
+    """
+    Counts the rows of a mask per label of the group_by dimensions of a cube, with pandas.
+    """
+    if not group_by:
+        return np.array(mask.sum())
+    counts = np.zeros([len(cube.labels[dimension]) for dimension in group_by], dtype=np.int64)
+    codes = []
+    for dimension in group_by:
+        labels = pd.Series(cube.labels[dimension])
+        lookup = {label: code for code, label in enumerate(labels) if not pd.isna(label)}
+        missing = len(labels) - 1 if labels.isna().any() else -1
+        codes.append(np.array([missing if pd.isna(value) else lookup[value] for value in df[dimension][mask]], dtype=np.int64))
+    np.add.at(counts, tuple(codes), 1)
+    return counts
+
+
+@pytest.mark.parametrize('selections, ranges', FILTER_STATES)
+@pytest.mark.parametrize('group_by', [[], ['State'], ['State', 'Victim.activity'], ['Incident.year']])
+def test_counts_match_pandas(selections, ranges, group_by):
+    df = random_frame(4000)
+    cube = CountCube(df, CATEGORIES, range_dimensions=NUMERIC)
+    mask = reference_mask(df, selections, ranges)
+    assert np.array_equal(cube.counts(group_by, selections, ranges), reference_counts(cube, df, group_by, mask))
+    positions = np.flatnonzero(mask)
+    assert np.array_equal(cube.row_counts(group_by, positions), reference_counts(cube, df, group_by, mask))
+
+
+@pytest.mark.parametrize('selections, ranges', FILTER_STATES)
+def test_append_matches_a_rebuild(selections, ranges):
+    df = random_frame(3000)
+    cube = CountCube(df, CATEGORIES, range_dimensions=NUMERIC)
+    cube.counts(['State'], selections, ranges) # a cached cuboid, updated by the appends
+    for seed in range(1, 4):
+        batch = random_frame(500, seed=seed)
+        batch.loc[batch.index[:3], 'Victim.activity'] = f'new activity {seed}'
+        cube.append(batch)
+        df = pd.concat([df, batch], ignore_index=True)
+    rebuilt = CountCube(df, CATEGORIES, range_dimensions=NUMERIC)
+    for group_by in ([], ['State'], ['Victim.activity', 'State']):
+        assert all(pd.Index(cube.labels[d]).equals(pd.Index(rebuilt.labels[d])) for d in group_by)
+        assert np.array_equal(cube.counts(group_by, selections, ranges), rebuilt.counts(group_by, selections, ranges))
@@ -0,0 +1,51 @@
+"""
+Tests of the compact dtype schema of the cleaned data (jbi100_app/data.py): the schema changes the dtypes, not the
+answers of the filters and counts.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_dtypes import previous_schema
+from benchmarks.synthetic import make_frame
+from jbi100_app.backends import PandasBackend
+from jbi100_app.data import COLUMN_DTYPES, apply_schema, get_data
+from tests.helpers import filter_state
+
+FILTERS = [{}, {'selected_states': ['NSW', 'QLD'], 'selected_sharks': ['white shark']},
+           {'shark_length_range': [1.0, 4.0], 'year_range': [1950, 2000], 'incident_month': [1, 2, 3]},
+           {'selected_activities': ['swimming'], 'include_unknown_length': []}]
+
+
+def test_apply_schema():
+    df = pd.DataFrame({
+        'index1': [3, 1, 2], 'Incident.month': [1, 12, 6], 'Incident.year': [1791, 2022, 1950],
+        'Latitude': [-33.9, -31.9, -27.5], 'Longitude': [151.3, 115.9, 153.0], 'Shark.length.m': [2.5, np.nan, 4.0],
+        'State': ['WA', 'NSW', 'WA'], 'Incident.date': pd.to_datetime(['1791-01-01', '2022-12-01', '1950-06-01']),
+    })
+    compact = apply_schema(df)
+    assert {column: str(compact[column].dtype) for column in COLUMN_DTYPES} == COLUMN_DTYPES
+    assert isinstance(compact['State'].dtype, pd.CategoricalDtype) and list(compact['State'].cat.categories) == ['NSW', 'WA']
+    assert compact['Incident.date'].dtype == df['Incident.date'].dtype
+    pd.testing.assert_frame_equal(compact.astype(df.dtypes.to_dict()), df) # no value changed
+
+
+def test_data_has_the_compact_dtypes():
+    df = get_data()
+    for column, dtype in COLUMN_DTYPES.items():
+        assert df[column].dtype == dtype, column
+    strings = [column for column in df.columns if not (pd.api.types.is_numeric_dtype(df[column]) or pd.api.types.is_datetime64_dtype(df[column]))]
+    assert strings and all(isinstance(df[column].dtype, pd.CategoricalDtype) for column in strings)
+    assert all(df[column].cat.categories.is_monotonic_increasing for column in strings)
+
+
+@pytest.mark.parametrize('changes', FILTERS)
+def test_filter_results_are_unchanged(app, changes):
+    df = make_frame(4000)
+    compact, previous = PandasBackend(app.build_data(df=df)), PandasBackend(app.build_data(df=previous_schema(df)))
+    key = app.filter_key(filter_state(app, **changes))
+    assert np.array_equal(compact.positions(key), previous.positions(key))
+    for group_by in (['State'], ['Victim.injury', 'Shark.common.name'], ['Incident.year', 'Incident.month']):
+        counts = [pd.Series(backend.counts(group_by, key).ravel(), index=pd.MultiIndex.from_product([backend.labels[d] for d in group_by]))
+                  for backend in (compact, previous)]
+        assert counts[0][counts[0] > 0].sort_index().equals(counts[1][counts[1] > 0].sort_index())
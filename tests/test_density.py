@@ -0,0 +1,79 @@
+"""
+Tests of the server-side density grid of the heatmap tab (jbi100_app/density.py).
+"""
+import numpy as np
+import pytest
+
+from jbi100_app.density import bounds_from_center, density_grid, gaussian_smooth, grid_shape, viewport_from_relayout
+
+# Roughly the extent of Australia
+BOUNDS = [110.0, -45.0, 155.0, -10.0]
+
+
+def random_points(n_points, seed=0):
+    """
+    Returns the coordinates of n_points incidents around Australia, some without coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    lon, lat = rng.uniform(100, 165, n_points).astype(np.float32), rng.uniform(-50, -5, n_points).astype(np.float32)
+    lon[rng.random(n_points) < 0.05] = np.nan
+    lat[rng.random(n_points) < 0.05] = np.nan
+    return lon, lat
+
+
+def test_grid_shape():
+    area, bins_lon, bins_lat = grid_shape(BOUNDS, bins=90, padding=0.1)
+    assert area == pytest.approx([105.5, -48.5, 159.5, -6.5])
+    assert (bins_lon, bins_lat) == (90, 70) # bins along the longer side, cells of about the same size
+    assert grid_shape([150.0, -34.0, 150.0, -33.0], bins=10)[1:] == (1, 10) # a viewport without width still has a cell
+
+
+@pytest.mark.parametrize('bins', [1, 16, 256])
+def test_counts_match_the_points_per_cell(bins):
+    lon, lat = random_points(20000)
+    cell_lon, cell_lat, counts = density_grid(lon, lat, BOUNDS, bins=bins)
+    area, bins_lon, bins_lat = grid_shape(BOUNDS, bins)
+    inside = (lon >= area[0]) & (lon <= area[2]) & (lat >= area[1]) & (lat <= area[3]) # NaN coordinates compare False
+    assert counts.sum() == inside.sum() and np.all(counts > 0)
+    assert cell_lon.dtype == cell_lat.dtype == counts.dtype == np.float32
+    # every point is counted in the cell whose center lies within half a cell of it
+    width, height = (area[2] - area[0]) / bins_lon, (area[3] - area[1]) / bins_lat
+    column = np.minimum(((lon[inside] - area[0]) / width).astype(int), bins_lon - 1)
+    row = np.minimum(((lat[inside] - area[1]) / height).astype(int), bins_lat - 1)
+    expected = np.zeros((bins_lon, bins_lat))
+    np.add.at(expected, (column, row), 1)
+    columns = np.rint((cell_lon - area[0]) / width - 0.5).astype(int)
+    rows = np.rint((cell_lat - area[1]) / height - 0.5).astype(int)
+    assert np.array_equal(counts, expected[columns, rows]) and len(counts) == np.count_nonzero(expected)
+
+
+def test_smoothing_keeps_the_total():
+    lon, lat = np.array([130.0, 130.1, 140.0]), np.array([-25.0, -25.1, -30.0]) # far from the edges of the grid
+    _, _, counts = density_grid(lon, lat, BOUNDS, bins=64, sigma=2.0)
+    assert counts.sum() == pytest.approx(3, abs=0.05) and len(counts) > 3
+    assert density_grid(lon[:0], lat[:0], BOUNDS, bins=64, sigma=2.0)[2].size == 0
+
+
+def test_gaussian_smooth():
+    grid = np.zeros((21, 21))
+    grid[10, 10] = 1
+    smooth = gaussian_smooth(grid, 1.5)
+    assert smooth.sum() == pytest.approx(1) and smooth.argmax() == grid.argmax()
+    assert np.allclose(smooth, smooth.T) and np.allclose(smooth, smooth[::-1, ::-1])
+    assert gaussian_smooth(grid, 0) is grid
+
+
+def test_viewport_from_relayout():
+    derived = {'map._derived': {'coordinates': [[110, -10], [155, -10], [155, -45], [110, -45]]}, 'map.zoom': 3}
+    assert viewport_from_relayout(derived) == {'bounds': BOUNDS, 'zoom': 3}
+    viewport = viewport_from_relayout({'map.center': {'lon': 135, 'lat': -25}, 'map.zoom': 3})
+    lon0, lat0, lon1, lat1 = viewport['bounds']
+    assert (lon0 + lon1) / 2 == pytest.approx(135) and (lat0 + lat1) / 2 == pytest.approx(-25) and lon1 - lon0 > lat1 - lat0
+    assert viewport_from_relayout({'autosize': True}) is None and viewport_from_relayout(None) is None
+
+
+def test_bounds_from_center():
+    lon0, lat0, lon1, lat1 = bounds_from_center(0, 0, 0)
+    assert lon1 - lon0 == pytest.approx(360 * 1000 / 256) and (lat0, lat1) == (-85, 85) # the whole world, clipped to the map
+    lon0, _, lon1, _ = bounds_from_center(135, -25, 4)
+    assert lon1 - lon0 == pytest.approx(360 * 1000 / (256 * 16))
@@ -0,0 +1,73 @@
+"""
+Tests of the compact encoding of the figures (jbi100_app/encoding.py): what the browser decodes from the typed arrays
+equals the data of the figure.
+"""
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+
+from jbi100_app.encoding import compact_customdata, compact_map_figure, epoch_ms
+
+
+def decode(value):
+    """
+    Decodes a typed array ({dtype, bdata, shape}) of a serialized figure as plotly.js does, other values are returned as they are.
+    """
+    if isinstance(value, dict) and 'bdata' in value:
+        array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        if 'shape' in value:
+            array = array.reshape([int(size) for size in str(value['shape']).split(',')])
+        return array
+    return np.asarray(value)
+
+
+def wire(fig):
+    """
+    Returns the traces of a figure as the browser receives them.
+    """
+    return json.loads(json.dumps(fig, cls=PlotlyJSONEncoder))['data']
+
+
+def map_figure():
+    lat = np.array([-33.89, -31.95, -27.47, -34.93])
+    lon = np.array([151.27, 115.86, 153.03, 138.6])
+    customdata = np.array([[11, -33.89, 151.27, 'white shark', 1.5], [12, -31.95, 115.86, 'white shark', 2.0],
+                           [13, -27.47, 153.03, 'white shark', 3.25], [14, -34.93, 138.6, 'white shark', 4.0]], dtype=object)
+    template = 'Lat %{customdata[1]}<br>Lon %{customdata[2]:.2f}<br>%{customdata[3]}<br>Length %{customdata[4]:.1f} m<extra></extra>'
+    return go.Figure(go.Scattermap(lat=lat, lon=lon, customdata=customdata, hovertemplate=template, marker={'size': [4, 8, 12, 16]}))
+
+
+def test_map_figure_round_trip():
+    fig = map_figure()
+    lat, lon = np.array(fig.data[0].lat), np.array(fig.data[0].lon)
+    trace, = wire(compact_map_figure(fig))
+    assert trace['lat']['dtype'] == 'f4' and trace['lon']['dtype'] == 'f4'
+    assert np.array_equal(decode(trace['lat']), lat.astype(np.float32)) and np.array_equal(decode(trace['lon']), lon.astype(np.float32))
+    assert np.array_equal(decode(trace['marker']['size']), np.array([4, 8, 12, 16], dtype=np.float32))
+    assert 'bdata' in trace['customdata']
+    # the row id and the length are sent per point, the coordinates and the shark type through the hover template
+    assert np.array_equal(decode(trace['customdata']), np.array([[11, 1.5], [12, 2.0], [13, 3.25], [14, 4.0]]))
+    assert trace['hovertemplate'] == 'Lat %{lat:.5f}<br>Lon %{lon:.2f}<br>white shark<br>Length %{customdata[1]:.1f} m<extra></extra>'
+
+
+def test_customdata_without_hover_columns():
+    trace = go.Scattermap(lat=[1.0, 2.0], lon=[3.0, 4.0], customdata=[[1, True], [2, True]], hovertemplate='%{customdata[1]}')
+    compact_customdata(trace)
+    assert trace.hovertemplate == 'true'
+    assert np.array_equal(decode(wire(go.Figure(trace))[0]['customdata']), np.array([[1], [2]]))
+    empty = go.Scattermap(lat=[], lon=[], customdata=[], hovertemplate='%{customdata[0]}')
+    compact_customdata(empty)
+    assert empty.hovertemplate == '%{customdata[0]}'
+
+
+def test_epoch_ms():
+    dates = pd.to_datetime(['1970-01-01', '2000-03-01', '1900-12-01'])
+    ms = epoch_ms(dates)
+    assert ms.dtype == np.float64 and ms[0] == 0
+    assert np.array_equal(pd.to_datetime(ms, unit='ms'), dates)
+    trace, = wire(go.Figure(go.Bar(x=ms, y=[1, 2, 3])))
+    assert np.array_equal(decode(trace['x']), ms)
@@ -0,0 +1,57 @@
+"""
+Tests of the export of the filtered or selected incidents (jbi100_app/export.py and the export route of the app).
+"""
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from jbi100_app.export import csv_stream
+from tests.helpers import PAGE_HEADERS, filter_state
+
+
+@pytest.mark.parametrize('changes', [{}, {'selected_states': ['NSW'], 'year_range': [1950, 2000]}])
+def test_backends_export_the_same_rows(app, sqlite_backend, changes):
+    key = app.filter_key(filter_state(app, **changes))
+    selection = app.backend.df['index1'].to_numpy()[::3]
+    for rows in (None, selection):
+        exports = [pd.concat(list(backend.export(key, rows, app.export_columns, 1000))) for backend in (app.backend, sqlite_backend)]
+        pd.testing.assert_frame_equal(*exports)
+        assert list(exports[0].columns) == app.export_columns
+        csv = [b''.join(csv_stream(backend.export(key, rows, app.export_columns, 1000))) for backend in (app.backend, sqlite_backend)]
+        assert csv[0] == csv[1]
+
+
+def test_export_route(app):
+    state = filter_state(app, selected_states=['NSW'])
+    response = app.server.test_client().post('/export/csv', data={'filters': json.dumps(state), 'selection': 'null'}, headers=PAGE_HEADERS)
+    assert response.status_code == 200
+    exported = pd.read_csv(io.BytesIO(response.data))
+    assert len(exported) == int(app.count_rows([], state))
+    assert set(exported['State']) == {'NSW'}
+
+
+@pytest.mark.parametrize('filters', [
+    lambda state: {**state, 'selections': {**state['selections'], 'State': 'NSW'}}, # a value instead of a list of values
+    lambda state: {**state, 'selections': ['State']},
+    lambda state: {'ranges': state['ranges']},
+])
+def test_export_route_refuses_invalid_filters(app, filters):
+    state = filters(filter_state(app))
+    response = app.server.test_client().post('/export/csv', data={'filters': json.dumps(state), 'selection': 'null'}, headers=PAGE_HEADERS)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('headers, status_code', [
+    ({'Referer': 'http://localhost/'}, 200), # a page of the dashboard, without an Origin header
+    ({}, 403),
+    ({'Origin': 'https://other.example'}, 403),
+    ({'Origin': 'https://other.example', 'Referer': 'http://localhost/'}, 403),
+    ({'Origin': 'null'}, 403), # an opaque origin, such as a sandboxed frame
+    ({'Referer': 'http://localhost.other.example/'}, 403),
+])
+def test_export_route_refuses_posts_from_other_sites(app, headers, status_code):
+    state = filter_state(app, selected_states=['NSW'])
+    response = app.server.test_client().post('/export/csv', data={'filters': json.dumps(state), 'selection': 'null'}, headers=headers)
+    assert response.status_code == status_code
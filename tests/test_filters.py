@@ -0,0 +1,41 @@
+"""
+Tests of the bitmap filter engine and the canonical filter keys (jbi100_app/filters.py).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from jbi100_app.filters import FilterEngine, canonical_filter_key, decode_positions, encode_positions
+from tests.frames import CATEGORIES, FILTER_STATES, NUMERIC, random_frame, reference_mask
+
+
+@pytest.mark.parametrize('selections, ranges', FILTER_STATES)
+def test_positions_match_pandas(selections, ranges):
+    df = random_frame(5000)
+    engine = FilterEngine(df, CATEGORIES, numeric_columns=NUMERIC)
+    assert np.array_equal(engine.positions(selections, ranges), np.flatnonzero(reference_mask(df, selections, ranges)))
+
+
+@pytest.mark.parametrize('selections, ranges', FILTER_STATES)
+def test_append_matches_a_rebuild(selections, ranges):
+    df = random_frame(3000)
+    batch = random_frame(700, seed=1)
+    batch.loc[batch.index[:5], 'State'] = 'NT' # a value the index has not seen
+    engine = FilterEngine(df, CATEGORIES, numeric_columns=NUMERIC)
+    engine.append(batch)
+    rebuilt = FilterEngine(pd.concat([df, batch], ignore_index=True), CATEGORIES, numeric_columns=NUMERIC)
+    assert np.array_equal(engine.positions(selections, ranges), rebuilt.positions(selections, ranges))
+    assert len(engine.positions({'State': ['NT']})) == 5
+
+
+def test_canonical_filter_key():
+    state = {'selections': {'State': ['WA', 'NSW', 'WA'], 'Victim.activity': []},
+             'ranges': {'Shark.length.m': [2.6000000000000005, 4, True]}}
+    same = {'selections': {'State': ['NSW', 'WA'], 'Victim.activity': None}, 'ranges': {'Shark.length.m': [2.6, 4.0, 1]}}
+    assert canonical_filter_key(state) == canonical_filter_key(same) == ((('State', ('NSW', 'WA')),), (('Shark.length.m', 2.6, 4.0, True),))
+
+
+@pytest.mark.parametrize('n_positions', [10, 5000])
+def test_encoded_positions_round_trip(n_positions):
+    positions = np.sort(np.random.default_rng(0).choice(10_000, n_positions, replace=False))
+    assert np.array_equal(decode_positions(encode_positions(positions, 10_000), 10_000), positions)
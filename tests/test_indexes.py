@@ -0,0 +1,46 @@
+"""
+Tests of the sorted range indexes (jbi100_app/indexes.py).
+"""
+import numpy as np
+import pytest
+
+from jbi100_app.indexes import SortedIndex
+from tests.frames import random_frame
+
+RANGES = [(1950, 2000, False), (1950, 2000, True), (1900, 1900, False), (2030, 2040, True), (2000, 1950, False), (-np.inf, np.inf, False)]
+
+
+@pytest.mark.parametrize('low, high, include_missing', RANGES)
+def test_range_matches_a_comparison(low, high, include_missing):
+    values = random_frame(5000)['Incident.year'].to_numpy()
+    index = SortedIndex(values)
+    expected = ((values >= low) & (values <= high)) | (include_missing & np.isnan(values))
+    assert np.array_equal(np.sort(index.range(low, high, include_missing)), np.flatnonzero(expected))
+    assert index.count(low, high, include_missing) == expected.sum()
+    assert np.array_equal(index.mask(low, high, include_missing), expected)
+    positions = np.arange(0, 5000, 7)
+    assert np.array_equal(index.contains(positions, low, high, include_missing), expected[positions])
+    assert index.covers_all(low, high, include_missing) == expected.all()
+
+
+def test_bounds_are_compared_in_the_precision_of_the_column():
+    values = np.array([2.6, 2.7, np.nan, 3.1, 2.6], dtype=np.float32)
+    index = SortedIndex(values)
+    assert index.count(2.6, 3.1) == 4 # 2.6 and 3.1 as float64 would miss the float32 values
+    assert np.array_equal(np.sort(index.range(2.6, 2.6)), [0, 4])
+    assert np.array_equal(index.mask(2.7, 3.1, include_missing=True), [False, True, True, True, False])
+    assert index.bounds() == (np.float32(2.6), np.float32(3.1))
+
+
+def test_integer_column_and_covers_all():
+    index = SortedIndex(np.array([2001, 1999, 2005], dtype=np.int16))
+    assert index.values.dtype == float and len(index) == 3 and len(index.missing) == 0
+    assert index.covers_all(1999, 2005) and not index.covers_all(2000, 2005)
+    assert list(index.range(1999, 2001)) == [1, 0] # in the order of the values
+
+
+def test_column_without_values():
+    index = SortedIndex(np.full(4, np.nan))
+    assert index.bounds() is None
+    assert index.count(0, 1) == 0 and index.count(0, 1, include_missing=True) == 4
+    assert index.covers_all(0, 1, include_missing=True)
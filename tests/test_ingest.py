@@ -0,0 +1,49 @@
+"""
+Tests of the ingestion of new incidents (jbi100_app/ingest.py).
+"""
+import threading
+import time
+
+from jbi100_app.ingest import ReadWriteLock
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    order = []
+    reading, writer_waits = threading.Event(), threading.Event()
+    def first_reader():
+        with lock.read():
+            reading.set()
+            writer_waits.wait()
+            time.sleep(0.05)
+            with lock.read(): # a nested read does not wait for the writer
+                order.append('nested read')
+        order.append('first read done')
+    def writer():
+        with lock.write():
+            order.append('write')
+    def second_reader():
+        with lock.read():
+            order.append('second read')
+    threads = [threading.Thread(target=first_reader)]
+    threads[0].start()
+    reading.wait()
+    threads.append(threading.Thread(target=writer))
+    threads[1].start()
+    while not lock._writers:
+        time.sleep(0.001)
+    writer_waits.set()
+    threads.append(threading.Thread(target=second_reader))
+    threads[2].start()
+    for thread in threads:
+        thread.join(5)
+    assert order == ['nested read', 'first read done', 'write', 'second read']
+
+
+def test_writer_can_read():
+    lock = ReadWriteLock()
+    with lock.write():
+        with lock.read():
+            pass
+    with lock.read():
+        pass
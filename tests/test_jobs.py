@@ -0,0 +1,189 @@
+"""
+Tests of the latest-only execution of the figure updates (jbi100_app/jobs.py).
+"""
+import json
+import threading
+import time
+
+import pytest
+
+from jbi100_app.jobs import LatestOnly, SingleFlight, Superseded, union_changed
+from tests.helpers import figure_update_body, filter_state
+
+
+def test_union_changed():
+    assert union_changed([{'a'}, {'b'}]) == {'a', 'b'}
+    assert union_changed([{'a'}, None]) is None
+    assert union_changed([]) == set()
+
+
+def test_superseded_changes_are_carried_over():
+    jobs = LatestOnly(window_s=0.01)
+    running, superseded = threading.Event(), threading.Event()
+    outcomes = []
+    def older():
+        try:
+            with jobs.job('page', {'filter-store'}):
+                running.set()
+                superseded.wait()
+                jobs.check()
+        except Superseded:
+            outcomes.append('superseded')
+    thread = threading.Thread(target=older)
+    thread.start()
+    running.wait()
+    with jobs.job('page', {'var-select'}) as changed:
+        superseded.set()
+        thread.join()
+        assert changed == {'filter-store', 'var-select'}
+    assert outcomes == ['superseded']
+    with jobs.job('page', {'var-select2'}) as changed: # the completed update rebuilt the changes of the superseded one
+        assert changed == {'var-select2'}
+
+
+def test_changes_of_failed_updates_are_kept():
+    jobs = LatestOnly(window_s=0)
+    with pytest.raises(ValueError):
+        with jobs.job('page', {'filter-store'}):
+            raise ValueError()
+    with jobs.job('page', None) as changed:
+        assert changed is None
+    with jobs.job('other page', {'map-tabs'}) as changed: # sessions do not share their changes
+        assert changed == {'map-tabs'}
+
+
+def test_without_session():
+    jobs = LatestOnly()
+    with jobs.job(None, {'filter-store'}) as changed:
+        jobs.check()
+        assert changed == {'filter-store'}
+
+
+def test_update_after_superseded_update_rebuilds_its_outputs(app, initial_props, monkeypatch):
+    """
+    A filter change superseded by a change of the bar variable 10 ms later: the second update must rebuild every output
+    of the filter change, not only those of the bar variable.
+    """
+    monkeypatch.setattr(app.figure_jobs, 'window_s', 1.0) # both updates arrive within the window of the first one
+    client = app.server.test_client()
+    props = {**initial_props, 'session-id.data': 'test-superseded', 'filter-store.data': filter_state(app)}
+    client.post('/_dash-update-component', data=figure_update_body(app, props, []), content_type='application/json')
+    props['filter-store.data'] = filter_state(app, selected_states=['NSW'])
+    responses = {}
+    def post(name, body):
+        responses[name] = client.post('/_dash-update-component', data=body, content_type='application/json')
+    filter_change = threading.Thread(target=post, args=('filter', figure_update_body(app, props, ['filter-store.data'])))
+    filter_change.start()
+    time.sleep(0.01)
+    props['var-select.value'] = 'State'
+    post('var', figure_update_body(app, props, ['var-select.value']))
+    filter_change.join()
+    assert responses['filter'].status_code == 204
+    outputs = json.loads(responses['var'].data)['response']
+    assert set(outputs) == set(app.FIGURE_DEPENDENCIES)
+    n_nsw = int(app.count_rows([], props['filter-store.data']))
+    assert f'{n_nsw}' in json.dumps(outputs['row-details'])
+
+
+def test_burst_of_updates_runs_only_the_last():
+    jobs = LatestOnly(window_s=0.05)
+    ran, outcomes = [], []
+    def update(number):
+        try:
+            with jobs.job('page', {'filter-store'}):
+                ran.append(number)
+        except Superseded:
+            outcomes.append(number)
+    with jobs.job('page', None): # a running update, so the burst waits for the window
+        threads = [threading.Thread(target=update, args=(number,)) for number in range(5)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+    assert ran == [4] and sorted(outcomes) == [0, 1, 2, 3]
+    assert jobs.stats()['superseded'] == 4
+
+
+def run_concurrently(flights, key, n_calls, function):
+    """
+    Calls flights.run(key, function) from n_calls threads at once, returns their results or exceptions.
+    """
+    barrier = threading.Barrier(n_calls)
+    results = [None] * n_calls
+    def call(number):
+        barrier.wait()
+        try:
+            results[number] = flights.run(key, function)
+        except Exception as exception:
+            results[number] = exception
+    threads = [threading.Thread(target=call, args=(number,)) for number in range(n_calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_flight_shares_one_computation():
+    flights = SingleFlight()
+    calls = []
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'figure': len(calls)}
+    results = run_concurrently(flights, 'key', 8, compute)
+    assert calls == [1] and all(result is results[0] for result in results)
+    assert flights.stats()['hits'] == 7 and flights.stats()['misses'] == 1 and flights.stats()['entries'] == 0
+    assert flights.run('key', compute) == {'figure': 2} # the key is forgotten once the computation is done
+    assert flights.run('other key', lambda: 'other') == 'other'
+
+
+def test_single_flight_recomputes_after_a_failure():
+    flights = SingleFlight()
+    calls = []
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        if len(calls) == 1:
+            raise Superseded()
+        return 'figures'
+    results = run_concurrently(flights, 'key', 4, compute)
+    assert sum(isinstance(result, Superseded) for result in results) == 1
+    assert results.count('figures') == 3 and len(calls) == 2
+
+
+def test_single_flight_disabled():
+    flights = SingleFlight(enabled=False)
+    calls = []
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return len(calls)
+    run_concurrently(flights, 'key', 4, compute)
+    assert len(calls) == 4
+
+
+def test_identical_updates_of_pages_share_their_figures(app, initial_props, monkeypatch):
+    calls = []
+    compute_figures = app.compute_figures
+    def counted(*args):
+        calls.append(1)
+        time.sleep(0.2) # so the updates overlap
+        return compute_figures(*args)
+    monkeypatch.setattr(app, 'compute_figures', counted)
+    props = {**initial_props, 'filter-store.data': filter_state(app, selected_states=['WA'])}
+    bodies = [figure_update_body(app, {**props, 'session-id.data': f'test-flight-{number}'}, ['filter-store.data']) for number in range(4)]
+    responses = [None] * 4
+    def post(number):
+        responses[number] = app.server.test_client().post('/_dash-update-component', data=bodies[number], content_type='application/json')
+    threads = [threading.Thread(target=post, args=(number,)) for number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(response.status_code == 200 and response.data == responses[0].data for response in responses)
+    other = {**props, 'session-id.data': 'test-flight-other', 'var-select.value': 'State'} # another key
+    app.server.test_client().post('/_dash-update-component', data=figure_update_body(app, other, ['filter-store.data']), content_type='application/json')
+    assert len(calls) == 2
@@ -0,0 +1,74 @@
+"""
+Tests of the least-recently-used cache with a memory budget (jbi100_app/lru.py).
+"""
+import pickle
+
+import numpy as np
+
+from jbi100_app.lru import LRUCache, sizeof
+
+
+def array(n_bytes):
+    return np.zeros(n_bytes, dtype=np.uint8)
+
+
+def test_sizeof():
+    assert sizeof(array(1000)) == 1000
+    assert sizeof((array(1000), [array(24), array(8)])) == 1032
+    assert sizeof('positions') > 0
+
+
+def test_evicts_least_recently_used_within_budget():
+    cache = LRUCache(1000)
+    for key in 'abc':
+        cache.put(key, array(300))
+    assert cache.get('a') is not None # 'b' is now the least recently used
+    cache.put('d', array(300))
+    assert 'b' not in cache and all(key in cache for key in 'acd')
+    cache.put('e', array(700))
+    assert list(cache._entries) == ['d', 'e'] and cache.current_bytes == 1000
+    assert cache.stats() == {'hits': 1, 'misses': 0, 'evictions': 3, 'entries': 2, 'bytes': 1000, 'max_bytes': 1000, 'hit_rate': 1.0}
+
+
+def test_replacing_a_value_updates_the_size():
+    cache = LRUCache(1000)
+    cache.put('a', array(600))
+    cache.put('a', array(100))
+    cache.put('b', array(800))
+    assert len(cache) == 2 and cache.current_bytes == 900 and cache.evictions == 0
+
+
+def test_value_larger_than_the_budget_is_not_stored():
+    cache = LRUCache(1000)
+    cache.put('a', array(500))
+    cache.put('b', array(1001))
+    assert 'b' not in cache and 'a' in cache and cache.current_bytes == 500
+
+
+def test_get_or_compute():
+    cache = LRUCache(1000, sizeof=len)
+    calls = []
+    def compute():
+        calls.append(1)
+        return 'value'
+    assert cache.get_or_compute('key', compute) == 'value'
+    assert cache.get_or_compute('key', compute) == 'value'
+    assert len(calls) == 1 and cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    assert cache.get('other', 'default') == 'default'
+
+
+def test_clear_keeps_the_counters():
+    cache = LRUCache(1000)
+    cache.put('a', array(100))
+    cache.get('a')
+    cache.clear()
+    assert len(cache) == 0 and cache.current_bytes == 0 and cache.stats()['hits'] == 1
+
+
+def test_pickled_empty():
+    cache = LRUCache(1000)
+    cache.put('a', array(100))
+    copy = pickle.loads(pickle.dumps(cache))
+    assert len(copy) == 0 and copy.max_bytes == 1000
+    copy.put('b', array(100))
+    assert 'b' in copy
@@ -0,0 +1,77 @@
+"""
+Tests of the stage timings (jbi100_app/metrics.py): the Prometheus histograms and the Server-Timing header.
+"""
+import re
+
+from flask import Flask
+
+from jbi100_app.lru import LRUCache
+from jbi100_app.metrics import DASH_UPDATE_PATH, Histogram, Metrics
+from tests.helpers import figure_update_body, filter_state
+
+# A stage in a Server-Timing header
+TIMING = re.compile(r'^([\w.-]+);dur=(\d+\.\d\d)$')
+
+
+def server_timing(response):
+    """
+    Returns the stages of the Server-Timing header of a response and their durations in milliseconds.
+    """
+    return {match.group(1): float(match.group(2)) for match in map(TIMING.match, response.headers['Server-Timing'].split(', '))}
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(seconds)
+    assert histogram.render('stage_seconds', 'stage="filter"') == [
+        'stage_seconds_bucket{stage="filter",le="0.1"} 2', # the bounds are inclusive
+        'stage_seconds_bucket{stage="filter",le="1.0"} 3',
+        'stage_seconds_bucket{stage="filter",le="+Inf"} 4',
+        'stage_seconds_sum{stage="filter"} 3.65',
+        'stage_seconds_count{stage="filter"} 4',
+    ]
+
+
+def test_render():
+    metrics = Metrics(buckets=(1.0,), prefix='test')
+    metrics.observe(metrics.stages, 'say "hi"', 0.5)
+    metrics.record_boot('data', 2.0)
+    cache = LRUCache(100)
+    cache.get('key')
+    metrics.register_cache('filter', cache.stats)
+    lines = metrics.render().splitlines()
+    assert 'test_stage_seconds_bucket{stage="say \\"hi\\"",le="1.0"} 1' in lines
+    assert 'test_boot_seconds{phase="data"} 2.0' in lines
+    assert 'test_cache_misses_total{cache="filter"} 1' in lines and 'test_cache_max_bytes{cache="filter"} 100' in lines
+
+
+def test_server_timing_header():
+    server = Flask(__name__)
+    metrics = Metrics(prefix='test')
+    metrics.install(server, '/metrics')
+    def update():
+        for stage in ('filter', 'map', 'filter'):
+            with metrics.span(stage):
+                pass
+        return '{}'
+    server.add_url_rule(f'/{DASH_UPDATE_PATH}', 'update', update, methods=['POST'])
+    server.add_url_rule('/other', 'other', lambda: 'other')
+    client = server.test_client()
+    response = client.post(f'/{DASH_UPDATE_PATH}', json={'output': 'map.figure'})
+    timings = server_timing(response)
+    assert list(timings) == ['filter', 'map', 'total'] # a stage that ran twice is summed
+    assert timings['total'] >= timings['filter'] + timings['map'] - 0.02 # rounded to hundredths
+    assert 'Server-Timing' not in client.get('/other').headers
+    assert sum(metrics.requests['map.figure'].counts) == 1
+    assert 'test_request_seconds_count{callback="map.figure"} 1' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_server_timing_of_the_figure_update(app, initial_props):
+    props = {**initial_props, 'session-id.data': 'test-metrics', 'filter-store.data': filter_state(app, selected_states=['QLD'])}
+    response = app.server.test_client().post('/_dash-update-component', data=figure_update_body(app, props, ['filter-store.data']),
+                                             content_type='application/json')
+    assert response.status_code == 200
+    timings = server_timing(response)
+    assert {*app.FIGURE_DEPENDENCIES, 'total'} <= set(timings) # a stage per output, also when built in the figure pool
+    assert all(duration >= 0 for duration in timings.values())
@@ -0,0 +1,90 @@
+"""
+Tests of the thread pool that builds the figures of an update (jbi100_app/pool.py).
+"""
+import contextvars
+import json
+import threading
+import time
+
+import plotly.graph_objects as go
+import pytest
+from dash import no_update
+from plotly.utils import PlotlyJSONEncoder
+
+from jbi100_app.jobs import LatestOnly, Superseded
+from jbi100_app.pool import TaskPool, plain_figure, pool_size
+from tests.helpers import filter_state
+
+request_name = contextvars.ContextVar('request_name')
+
+
+def test_pool_size():
+    assert pool_size('3', 5) == 3
+    assert pool_size('0', 5) == 0
+    assert 0 <= pool_size('auto', 2) <= 2
+
+
+def test_plain_figure():
+    figure = go.Figure(go.Bar(x=['a'], y=[1]))
+    assert plain_figure(figure) == figure.to_plotly_json()
+    assert plain_figure(no_update) is no_update
+    assert plain_figure('Filtered Data: 3 rows') == 'Filtered Data: 3 rows'
+
+
+@pytest.mark.parametrize('workers', [0, 3])
+def test_map_keeps_the_order_and_the_context(workers):
+    request_name.set('update')
+    pool = TaskPool(workers)
+    def task(item):
+        time.sleep(0.01 * (5 - item)) # the first items finish last
+        return item, request_name.get(), threading.current_thread().name
+    results = pool.map(task, list(range(5)))
+    assert [(item, name) for item, name, _ in results] == [(item, 'update') for item in range(5)]
+    assert any(thread.startswith('figures') for *_, thread in results) == bool(workers)
+
+
+def test_map_waits_for_all_tasks_and_raises_the_first_exception():
+    pool = TaskPool(3)
+    finished = []
+    def task(item):
+        if item == 1:
+            raise KeyError(item)
+        time.sleep(0.05)
+        finished.append(item)
+        if item == 2:
+            raise ValueError(item)
+    with pytest.raises(KeyError):
+        pool.map(task, [0, 1, 2])
+    assert sorted(finished) == [0, 2]
+
+
+def test_superseded_update_is_cancelled_in_the_pool():
+    jobs = LatestOnly(window_s=0)
+    pool = TaskPool(2)
+    started, superseded = threading.Event(), threading.Event()
+    def task(item):
+        started.set()
+        superseded.wait()
+        jobs.check()
+    def newer_update():
+        started.wait()
+        with jobs.job('page', None):
+            superseded.set()
+    newer = threading.Thread(target=newer_update)
+    newer.start()
+    with pytest.raises(Superseded):
+        with jobs.job('page', None):
+            pool.map(jobs.bind(task), [0, 1])
+    newer.join()
+
+
+def test_figures_with_a_pool_equal_those_without(app, monkeypatch):
+    state = filter_state(app, selected_states=['NSW'])
+    def figures():
+        app.backend.clear_caches()
+        app.timeline_cache.clear()
+        outputs = app.compute_figures(None, state, None, None, 'scatter', 'Victim.injury', 'Provoked/unprovoked', 0, 0, 'viridis', 'Vivid')
+        return json.dumps([plain_figure(output) for output in outputs], cls=PlotlyJSONEncoder)
+    sequential = figures()
+    monkeypatch.setattr(app, 'figure_pool', TaskPool(3))
+    assert figures() == sequential
@@ -0,0 +1,119 @@
+"""
+Tests of the server-side store of the map selections (jbi100_app/sessions.py).
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from jbi100_app.sessions import SelectionStore
+from jbi100_app.shared import shared_state
+from tests.helpers import PAGE_HEADERS, filter_state
+
+
+def test_shared_selections_survive_a_new_shared_state(tmp_path):
+    """
+    The store lives next to the shared states, as in app.py: building a state removes the states of other keys but
+    must keep the selections.
+    """
+    shared_dir = str(tmp_path)
+    store = SelectionStore(10**6, 60, os.path.join(shared_dir, '.selections'))
+    token = store.put('page', [3, 1, 2])
+    shared_state(shared_dir, 'first', lambda: {'ids': np.arange(10)})
+    shared_state(shared_dir, 'second', lambda: {'ids': np.arange(20)})
+    assert sorted(os.listdir(shared_dir)) == ['.lock', '.selections', 'second']
+    other_worker = SelectionStore(10**6, 60, os.path.join(shared_dir, '.selections'))
+    assert other_worker.get(token).tolist() == [1, 2, 3]
+    assert store.get(store.put('page', [4])).tolist() == [4]
+
+
+def test_dense_selections_are_kept_as_bitmaps():
+    store = SelectionStore(10**6, 60)
+    ids = np.arange(1_000_000, 3_000_000, 2) # 4 MB as an array
+    token = store.put('page', ids[::-1])
+    assert store.stats()['bytes'] <= 2_000_000 // 8 + 1
+    assert np.array_equal(store.get(token), ids)
+    sparse = [5, 70_000_000]
+    assert store.get(store.put('other page', sparse)).tolist() == sparse
+
+
+def test_selection_larger_than_the_budget_is_refused():
+    store = SelectionStore(1000, 60)
+    kept = store.put('other page', [1, 2, 3])
+    assert store.put('page', np.arange(0, 10**6, 7)) is None
+    assert store.get(kept).tolist() == [1, 2, 3]
+    assert store.stats()['evictions'] == 0
+
+
+def test_app_reports_a_selection_too_large_to_keep(app, monkeypatch):
+    monkeypatch.setattr(app.selection_store, 'max_bytes', 0)
+    state = filter_state(app)
+    selected_data = {'range': {'map': [[100, 0], [170, -50]]}} # a box around Australia
+    selection = app.update_selection(state, selected_data, 0, 'test-too-large')
+    assert selection['token'] is None and selection['rows'] > 0
+    assert app.selection_rows(selection) is None
+    assert 'too large' in app.show_selection_message(selection)
+    response = app.server.test_client().post('/export/csv', data={'filters': json.dumps(state), 'selection': json.dumps(selection)},
+                                             headers=PAGE_HEADERS)
+    assert response.status_code == 413
+
+
+def test_round_trip():
+    store = SelectionStore(10**6, 60)
+    token = store.put('page', [7, 3, 3, 5])
+    ids = store.get(token)
+    assert ids.tolist() == [3, 5, 7] and ids.dtype == np.int32
+    assert store.get('unknown') is None
+    assert store.stats()['hits'] == 1 and store.stats()['misses'] == 1
+
+
+def test_new_selection_of_a_page_replaces_its_previous_one(tmp_path):
+    store = SelectionStore(10**6, 60, str(tmp_path))
+    first = store.put('page', [1, 2])
+    second = store.put('page', [3])
+    assert store.get(first) is None and store.get(second).tolist() == [3]
+    assert os.listdir(tmp_path) == [f'{second}.npy']
+    assert store.stats()['entries'] == 1
+
+
+def test_least_recently_used_selections_are_evicted(tmp_path):
+    store = SelectionStore(100, 60, str(tmp_path)) # room for two selections of 10 sparse int32 ids
+    tokens = [store.put(f'page {number}', np.arange(number * 1000, number * 1000 + 1000, 100)) for number in range(2)]
+    store.get(tokens[0]) # now the second one is the least recently used
+    tokens.append(store.put('page 2', np.arange(5000, 6000, 100)))
+    assert store.stats()['evictions'] == 1 and store.stats()['bytes'] == 80
+    assert tokens[1] not in store._entries
+    assert store.get(tokens[1]).tolist() == list(range(1000, 2000, 100)) # still in the shared directory
+    other_worker = SelectionStore(100, 60, str(tmp_path))
+    assert [other_worker.get(token)[0] for token in tokens] == [0, 1000, 5000]
+
+
+def test_selections_expire(tmp_path):
+    store = SelectionStore(10**6, 0.05, str(tmp_path))
+    token = store.put('page', [1])
+    path = os.path.join(tmp_path, f'{token}.npy')
+    os.utime(path, (os.path.getmtime(path) - 1,) * 2) # last used a second ago
+    time.sleep(0.1)
+    assert store.get(token) is None
+    assert SelectionStore(10**6, 0.05, str(tmp_path)).get(token) is None
+    store.put('other page', [2]) # removes the expired file
+    assert not os.path.exists(path)
+
+
+def test_tokens_are_not_paths(tmp_path):
+    store = SelectionStore(10**6, 60, str(tmp_path / 'selections'))
+    np.save(tmp_path / 'secret.npy', np.arange(3))
+    assert store.get('../secret') is None
+
+
+def test_app_selection_round_trip(app):
+    state = filter_state(app, selected_states=['NSW'])
+    selection = app.update_selection(state, {'range': {'map': [[145, -25], [155, -40]]}}, 0, 'test-round-trip')
+    rows = app.selection_rows(selection)
+    assert selection['rows'] == len(rows) > 0
+    assert set(rows) <= set(app.backend.rows(app.filter_key(state))['index1'])
+    clicked = app.update_selection(state, {'points': [{'customdata': [int(rows[0])]}]}, 0, 'test-round-trip')
+    assert app.selection_rows(clicked).tolist() == [rows[0]]
+    assert app.selection_rows(selection) is None # replaced by the new selection of the page
+    assert app.update_selection(state, None, 0, 'test-round-trip') is None
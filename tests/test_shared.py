@@ -0,0 +1,79 @@
+"""
+Tests of the state shared by the worker processes (jbi100_app/shared.py).
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from jbi100_app.shared import MIN_MAPPED_BYTES, load_state, shareable_frame, shared_state, state_key
+from tests.frames import random_frame
+
+
+def build_state():
+    positions = np.arange(MIN_MAPPED_BYTES // 8 * 2, dtype=np.int64)
+    return {'positions': positions, 'same positions': positions, 'small': np.arange(10), 'frame': shareable_frame(random_frame(20000))}
+
+
+def is_mapped(array):
+    """
+    Returns whether an array is a read-only view on a memory-mapped file.
+    """
+    base = array
+    while isinstance(base, np.ndarray) and not isinstance(base, np.memmap):
+        base = base.base
+    return not array.flags.writeable and isinstance(base, np.memmap)
+
+
+def test_state_is_reloaded_memory_mapped(tmp_path):
+    calls = []
+    def build():
+        calls.append(1)
+        return build_state()
+    key = state_key('data version', 1)
+    state = shared_state(str(tmp_path), key, build)
+    again = shared_state(str(tmp_path), key, build)
+    assert len(calls) == 1
+    expected = build_state()
+    for loaded in (state, again):
+        assert is_mapped(loaded['positions']) and np.array_equal(loaded['positions'], expected['positions'])
+        assert loaded['same positions'] is loaded['positions'] # an array referenced twice is stored and mapped once
+        assert not is_mapped(loaded['small']) and np.array_equal(loaded['small'], expected['small'])
+        pd.testing.assert_frame_equal(loaded['frame'], expected['frame'])
+    assert is_mapped(state['frame']['Incident.year'].to_numpy())
+
+
+def test_other_keys_are_removed(tmp_path):
+    old_key, new_key = state_key('data version', 1), state_key('new data version', 1)
+    shared_state(str(tmp_path), old_key, build_state)
+    (tmp_path / '.selections').mkdir() # entries starting with '.' belong to others
+    shared_state(str(tmp_path), new_key, build_state)
+    assert sorted(name for name in os.listdir(tmp_path) if name != '.lock') == ['.selections', new_key]
+    assert load_state(str(tmp_path / old_key)) is None
+
+
+def test_concurrent_starts_build_once(tmp_path):
+    calls = []
+    def build():
+        calls.append(1)
+        time.sleep(0.2)
+        return build_state()
+    states = [None] * 4
+    def start(number):
+        states[number] = shared_state(str(tmp_path), 'key', build)
+    threads = [threading.Thread(target=start, args=(number,)) for number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and all(np.array_equal(state['positions'], states[0]['positions']) for state in states)
+
+
+def test_shareable_frame():
+    df = pd.DataFrame({'State': ['WA', 'NSW', None, 'WA'], 'Incident.year': [2000.0, 1990.0, np.nan, 1950.0], 'Provoked': [True, False, True, False]})
+    shareable = shareable_frame(df)
+    assert isinstance(shareable['State'].dtype, pd.CategoricalDtype) and list(shareable['State'].cat.categories) == ['NSW', 'WA']
+    assert shareable['Incident.year'].dtype == np.float64 and shareable['Provoked'].dtype == bool
+    assert shareable['State'].astype(object).equals(df['State'].astype(object))
@@ -0,0 +1,44 @@
+"""
+Tests of the layout manifest (jbi100_app/startup.py).
+"""
+import os
+
+from jbi100_app.startup import LAYOUT_PREFIX, layout_key, load_layout_manifest, save_layout_manifest
+
+LAYOUT = {'options': {'State': ['NSW', 'QLD', None]}, 'bounds': {'year': [1791, 2022]}, 'palettes': {'Plotly': ['#636efa']}}
+
+
+def manifests(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.startswith(LAYOUT_PREFIX))
+
+
+def test_round_trip(tmp_path):
+    key = layout_key('data version', '6.0.0')
+    save_layout_manifest(LAYOUT, str(tmp_path), key)
+    assert load_layout_manifest(str(tmp_path), key) == LAYOUT
+    assert manifests(tmp_path) == [f'{LAYOUT_PREFIX}{key}.json'] # no temporary files are left
+
+
+def test_changed_key(tmp_path):
+    key = layout_key('data version', '6.0.0')
+    save_layout_manifest(LAYOUT, str(tmp_path), key)
+    assert layout_key('data version', '6.1.0') != key and layout_key('new data version', '6.0.0') != key
+    assert load_layout_manifest(str(tmp_path), layout_key('new data version', '6.0.0')) is None
+    assert load_layout_manifest(str(tmp_path / 'missing'), key) is None
+
+
+def test_new_key_replaces_old_manifest(tmp_path):
+    old_key, new_key = layout_key('data version'), layout_key('new data version')
+    save_layout_manifest(LAYOUT, str(tmp_path), old_key)
+    save_layout_manifest({**LAYOUT, 'bounds': {'year': [1791, 2023]}}, str(tmp_path), new_key)
+    assert manifests(tmp_path) == [f'{LAYOUT_PREFIX}{new_key}.json']
+    assert load_layout_manifest(str(tmp_path), old_key) is None
+    assert load_layout_manifest(str(tmp_path), new_key)['bounds'] == {'year': [1791, 2023]}
+
+
+def test_invalid_manifest(tmp_path):
+    key = layout_key('data version')
+    (tmp_path / f'{LAYOUT_PREFIX}{key}.json').write_text('{"key": "', encoding='utf-8') # a half written file
+    assert load_layout_manifest(str(tmp_path), key) is None
+    (tmp_path / f'{LAYOUT_PREFIX}{key}.json').write_text('{"key": "other", "layout": {}}', encoding='utf-8')
+    assert load_layout_manifest(str(tmp_path), key) is None
@@ -0,0 +1,115 @@
+"""
+Tests of the timeline engine (jbi100_app/timeline.py): the bins of the monthly prefix sums hold as many incidents as a
+direct count of the filtered rows per month.
+"""
+import numpy as np
+import pytest
+
+from jbi100_app.timeline import BIN_WIDTHS, MonthlyPrefix
+from tests.helpers import filter_state
+
+
+def month_indexes(years, months):
+    """
+    Returns the months since January of year 0 of the rows with a known year and month.
+    """
+    years, months = np.asarray(years, dtype=float), np.asarray(months, dtype=float)
+    known = ~np.isnan(years) & ~np.isnan(months)
+    return years[known].astype(np.int64) * 12 + months[known].astype(np.int64) - 1
+
+
+def reference_bins(month_index, edges):
+    """
+    Counts the rows per bin [edges[i], edges[i + 1]) directly.
+    """
+    return np.diff(np.searchsorted(np.sort(month_index), edges))
+
+
+def check_edges(bin_width, edges, low_year, high_year, max_bins):
+    """
+    Checks that the bins lie within the year range, start on calendar boundaries and are the finest within max_bins.
+    """
+    width = dict(BIN_WIDTHS)[bin_width]
+    assert edges[0] >= low_year * 12 and edges[-1] <= (high_year + 1) * 12
+    assert np.all(np.diff(edges) > 0) and np.all(edges[1:-1] % width == 0)
+    assert len(edges) - 1 <= max_bins or bin_width == BIN_WIDTHS[-1][0]
+    if width > 1: # a finer width would need more than max_bins bins
+        finer = BIN_WIDTHS[[name for name, _ in BIN_WIDTHS].index(bin_width) - 1][1]
+        assert -(-(edges[-1] - edges[0] // finer * finer) // finer) > max_bins
+
+
+def random_months(n_rows, seed=0):
+    """
+    Returns the years (1900 to 2019) and months of n_rows incidents, some unknown, without incidents in March and
+    in the years 1950 to 1959.
+    """
+    rng = np.random.default_rng(seed)
+    years, months = rng.integers(1900, 2020, n_rows).astype(float), rng.integers(1, 13, n_rows).astype(float)
+    keep = (months != 3) & ((years < 1950) | (years > 1959))
+    years, months = years[keep], months[keep]
+    years[rng.random(len(years)) < 0.05] = np.nan
+    months[rng.random(len(months)) < 0.05] = np.nan
+    return years, months
+
+
+def monthly_prefix(years, months):
+    """
+    Returns the MonthlyPrefix of the incidents, from counts per year and month as the count cube has them.
+    """
+    year_labels, year_codes = np.unique(years, return_inverse=True) # NaN sorts last
+    month_labels, month_codes = np.unique(months, return_inverse=True)
+    counts = np.zeros((len(year_labels), len(month_labels)), dtype=np.int64)
+    np.add.at(counts, (year_codes, month_codes), 1)
+    return MonthlyPrefix(counts, year_labels, month_labels)
+
+
+@pytest.mark.parametrize('low_year, high_year, max_bins', [
+    (1900, 2019, 250), # years
+    (1900, 2019, 100), # decades
+    (1900, 2019, 2000), # months
+    (1948, 1962, 250), # a range with a gap of ten years
+    (1950, 1959, 250), # a range without incidents
+    (1800, 2100, 250), # a range wider than the data
+    (1987.5, 1990.2, 10), # bins cut off at the range
+])
+def test_bins_match_direct_counts(low_year, high_year, max_bins):
+    years, months = random_months(20000)
+    series = monthly_prefix(years, months)
+    bin_width, edges, counts = series.bins(low_year, high_year, max_bins)
+    month_index = month_indexes(years, months)
+    visible = month_index[(month_index >= np.ceil(low_year) * 12) & (month_index < (np.floor(high_year) + 1) * 12)]
+    if len(visible) == 0: # empty bins within the months with incidents
+        assert not counts.any()
+        return
+    check_edges(bin_width, edges, np.ceil(low_year), np.floor(high_year), max_bins)
+    assert edges[0] <= visible.min() and edges[-1] > visible.max()
+    assert np.array_equal(counts, reference_bins(month_index, edges))
+    assert counts.sum() == len(visible)
+
+
+def test_empty_slice():
+    series = monthly_prefix(np.array([np.nan]), np.array([5.0]))
+    assert len(series) == 0
+    assert all(len(part) == 0 for part in series.bins(1900, 2000, 250)[1:])
+
+
+@pytest.mark.parametrize('changes', [
+    {},
+    {'year_range': [2000, 2005]},
+    {'incident_month': [1, 2], 'year_range': [1995, 2010]}, # filters that remove whole months, in month bins
+    {'selected_states': ['WA'], 'incident_month': [12]},
+    {'selected_states': ['NSW'], 'year_range': [1900, 2000], 'shark_length_range': [2.0, 4.0], 'include_unknown_length': []},
+])
+def test_app_timeline_matches_filtered_rows(app, changes):
+    state = filter_state(app, **changes)
+    bin_width, edges, counts = app.timeline_bins(state)
+    rows = app.backend.rows(app.filter_key(state))
+    month_index = month_indexes(rows['Incident.year'], rows['Incident.month'])
+    low_year, high_year, _ = state['ranges']['Incident.year']
+    check_edges(bin_width, edges, low_year, high_year, app.TIMELINE_MAX_BINS)
+    assert np.array_equal(counts, reference_bins(month_index, edges))
+    assert counts.sum() == len(month_index)
+    if bin_width == 'month' and 'incident_month' in changes: # the months that are filtered out have no incidents
+        assert not counts[~np.isin(edges[:-1] % 12 + 1, changes['incident_month'])].any()
+    app.timeline_cache.clear()
+    assert np.array_equal(app.timeline_bins(state)[2], counts) # recomputed, not cached